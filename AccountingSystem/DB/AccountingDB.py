@@ -9,6 +9,8 @@ from DIRAC.Core.Base.DB import DB
 from DIRAC import S_OK, S_ERROR, gMonitor, gConfig
 from DIRAC.Core.Utilities import List, ThreadSafe, Time, DEncode
 from DIRAC.AccountingSystem.private.TypeLoader import TypeLoader
+from DIRAC.AccountingSystem.private.BucketAggregator import BucketAggregator
+from DIRAC.AccountingSystem.private.Rollup import Rollup
 from DIRAC.Core.Utilities.ThreadPool import ThreadPool
 
 gSynchro = ThreadSafe.Synchronizer()
@@ -139,6 +141,9 @@ class AccountingDB( DB ):
           self.dbCatalog[ typeName ][ 'dataTimespan' ] = typeClass().getDataTimespan()
           self.dbCatalog[ typeName ][ 'definition' ] = { 'keys' : definitionKeyFields,
                                                          'values' : definitionAccountingFields }
+          retVal = self.__registerRollups( typeName, pythonClassName )
+          if not retVal[ 'OK' ]:
+            self.log.error( "Can't register rollups", "%s: %s" % ( typeName, retVal[ 'Message' ] ) )
     return S_OK()
 
   def __loadCatalogFromDB( self ):
@@ -256,7 +261,8 @@ class AccountingDB( DB ):
     """
     self.log.verbose( "Adding to catalog type %s" % typeName, "with length %s" % str( bucketsLength ) )
     self.dbCatalog[ typeName ] = { 'keys' : keyFields , 'values' : valueFields,
-                                   'typeFields' : [], 'bucketFields' : [], 'dataTimespan' : 0 }
+                                   'typeFields' : [], 'bucketFields' : [], 'dataTimespan' : 0,
+                                   'rollups' : [] }
     self.dbCatalog[ typeName ][ 'typeFields' ].extend( keyFields )
     self.dbCatalog[ typeName ][ 'typeFields' ].extend( valueFields )
     self.dbCatalog[ typeName ][ 'bucketFields' ] = list( self.dbCatalog[ typeName ][ 'typeFields' ] )
@@ -400,6 +406,157 @@ class AccountingDB( DB ):
     self.log.info( "Registered type %s" % name )
     return S_OK( True )
 
+  def __registerRollups( self, typeName, typeClassName ):
+    """
+    Register the rollups defined for a type in the CS section Rollups/<type class>/<rollup name>
+    with the options Keys ( key fields kept ) and Granularity ( seconds ). The tables of new
+    rollups are created and filled from the buckets. A rollup has to be renamed when its
+    definition changes
+    """
+    result = gConfig.getSections( "%s/Rollups/%s" % ( self.cs_path, typeClassName ) )
+    if not result[ 'OK' ]:
+      return S_OK()
+    rollupNames = result[ 'Value' ]
+    result = self.__loadTablesCreated()
+    if not result[ 'OK' ]:
+      return result
+    tablesInThere = result[ 'Value' ]
+    rollups = []
+    for rollupName in rollupNames:
+      rollupPath = "Rollups/%s/%s" % ( typeClassName, rollupName )
+      keys = List.fromChar( self.getCSOption( "%s/Keys" % rollupPath, "" ) )
+      missing = [ key for key in keys if key not in self.dbCatalog[ typeName ][ 'keys' ] ]
+      if missing:
+        self.log.error( "Invalid rollup", "%s of %s has undefined keys %s" % ( rollupName, typeName, ", ".join( missing ) ) )
+        continue
+      try:
+        granularity = int( self.getCSOption( "%s/Granularity" % rollupPath, 86400 ) )
+      except ValueError:
+        granularity = 0
+      if granularity <= 0:
+        self.log.error( "Invalid rollup", "%s of %s has an invalid granularity" % ( rollupName, typeName ) )
+        continue
+      rollup = Rollup( rollupName, _getTableName( "rollup", typeName, rollupName ), keys, granularity,
+                       self.dbCatalog[ typeName ][ 'keys' ], self.dbCatalog[ typeName ][ 'values' ] )
+      if rollup.tableName not in tablesInThere:
+        if self.__readOnly:
+          self.log.notice( "ReadOnly mode: Skipping rollup %s of %s" % ( rollupName, typeName ) )
+          continue
+        fieldsDict = { 'startTime' : "INT UNSIGNED NOT NULL",
+                       'bucketLength' : "MEDIUMINT UNSIGNED NOT NULL",
+                       'entriesInBucket' : "DECIMAL(30,10) NOT NULL" }
+        for key in rollup.keys:
+          fieldsDict[ key ] = "INTEGER NOT NULL"
+        for value in self.dbCatalog[ typeName ][ 'values' ]:
+          fieldsDict[ value ] = "DECIMAL(30,10) NOT NULL"
+        retVal = self._createTables( { rollup.tableName : { 'Fields' : fieldsDict,
+                                                            'UniqueIndexes' : { 'UniqueConstraint' : [ 'startTime' ] + rollup.keys + [ 'bucketLength' ] }
+                                                          }
+                                     } )
+        if not retVal[ 'OK' ]:
+          self.log.error( "Can't create rollup", "%s of %s: %s" % ( rollupName, typeName, retVal[ 'Message' ] ) )
+          continue
+        self.log.info( "Filling rollup %s of %s" % ( rollupName, typeName ) )
+        retVal = self.__fillRollup( typeName, rollup )
+        if not retVal[ 'OK' ]:
+          #An incomplete rollup would give wrong answers
+          self.log.error( "Can't fill rollup", "%s of %s: %s" % ( rollupName, typeName, retVal[ 'Message' ] ) )
+          self._update( "DROP TABLE `%s`" % rollup.tableName )
+          continue
+      self.log.info( "Registered rollup %s of %s" % ( rollupName, typeName ),
+                     "by %s every %s secs" % ( ", ".join( rollup.keys ), granularity ) )
+      rollups.append( rollup )
+    self.dbCatalog[ typeName ][ 'rollups' ] = rollups
+    return S_OK()
+
+  def __fillRollup( self, typeName, rollup ):
+    """
+    Fill a rollup from the buckets of the type
+    """
+    bucketTableName = _getTableName( "bucket", typeName )
+    granularity = rollup.granularity
+    sqlSelectList = [ "IF( `bucketLength` <= %d, %s, `startTime` )" % ( granularity,
+                                                                         _bucketizeDataField( "`startTime`", granularity ) ),
+                      "IF( `bucketLength` <= %d, %d, `bucketLength` )" % ( granularity, granularity ),
+                      "SUM( `entriesInBucket` )" ]
+    sqlSelectList.extend( [ "`%s`" % key for key in rollup.keys ] )
+    sqlSelectList.extend( [ "SUM( `%s` )" % value for value in self.dbCatalog[ typeName ][ 'values' ] ] )
+    sqlGroupList = [ "1", "2" ] + [ "`%s`" % key for key in rollup.keys ]
+    cmd = "INSERT INTO `%s` ( %s ) SELECT %s FROM `%s` GROUP BY %s" % ( rollup.tableName,
+                                                                        ", ".join( [ "`%s`" % f for f in rollup.getFields() ] ),
+                                                                        ", ".join( sqlSelectList ),
+                                                                        bucketTableName,
+                                                                        ", ".join( sqlGroupList ) )
+    return self._update( cmd )
+
+  def __rebuildRollups( self, typeName ):
+    """
+    Empty and fill again the rollups of a type. Each rollup is rebuilt in a
+    transaction, so the reports using it never see it empty or half filled
+    """
+    for rollup in self.dbCatalog[ typeName ][ 'rollups' ]:
+      self.log.info( "Rebuilding rollup %s of %s" % ( rollup.name, typeName ) )
+      retVal = self.transactionStart()
+      if not retVal[ 'OK' ]:
+        return retVal
+      retVal = self._update( "DELETE FROM `%s`" % rollup.tableName )
+      if retVal[ 'OK' ]:
+        retVal = self.__fillRollup( typeName, rollup )
+      if retVal[ 'OK' ]:
+        retVal = self.transactionCommit()
+      else:
+        self.transactionRollback()
+      if not retVal[ 'OK' ]:
+        return S_ERROR( "Cannot rebuild rollup %s of %s: %s" % ( rollup.name, typeName, retVal[ 'Message' ] ) )
+    return S_OK()
+
+  def __writeRollups( self, typeName, bucketRows, connObj = False ):
+    """
+    Apply to the rollups of a type the deltas written in its buckets
+
+    :param list bucketRows: startTime, bucketLength, entriesInBucket, keys..., values... deltas
+    """
+    chunkSize = 1000
+    for rollup in self.dbCatalog[ typeName ][ 'rollups' ]:
+      rows = rollup.aggregateRows( bucketRows )
+      sqlFields = rollup.getFields()
+      sqlUpData = []
+      for field in [ 'entriesInBucket' ] + self.dbCatalog[ typeName ][ 'values' ]:
+        sqlUpData.append( "`%s`=GREATEST(0,`%s`+VALUES(`%s`))" % ( field, field, field ) )
+      for iChunk in range( 0, len( rows ), chunkSize ):
+        valuesGroups = [ "( %s )" % ", ".join( [ _sqlNumber( value ) for value in row ] )
+                         for row in rows[ iChunk : iChunk + chunkSize ] ]
+        cmd = "INSERT INTO `%s` ( %s ) VALUES %s ON DUPLICATE KEY UPDATE %s" % ( rollup.tableName,
+                                                                                 ", ".join( [ "`%s`" % f for f in sqlFields ] ),
+                                                                                 ", ".join( valuesGroups ),
+                                                                                 ", ".join( sqlUpData ) )
+        retVal = self._update( cmd, conn = connObj )
+        if not retVal[ 'OK' ]:
+          return S_ERROR( "Cannot update rollup %s: %s" % ( rollup.name, retVal[ 'Message' ] ) )
+    return S_OK()
+
+  def __getRollupForQuery( self, typeName, startTime, endTime, selectFields, condDict, groupFields, orderFields, bucketLength ):
+    """
+    Get the coarsest rollup of a type that can answer a query of its buckets, None if there is none
+    """
+    if not self.getCSOption( "UseRollups", True ):
+      return None
+    #Buckets read by the query, with the same bounds as __generateQueryTypeSQL
+    firstBucket = None
+    if startTime:
+      firstBucket = self.calculateBuckets( typeName, startTime + 3600, startTime + 3600 )[0][0]
+    bucketsEnd = None
+    if endTime:
+      lastBucket = self.calculateBuckets( typeName, endTime + 3600, endTime + 3600 )[0]
+      bucketsEnd = lastBucket[0] + lastBucket[2]
+    rollups = [ rollup for rollup in self.dbCatalog[ typeName ][ 'rollups' ]
+                if rollup.canAnswer( selectFields, condDict, groupFields, orderFields, bucketLength,
+                                     firstBucket, bucketsEnd ) ]
+    if not rollups:
+      return None
+    rollups.sort( key = lambda rollup: ( -rollup.granularity, len( rollup.keys ) ) )
+    return rollups[0]
+
   def getRegisteredTypes( self ):
     """
     Get list of registered types
@@ -467,6 +624,8 @@ class AccountingDB( DB ):
     tablesToDelete = []
     for keyField in self.dbCatalog[ typeName ][ 'keys' ]:
       tablesToDelete.append( "`%s`" % _getTableName( "key", typeName, keyField ) )
+    for rollup in self.dbCatalog[ typeName ][ 'rollups' ]:
+      tablesToDelete.append( "`%s`" % rollup.tableName )
     tablesToDelete.insert( 0, "`%s`" % _getTableName( "type", typeName ) )
     tablesToDelete.insert( 0, "`%s`" % _getTableName( "bucket", typeName ) )
     tablesToDelete.insert( 0, "`%s`" % _getTableName( "in", typeName ) )
@@ -572,33 +731,40 @@ class AccountingDB( DB ):
     return buckets
 
   def __insertInQueueTable( self, typeName, startTime, endTime, valuesList ):
-    sqlFields = [ 'id', 'taken', 'takenSince' ] + self.dbCatalog[ typeName ][ 'typeFields' ]
-    sqlValues = [ '0', '0', 'UTC_TIMESTAMP()' ] + valuesList + [ startTime, endTime ]
-    if len( sqlFields ) != len( sqlValues ):
-      numRcv = len( valuesList ) + 2
-      numExp = len( self.dbCatalog[ typeName ][ 'typeFields' ] )
-      return S_ERROR( "Fields mismatch for record %s. %s fields and %s expected" % ( typeName,
-                                                                                     numRcv,
-                                                                                     numExp ) )
-    retVal = self.insertFields( _getTableName( "in", typeName ),
-                           sqlFields,
-                           sqlValues )
-    if not retVal[ 'OK' ]:
-      return retVal
-    return S_OK( retVal[ 'lastRowId' ] )
+    return self.__insertBundleInQueueTable( typeName, [ ( startTime, endTime, valuesList ) ] )
+
+  def __insertBundleInQueueTable( self, typeName, recordsList ):
+    """
+    Insert ( startTime, endTime, valuesList ) records of a type in its in table
+    with a single bulk insertion
+    """
+    sqlFields = [ 'taken', 'takenSince' ] + self.dbCatalog[ typeName ][ 'typeFields' ]
+    now = Time.dateTime()
+    rows = []
+    for startTime, endTime, valuesList in recordsList:
+      sqlValues = [ 0, now ] + list( valuesList ) + [ startTime, endTime ]
+      if len( sqlFields ) != len( sqlValues ):
+        numRcv = len( valuesList ) + 2
+        numExp = len( self.dbCatalog[ typeName ][ 'typeFields' ] )
+        return S_ERROR( "Fields mismatch for record %s. %s fields and %s expected" % ( typeName,
+                                                                                       numRcv,
+                                                                                       numExp ) )
+      rows.append( sqlValues )
+    return self.bulkInsert( _getTableName( "in", typeName ), sqlFields, rows )
 
   def insertRecordBundleThroughQueue( self, recordsToQueue ) :
     if self.__readOnly:
       return S_ERROR( "ReadOnly mode enabled. No modification allowed" )
-    recordsToProcess = []
-    now = Time.toEpoch()
+    recordsByType = {}
     for record in recordsToQueue:
       typeName, startTime, endTime, valuesList = record
-      result = self.__insertInQueueTable( typeName, startTime, endTime, valuesList )
+      if not typeName in self.dbCatalog:
+        return S_ERROR( "Type %s has not been defined in the db" % typeName )
+      recordsByType.setdefault( typeName, [] ).append( ( startTime, endTime, valuesList ) )
+    for typeName in recordsByType:
+      result = self.__insertBundleInQueueTable( typeName, recordsByType[ typeName ] )
       if not result[ 'OK' ]:
         return result
-      iD = result[ 'Value' ]
-      recordsToProcess.append( ( iD, typeName, startTime, endTime, valuesList, now ) )
 
     return S_OK()
 
@@ -612,7 +778,7 @@ class AccountingDB( DB ):
     if not typeName in self.dbCatalog:
       return S_ERROR( "Type %s has not been defined in the db" % typeName )
     result = self.__insertInQueueTable( typeName, startTime, endTime, valuesList )
-    if not result[ '0K' ]:
+    if not result[ 'OK' ]:
       return result
 
     return S_OK()
@@ -622,18 +788,100 @@ class AccountingDB( DB ):
     Do the real insert and delete from the in buffer table
     """
     self.log.verbose( "Received bundle to process", "of %s elements" % len( recordTuples ) )
+    recordsByType = {}
     for record in recordTuples:
-      iD, typeName, startTime, endTime, valuesList, insertionEpoch = record
-      result = self.insertRecordDirectly( typeName, startTime, endTime, valuesList )
-      if not result[ 'OK' ]:
-        self._update( "UPDATE `%s` SET taken=0 WHERE id=%s" % ( _getTableName( "in", typeName ), iD ) )
-        self.log.error( "Can't insert row", result[ 'Message' ] )
-        continue
-      result = self._update( "DELETE FROM `%s` WHERE id=%s" % ( _getTableName( "in", typeName ), iD ) )
-      if not result[ 'OK' ]:
-        self.log.error( "Can't delete row from the IN table", result[ 'Message' ] )
-      gMonitor.addMark( "insertiontime", Time.toEpoch() - insertionEpoch )
-
+      recordsByType.setdefault( record[1], [] ).append( record )
+    for typeName in recordsByType:
+      self.__insertBundleFromINTable( typeName, recordsByType[ typeName ] )
+
+  def __insertBundleFromINTable( self, typeName, recordTuples ):
+    """
+    Insert the records of a type with bulk statements: the raw records with one
+    insertion, their buckets aggregated in memory with one upsert and the in
+    buffer rows removed with one deletion
+    """
+    inTableName = _getTableName( "in", typeName )
+    failedIds = []
+    insertedIds = []
+    if self.__readOnly or typeName not in self.dbCatalog:
+      self.log.error( "Can't insert rows", "type %s is not writable" % typeName )
+      failedIds = [ record[0] for record in recordTuples ]
+    else:
+      numKeys = len( self.dbCatalog[ typeName ][ 'keys' ] )
+      aggregator = BucketAggregator( len( self.dbCatalog[ typeName ][ 'values' ] ) )
+      nowEpoch = int( Time.toEpoch( Time.dateTime() ) )
+      rawRows = []
+      for iD, _typeName, startTime, endTime, valuesList, _insertionEpoch in recordTuples:
+        valuesList = list( valuesList )
+        retVal = S_OK()
+        #Discover key indexes
+        for keyPos in range( numKeys ):
+          retVal = self.__addKeyValue( typeName, self.dbCatalog[ typeName ][ 'keys' ][ keyPos ], valuesList[ keyPos ] )
+          if not retVal[ 'OK' ]:
+            break
+          valuesList[ keyPos ] = retVal[ 'Value' ]
+        if not retVal[ 'OK' ]:
+          self.log.error( "Can't insert row", retVal[ 'Message' ] )
+          failedIds.append( iD )
+          continue
+        rawRows.append( valuesList + [ startTime, endTime ] )
+        aggregator.addRecord( valuesList[ :numKeys ], valuesList[ numKeys: ],
+                              self.calculateBuckets( typeName, startTime, endTime, nowEpoch ) )
+        insertedIds.append( iD )
+      if insertedIds:
+        self.log.verbose( "Aggregated %s records of %s" % ( aggregator.getNumRecords(), typeName ),
+                          "in %s buckets" % aggregator.getNumBuckets() )
+        retVal = self.bulkInsert( _getTableName( "type", typeName ), self.dbCatalog[ typeName ][ 'typeFields' ], rawRows )
+        if retVal[ 'OK' ]:
+          retVal = self.__writeAggregatedBuckets( typeName, aggregator )
+        if not retVal[ 'OK' ]:
+          self.log.error( "Can't insert rows", retVal[ 'Message' ] )
+          failedIds.extend( insertedIds )
+          insertedIds = []
+    if failedIds:
+      self._update( "UPDATE `%s` SET taken=0 WHERE id in (%s)" % ( inTableName, List.intListToString( failedIds ) ) )
+    if not insertedIds:
+      return
+    gMonitor.addMark( "registeradded", len( insertedIds ) )
+    gMonitor.addMark( "registeradded:%s" % typeName, len( insertedIds ) )
+    result = self._update( "DELETE FROM `%s` WHERE id in (%s)" % ( inTableName, List.intListToString( insertedIds ) ) )
+    if not result[ 'OK' ]:
+      self.log.error( "Can't delete rows from the IN table", result[ 'Message' ] )
+    now = Time.toEpoch()
+    insertedIds = set( insertedIds )
+    for record in recordTuples:
+      if record[0] in insertedIds:
+        gMonitor.addMark( "insertiontime", now - record[5] )
+
+  def __writeAggregatedBuckets( self, typeName, aggregator ):
+    """ Insert or update all the buckets of an aggregator
+    """
+    sqlFields = [ 'startTime', 'bucketLength', 'entriesInBucket' ]
+    sqlFields.extend( self.dbCatalog[ typeName ][ 'keys' ] )
+    sqlFields.extend( self.dbCatalog[ typeName ][ 'values' ] )
+    sqlUpData = {}
+    for field in [ 'entriesInBucket' ] + self.dbCatalog[ typeName ][ 'values' ]:
+      sqlUpData[ field ] = "`%s`+VALUES(`%s`)" % ( field, field )
+    rows = aggregator.getRows()
+    #The rollups are updated in the same transaction as the buckets
+    withRollups = len( self.dbCatalog[ typeName ][ 'rollups' ] ) > 0
+    for _i in range( max( 1, self.__deadLockRetries ) ):
+      if withRollups:
+        result = self.transactionStart()
+        if not result[ 'OK' ]:
+          return result
+      result = self.bulkInsert( _getTableName( "bucket", typeName ), sqlFields, rows, onDuplicate = sqlUpData )
+      if withRollups:
+        if result[ 'OK' ]:
+          result = self.__writeRollups( typeName, rows )
+        if result[ 'OK' ]:
+          result = self.transactionCommit()
+        else:
+          self.transactionRollback()
+      #If failed because of dead lock try restarting
+      if result[ 'OK' ] or result[ 'Message' ].find( "try restarting transaction" ) == -1:
+        return result
+    return S_ERROR( "Cannot update buckets: %s" % result[ 'Message' ] )
 
   def insertRecordDirectly( self, typeName, startTime, endTime, valuesList ):
     """
@@ -749,9 +997,10 @@ class AccountingDB( DB ):
       return retVal
     return S_OK( numInsertions )
 
-  def __splitInBuckets( self, typeName, startTime, endTime, valuesList, connObj = False ):
+  def __splitInBuckets( self, typeName, startTime, endTime, valuesList, connObj = False, rollupRows = None ):
     """
-    Bucketize a record
+    Bucketize a record. If rollupRows is a list the bucket deltas are appended to it
+    instead of being written in the rollups
     """
     #Calculate amount of buckets
     buckets = self.calculateBuckets( typeName, startTime, endTime )
@@ -760,7 +1009,7 @@ class AccountingDB( DB ):
     keyValues = valuesList[ :numKeys ]
     valuesList = valuesList[ numKeys: ]
     self.log.verbose( "Splitting entry", " in %s buckets" % len( buckets ) )
-    return self.__writeBuckets( typeName, buckets, keyValues, valuesList, connObj = connObj )
+    return self.__writeBuckets( typeName, buckets, keyValues, valuesList, connObj = connObj, rollupRows = rollupRows )
 
   def __deleteFromBuckets( self, typeName, startTime, endTime, valuesList, numInsertions, connObj = False ):
     """
@@ -773,6 +1022,8 @@ class AccountingDB( DB ):
     keyValues = valuesList[ :numKeys ]
     valuesList = valuesList[ numKeys: ]
     self.log.verbose( "Deleting bucketed entry", "from %s buckets" % len( buckets ) )
+    numValues = len( self.dbCatalog[ typeName ][ 'values' ] )
+    rollupRows = []
     for bucketInfo in buckets:
       bucketStartTime = bucketInfo[0]
       bucketProportion = bucketInfo[1]
@@ -790,7 +1041,13 @@ class AccountingDB( DB ):
           return retVal
         #If OK, break loop
         if retVal[ 'OK' ]:
+          proportion = -bucketProportion * numInsertions
+          rollupRows.append( [ bucketStartTime, bucketLength, float( valuesList[-1] ) * proportion ] +
+                             list( keyValues ) +
+                             [ float( value ) * proportion for value in valuesList[ :numValues ] ] )
           break
+    if self.dbCatalog[ typeName ][ 'rollups' ]:
+      return self.__writeRollups( typeName, rollupRows, connObj = connObj )
     return S_OK()
 
   def getBucketsDef( self, typeName ):
@@ -855,8 +1112,9 @@ class AccountingDB( DB ):
     return self._update( cmd, conn = connObj )
 
 
-  def __writeBuckets( self, typeName, buckets, keyValues, valuesList, connObj = False ):
-    """ Insert or update a bucket
+  def __writeBuckets( self, typeName, buckets, keyValues, valuesList, connObj = False, rollupRows = None ):
+    """ Insert or update a bucket and its rollups. The rollups are updated in the same
+        transaction as the buckets: the one connObj is in if given, an own one if not
     """
 #     tableName = _getTableName( "bucket", typeName )
     #INSERT PART OF THE QUERY
@@ -885,18 +1143,36 @@ class AccountingDB( DB ):
     cmd += "VALUES %s " % ", ".join( valuesGroups)
     cmd += "ON DUPLICATE KEY UPDATE %s" % ", ".join( sqlUpData )
 
+    bucketRows = []
+    if self.dbCatalog[ typeName ][ 'rollups' ]:
+      for bStartTime, bProportion, bLength in buckets:
+        bucketRows.append( [ bStartTime, bLength, float( valuesList[-1] ) * bProportion ] +
+                           list( keyValues ) +
+                           [ float( value ) * bProportion for value in valuesList[ :len( self.dbCatalog[ typeName ][ 'values' ] ) ] ] )
+      if rollupRows is not None:
+        rollupRows.extend( bucketRows )
+        bucketRows = []
+    ownTransaction = bucketRows and not connObj
     for _i in range( max( 1, self.__deadLockRetries ) ):
+      if ownTransaction:
+        result = self.transactionStart()
+        if not result[ 'OK' ]:
+          return result
       result = self._update( cmd, conn = connObj )
-      if not result[ 'OK' ]:
-        #If failed because of dead lock try restarting
-        if result[ 'Message' ].find( "try restarting transaction" ):
-          continue
-        return result
-      #If OK, break loopo
-      if result[ 'OK' ]:
-        return result
+      if result[ 'OK' ] and bucketRows:
+        result = self.__writeRollups( typeName, bucketRows, connObj = connObj )
+      if ownTransaction:
+        if result[ 'OK' ]:
+          result = self.transactionCommit()
+        else:
+          self.transactionRollback()
+      #If failed because of dead lock try restarting, unless it rolled back the transaction of connObj
+      if result[ 'OK' ] or connObj or result[ 'Message' ].find( "try restarting transaction" ) == -1:
+        break
 
-    return S_ERROR( "Cannot update bucket: %s" % result[ 'Message' ] )
+    if not result[ 'OK' ]:
+      return S_ERROR( "Cannot update bucket: %s" % result[ 'Message' ] )
+    return result
 
   def __checkFieldsExistsInType( self, typeName, fields, tableType ):
     """
@@ -941,6 +1217,25 @@ class AccountingDB( DB ):
     return self.__queryType( typeName, startTime, endTime, selectFields,
                              condDict, False, orderFields, "type" )
 
+  def retrieveRawRecordsIter( self, typeName, startTime, endTime, condDict, orderFields, batchSize = 1000 ):
+    """
+    Get RAW data from the DB streamed in batches of at most batchSize records
+    Yields S_OK structures with the records or a S_ERROR
+    """
+    if typeName not in self.dbCatalog:
+      return iter( [ S_ERROR( "Type %s not defined" % typeName ) ] )
+    selectFields = [ [ "%s", "%s" ], [ "startTime", "endTime" ] ]
+    for tK in ( 'keys', 'values' ):
+      for key in self.dbCatalog[ typeName ][ tK ]:
+        selectFields[ 0 ].append( "%s" )
+        selectFields[ 1 ].append( key )
+    selectFields[ 0 ] = ", ".join( selectFields[ 0 ] )
+    retVal = self.__generateQueryTypeSQL( typeName, startTime, endTime, selectFields,
+                                          condDict, False, orderFields, "type" )
+    if not retVal[ 'OK' ]:
+      return iter( [ retVal ] )
+    return self._queryIter( retVal[ 'Value' ], batchSize )
+
   def retrieveBucketedData( self, typeName, startTime, endTime, selectFields, condDict, groupFields, orderFields, connObj = False ):
     """
     Get data from the DB
@@ -968,6 +1263,10 @@ class AccountingDB( DB ):
     nowEpoch = Time.toEpoch( Time.dateTime () )
     bucketTimeLength = self.calculateBucketLengthForTime( typeName, nowEpoch , startTime )
     startTime = startTime - startTime % bucketTimeLength
+    rollup = self.__getRollupForQuery( typeName, startTime, endTime, selectFields, condDict, groupFields, orderFields,
+                                       bucketTimeLength )
+    if rollup:
+      self.log.verbose( "Querying rollup %s of %s" % ( rollup.name, typeName ) )
     result = self.__queryType( typeName,
                              startTime,
                              endTime,
@@ -976,15 +1275,31 @@ class AccountingDB( DB ):
                              groupFields,
                              orderFields,
                              "bucket",
-                             connObj = connObj )
+                             connObj = connObj,
+                             rollup = rollup )
     gMonitor.addMark( "querytime", Time.toEpoch() - startQueryEpoch )
     return result
 
-  def __queryType( self, typeName, startTime, endTime, selectFields, condDict, groupFields, orderFields, tableType, connObj = False ):
+  def __queryType( self, typeName, startTime, endTime, selectFields, condDict, groupFields, orderFields, tableType,
+                   connObj = False, rollup = None ):
     """
     Execute a query over a main table
     """
-    tableName = _getTableName( tableType, typeName )
+    retVal = self.__generateQueryTypeSQL( typeName, startTime, endTime, selectFields, condDict,
+                                          groupFields, orderFields, tableType, rollup )
+    if not retVal[ 'OK' ]:
+      return retVal
+    return self._query( retVal[ 'Value' ], conn = connObj )
+
+  def __generateQueryTypeSQL( self, typeName, startTime, endTime, selectFields, condDict, groupFields, orderFields, tableType,
+                              rollup = None ):
+    """
+    Generate the SQL of a query over a main table, or over a rollup of the bucket table
+    """
+    if rollup:
+      tableName = rollup.tableName
+    else:
+      tableName = _getTableName( tableType, typeName )
     cmd = "SELECT"
     sqlLinkList = []
     #Check if groupFields and orderFields are in ( "%s", ( field1, ) ) form
@@ -1084,7 +1399,7 @@ class AccountingDB( DB ):
     if orderFields:
       cmd += " ORDER BY %s" % ( orderFields[0] % tuple( orderFields[1] ) )
     self.log.verbose( cmd )
-    return self._query( cmd, conn = connObj )
+    return S_OK( cmd )
 
   def compactBuckets( self, typeFilter = False ):
     """
@@ -1186,18 +1501,18 @@ class AccountingDB( DB ):
         #self.__rollbackTransaction( connObj )
         return retVal
       self.log.info( "[COMPACT] Compacting %s records %s seconds size for %s" % ( len( bucketsData ), bucketLength, typeName ) )
-      #Add data
+      #Add data, the grouped data can not be removed from the rollups, they are rebuilt at the end
       for record in bucketsData:
         startTime = record[-2]
         endTime = record[-1]
         valuesList = record[:-2]
-        retVal = self.__splitInBuckets( typeName, startTime, endTime, valuesList )
+        retVal = self.__splitInBuckets( typeName, startTime, endTime, valuesList, rollupRows = [] )
         if not retVal[ 'OK' ]:
           #self.__rollbackTransaction( connObj )
           self.log.error( "[COMPACT] Error while compacting data for record", "%s: %s" % ( typeName, retVal[ 'Value' ] ) )
       self.log.info( "[COMPACT] Finished compaction %d of %d" % ( bPos, len( self.dbBucketsLength[ typeName ] ) - 1 ) )
     #return self.__commitTransaction( connObj )
-    return S_OK()
+    return self.__rebuildRollups( typeName )
 
   def __slowCompactBucketsForType( self, typeName ):
     """
@@ -1241,14 +1556,22 @@ class AccountingDB( DB ):
         deleteEndTime = time.time()
         self.log.info( "[COMPACT] Deleted %s out-of-bounds buckets (took %.2f secs)" % ( len( bucketsData ),
                                                                                          deleteEndTime - selectEndTime ) )
-        #Add data
+        #Add data. The rollups get the net change: buckets that stay in the same rollup bucket cancel out
+        numKeys = len( self.dbCatalog[ typeName ][ 'keys' ] )
+        rollupRows = []
         for record in bucketsData:
           startTime = record[-2]
           endTime = record[-2] + record[-1]
           valuesList = record[:-2]
-          retVal = self.__splitInBuckets( typeName, startTime, endTime, valuesList )
+          retVal = self.__splitInBuckets( typeName, startTime, endTime, valuesList, rollupRows = rollupRows )
           if not retVal[ 'OK' ]:
             self.log.error( "[COMPACT] Error while compacting data for buckets", "%s: %s" % ( typeName, retVal[ 'Value' ] ) )
+          rollupRows.append( [ record[-2], record[-1], -float( record[-3] ) ] + list( record[ :numKeys ] ) +
+                             [ -float( value ) for value in record[ numKeys:-3 ] ] )
+        if self.dbCatalog[ typeName ][ 'rollups' ]:
+          retVal = self.__writeRollups( typeName, rollupRows )
+          if not retVal[ 'OK' ]:
+            self.log.error( "[COMPACT] Error while updating the rollups", "%s: %s" % ( typeName, retVal[ 'Message' ] ) )
         totalCompacted += len( bucketsData )
         insertElapsedTime = time.time() - deleteEndTime
         self.log.info( "[COMPACT] Records compacted (took %.2f secs, %.2f secs/bucket)" % ( insertElapsedTime,
@@ -1313,8 +1636,12 @@ class AccountingDB( DB ):
     dataTimespan = self.dbCatalog[ typeName ][ 'dataTimespan' ]
     if dataTimespan < 86400 * 30:
       return
-    for table, field in ( ( _getTableName( "type", typeName ), 'endTime' ),
-                          ( _getTableName( "bucket", typeName ), 'startTime + %s' % self.dbBucketsLength[ typeName ][-1][1] ) ):
+    tablesToClean = [ ( _getTableName( "type", typeName ), 'endTime' ),
+                      ( _getTableName( "bucket", typeName ), 'startTime + %s' % self.dbBucketsLength[ typeName ][-1][1] ) ]
+    for rollup in self.dbCatalog[ typeName ][ 'rollups' ]:
+      tablesToClean.append( ( rollup.tableName, 'startTime + %s' % max( rollup.granularity,
+                                                                        self.dbBucketsLength[ typeName ][-1][1] ) ) )
+    for table, field in tablesToClean:
       self.log.info( "[COMPACT] Deleting old records for table %s" % table )
       deleteLimit = 100000
       deleted = deleteLimit
@@ -1346,6 +1673,10 @@ class AccountingDB( DB ):
     retVal = self._update( "DELETE FROM `%s`" % _getTableName( "bucket", typeName ) )
     if not retVal[ 'OK' ]:
       return retVal
+    for rollup in self.dbCatalog[ typeName ][ 'rollups' ]:
+      retVal = self._update( "DELETE FROM `%s`" % rollup.tableName )
+      if not retVal[ 'OK' ]:
+        return retVal
     #Generate the common part of the query
     #SELECT fields
     startTimeTableField = "`%s`.startTime" % rawTableName
@@ -1425,35 +1756,38 @@ class AccountingDB( DB ):
     for sqlQuery in sqlQueries:
       self.log.info( "[REBUCKET] Executing query #%s..." % queryNum )
       queryNum += 1
-      retVal = self._query( sqlQuery )
-      if not retVal[ 'OK' ]:
-        self.log.error( "[REBUCKET] Can't retrieve data for rebucketing", retVal[ 'Message' ] )
-        #self.__rollbackTransaction( connObj )
-        return retVal
-      rawData = retVal[ 'Value' ]
-      self.log.info( "[REBUCKET] Retrieved %s records" % len( rawData ) )
+      # The records are streamed, the buckets are written while the next ones are fetched
       rebucketedRecords = 0
       startQuery = time.time()
       startBlock = time.time()
-      numRecords = len( rawData )
-      for entry in rawData:
-        startT = entry[0]
-        endT = entry[1]
-        values = entry[2:]
-        retVal = self.__splitInBuckets( typeName, startT, endT, values )
+      for retVal in self._queryIter( sqlQuery ):
         if not retVal[ 'OK' ]:
+          self.log.error( "[REBUCKET] Can't retrieve data for rebucketing", retVal[ 'Message' ] )
           #self.__rollbackTransaction( connObj )
           return retVal
-        rebucketedRecords += 1
-        if rebucketedRecords % 1000 == 0:
-          queryAvg = rebucketedRecords / float( time.time() - startQuery )
-          blockAvg = 1000 / float( time.time() - startBlock )
-          startBlock = time.time()
-          perDone = 100 * rebucketedRecords / float ( numRecords )
-          expectedEnd = str( datetime.timedelta( seconds = int( ( numRecords - rebucketedRecords ) / blockAvg ) ) )
-          self.log.info( "[REBUCKET] Rebucketed %.2f%% %s (%.2f r/s block %.2f r/s query | ETA %s )..." % ( perDone, typeName,
-                                                                                                            blockAvg, queryAvg,
-                                                                                                            expectedEnd ) )
+        #The rollups are updated once per batch
+        rollupRows = []
+        for entry in retVal[ 'Value' ]:
+          startT = entry[0]
+          endT = entry[1]
+          values = entry[2:]
+          retVal = self.__splitInBuckets( typeName, startT, endT, values, rollupRows = rollupRows )
+          if not retVal[ 'OK' ]:
+            #self.__rollbackTransaction( connObj )
+            return retVal
+          rebucketedRecords += 1
+          if rebucketedRecords % 1000 == 0:
+            queryAvg = rebucketedRecords / float( time.time() - startQuery )
+            blockAvg = 1000 / float( time.time() - startBlock )
+            startBlock = time.time()
+            self.log.info( "[REBUCKET] Rebucketed %s records of %s (%.2f r/s block %.2f r/s query)..." % ( rebucketedRecords,
+                                                                                                      typeName,
+                                                                                                      blockAvg, queryAvg ) )
+        if rollupRows:
+          retVal = self.__writeRollups( typeName, rollupRows )
+          if not retVal[ 'OK' ]:
+            return retVal
+      self.log.info( "[REBUCKET] Rebucketed %s records" % rebucketedRecords )
     #return self.__commitTransaction( connObj )
     return S_OK()
 
@@ -1470,13 +1804,21 @@ class AccountingDB( DB ):
 def _bucketizeDataField( dataField, bucketLength ):
   return "%s - ( %s %% %s )" % ( dataField, dataField, bucketLength )
 
+def _sqlNumber( value ):
+  """
+  SQL literal of a number without loss of precision
+  """
+  if type( value ) == types.FloatType:
+    return repr( value )
+  return str( value )
+
 def _getTableName( tableType, typeName, keyName = None ):
   """
   Generate table name
   """
   if not keyName:
     return "ac_%s_%s" % ( tableType, typeName )
-  elif tableType == "key" :
+  elif tableType in ( "key", "rollup" ) :
     return "ac_%s_%s_%s" % ( tableType, typeName, keyName )
   else:
     raise Exception( "Call to _getTableName with tableType as key but with no keyName" )
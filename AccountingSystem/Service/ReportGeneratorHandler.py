@@ -51,7 +51,10 @@ class ReportGeneratorHandler( RequestHandler ):
     except IOError:
       gLogger.fatal( "Can't write to %s" % dataPath )
       return S_ERROR( "Data location is not writable" )
-    gDataCache.setGraphsLocation( dataPath )
+    #Clones of the service on the same host can share the cached reports through the data location
+    gDataCache.setGraphsLocation( dataPath, gConfig.getValue( "%s/SharedCache" % reportSection, False ) )
+    gDataCache.setLimits( gConfig.getValue( "%s/CacheMaxEntries" % reportSection, 1000 ),
+                          gConfig.getValue( "%s/CacheMaxSizeMB" % reportSection, 512 ) * 1048576 )
     gMonitor.registerActivity( "plotsDrawn", "Drawn plot images", "Accounting reports", "plots", gMonitor.OP_SUM )
     gMonitor.registerActivity( "reportsRequested", "Generated reports", "Accounting reports", "reports", gMonitor.OP_SUM )
     return S_OK()
@@ -138,6 +141,13 @@ class ReportGeneratorHandler( RequestHandler ):
     reportRequest[ 'generatePlot' ] = False
     return reporter.generate( reportRequest, self.getRemoteCredentials() )
 
+  types_getCacheStats = []
+  def export_getCacheStats( self ):
+    """
+    Get the usage of the report data and plot caches
+    """
+    return S_OK( gDataCache.getStats() )
+
   types_listReports = [ types.StringType ]
   def export_listReports( self, typeName ):
     """
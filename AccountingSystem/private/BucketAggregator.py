@@ -0,0 +1,56 @@
+""" In-memory aggregation of the buckets of accounting records
+
+    Many records inserted together share the same key values and fall in the
+    same buckets. Instead of writing the buckets of each record with its own
+    upsert, the AccountingDB folds the whole bundle into one accumulator per
+    ( bucket start, bucket length, key ids ) and writes all of them at once.
+"""
+
+__RCSID__ = "$Id$"
+
+class BucketAggregator( object ):
+
+  def __init__( self, numValues ):
+    """
+    :param numValues: number of value fields of the type
+    """
+    self.__numValues = numValues
+    # ( startTime, bucketLength, keyIds ) -> [ entriesInBucket, values... ]
+    self.__buckets = {}
+    self.__numRecords = 0
+
+  def addRecord( self, keyIds, valuesList, buckets ):
+    """ Add the proportional part of a record to each of its buckets
+
+    :param list keyIds: ids of the key values of the record
+    :param list valuesList: values of the record
+    :param list buckets: ( bucketStart, proportion, bucketLength ) as returned by AccountingDB.calculateBuckets
+    """
+    keyIds = tuple( keyIds )
+    for bucketStart, proportion, bucketLength in buckets:
+      bucketKey = ( bucketStart, bucketLength, keyIds )
+      accumulator = self.__buckets.get( bucketKey )
+      if accumulator is None:
+        accumulator = [ 0.0 ] * ( self.__numValues + 1 )
+        self.__buckets[ bucketKey ] = accumulator
+      accumulator[0] += proportion
+      for pos in range( self.__numValues ):
+        accumulator[ pos + 1 ] += valuesList[ pos ] * proportion
+    self.__numRecords += 1
+
+  def getNumRecords( self ):
+    return self.__numRecords
+
+  def getNumBuckets( self ):
+    return len( self.__buckets )
+
+  def getRows( self ):
+    """ Rows to upsert in the bucket table, with the fields
+        startTime, bucketLength, entriesInBucket, keys..., values...
+    """
+    rows = []
+    for bucketKey in sorted( self.__buckets ):
+      bucketStart, bucketLength, keyIds = bucketKey
+      accumulator = self.__buckets[ bucketKey ]
+      rows.append( [ bucketStart, bucketLength, accumulator[0] ] + list( keyIds ) + accumulator[1:] )
+    return rows
@@ -1,5 +1,10 @@
 import types
 from DIRAC.Core.Utilities import Time
+try:
+  from DIRAC.AccountingSystem.private.SeriesMatrix import groupedToGranularity
+  gUseNumPy = True
+except ImportError:
+  gUseNumPy = False
 
 class DBUtils:
 
@@ -64,6 +69,22 @@ class DBUtils:
       groupDict[ groupingField ].append( row )
     return groupDict
 
+  def _groupByFieldToGranularity( self, fieldIndex, dataList, granularity, average = False ):
+    """
+    Group the bucket rows by the field fieldIndex and convert each group to the granularity,
+    as _groupByField followed by _sumToGranularity or _averageToGranularity for each group.
+    With NumPy all the groups are converted at once with array operations
+    """
+    if gUseNumPy:
+      return groupedToGranularity( granularity, dataList, fieldIndex, average )
+    groupDict = self._groupByField( fieldIndex, dataList )
+    for key in groupDict:
+      if average:
+        groupDict[ key ] = self._averageToGranularity( granularity, groupDict[ key ] )
+      else:
+        groupDict[ key ] = self._sumToGranularity( granularity, groupDict[ key ] )
+    return groupDict
+
   def _getBins( self, typeName, startTime, endTime ):
     return self._acDB.calculateBuckets( self._setup, typeName, startTime, endTime )
 
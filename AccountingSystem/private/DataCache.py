@@ -7,7 +7,7 @@ import time
 import threading
 
 from DIRAC import S_OK, S_ERROR, gLogger, rootPath, gConfig
-from DIRAC.Core.Utilities.DictCache import DictCache
+from DIRAC.Core.Utilities.ResultCache import ResultCache
 
 
 class DataCache:
@@ -16,47 +16,62 @@ class DataCache:
     self.graphsLocation = os.path.join( gConfig.getValue( '/LocalSite/InstancePath', rootPath ), 'data', 'accountingPlots' )
     self.cachedGraphs = {}
     self.alive = True
+    self.__dataLifeTime = 600
+    self.__graphLifeTime = 3600
+    self.__dataCache = ResultCache( "ReportData", self.__dataLifeTime )
+    self.__graphCache = ResultCache( "ReportPlots", self.__graphLifeTime, deleteFunction = self._deleteGraph )
     self.purgeThread = threading.Thread( target = self.purgeExpired )
     self.purgeThread.setDaemon( 1 )
     self.purgeThread.start()
-    self.__dataCache = DictCache()
-    self.__graphCache = DictCache( deleteFunction = self._deleteGraph )
-    self.__dataLifeTime = 600
-    self.__graphLifeTime = 3600
 
-  def setGraphsLocation( self, graphsDir ):
+  def setGraphsLocation( self, graphsDir, shared = False ):
+    """
+    Set the directory of the plots. If shared, the report data and plots are shared
+    with the other processes using it, the existing plots are kept
+    """
     self.graphsLocation = graphsDir
+    if shared:
+      self.__dataCache.setCacheDir( os.path.join( graphsDir, "cache", "data" ) )
+      self.__graphCache.setCacheDir( os.path.join( graphsDir, "cache", "plots" ) )
+      return
     for graphName in os.listdir( self.graphsLocation ):
       if graphName.find( ".png" ) > 0:
         graphLocation = "%s/%s" % ( self.graphsLocation, graphName )
         gLogger.verbose( "Purging %s" % graphLocation )
         os.unlink( graphLocation )
 
+  def setLimits( self, maxEntries, maxBytes ):
+    """
+    Limit the number of cached reports and the size of their data
+    """
+    self.__dataCache.setLimits( maxEntries, maxBytes )
+    self.__graphCache.setLimits( maxEntries )
+
   def purgeExpired( self ):
     while self.alive:
       time.sleep( 600 )
       self.__graphCache.purgeExpired()
       self.__dataCache.purgeExpired()
+      gLogger.info( "Report cache usage", str( self.getStats() ) )
+
+  def getStats( self ):
+    """
+    Get the hits, misses... of the report data and plot caches
+    """
+    return { 'data' : self.__dataCache.getStats(), 'plots' : self.__graphCache.getStats() }
 
   def getReportData( self, reportRequest, reportHash, dataFunc ):
     """
-    Get report data from cache if exists, else generate it
+    Get report data from cache if exists, else generate it.
+    Concurrent requests of the same report only generate it once
     """
-    reportData = self.__dataCache.get( reportHash )
-    if reportData == False:
-      retVal = dataFunc( reportRequest )
-      if not retVal[ 'OK' ]:
-        return retVal
-      reportData = retVal[ 'Value' ]
-      self.__dataCache.add( reportHash, self.__dataLifeTime, reportData )
-    return S_OK( reportData )
+    return self.__dataCache.getOrGenerate( reportHash, lambda: dataFunc( reportRequest ) )
 
   def getReportPlot( self, reportRequest, reportHash, reportData, plotFunc ):
     """
     Get report data from cache if exists, else generate it
     """
-    plotDict = self.__graphCache.get( reportHash )
-    if plotDict == False:
+    def generatePlot():
       basePlotFileName = "%s/%s" % ( self.graphsLocation, reportHash )
       retVal = plotFunc( reportRequest, reportData, basePlotFileName )
       if not retVal[ 'OK' ]:
@@ -66,8 +81,9 @@ class DataCache:
         plotDict[ 'plot' ] = "%s.png" % reportHash
       if plotDict[ 'thumbnail' ]:
         plotDict[ 'thumbnail' ] = "%s.thb.png" % reportHash
-      self.__graphCache.add( reportHash, self.__graphLifeTime, plotDict )
-    return S_OK( plotDict )
+      return S_OK( plotDict )
+
+    return self.__graphCache.getOrGenerate( reportHash, generatePlot )
 
   def getPlotData( self, plotFileName ):
     filename = "%s/%s" % ( self.graphsLocation, plotFileName )
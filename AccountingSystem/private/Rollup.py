@@ -0,0 +1,108 @@
+""" Rollup of the buckets of an accounting type
+
+    A rollup is a materialised aggregate of the bucket table of a type: the
+    buckets are summed over the keys that are not in the rollup and the ones
+    shorter than the rollup granularity are merged in buckets of that
+    granularity. It is maintained with the same deltas as the bucket table and
+    can answer the queries that only group and filter by its keys and sum the
+    values, at a report granularity that is a multiple of its own.
+"""
+
+__RCSID__ = "$Id$"
+
+import re
+
+# A value field can only be summed to be answered from a rollup
+SUM_START = re.compile( r'SUM\(\s*$', re.I )
+SUM_END = re.compile( r'^\s*\)' )
+
+class Rollup( object ):
+
+  def __init__( self, name, tableName, keys, granularity, typeKeys, typeValues ):
+    """
+    :param str name: name of the rollup
+    :param str tableName: table holding the rollup
+    :param list keys: key fields kept in the rollup, a subset of typeKeys
+    :param int granularity: length of the rollup buckets
+    :param list typeKeys: key fields of the type
+    :param list typeValues: value fields of the type
+    """
+    self.name = name
+    self.tableName = tableName
+    self.keys = [ key for key in typeKeys if key in keys ]
+    self.granularity = granularity
+    self.__numTypeKeys = len( typeKeys )
+    self.__keyPositions = [ typeKeys.index( key ) for key in self.keys ]
+    self.__values = list( typeValues )
+
+  def getFields( self ):
+    """ Fields of the rollup table, in the order of the rows
+    """
+    return [ 'startTime', 'bucketLength', 'entriesInBucket' ] + self.keys + self.__values
+
+  def getRollupBucket( self, startTime, bucketLength ):
+    """ Rollup bucket a bucket of the type is summed in, buckets longer
+        than the granularity are kept as they are
+    """
+    if bucketLength <= self.granularity:
+      return startTime - startTime % self.granularity, self.granularity
+    return startTime, bucketLength
+
+  def aggregateRows( self, bucketRows ):
+    """ Sum bucket deltas in rollup deltas. Deltas that cancel out are dropped
+
+    :param list bucketRows: startTime, bucketLength, entriesInBucket, keys..., values...
+                            as returned by BucketAggregator.getRows
+    :return: rows with the fields of getFields
+    """
+    rollupBuckets = {}
+    for row in bucketRows:
+      bucketKey = self.getRollupBucket( row[0], row[1] ) + tuple( [ row[ 3 + pos ] for pos in self.__keyPositions ] )
+      accumulator = rollupBuckets.get( bucketKey )
+      if accumulator is None:
+        accumulator = [ 0.0 ] * ( len( self.__values ) + 1 )
+        rollupBuckets[ bucketKey ] = accumulator
+      accumulator[0] += float( row[2] )
+      for pos in range( len( self.__values ) ):
+        accumulator[ pos + 1 ] += float( row[ 3 + self.__numTypeKeys + pos ] )
+    rows = []
+    for bucketKey in sorted( rollupBuckets ):
+      accumulator = rollupBuckets[ bucketKey ]
+      if max( [ abs( value ) for value in accumulator ] ) < 1e-10:
+        continue
+      rows.append( list( bucketKey[:2] ) + accumulator[:1] + list( bucketKey[2:] ) + accumulator[1:] )
+    return rows
+
+  def canAnswer( self, selectFields, condDict, groupFields, orderFields, bucketLength, startTime = None, endTime = None ):
+    """ Check if a query of the bucket table gives the same result on the rollup
+
+    :param int bucketLength: granularity the query is done at
+    :param int startTime: start of the first bucket read by the query, None if unbounded
+    :param int endTime: end of the last bucket read by the query, None if unbounded
+    """
+    if bucketLength % self.granularity:
+      return False
+    # A rollup bucket only partially in the time range holds data out of it
+    for bound in ( startTime, endTime ):
+      if bound is not None and bound % self.granularity:
+        return False
+    groupingFields = self.keys + [ 'startTime', 'bucketLength' ]
+    for field in condDict:
+      if field not in self.keys:
+        return False
+    for fields in ( groupFields, orderFields ):
+      if fields and [ field for field in fields[1] if field not in groupingFields ]:
+        return False
+    summableFields = self.__values + [ 'entriesInBucket' ]
+    pieces = selectFields[0].split( '%s' )
+    if len( pieces ) != len( selectFields[1] ) + 1:
+      return False
+    for pos in range( len( selectFields[1] ) ):
+      field = selectFields[1][ pos ]
+      if field in groupingFields:
+        continue
+      if field not in summableFields:
+        return False
+      if not SUM_START.search( pieces[ pos ] ) or not SUM_END.match( pieces[ pos + 1 ] ):
+        return False
+    return True
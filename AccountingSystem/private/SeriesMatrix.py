@@ -0,0 +1,99 @@
+""" NumPy implementation of the DBUtils time series transformations
+
+    The bucket rows returned by the AccountingDB are converted once to arrays
+    and re-binned to the report granularity for all the grouping keys at once,
+    as a matrix of keys x time bins. The result is converted back to the
+    { key : { timeEpoch : [ values ] } } dicts used by the plotters.
+    This module requires NumPy, DBUtils falls back to its pure python code
+    when it is not available.
+"""
+
+__RCSID__ = "$Id$"
+
+import numpy
+
+def _toFloatArray( data, numColumns ):
+  """ 2D float array of the data, None values are converted to 0
+  """
+  array = numpy.array( data, dtype = numpy.float64 ).reshape( ( len( data ), numColumns ) )
+  array[ numpy.isnan( array ) ] = 0.0
+  return array
+
+def _splitInBins( granularity, dates, lengths ):
+  """ Split each bucket in the bins of granularity length it overlaps, as DBUtils._spanToGranularity does
+
+  :return: ( index of the bucket of each piece, start of the bin of each piece, proportion of the bucket in the piece )
+  """
+  ends = dates + lengths
+  newStarts = dates - dates % granularity
+  # Buckets already at the granularity and instant ones give a single piece
+  single = ( lengths == granularity ) | ( lengths == 0 )
+  numPieces = numpy.where( single, 1, ( ends - newStarts + granularity - 1 ) // granularity )
+  numPieces = numpy.maximum( numPieces, 1 )
+  if ( numPieces == 1 ).all():
+    rowIndex = numpy.arange( len( dates ) )
+    pieceStarts = numpy.where( lengths == granularity, dates, newStarts )
+  else:
+    rowIndex = numpy.repeat( numpy.arange( len( dates ) ), numPieces )
+    firstPiece = numpy.repeat( numpy.cumsum( numPieces ) - numPieces, numPieces )
+    pieceStarts = newStarts[ rowIndex ] + ( numpy.arange( len( rowIndex ) ) - firstPiece ) * granularity
+    pieceStarts = numpy.where( lengths[ rowIndex ] == granularity, dates[ rowIndex ], pieceStarts )
+  overlaps = numpy.minimum( pieceStarts + granularity, ends[ rowIndex ] ) - numpy.maximum( pieceStarts, dates[ rowIndex ] )
+  proportions = numpy.where( single[ rowIndex ], 1.0,
+                             overlaps / numpy.maximum( lengths[ rowIndex ], 1 ).astype( numpy.float64 ) )
+  return rowIndex, pieceStarts, proportions
+
+def groupedToGranularity( granularity, dataList, fieldIndex = 0, average = False ):
+  """ Group the bucket rows by the field at fieldIndex and re-bin them to the granularity.
+      Same result as DBUtils._groupByField followed by _sumToGranularity or
+      _averageToGranularity for each group
+
+  :param dataList: rows with the grouping field and datetime, bucketLength, numerical fields
+  :return: { key : { timeEpoch : [ values ] } }
+  """
+  if not dataList:
+    return {}
+  keyPos = {}
+  keys = []
+  keyIndex = []
+  for row in dataList:
+    key = row[ fieldIndex ]
+    if key not in keyPos:
+      keyPos[ key ] = len( keys )
+      keys.append( key )
+    keyIndex.append( keyPos[ key ] )
+  numColumns = len( dataList[0] ) - 1
+  if fieldIndex == 0:
+    array = _toFloatArray( [ row[1:] for row in dataList ], numColumns )
+  else:
+    array = _toFloatArray( [ row[ :fieldIndex ] + row[ fieldIndex + 1: ] for row in dataList ], numColumns )
+  keyIndex = numpy.array( keyIndex, dtype = numpy.int64 )
+  dates = array[ :, 0 ].astype( numpy.int64 )
+  lengths = array[ :, 1 ].astype( numpy.int64 )
+  rowIndex, pieceStarts, proportions = _splitInBins( granularity, dates, lengths )
+  # Cells of the keys x bins matrix
+  bins, binIndex = numpy.unique( pieceStarts, return_inverse = True )
+  cells, cellIndex = numpy.unique( keyIndex[ rowIndex ] * len( bins ) + binIndex, return_inverse = True )
+  numFields = numColumns - 2
+  sums = numpy.zeros( ( len( cells ), numFields ) )
+  for iP in range( numFields ):
+    sums[ :, iP ] = numpy.bincount( cellIndex, weights = array[ rowIndex, iP + 2 ] * proportions,
+                                    minlength = len( cells ) )
+  if average:
+    sums /= numpy.bincount( cellIndex, weights = proportions, minlength = len( cells ) )[ :, numpy.newaxis ]
+  dataDict = dict( [ ( key, {} ) for key in keys ] )
+  binList = bins.tolist()
+  for cell, values in zip( cells.tolist(), sums.tolist() ):
+    dataDict[ keys[ cell // len( binList ) ] ][ binList[ cell % len( binList ) ] ] = values
+  return dataDict
+
+def sumToGranularity( granularity, bucketsData ):
+  """ Same as DBUtils._sumToGranularity
+  """
+  return groupedToGranularity( granularity, [ [ None ] + list( row ) for row in bucketsData ] ).get( None, {} )
+
+def averageToGranularity( granularity, bucketsData ):
+  """ Same as DBUtils._averageToGranularity
+  """
+  return groupedToGranularity( granularity, [ [ None ] + list( row ) for row in bucketsData ],
+                               average = True ).get( None, {} )
@@ -0,0 +1,46 @@
+""" Benchmark of the in-memory aggregation of accounting buckets
+
+    Usage: python Bench_BucketAggregator.py [ numRecords [ numKeyTuples ] ]
+    compares the statements and bucket rows written for a bundle of pending
+    records, one record at a time as before and aggregated
+"""
+
+import sys
+import time
+import random
+
+from DIRAC.AccountingSystem.private.BucketAggregator import BucketAggregator
+from Test_BucketAggregator import calculateBuckets
+
+def benchmark( numRecords = 10000, numKeyTuples = 50, chunkSize = 1000 ):
+  """ Statements and bucket rows needed to insert a bundle of records
+  """
+  numRecords = int( numRecords )
+  numKeyTuples = int( numKeyTuples )
+  now = 1400000000
+  keyTuples = [ [ random.randint( 1, 1000 ) for _k in range( 5 ) ] for _i in range( numKeyTuples ) ]
+  records = []
+  for _i in range( numRecords ):
+    endTime = now - random.randint( 0, 3600 )
+    records.append( ( random.choice( keyTuples ), [ random.randint( 0, 86400 ), random.random() * 1000, 1 ],
+                      endTime - random.randint( 0, 7200 ), endTime ) )
+  start = time.time()
+  bucketRows = 0
+  for keyIds, valuesList, startTime, endTime in records:
+    bucketRows += len( calculateBuckets( startTime, endTime ) )
+  oneByOne = time.time() - start
+  start = time.time()
+  aggregator = BucketAggregator( 3 )
+  for keyIds, valuesList, startTime, endTime in records:
+    aggregator.addRecord( keyIds, valuesList, calculateBuckets( startTime, endTime ) )
+  rows = aggregator.getRows()
+  aggregated = time.time() - start
+  chunks = lambda n: ( n + chunkSize - 1 ) / chunkSize
+  print "%s records with %s key tuples" % ( numRecords, numKeyTuples )
+  print "One by one: %s statements, %s bucket rows (%.3fs of CPU)" % ( 3 * numRecords, bucketRows, oneByOne )
+  print "Aggregated: %s statements, %s bucket rows (%.3fs of CPU, %d records/s)" % ( chunks( numRecords ) + chunks( len( rows ) ) + 1,
+                                                                                 len( rows ), aggregated,
+                                                                                 numRecords / max( aggregated, 1e-6 ) )
+
+if __name__ == '__main__':
+  benchmark( *sys.argv[1:] )
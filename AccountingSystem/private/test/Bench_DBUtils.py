@@ -0,0 +1,35 @@
+""" Benchmark of the DBUtils time series transformations
+
+    Usage: python Bench_DBUtils.py [ numKeys [ numDays ] ]
+    times the conversion of the hourly buckets of numKeys keys over numDays days
+    with and without NumPy, a year of 200 sites by default
+"""
+
+import sys
+import time
+
+from DIRAC.AccountingSystem.private import DBUtils as DBUtilsModule
+from DIRAC.AccountingSystem.private.DBUtils import DBUtils
+from Test_DBUtils import makeRows
+
+def benchmark( numKeys = 200, numDays = 365 ):
+  """ Time the conversion of a report with and without NumPy
+  """
+  if not DBUtilsModule.gUseNumPy:
+    print "NumPy is not available"
+    return
+  numKeys = int( numKeys )
+  numDays = int( numDays )
+  endEpoch = 1400000000
+  rows = makeRows( numKeys, endEpoch - numDays * 86400, endEpoch )
+  print "%s bucket rows of %s keys" % ( len( rows ), numKeys )
+  dbUtils = DBUtils( None, 'Test' )
+  for granularity in ( 3600, 86400 ):
+    for useNumPy in ( False, True ):
+      DBUtilsModule.gUseNumPy = useNumPy
+      start = time.time()
+      dbUtils._groupByFieldToGranularity( 0, rows, granularity )
+      print "NumPy %-5s granularity %5s: %.2fs" % ( useNumPy, granularity, time.time() - start )
+
+if __name__ == '__main__':
+  benchmark( *sys.argv[1:] )
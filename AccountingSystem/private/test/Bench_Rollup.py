@@ -0,0 +1,32 @@
+""" Benchmark of the rollups of the accounting buckets
+
+    Usage: python Bench_Rollup.py [ numSites [ numUsers ] ]
+    compares the rows read by a report by site over the last 6 months from the
+    buckets and from a daily rollup by site
+"""
+
+import sys
+import random
+
+from Test_Rollup import getSiteRollup
+
+def benchmark( numSites = 100, numUsers = 50 ):
+  """ Rows of the buckets and of a daily rollup by site for 6 months of hourly and daily buckets
+  """
+  numSites = int( numSites )
+  numUsers = int( numUsers )
+  now = 1400000000
+  now -= now % 86400
+  bucketRows = []
+  for startTime, bucketLength in [ ( t, 3600 ) for t in range( now - 8 * 86400, now, 3600 ) ] + \
+                                 [ ( t, 86400 ) for t in range( now - 180 * 86400, now - 8 * 86400, 86400 ) ]:
+    # Not every user runs at every site
+    for _i in range( numSites * numUsers / 5 ):
+      bucketRows.append( [ startTime, bucketLength, 1, random.randint( 1, numUsers ), random.randint( 1, numSites ),
+                           random.randint( 1, 5 ), random.random(), random.random() ] )
+  rollupRows = getSiteRollup().aggregateRows( bucketRows )
+  print "Bucket rows: %s" % len( bucketRows )
+  print "Daily rollup by site rows: %s (%.1f times less)" % ( len( rollupRows ), len( bucketRows ) / float( len( rollupRows ) ) )
+
+if __name__ == '__main__':
+  benchmark( *sys.argv[1:] )
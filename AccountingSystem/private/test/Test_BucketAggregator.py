@@ -0,0 +1,59 @@
+""" Test cases for the in-memory aggregation of accounting buckets
+"""
+
+import random
+import unittest
+
+from DIRAC.AccountingSystem.private.BucketAggregator import BucketAggregator
+
+def calculateBuckets( startTime, endTime, bucketLength = 900 ):
+  """ Same splitting as AccountingDB.calculateBuckets with a single bucket length """
+  currentBucketStart = startTime - startTime % bucketLength
+  if startTime == endTime:
+    return [ ( currentBucketStart, 1, bucketLength ) ]
+  buckets = []
+  totalLength = endTime - startTime
+  while currentBucketStart < endTime:
+    start = max( currentBucketStart, startTime )
+    end = min( currentBucketStart + bucketLength, endTime )
+    buckets.append( ( currentBucketStart, float( end - start ) / totalLength, bucketLength ) )
+    currentBucketStart += bucketLength
+  return buckets
+
+class BucketAggregatorTestCase( unittest.TestCase ):
+
+  def test_sameBucket( self ):
+    aggregator = BucketAggregator( 2 )
+    aggregator.addRecord( [ 1, 2 ], [ 10, 1.5 ], calculateBuckets( 1000, 1000 ) )
+    aggregator.addRecord( [ 1, 2 ], [ 20, 0.5 ], calculateBuckets( 1100, 1100 ) )
+    aggregator.addRecord( [ 1, 3 ], [ 5, 1 ], calculateBuckets( 1100, 1100 ) )
+    self.assertEqual( aggregator.getNumRecords(), 3 )
+    self.assertEqual( aggregator.getRows(), [ [ 900, 900, 2.0, 1, 2, 30.0, 2.0 ],
+                                              [ 900, 900, 1.0, 1, 3, 5.0, 1.0 ] ] )
+
+  def test_split( self ):
+    aggregator = BucketAggregator( 1 )
+    # A quarter of the record in the first bucket, three quarters in the second one
+    aggregator.addRecord( [ 7 ], [ 100 ], calculateBuckets( 1725, 2025 ) )
+    aggregator.addRecord( [ 7 ], [ 100 ], calculateBuckets( 1800, 1800 ) )
+    self.assertEqual( aggregator.getNumBuckets(), 2 )
+    self.assertEqual( aggregator.getRows(), [ [ 900, 900, 0.25, 7, 25.0 ],
+                                              [ 1800, 900, 1.75, 7, 175.0 ] ] )
+
+  def test_totals( self ):
+    aggregator = BucketAggregator( 1 )
+    total = 0
+    for _i in range( 1000 ):
+      startTime = random.randint( 0, 100000 )
+      value = random.randint( 0, 1000 )
+      total += value
+      aggregator.addRecord( [ random.randint( 1, 5 ) ], [ value ],
+                            calculateBuckets( startTime, startTime + random.randint( 0, 5000 ) ) )
+    rows = aggregator.getRows()
+    self.assertAlmostEqual( sum( [ row[2] for row in rows ] ), 1000, 6 )
+    self.assertAlmostEqual( sum( [ row[4] for row in rows ] ), total, 3 )
+if __name__ == '__main__':
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( BucketAggregatorTestCase )
+  gSuite = unittest.TestSuite( [ gSuite ] )
+  unittest.TextTestRunner( verbosity = 2 ).run( gSuite )
@@ -0,0 +1,83 @@
+""" Test cases for the DBUtils time series transformations
+
+    The NumPy implementation is compared with the pure python one. Without NumPy
+    only the pure python code is tested.
+"""
+
+import copy
+import random
+import unittest
+
+from DIRAC.AccountingSystem.private import DBUtils as DBUtilsModule
+from DIRAC.AccountingSystem.private.DBUtils import DBUtils
+
+def makeRows( numKeys, startEpoch, endEpoch, bucketLength = 3600, numFields = 2 ):
+  """ Rows as returned by the AccountingDB for a report grouped by key """
+  rows = []
+  for bucketEpoch in range( startEpoch - startEpoch % bucketLength, endEpoch, bucketLength ):
+    for iK in range( numKeys ):
+      if random.random() < 0.2:
+        continue
+      row = [ 'Key%d' % iK, bucketEpoch, bucketLength ] + [ random.random() * 1000 for _f in range( numFields ) ]
+      if random.random() < 0.01:
+        row[3] = None
+      rows.append( tuple( row ) )
+  return rows
+
+class DBUtilsTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.dbUtils = DBUtils( None, 'Test' )
+    self.useNumPy = DBUtilsModule.gUseNumPy
+
+  def tearDown( self ):
+    DBUtilsModule.gUseNumPy = self.useNumPy
+
+  def compare( self, *args ):
+    """ Result of _groupByFieldToGranularity with and without NumPy """
+    DBUtilsModule.gUseNumPy = False
+    expected = self.dbUtils._groupByFieldToGranularity( *copy.deepcopy( args ) )
+    DBUtilsModule.gUseNumPy = self.useNumPy
+    result = self.dbUtils._groupByFieldToGranularity( *copy.deepcopy( args ) )
+    self.assertAlmostEqualStructure( result, expected )
+    return expected
+
+  def assertAlmostEqualStructure( self, result, expected ):
+    if isinstance( expected, dict ):
+      self.assertEqual( sorted( result.keys() ), sorted( expected.keys() ) )
+      for key in expected:
+        self.assertAlmostEqualStructure( result[ key ], expected[ key ] )
+    elif isinstance( expected, ( list, tuple ) ):
+      self.assertEqual( len( result ), len( expected ) )
+      for resultValue, expectedValue in zip( result, expected ):
+        self.assertAlmostEqualStructure( resultValue, expectedValue )
+    else:
+      self.assertAlmostEqual( result, expected, 6 )
+
+  def test_granularity( self ):
+    rows = [ ( 'A', 3600, 3600, 1, 2 ), ( 'A', 7200, 3600, None, 4 ), ( 'B', 3600, 86400, 10, 20 ),
+             ( 'A', 90000, 0, 5, 5 ), ( 'B', 100000, 1000, 3, 3 ), ( 'C', 3700, 3600, 1, 1 ) ]
+    for granularity in ( 3600, 7200, 86400 ):
+      self.compare( 0, rows, granularity )
+      self.compare( 0, rows, granularity, True )
+    result = self.compare( 0, rows, 7200 )
+    self.assertAlmostEqualStructure( result[ 'B' ][ 0 ], [ 10 / 24., 20 / 24. ] )
+    self.assertEqual( self.compare( 0, [], 3600 ), {} )
+
+  def test_fieldIndex( self ):
+    rows = [ ( 3600, 'A', 3600, 1 ), ( 3600, 'B', 3600, 2 ), ( 7200, 'A', 3600, 3 ) ]
+    self.assertEqual( self.compare( 1, rows, 7200 ), { 'A' : { 0 : [ 1.0 ], 7200 : [ 3.0 ] },
+                                                      'B' : { 0 : [ 2.0 ] } } )
+
+  def test_report( self ):
+    startEpoch = 1400000000
+    rows = makeRows( 5, startEpoch, startEpoch + 10 * 86400 )
+    for granularity in ( 3600, 86400 ):
+      self.compare( 0, rows, granularity )
+      self.compare( 0, rows, granularity, True )
+
+if __name__ == '__main__':
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( DBUtilsTestCase )
+  gSuite = unittest.TestSuite( [ gSuite ] )
+  unittest.TextTestRunner( verbosity = 2 ).run( gSuite )
@@ -0,0 +1,71 @@
+""" Test cases for the rollups of the accounting buckets
+"""
+
+import unittest
+
+from DIRAC.AccountingSystem.private.Rollup import Rollup
+
+TYPE_KEYS = [ 'User', 'Site', 'JobType' ]
+TYPE_VALUES = [ 'CPUTime', 'NormCPUTime' ]
+
+def getSiteRollup( granularity = 86400 ):
+  return Rollup( 'SiteDaily', 'ac_rollup_Test_SiteDaily', [ 'Site' ], granularity, TYPE_KEYS, TYPE_VALUES )
+
+class RollupTestCase( unittest.TestCase ):
+
+  def test_fields( self ):
+    rollup = Rollup( 'Test', 'table', [ 'JobType', 'User' ], 3600, TYPE_KEYS, TYPE_VALUES )
+    self.assertEqual( rollup.getFields(), [ 'startTime', 'bucketLength', 'entriesInBucket',
+                                            'User', 'JobType', 'CPUTime', 'NormCPUTime' ] )
+
+  def test_aggregate( self ):
+    rollup = getSiteRollup()
+    rows = [ [ 3600, 3600, 1, 1, 10, 5, 10.0, 20.0 ],
+             [ 7200, 3600, 2, 2, 10, 6, 1.0, 2.0 ],
+             [ 7200, 3600, 1, 2, 11, 6, 1.0, 2.0 ],
+             [ 604800, 604800, 1, 1, 10, 5, 4.0, 4.0 ] ]
+    self.assertEqual( rollup.aggregateRows( rows ), [ [ 0, 86400, 3.0, 10, 11.0, 22.0 ],
+                                                      [ 0, 86400, 1.0, 11, 1.0, 2.0 ],
+                                                      [ 604800, 604800, 1.0, 10, 4.0, 4.0 ] ] )
+
+  def test_cancelOut( self ):
+    rollup = getSiteRollup()
+    # An hourly bucket compacted in a daily one does not change the daily rollup
+    rows = [ [ 7200, 3600, -1, 1, 10, 5, -10.0, -20.0 ],
+             [ 0, 86400, 1, 1, 10, 5, 10.0, 20.0 ] ]
+    self.assertEqual( rollup.aggregateRows( rows ), [] )
+    # But it does change an hourly one
+    rollup = getSiteRollup( 3600 )
+    self.assertEqual( len( rollup.aggregateRows( rows ) ), 2 )
+
+  def test_canAnswer( self ):
+    rollup = getSiteRollup()
+    groupFields = ( "%s, %s, %s", [ 'Site', 'startTime', 'bucketLength' ] )
+    selectFields = ( "%s, %s, %s, SUM(%s)", [ 'Site', 'startTime', 'bucketLength', 'CPUTime' ] )
+    self.assert_( rollup.canAnswer( selectFields, { 'Site' : [ 'A' ] }, groupFields, False, 86400 ) )
+    self.assert_( rollup.canAnswer( selectFields, {}, groupFields, False, 604800 ) )
+    self.assert_( rollup.canAnswer( ( "SUM( %s )/SUM(%s)", [ 'CPUTime', 'entriesInBucket' ] ), {}, False, False, 86400 ) )
+    # Finer granularity
+    self.failIf( rollup.canAnswer( selectFields, {}, groupFields, False, 3600 ) )
+    # Keys not in the rollup
+    self.failIf( rollup.canAnswer( selectFields, { 'User' : [ 'a' ] }, groupFields, False, 86400 ) )
+    self.failIf( rollup.canAnswer( selectFields, {}, ( "%s", [ 'User' ] ), False, 86400 ) )
+    self.failIf( rollup.canAnswer( selectFields, {}, groupFields, ( "%s", [ 'User' ] ), 86400 ) )
+    # Values not summed or summed after a per bucket operation
+    self.failIf( rollup.canAnswer( ( "%s, MAX(%s)", [ 'Site', 'CPUTime' ] ), {}, groupFields, False, 86400 ) )
+    self.failIf( rollup.canAnswer( ( "%s, SUM(%s/%s)", [ 'Site', 'CPUTime', 'entriesInBucket' ] ), {}, groupFields, False, 86400 ) )
+
+  def test_canAnswerTimeRange( self ):
+    rollup = getSiteRollup()
+    groupFields = ( "%s, %s, %s", [ 'Site', 'startTime', 'bucketLength' ] )
+    selectFields = ( "%s, %s, %s, SUM(%s)", [ 'Site', 'startTime', 'bucketLength', 'CPUTime' ] )
+    self.assert_( rollup.canAnswer( selectFields, {}, groupFields, False, 86400, 86400, 3 * 86400 ) )
+    self.assert_( rollup.canAnswer( selectFields, {}, groupFields, False, 86400, None, 3 * 86400 ) )
+    # The last hourly bucket read ends mid-day: the last daily rollup bucket holds data after it
+    self.failIf( rollup.canAnswer( selectFields, {}, groupFields, False, 86400, 86400, 2 * 86400 + 43200 ) )
+    self.failIf( rollup.canAnswer( selectFields, {}, groupFields, False, 86400, 86400 + 3600, 3 * 86400 ) )
+if __name__ == '__main__':
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( RollupTestCase )
+  gSuite = unittest.TestSuite( [ gSuite ] )
+  unittest.TextTestRunner( verbosity = 2 ).run( gSuite )
@@ -31,6 +31,14 @@ class ConfigurationHandler( RequestHandler ):
       retDict[ 'data' ] = gServiceInterface.getCompressedConfigurationData()
     return S_OK( retDict )
 
+  types_getDeltaIfNewer = [ types.StringType ]
+  def export_getDeltaIfNewer( self, sClientVersion ):
+    """
+    Get the modifications since the client version, or the whole compressed
+    data if the modifications are not available any more
+    """
+    return S_OK( gServiceInterface.getDeltaIfNewer( sClientVersion ) )
+
   types_publishSlaveServer = [ types.StringType ]
   def export_publishSlaveServer( self, sURL ):
     gServiceInterface.publishSlaveServer( sURL )
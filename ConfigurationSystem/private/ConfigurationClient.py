@@ -98,6 +98,8 @@ class ConfigurationClient:
 
   def getOption( self, optionPath, typeValue = None ):
     gRefresher.refreshConfigurationIfNeeded()
+    #Casts are memoized until the configuration changes
+    lookupCache = gConfigurationData.getLookupCache()
     optionValue = gConfigurationData.extractOptionFromCFG( optionPath )
 
     if optionValue == None:
@@ -112,6 +114,20 @@ class ConfigurationClient:
     if not type( typeValue ) == types.TypeType:
       requestedType = type( typeValue )
 
+    cacheKey = ( "typed", optionPath, requestedType )
+    try:
+      castValue = lookupCache[ cacheKey ]
+    except KeyError:
+      result = self.__castOption( optionValue, typeValue, requestedType )
+      if not result[ 'OK' ]:
+        return result
+      castValue = result[ 'Value' ]
+      lookupCache[ cacheKey ] = castValue
+    if requestedType == types.ListType:
+      castValue = list( castValue )
+    return S_OK( castValue )
+
+  def __castOption( self, optionValue, typeValue, requestedType ):
     if requestedType == types.ListType:
       try:
         return S_OK( List.fromChar( optionValue, ',' ) )
@@ -147,12 +163,17 @@ class ConfigurationClient:
 
   def getOptionsDict( self, sectionPath ):
     gRefresher.refreshConfigurationIfNeeded()
+    lookupCache = gConfigurationData.getLookupCache()
+    cacheKey = ( "optionsDict", sectionPath )
+    if cacheKey in lookupCache:
+      return S_OK( dict( lookupCache[ cacheKey ] ) )
     optionsDict = {}
     optionList = gConfigurationData.getOptionsFromCFG( sectionPath )
     if type( optionList ) == types.ListType:
       for option in optionList:
         optionsDict[ option ] = gConfigurationData.extractOptionFromCFG( "%s/%s" %
                                                               ( sectionPath, option ) )
+      lookupCache[ cacheKey ] = dict( optionsDict )
       return S_OK( optionsDict )
     else:
       return S_ERROR( "Path %s does not exist or it's not a section" % sectionPath )
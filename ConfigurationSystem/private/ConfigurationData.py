@@ -6,6 +6,10 @@ import zlib
 import zipfile
 import threading, thread
 import time
+try:
+  from hashlib import md5
+except:
+  from md5 import md5
 import DIRAC
 from DIRAC.Core.Utilities import List, Time
 from DIRAC.Core.Utilities.ReturnValues import S_OK, S_ERROR
@@ -22,12 +26,18 @@ class ConfigurationData:
     self.threadingLock = lr.getLock()
     self.runningThreadsNumber = 0
     self.compressedConfigurationData = ""
+    self.remoteCFGChecksum = ""
+    self.__deltaHistory = []
+    self.__lastRemoteCFG = False
+    self.__lastRemoteVersion = False
     self.configurationPath = "/DIRAC/Configuration"
     self.backupsDir = os.path.join( DIRAC.rootPath, "etc", "csbackup" )
     self._isService = False
     self.localCFG = CFG()
     self.remoteCFG = CFG()
     self.mergedCFG = CFG()
+    self.__lookupCache = ( None, {} )
+    self.__maxLookupCacheSize = 100000
     self.remoteServerList = []
     if loadDefaultCFG:
       defaultCFGFile = os.path.join( DIRAC.rootPath, "etc", "dirac.cfg" )
@@ -55,7 +65,58 @@ class ConfigurationData:
     if remoteServers:
       self.remoteServerList.extend( List.fromChar( remoteServers, "," ) )
     self.remoteServerList = List.uniqueElements( self.remoteServerList )
-    self.compressedConfigurationData = zlib.compress( str( self.remoteCFG ), 9 )
+    #Serialized forms of the remote CFG are generated when requested
+    self.compressedConfigurationData = ""
+    self.remoteCFGChecksum = ""
+    if self._isService:
+      self.__recordDelta()
+
+  def __recordDelta( self ):
+    """
+    Keep the modifications between the last versions so clients can be sent
+    only the changes since their version
+    """
+    #sync may be called while holding the lock, so no danger zones here
+    version = self.remoteCFG.getOption( "%s/Version" % self.configurationPath, "0" )
+    if version == self.__lastRemoteVersion:
+      return
+    if self.__lastRemoteCFG:
+      modList = self.__lastRemoteCFG.getModifications( self.remoteCFG )
+      self.__deltaHistory.append( ( self.__lastRemoteVersion, version, modList ) )
+      historySize = self.mergedCFG.getOption( "%s/DeltaHistorySize" % self.configurationPath, 20 )
+      self.__deltaHistory = self.__deltaHistory[ -historySize: ]
+    self.__lastRemoteCFG = self.remoteCFG.clone()
+    self.__lastRemoteVersion = version
+
+  def getModificationsSince( self, version ):
+    """
+    Get the list of modification lists to apply to go from version to the current one
+    """
+    history = list( self.__deltaHistory )
+    for iPos in range( len( history ) ):
+      if history[ iPos ][0] == version:
+        break
+    else:
+      return S_ERROR( "No modifications recorded since version %s" % version )
+    if history[-1][1] != self.getVersion():
+      return S_ERROR( "Modifications history is not up to date" )
+    return S_OK( [ modList for dummy, dummy, modList in history[ iPos: ] ] )
+
+  def getDeltaIfNewer( self, clientVersion ):
+    """
+    Get what a client with version clientVersion needs to be up to date. Either the
+    modifications since its version or, if they are not available, the whole compressed data
+    """
+    version = self.getVersion()
+    retDict = { 'newestVersion' : version }
+    if clientVersion < version:
+      result = self.getModificationsSince( clientVersion )
+      if result[ 'OK' ]:
+        retDict[ 'modifications' ] = result[ 'Value' ]
+        retDict[ 'checksum' ] = self.getRemoteCFGChecksum()
+      else:
+        retDict[ 'data' ] = self.getCompressedData()
+    return retDict
 
   def loadFile( self, fileName ):
     try:
@@ -88,6 +149,24 @@ class ConfigurationData:
     self.unlock()
     self.sync()
 
+  def applyRemoteModifications( self, modificationsList, checksum ):
+    """
+    Update the remote CFG applying a list of modification lists. The result
+    has to match the checksum of the remote CFG in the server.
+    """
+    newCFG = self.remoteCFG.clone()
+    for modList in modificationsList:
+      result = newCFG.applyModifications( modList )
+      if not result[ 'OK' ]:
+        return result
+    if md5( str( newCFG ) ).hexdigest() != checksum:
+      return S_ERROR( "Configuration checksum mismatch after applying modifications" )
+    self.lock()
+    self.remoteCFG = newCFG
+    self.unlock()
+    self.sync()
+    return S_OK()
+
   def loadConfigurationData( self, fileName = False ):
     name = self.getName()
     self.lock()
@@ -116,9 +195,32 @@ class ConfigurationData:
       pass
     return self.dangerZoneEnd( None )
 
+  def __getLookup( self ):
+    """
+    Get the merged CFG and the memo of the lookups done on it.
+    The merged CFG is regenerated on each sync and never modified afterwards, so
+    the memo is valid as long as the merged CFG is the current one.
+    """
+    mergedCFG = self.mergedCFG
+    lookup = self.__lookupCache
+    if lookup[0] is not mergedCFG or len( lookup[1] ) > self.__maxLookupCacheSize:
+      lookup = ( mergedCFG, {} )
+      self.__lookupCache = lookup
+    return lookup
+
+  def getLookupCache( self ):
+    """
+    Get the memo of lookups for the current configuration version. Anything
+    stored in it is discarded when the configuration changes.
+    """
+    return self.__getLookup()[1]
+
   def getSectionsFromCFG( self, path, cfg = False, ordered = False ):
-    if not cfg:
-      cfg = self.mergedCFG
+    if not cfg or cfg is self.mergedCFG:
+      return self.__cachedLookup( ( "sections", path, ordered ), self.__getSections, path, ordered )
+    return self.__getSections( path, cfg, ordered )
+
+  def __getSections( self, path, cfg, ordered ):
     self.dangerZoneStart()
     try:
       levelList = [ level.strip() for level in path.split( "/" ) if level.strip() != "" ]
@@ -130,8 +232,11 @@ class ConfigurationData:
     return self.dangerZoneEnd( None )
 
   def getOptionsFromCFG( self, path, cfg = False, ordered = False ):
-    if not cfg:
-      cfg = self.mergedCFG
+    if not cfg or cfg is self.mergedCFG:
+      return self.__cachedLookup( ( "options", path, ordered ), self.__getOptions, path, ordered )
+    return self.__getOptions( path, cfg, ordered )
+
+  def __getOptions( self, path, cfg, ordered ):
     self.dangerZoneStart()
     try:
       levelList = [ level.strip() for level in path.split( "/" ) if level.strip() != "" ]
@@ -143,8 +248,18 @@ class ConfigurationData:
     return self.dangerZoneEnd( None )
 
   def extractOptionFromCFG( self, path, cfg = False, disableDangerZones = False ):
-    if not cfg:
-      cfg = self.mergedCFG
+    if not cfg or cfg is self.mergedCFG:
+      mergedCFG, lookupCache = self.__getLookup()
+      cacheKey = ( "option", path )
+      try:
+        return lookupCache[ cacheKey ]
+      except KeyError:
+        value = self.__extractOption( path, mergedCFG, disableDangerZones )
+        lookupCache[ cacheKey ] = value
+        return value
+    return self.__extractOption( path, cfg, disableDangerZones )
+
+  def __extractOption( self, path, cfg, disableDangerZones ):
     if not disableDangerZones:
       self.dangerZoneStart()
     try:
@@ -158,6 +273,21 @@ class ConfigurationData:
     if not disableDangerZones:
       self.dangerZoneEnd()
 
+  def __cachedLookup( self, cacheKey, lookupFunction, path, ordered ):
+    """
+    Section and option listings are memoized for the current merged CFG.
+    Callers get a copy because they are free to modify the returned list.
+    """
+    mergedCFG, lookupCache = self.__getLookup()
+    try:
+      value = lookupCache[ cacheKey ]
+    except KeyError:
+      value = lookupFunction( path, mergedCFG, ordered )
+      lookupCache[ cacheKey ] = value
+    if value is None:
+      return None
+    return list( value )
+
   def setOptionInCFG( self, path, value, cfg = False, disableDangerZones = False ):
     if not cfg:
       cfg = self.localCFG
@@ -284,8 +414,15 @@ class ConfigurationData:
     self.sync()
 
   def getCompressedData( self ):
+    if not self.compressedConfigurationData:
+      self.compressedConfigurationData = zlib.compress( str( self.remoteCFG ), 9 )
     return self.compressedConfigurationData
 
+  def getRemoteCFGChecksum( self ):
+    if not self.remoteCFGChecksum:
+      self.remoteCFGChecksum = md5( str( self.remoteCFG ) ).hexdigest()
+    return self.remoteCFGChecksum
+
   def isMaster( self ):
     value = self.extractOptionFromCFG( "%s/Master" % self.configurationPath,
                                             self.localCFG )
@@ -15,12 +15,24 @@ from DIRAC.Core.Utilities.ReturnValues import S_OK, S_ERROR
 def _updateFromRemoteLocation( serviceClient ):
   gLogger.debug( "", "Trying to refresh from %s" % serviceClient.serviceURL )
   localVersion = gConfigurationData.getVersion()
-  retVal = serviceClient.getCompressedDataIfNewer( localVersion )
+  retVal = serviceClient.getDeltaIfNewer( localVersion )
+  if not retVal[ 'OK' ] and retVal[ 'Message' ].find( "Unknown method" ) == 0:
+    #Old server, it can only send the whole data
+    retVal = serviceClient.getCompressedDataIfNewer( localVersion )
   if retVal[ 'OK' ]:
     dataDict = retVal[ 'Value' ]
     if localVersion < dataDict[ 'newestVersion' ] :
       gLogger.debug( "New version available", "Updating to version %s..." % dataDict[ 'newestVersion' ] )
-      gConfigurationData.loadRemoteCFGFromCompressedMem( dataDict[ 'data' ] )
+      if 'modifications' in dataDict:
+        result = gConfigurationData.applyRemoteModifications( dataDict[ 'modifications' ], dataDict[ 'checksum' ] )
+        if not result[ 'OK' ]:
+          gLogger.warn( "Cannot apply configuration modifications, getting the whole data", result[ 'Message' ] )
+          result = serviceClient.getCompressedData()
+          if not result[ 'OK' ]:
+            return result
+          gConfigurationData.loadRemoteCFGFromCompressedMem( result[ 'Value' ] )
+      else:
+        gConfigurationData.loadRemoteCFGFromCompressedMem( dataDict[ 'data' ] )
       gLogger.debug( "Updated to version %s" % gConfigurationData.getVersion() )
       gEventDispatcher.triggerEvent( "CSNewVersion", dataDict[ 'newestVersion' ], threaded = True )
     return S_OK()
@@ -67,6 +79,9 @@ class Refresher( threading.Thread ):
   def refreshConfigurationIfNeeded( self ):
     if not self.__refreshEnabled or self.__automaticUpdate or not gConfigurationData.getServers():
       return
+    #Cheap check first so that readers do not contend for the lock on each access
+    if not self.__lastRefreshExpired():
+      return
     self.__triggeredRefreshLock.acquire()
     try:
       if not self.__lastRefreshExpired():
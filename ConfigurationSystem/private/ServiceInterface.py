@@ -162,6 +162,9 @@ class ServiceInterface( threading.Thread ):
   def getVersion( self ):
     return gConfigurationData.getVersion()
 
+  def getDeltaIfNewer( self, sClientVersion ):
+    return gConfigurationData.getDeltaIfNewer( sClientVersion )
+
   def getCommitHistory( self ):
     files = self.__getCfgBackups( gConfigurationData.getBackupDir() )
     backups = [ ".".join( fileName.split( "." )[1:-1] ).split( "@" ) for fileName in files ]
@@ -0,0 +1,88 @@
+""" Test cases for the memo of the casts done by ConfigurationClient.getOption
+"""
+
+import unittest
+
+from mock import MagicMock, patch
+
+from DIRAC.ConfigurationSystem.private.ConfigurationData import ConfigurationData
+import DIRAC.ConfigurationSystem.private.ConfigurationClient as sut
+
+REMOTE_CFG = """
+DIRAC
+{
+  Configuration
+  {
+    Version = %s
+  }
+}
+Systems
+{
+  MaxJobs = %s
+  Enabled = yes
+  Sites = CERN, PIC
+  Name = abc
+}
+"""
+
+class GetOptionTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.data = ConfigurationData( loadDefaultCFG = False )
+    self.data.loadRemoteCFGFromMem( REMOTE_CFG % ( "2014-01-01 00:00:00", "10" ) )
+    self.patches = [ patch.object( sut, "gConfigurationData", self.data ),
+                     patch.object( sut, "gRefresher", MagicMock() ) ]
+    for patcher in self.patches:
+      patcher.start()
+    self.client = sut.ConfigurationClient()
+
+  def tearDown( self ):
+    for patcher in self.patches:
+      patcher.stop()
+
+  def test_casts( self ):
+    """ Each type gets its own cast of the value
+    """
+    self.assertEqual( self.client.getOption( '/Systems/MaxJobs' )[ 'Value' ], '10' )
+    self.assertEqual( self.client.getOption( '/Systems/MaxJobs', 0 )[ 'Value' ], 10 )
+    self.assertEqual( self.client.getOption( '/Systems/MaxJobs', 0. )[ 'Value' ], 10. )
+    self.assertEqual( type( self.client.getOption( '/Systems/MaxJobs', 0. )[ 'Value' ] ), float )
+    self.assertEqual( self.client.getOption( '/Systems/MaxJobs', "" )[ 'Value' ], '10' )
+    self.assertEqual( self.client.getOption( '/Systems/MaxJobs', [] )[ 'Value' ], [ '10' ] )
+    self.assertEqual( self.client.getOption( '/Systems/Enabled', False )[ 'Value' ], True )
+    # A type and a value of that type share the cast
+    self.assertEqual( self.client.getOption( '/Systems/MaxJobs', int )[ 'Value' ], 10 )
+    lookupCache = self.data.getLookupCache()
+    for requestedType in ( int, float, str, list ):
+      self.assertTrue( ( 'typed', '/Systems/MaxJobs', requestedType ) in lookupCache )
+    self.assertEqual( self.client.getValue( '/Systems/MaxJobs', 1 ), 10 )
+
+  def test_listCopies( self ):
+    sites = self.client.getOption( '/Systems/Sites', [] )[ 'Value' ]
+    self.assertEqual( sites, [ 'CERN', 'PIC' ] )
+    sites.append( 'CNAF' )
+    self.assertEqual( self.client.getOption( '/Systems/Sites', [] )[ 'Value' ], [ 'CERN', 'PIC' ] )
+
+  def test_castError( self ):
+    """ Failed casts are not memoized
+    """
+    for dummy in range( 2 ):
+      self.assertFalse( self.client.getOption( '/Systems/Name', 0 )[ 'OK' ] )
+    self.assertFalse( ( 'typed', '/Systems/Name', int ) in self.data.getLookupCache() )
+    self.assertEqual( self.client.getValue( '/Systems/Name', 5 ), 5 )
+
+  def test_newVersion( self ):
+    """ The casts are discarded when the merged CFG changes
+    """
+    self.assertEqual( self.client.getOption( '/Systems/MaxJobs', 0 )[ 'Value' ], 10 )
+    mergedCFG = self.data.mergedCFG
+    self.data.loadRemoteCFGFromMem( REMOTE_CFG % ( "2014-01-02 00:00:00", "20" ) )
+    self.assertFalse( self.data.mergedCFG is mergedCFG )
+    self.assertEqual( self.client.getOption( '/Systems/MaxJobs', 0 )[ 'Value' ], 20 )
+    self.data.setOptionInCFG( '/Systems/MaxJobs', '30' )
+    self.assertEqual( self.client.getOption( '/Systems/MaxJobs', 0 )[ 'Value' ], 30 )
+
+if __name__ == '__main__':
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( GetOptionTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( gSuite )
@@ -0,0 +1,253 @@
+""" Test cases for the configuration modifications sent to the CS clients instead
+    of the full dumps, and for the memo of the lookups
+"""
+
+import zlib
+import unittest
+
+from mock import MagicMock, patch
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.Core.Utilities.CFG import CFG
+from DIRAC.ConfigurationSystem.private.ConfigurationData import ConfigurationData
+import DIRAC.ConfigurationSystem.private.Refresher as Refresher
+import DIRAC.ConfigurationSystem.Service.ConfigurationHandler as ConfigurationHandler
+
+REMOTE_CFG = """
+DIRAC
+{
+  Configuration
+  {
+    Name = Test
+    Version = 2014-01-01 00:00:00
+  }
+}
+Resources
+{
+  Sites
+  {
+    CERN
+    {
+      CE = ce1.cern.ch
+    }
+  }
+}
+"""
+
+class DeltaBaseTestCase( unittest.TestCase ):
+  """ A server and a client with the same remote CFG
+  """
+
+  def setUp( self ):
+    self.server = ConfigurationData( loadDefaultCFG = False )
+    self.server.setAsService()
+    self.server.loadRemoteCFGFromMem( REMOTE_CFG )
+    self.client = ConfigurationData( loadDefaultCFG = False )
+    self.client.loadRemoteCFGFromMem( REMOTE_CFG )
+    self.oldVersion = self.client.getVersion()
+
+  def commit( self, version, changes ):
+    """ New version of the server configuration, with changes( remoteCFG ) applied
+    """
+    changes( self.server.remoteCFG )
+    self.server.setVersion( version )
+    self.assertEqual( self.server.getVersion(), version )
+
+  def commitTwice( self ):
+    def addSite( cfg ):
+      cfg[ 'Resources' ][ 'Sites' ].createNewSection( 'CNAF' )
+      cfg.setOption( '/Resources/Sites/CNAF/CE', 'ce1.cnaf.it' )
+    def changeCE( cfg ):
+      cfg.setOption( '/Resources/Sites/CERN/CE', 'ce2.cern.ch' )
+      cfg[ 'Resources' ][ 'Sites' ].deleteKey( 'CNAF' )
+      cfg[ 'Resources' ][ 'Sites' ].createNewSection( 'PIC' )
+      cfg.setOption( '/Resources/Sites/PIC/CE', 'ce1.pic.es' )
+    self.commit( "2014-01-02 00:00:00", addSite )
+    self.commit( "2014-01-03 00:00:00", changeCE )
+
+class DeltaTestCase( DeltaBaseTestCase ):
+
+  def test_modifications( self ):
+    """ The modifications applied to an old remote CFG give the remote CFG of the server
+    """
+    self.commitTwice()
+    retDict = self.server.getDeltaIfNewer( self.oldVersion )
+    self.assertEqual( retDict[ 'newestVersion' ], "2014-01-03 00:00:00" )
+    self.assertFalse( 'data' in retDict )
+    self.assertEqual( len( retDict[ 'modifications' ] ), 2 )
+    result = self.client.applyRemoteModifications( retDict[ 'modifications' ], retDict[ 'checksum' ] )
+    self.assertTrue( result[ 'OK' ] )
+    self.assertEqual( str( self.client.remoteCFG ), str( self.server.remoteCFG ) )
+    self.assertEqual( self.client.getVersion(), "2014-01-03 00:00:00" )
+    self.assertEqual( self.client.extractOptionFromCFG( '/Resources/Sites/PIC/CE' ), 'ce1.pic.es' )
+
+  def test_intermediateVersion( self ):
+    self.commitTwice()
+    result = self.server.getModificationsSince( "2014-01-02 00:00:00" )
+    self.assertTrue( result[ 'OK' ] )
+    self.assertEqual( len( result[ 'Value' ] ), 1 )
+
+  def test_upToDate( self ):
+    self.commitTwice()
+    retDict = self.server.getDeltaIfNewer( "2014-01-03 00:00:00" )
+    self.assertEqual( retDict, { 'newestVersion' : "2014-01-03 00:00:00" } )
+
+  def test_unknownVersion( self ):
+    """ Clients with a version older than the history get the whole data
+    """
+    self.commitTwice()
+    retDict = self.server.getDeltaIfNewer( "2013-01-01 00:00:00" )
+    self.assertFalse( 'modifications' in retDict )
+    self.assertEqual( zlib.decompress( retDict[ 'data' ] ), str( self.server.remoteCFG ) )
+
+  def test_historySize( self ):
+    localCFG = CFG()
+    localCFG.loadFromBuffer( "DIRAC\n{\n  Configuration\n  {\n    DeltaHistorySize = 1\n  }\n}\n" )
+    self.server.mergeWithLocal( localCFG )
+    self.commitTwice()
+    self.assertFalse( self.server.getModificationsSince( self.oldVersion )[ 'OK' ] )
+    self.assertTrue( 'data' in self.server.getDeltaIfNewer( self.oldVersion ) )
+    self.assertTrue( self.server.getModificationsSince( "2014-01-02 00:00:00" )[ 'OK' ] )
+
+  def test_checksumMismatch( self ):
+    """ A client whose remote CFG differs from the one of the server keeps its CFG
+    """
+    self.client.remoteCFG.setOption( '/Resources/Sites/CERN/SE', 'CERN-disk' )
+    self.client.sync()
+    before = str( self.client.remoteCFG )
+    self.commitTwice()
+    retDict = self.server.getDeltaIfNewer( self.oldVersion )
+    result = self.client.applyRemoteModifications( retDict[ 'modifications' ], retDict[ 'checksum' ] )
+    self.assertFalse( result[ 'OK' ] )
+    self.assertTrue( 'checksum mismatch' in result[ 'Message' ] )
+    self.assertEqual( str( self.client.remoteCFG ), before )
+    self.assertEqual( self.client.getVersion(), self.oldVersion )
+
+  def test_handler( self ):
+    self.commitTwice()
+    handler = ConfigurationHandler.ConfigurationHandler.__new__( ConfigurationHandler.ConfigurationHandler )
+    serviceInterface = MagicMock()
+    serviceInterface.getDeltaIfNewer.side_effect = self.server.getDeltaIfNewer
+    patcher = patch.object( ConfigurationHandler, "gServiceInterface", serviceInterface )
+    patcher.start()
+    try:
+      result = handler.export_getDeltaIfNewer( self.oldVersion )
+    finally:
+      patcher.stop()
+    self.assertTrue( result[ 'OK' ] )
+    self.assertEqual( result[ 'Value' ], self.server.getDeltaIfNewer( self.oldVersion ) )
+
+class RefresherTestCase( DeltaBaseTestCase ):
+  """ Refresh of a client from a fake service client in front of the server
+  """
+
+  def setUp( self ):
+    DeltaBaseTestCase.setUp( self )
+    self.serviceClient = MagicMock()
+    self.serviceClient.getDeltaIfNewer.side_effect = lambda version: S_OK( self.server.getDeltaIfNewer( version ) )
+    self.serviceClient.getCompressedDataIfNewer.side_effect = self.getCompressedDataIfNewer
+    self.serviceClient.getCompressedData.side_effect = lambda: S_OK( self.server.getCompressedData() )
+    self.patches = [ patch.object( Refresher, "gConfigurationData", self.client ),
+                     patch.object( Refresher, "gEventDispatcher", MagicMock() ) ]
+    for patcher in self.patches:
+      patcher.start()
+
+  def tearDown( self ):
+    for patcher in self.patches:
+      patcher.stop()
+
+  def getCompressedDataIfNewer( self, version ):
+    return S_OK( { 'newestVersion' : self.server.getVersion(), 'data' : self.server.getCompressedData() } )
+
+  def refresh( self ):
+    self.assertTrue( Refresher._updateFromRemoteLocation( self.serviceClient )[ 'OK' ] )
+    self.assertEqual( str( self.client.remoteCFG ), str( self.server.remoteCFG ) )
+
+  def test_refresh( self ):
+    self.commitTwice()
+    self.refresh()
+    self.assertFalse( self.serviceClient.getCompressedData.called )
+    self.assertFalse( self.serviceClient.getCompressedDataIfNewer.called )
+
+  def test_refreshMismatch( self ):
+    """ On a checksum mismatch the whole data is downloaded
+    """
+    self.client.remoteCFG.setOption( '/Resources/Sites/CERN/SE', 'CERN-disk' )
+    self.client.sync()
+    self.commitTwice()
+    self.refresh()
+    self.assertEqual( self.serviceClient.getCompressedData.call_count, 1 )
+
+  def test_refreshOldServer( self ):
+    self.serviceClient.getDeltaIfNewer.side_effect = lambda version: S_ERROR( "Unknown method getDeltaIfNewer" )
+    self.commitTwice()
+    self.refresh()
+    self.assertEqual( self.serviceClient.getCompressedDataIfNewer.call_count, 1 )
+
+class LookupCacheTestCase( unittest.TestCase ):
+  """ The lookups are memoized as long as the merged CFG is the same
+  """
+
+  def setUp( self ):
+    self.data = ConfigurationData( loadDefaultCFG = False )
+    self.data.loadRemoteCFGFromMem( REMOTE_CFG )
+
+  def newVersion( self, version, ce ):
+    self.data.loadRemoteCFGFromMem( REMOTE_CFG.replace( "2014-01-01 00:00:00", version ).replace( "ce1.cern.ch", ce ) )
+
+  def test_memo( self ):
+    lookupCache = self.data.getLookupCache()
+    self.assertEqual( self.data.extractOptionFromCFG( '/Resources/Sites/CERN/CE' ), 'ce1.cern.ch' )
+    self.assertEqual( self.data.getSectionsFromCFG( '/Resources/Sites' ), [ 'CERN' ] )
+    self.assertEqual( self.data.extractOptionFromCFG( '/Resources/Sites/PIC/CE' ), None )
+    self.assertTrue( self.data.getLookupCache() is lookupCache )
+    self.assertEqual( lookupCache[ ( 'option', '/Resources/Sites/CERN/CE' ) ], 'ce1.cern.ch' )
+    self.assertTrue( ( 'option', '/Resources/Sites/PIC/CE' ) in lookupCache )
+    # Lookups in other CFGs are not memoized
+    self.data.extractOptionFromCFG( '/DIRAC/Configuration/Name', self.data.remoteCFG )
+    self.assertFalse( ( 'option', '/DIRAC/Configuration/Name' ) in lookupCache )
+
+  def test_newVersion( self ):
+    lookupCache = self.data.getLookupCache()
+    mergedCFG = self.data.mergedCFG
+    self.data.extractOptionFromCFG( '/Resources/Sites/CERN/CE' )
+    self.newVersion( "2014-01-02 00:00:00", "ce2.cern.ch" )
+    self.assertFalse( self.data.mergedCFG is mergedCFG )
+    self.assertFalse( self.data.getLookupCache() is lookupCache )
+    self.assertEqual( self.data.getLookupCache(), {} )
+    self.assertEqual( self.data.extractOptionFromCFG( '/Resources/Sites/CERN/CE' ), 'ce2.cern.ch' )
+
+  def test_localChange( self ):
+    self.data.extractOptionFromCFG( '/Resources/Sites/CERN/SE' )
+    self.data.setOptionInCFG( '/Resources/Sites/CERN/SE', 'CERN-disk' )
+    self.assertEqual( self.data.extractOptionFromCFG( '/Resources/Sites/CERN/SE' ), 'CERN-disk' )
+
+  def test_copies( self ):
+    """ The listings returned can be modified without changing the memo
+    """
+    sections = self.data.getSectionsFromCFG( '/Resources/Sites' )
+    sections.append( 'PIC' )
+    options = self.data.getOptionsFromCFG( '/Resources/Sites/CERN' )
+    options.append( 'SE' )
+    self.assertEqual( self.data.getSectionsFromCFG( '/Resources/Sites' ), [ 'CERN' ] )
+    self.assertEqual( self.data.getOptionsFromCFG( '/Resources/Sites/CERN' ), [ 'CE' ] )
+
+  def test_maxSize( self ):
+    """ The memo is started again when it grows beyond its maximum size
+    """
+    self.data._ConfigurationData__maxLookupCacheSize = 2
+    lookupCache = self.data.getLookupCache()
+    self.data.extractOptionFromCFG( '/Resources/Sites/CERN/CE' )
+    self.data.extractOptionFromCFG( '/DIRAC/Configuration/Name' )
+    self.assertTrue( self.data.getLookupCache() is lookupCache )
+    self.data.extractOptionFromCFG( '/DIRAC/Configuration/Version' )
+    self.assertEqual( len( lookupCache ), 3 )
+    self.assertFalse( self.data.getLookupCache() is lookupCache )
+    self.assertEqual( self.data.extractOptionFromCFG( '/Resources/Sites/CERN/CE' ), 'ce1.cern.ch' )
+
+if __name__ == '__main__':
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( DeltaTestCase )
+  gSuite.addTest( gTestLoader.loadTestsFromTestCase( RefresherTestCase ) )
+  gSuite.addTest( gTestLoader.loadTestsFromTestCase( LookupCacheTestCase ) )
+  unittest.TextTestRunner( verbosity = 2 ).run( gSuite )
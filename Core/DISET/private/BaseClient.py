@@ -4,6 +4,10 @@ __RCSID__ = "$Id$"
 import time
 import types
 import thread
+try:
+  from hashlib import md5
+except:
+  from md5 import md5
 import DIRAC
 from DIRAC.Core.DISET.private.Protocols import gProtocolDict
 from DIRAC.FrameworkSystem.Client.Logger import gLogger
@@ -11,8 +15,9 @@ from DIRAC.Core.Utilities import List, Network
 from DIRAC.Core.Utilities.ReturnValues import S_OK, S_ERROR
 from DIRAC.ConfigurationSystem.Client.Config import gConfig
 from DIRAC.ConfigurationSystem.Client.PathFinder import getServiceURL
-from DIRAC.Core.Security import CS
+from DIRAC.Core.Security import CS, Locations
 from DIRAC.Core.DISET.private.TransportPool import getGlobalTransportPool
+from DIRAC.Core.DISET.private.ClientTransportPool import getGlobalClientTransportPool
 from DIRAC.Core.DISET.ThreadConfig import ThreadConfig
 
 class BaseClient:
@@ -32,6 +37,7 @@ class BaseClient:
   KW_PROXY_CHAIN = "proxyChain"
   KW_SKIP_CA_CHECK = "skipCACheck"
   KW_KEEP_ALIVE_LAPSE = "keepAliveLapse"
+  KW_KEEP_CONNECTION = "keepConnection"
 
   __threadConfig = ThreadConfig()
 
@@ -52,7 +58,7 @@ class BaseClient:
     for initFunc in ( self.__discoverSetup, self.__discoverVO, self.__discoverTimeout,
                       self.__discoverURL, self.__discoverCredentialsToUse,
                       self.__checkTransportSanity,
-                      self.__setKeepAliveLapse ):
+                      self.__setKeepAliveLapse, self.__discoverKeepConnection ):
       result = initFunc()
       if not result[ 'OK' ] and self.__initStatus[ 'OK' ]:
         self.__initStatus = result
@@ -163,6 +169,30 @@ class BaseClient:
 
     return S_OK()
 
+  def __discoverKeepConnection( self ):
+    #Can connections be reused for several actions?
+    if self.KW_KEEP_CONNECTION in self.kwargs:
+      self.__keepConnection = bool( self.kwargs[ self.KW_KEEP_CONNECTION ] )
+    else:
+      self.__keepConnection = gConfig.getValue( "/DIRAC/KeepConnections", True )
+    return S_OK()
+
+  def __getConnectionKey( self ):
+    """
+    Key identifying which pooled connections can be used by this client.
+    Connections are only shared if they were authenticated with the same credentials.
+    """
+    if self.useCertificates:
+      credKey = ( "certificates", )
+    elif self.KW_PROXY_STRING in self.kwargs:
+      credKey = ( "proxyString", md5( self.kwargs[ self.KW_PROXY_STRING ] ).hexdigest() )
+    elif self.KW_PROXY_LOCATION in self.kwargs:
+      credKey = ( "proxyLocation", self.kwargs[ self.KW_PROXY_LOCATION ] )
+    else:
+      credKey = ( "proxyLocation", Locations.getProxyLocation() )
+    return ( self.serviceURL, credKey, str( self.__extraCredentials ),
+             self.kwargs.get( self.KW_SKIP_CA_CHECK ), self.setup, self.vo )
+
   def __findServiceURL( self ):
     if not self.__initStatus[ 'OK' ]:
       return self.__initStatus
@@ -233,18 +263,34 @@ and this is thread %s
       #raise Exception( msgTxt )
 
 
-  def _connect( self ):
+  def _connect( self, reuse = False ):
+    """
+    Connect to the service. If reuse is requested an idle pooled connection
+    with the same credentials will be returned if there's one available. In that
+    case the returned structure will have the 'reused' key set.
+    """
     deco = self.__threadConfig.getDecorator()
     if callable( deco ):
-      return deco( self.__innerConnect )()
-    return self.__innerConnect()
+      return deco( self.__innerConnect )( reuse )
+    return self.__innerConnect( reuse )
 
-  def __innerConnect( self ):
+  def __innerConnect( self, reuse = False ):
     self.__discoverExtraCredentials()
     if not self.__initStatus[ 'OK' ]:
       return self.__initStatus
     if self.__enableThreadCheck:
       self.__checkThreadID()
+    connKey = False
+    if reuse and self.__keepConnection:
+      connKey = self.__getConnectionKey()
+      trid = getGlobalClientTransportPool().get( connKey )
+      if trid:
+        transport = getGlobalTransportPool().get( trid )
+        if transport:
+          gLogger.debug( "Reusing connection to: %s" % self.serviceURL )
+          result = S_OK( ( trid, transport ) )
+          result[ 'reused' ] = True
+          return result
     gLogger.debug( "Connecting to: %s" % self.serviceURL )
     try:
       transport = gProtocolDict[ self.__URLTuple[0] ][ 'transport' ]( self.__URLTuple[1:3], **self.kwargs )
@@ -259,23 +305,36 @@ and this is thread %s
           gLogger.info( "Retry connection: ", "%d" % self.__retry )
           time.sleep( self.__retryDelay )
           self.__discoverURL()
-          return self._connect()
+          return self._connect( reuse )
         else:
           return S_ERROR( "Can't connect to %s: %s" % ( self.serviceURL, retVal ) )
     except Exception, e:
       return S_ERROR( "Can't connect to %s: %s" % ( self.serviceURL, e ) )
     trid = getGlobalTransportPool().add( transport )
+    if connKey:
+      getGlobalTransportPool().associateData( trid, 'connectionKey', connKey )
     return S_OK( ( trid, transport ) )
 
-  def _disconnect( self, trid ):
+  def _disconnect( self, trid, keepConnection = False ):
+    """
+    Disconnect from the service. If keepConnection is True and the connection was
+    requested for reuse the transport is returned to the pool instead of being closed
+    """
+    if keepConnection:
+      connKey = getGlobalTransportPool().getAssociatedData( trid, 'connectionKey' )
+      if connKey and getGlobalClientTransportPool().put( connKey, trid ):
+        return
     getGlobalTransportPool().close( trid )
 
-  def _proposeAction( self, transport, action ):
+  def _proposeAction( self, transport, action, keepConnection = False ):
     if not self.__initStatus[ 'OK' ]:
       return self.__initStatus
     stConnectionInfo = ( ( self.__URLTuple[3], self.setup, self.vo ),
                          action,
                          self.__extraCredentials )
+    if keepConnection:
+      #Old servers just ignore the extra field and close the connection after the action
+      stConnectionInfo += ( { 'keepConnection' : True }, )
     retVal = transport.sendData( S_OK( stConnectionInfo ) )
     if not retVal[ 'OK' ]:
       return retVal
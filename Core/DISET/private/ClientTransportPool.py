@@ -0,0 +1,144 @@
+# $HeadURL$
+"""
+Pool of idle client transports that can be reused for further RPCs.
+
+Transports are grouped by connection key (service URL, credentials, setup and VO).
+A transport is only put back in the pool when the server has acknowledged that it
+will keep the connection open after serving the action.
+
+The pool is per process: a forked child must not use the connections of its
+parent, so they are forgotten as soon as the pool is used from another process.
+"""
+__RCSID__ = "$Id$"
+
+import os
+import time
+import threading
+from DIRAC.FrameworkSystem.Client.Logger import gLogger
+from DIRAC.Core.Utilities.ThreadScheduler import gThreadScheduler
+from DIRAC.Core.DISET.private.TransportPool import getGlobalTransportPool
+
+class ClientTransportPool:
+
+  def __init__( self, maxIdleTime = 30, maxIdlePerKey = 4 ):
+    self.__maxIdleTime = maxIdleTime
+    self.__maxIdlePerKey = maxIdlePerKey
+    self.__lock = threading.Lock()
+    self.__pid = os.getpid()
+    self.__idle = {}
+    self.__stats = { 'hits' : 0, 'misses' : 0, 'expired' : 0 }
+    result = gThreadScheduler.addPeriodicTask( max( 5, maxIdleTime / 2 ), self.__purgeExpired )
+    if not result[ 'OK' ]:
+      gLogger.error( "Cannot add task to thread scheduler", result[ 'Message' ] )
+
+  def __checkFork( self ):
+    """
+    Forget the transports of the parent process after a fork. They are not closed,
+    that would end the TLS sessions the parent is still using. Called with the lock held
+    """
+    if self.__pid != os.getpid():
+      self.__pid = os.getpid()
+      self.__idle = {}
+      self.__stats = { 'hits' : 0, 'misses' : 0, 'expired' : 0 }
+
+  def get( self, connKey ):
+    """
+    Get an idle transport for the connection key
+
+    @return : Transport id of a connected transport or False if there's none available
+    """
+    now = time.time()
+    toClose = []
+    found = False
+    self.__lock.acquire()
+    try:
+      self.__checkFork()
+      idleList = self.__idle.get( connKey, [] )
+      while idleList:
+        trid, lastUse = idleList.pop()
+        if now - lastUse > self.__maxIdleTime:
+          toClose.append( trid )
+          continue
+        found = trid
+        break
+      if not idleList and connKey in self.__idle:
+        del( self.__idle[ connKey ] )
+    finally:
+      self.__lock.release()
+
+    trPool = getGlobalTransportPool()
+    if found:
+      transport = trPool.get( found )
+      #Anything readable on an idle connection means the server has closed it
+      if not transport or transport.waitForData( 0 ):
+        toClose.append( found )
+        found = False
+    for trid in toClose:
+      trPool.close( trid )
+    self.__lock.acquire()
+    try:
+      self.__stats[ 'expired' ] += len( toClose )
+      if found:
+        self.__stats[ 'hits' ] += 1
+      else:
+        self.__stats[ 'misses' ] += 1
+    finally:
+      self.__lock.release()
+    return found
+
+  def put( self, connKey, trid ):
+    """
+    Return a transport to the pool after a successful action
+
+    @return : True if the transport has been kept, False if it has to be closed
+    """
+    self.__lock.acquire()
+    try:
+      self.__checkFork()
+      idleList = self.__idle.setdefault( connKey, [] )
+      if len( idleList ) >= self.__maxIdlePerKey:
+        return False
+      idleList.append( ( trid, time.time() ) )
+      return True
+    finally:
+      self.__lock.release()
+
+  def getStats( self ):
+    self.__lock.acquire()
+    try:
+      self.__checkFork()
+      stats = dict( self.__stats )
+      stats[ 'idle' ] = sum( [ len( idleList ) for idleList in self.__idle.values() ] )
+    finally:
+      self.__lock.release()
+    return stats
+
+  def __purgeExpired( self ):
+    limit = time.time() - self.__maxIdleTime
+    toClose = []
+    self.__lock.acquire()
+    try:
+      self.__checkFork()
+      for connKey in list( self.__idle ):
+        idleList = self.__idle[ connKey ]
+        toClose.extend( [ trid for trid, lastUse in idleList if lastUse < limit ] )
+        idleList = [ ( trid, lastUse ) for trid, lastUse in idleList if lastUse >= limit ]
+        if idleList:
+          self.__idle[ connKey ] = idleList
+        else:
+          del( self.__idle[ connKey ] )
+      self.__stats[ 'expired' ] += len( toClose )
+    finally:
+      self.__lock.release()
+    trPool = getGlobalTransportPool()
+    for trid in toClose:
+      trPool.close( trid )
+
+
+gClientTransportPool = None
+
+def getGlobalClientTransportPool():
+  global gClientTransportPool
+  if not gClientTransportPool:
+    gClientTransportPool = ClientTransportPool()
+  return gClientTransportPool
@@ -12,28 +12,35 @@ class InnerRPCClient( BaseClient ):
   
   def executeRPC( self, functionName, args ):
     stub = ( self._getBaseStub(), functionName, args )
-    retVal = self._connect()
+    retVal = self._connect( reuse = True )
     if not retVal[ 'OK' ]:
       retVal[ 'rpcStub' ] = stub
       return retVal
     trid, transport = retVal[ 'Value' ]
+    reused = retVal.get( 'reused', False )
+    keepConnection = False
     try:
-      retVal = self._proposeAction( transport, ( "RPC", functionName ) )
+      retVal = self._proposeAction( transport, ( "RPC", functionName ), keepConnection = True )
       if not retVal[ 'OK' ]:
+        if reused:
+          #The pooled connection was closed by the server before the action was proposed
+          return self.executeRPC( functionName, args )
         if self.__retry < 3:
           self.__retry += 1
           return self.executeRPC( functionName, args )
         else:
           retVal[ 'rpcStub' ] = stub
           return retVal
+      serverKeepsConnection = retVal.get( 'keepConnection', False )
 
       retVal = transport.sendData( S_OK( args ) )
       if not retVal[ 'OK' ]:
         return retVal
       receivedData = transport.receiveData()
       if type( receivedData ) == types.DictType:
+        #Only reuse connections that are known to be in a clean state
+        keepConnection = serverKeepsConnection and receivedData.get( 'OK', False )
         receivedData[ 'rpcStub' ] = stub
       return receivedData
     finally:
-      self._disconnect( trid )
-
+      self._disconnect( trid, keepConnection )
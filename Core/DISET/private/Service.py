@@ -1,6 +1,7 @@
 
 import os
 import time
+import types
 import DIRAC
 import threading
 from DIRAC import gConfig, gLogger, S_OK, S_ERROR, gMonitor
@@ -283,6 +284,7 @@ class Service:
   def _processInThread( self, clientTransport ):
     self.__maxFD = max( self.__maxFD, clientTransport.oSocket.fileno() )
     self._lockManager.lockGlobal()
+    globalLocked = True
     try:
       monReport = self.__startReportToMonitoring()
     except Exception, e:
@@ -300,32 +302,68 @@ class Service:
       trid = self._transportPool.add( clientTransport )
       if not trid:
         return
-      #Receive and check proposal
-      result = self._receiveAndCheckProposal( trid )
-      if not result[ 'OK' ]:
-        self._transportPool.sendAndClose( trid, result )
-        return
-      proposalTuple = result[ 'Value' ]
-      #Instantiate handler
-      result = self._instantiateHandler( trid, proposalTuple )
-      if not result[ 'OK' ]:
-        self._transportPool.sendAndClose( trid, result )
-        return
-      handlerObj = result[ 'Value' ]
-      #Execute the action
-      result = self._processProposal( trid, proposalTuple, handlerObj )
-      #Close the connection if required
-      if result[ 'closeTransport' ] or not result[ 'OK' ]:
+      keptConnection = False
+      #Serve proposals while the client keeps the connection busy
+      while True:
+        #Receive and check proposal
+        result = self._receiveAndCheckProposal( trid, keptConnection )
         if not result[ 'OK' ]:
-          gLogger.error( "Error processing proposal", result[ 'Message' ] )
-        self._transportPool.close( trid )
-      return result
+          if result.get( 'peerClosed' ):
+            self._transportPool.close( trid )
+          else:
+            self._transportPool.sendAndClose( trid, result )
+          return
+        proposalTuple = result[ 'Value' ]
+        #Instantiate handler
+        result = self._instantiateHandler( trid, proposalTuple )
+        if not result[ 'OK' ]:
+          self._transportPool.sendAndClose( trid, result )
+          return
+        handlerObj = result[ 'Value' ]
+        #Execute the action
+        result = self._processProposal( trid, proposalTuple, handlerObj )
+        #Close the connection if required
+        if result[ 'closeTransport' ] or not result[ 'OK' ]:
+          if not result[ 'OK' ]:
+            gLogger.error( "Error processing proposal", result[ 'Message' ] )
+          self._transportPool.close( trid )
+          return result
+        if not result.get( 'keepConnection' ):
+          return result
+        #Wait for the next proposal on the same connection, an idle connection
+        #does not hold a slot of the global lock
+        self._lockManager.unlockGlobal()
+        globalLocked = False
+        if not self.__waitForNextProposal( clientTransport ):
+          self._transportPool.close( trid )
+          return result
+        self._lockManager.lockGlobal()
+        globalLocked = True
+        keptConnection = True
+        self._monitor.addMark( "Queries" )
     finally:
-      self._lockManager.unlockGlobal()
+      if globalLocked:
+        self._lockManager.unlockGlobal()
       if monReport:
         self.__endReportToMonitoring( *monReport )
 
 
+  def __waitForNextProposal( self, clientTransport ):
+    """
+    Wait for the client to send another proposal on a kept connection.
+    Gives up once the connection has been idle for ConnectionIdleTime seconds or
+    as soon as there are connections waiting for a free thread.
+    """
+    endTime = time.time() + self._cfg.getConnectionIdleTime()
+    while True:
+      if self._threadPool.pendingJobs():
+        return False
+      timeLeft = endTime - time.time()
+      if timeLeft <= 0:
+        return False
+      if clientTransport.waitForData( min( 0.5, timeLeft ) ):
+        return True
+
   def _createIdentityString( self, credDict, clientTransport = None ):
     if 'username' in credDict:
       if 'group' in credDict:
@@ -342,12 +380,20 @@ class Service:
       identity += "(%s)" % credDict[ 'DN' ]
     return identity
 
-  def _receiveAndCheckProposal( self, trid ):
+  def _receiveAndCheckProposal( self, trid, keptConnection = False ):
     clientTransport = self._transportPool.get( trid )
     #Get the peer credentials
     credDict = clientTransport.getConnectingCredentials()
     #Receive the action proposal
     retVal = clientTransport.receiveData( 1024 )
+    if not retVal[ 'OK' ] and keptConnection:
+      #Clients close kept connections whenever they want
+      gLogger.debug( "Kept connection closed", "%s %s" % ( self._createIdentityString( credDict,
+                                                                                       clientTransport ),
+                                                           retVal[ 'Message' ] ) )
+      result = S_ERROR( "Connection closed by peer" )
+      result[ 'peerClosed' ] = True
+      return result
     if not retVal[ 'OK' ]:
       gLogger.error( "Invalid action proposal", "%s %s" % ( self._createIdentityString( credDict,
                                                                                         clientTransport ),
@@ -370,6 +416,12 @@ class Service:
     result = self._authorizeProposal( proposalTuple[1], trid, credDict )
     if not result[ 'OK' ]:
       return result
+    #Does the client want to reuse the connection for further RPCs?
+    keepConnection = False
+    if requestedActionType == 'RPC' and len( proposalTuple ) > 3 and \
+       type( proposalTuple[3] ) == types.DictType and self._cfg.getConnectionIdleTime() > 0:
+      keepConnection = bool( proposalTuple[3].get( 'keepConnection', False ) )
+    self._transportPool.associateData( trid, 'keepConnection', keepConnection )
     #Proposal is OK
     return S_OK( proposalTuple )
 
@@ -448,7 +500,11 @@ class Service:
 
   def _processProposal( self, trid, proposalTuple, handlerObj ):
     #Notify the client we're ready to execute the action
-    retVal = self._transportPool.send( trid, S_OK() )
+    readyMsg = S_OK()
+    keepConnection = self._transportPool.getAssociatedData( trid, 'keepConnection' )
+    if keepConnection:
+      readyMsg[ 'keepConnection' ] = True
+    retVal = self._transportPool.send( trid, readyMsg )
     if not retVal[ 'OK' ]:
       return retVal
 
@@ -477,6 +533,9 @@ class Service:
         self._msgBroker.removeTransport( trid )
 
     result[ 'closeTransport' ] = not messageConnection or not result[ 'OK' ]
+    if keepConnection and result[ 'OK' ]:
+      result[ 'closeTransport' ] = False
+      result[ 'keepConnection' ] = True
     return result
 
   def _mbConnect( self, trid, handlerObj = None ):
@@ -80,6 +80,12 @@ class ServiceConfiguration:
     except:
       return 15
 
+  def getConnectionIdleTime( self ):
+    try:
+      return float( self.getOption( "ConnectionIdleTime" ) )
+    except:
+      return 5
+
   def getCloneProcesses( self ):
     try:
       return int( self.getOption( "CloneProcesses" ) )
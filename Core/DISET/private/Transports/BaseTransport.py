@@ -98,6 +98,19 @@ class BaseTransport:
       return True
     return False
 
+  def waitForData( self, timeout = 0 ):
+    """
+    Check if there is data to be received, waiting up to timeout seconds for it.
+    A closed connection is reported as readable so the next receive gets the error.
+    """
+    if self.byteStream or self.receivedMessages:
+      return True
+    try:
+      inList, dummy, dummy = select.select( [ self.oSocket ], [], [], timeout )
+    except Exception:
+      return True
+    return self.oSocket in inList
+
   def _read( self, bufSize = 4096, skipReadyCheck = False ):
     try:
       if skipReadyCheck or self._readReady():
@@ -116,7 +129,8 @@ class BaseTransport:
 
   def sendData( self, uData, prefix = False ):
     self.__updateLastActionTimestamp()
-    sCodedData = DEncode.encode( uData )
+    #Key order doesn't matter on the wire
+    sCodedData = DEncode.encode( uData, sortKeys = False )
     if prefix:
       dataToSend = "%s%s:%s" % ( prefix, len( sCodedData ), sCodedData )
     else:
@@ -175,16 +189,25 @@ class BaseTransport:
       #From here it must be a real message!
       #Process the size and remove the msg length from the bytestream
       pkgSize = int( self.byteStream[ :iSeparatorPosition ] )
-      pkgData = self.byteStream[ iSeparatorPosition + 1: ]
-      readSize = len( pkgData )
+      pkgStart = iSeparatorPosition + 1
+      readSize = len( self.byteStream ) - pkgStart
       if readSize >= pkgSize:
-        #If we already have all the data we need
-        data = pkgData[ :pkgSize ]
-        self.byteStream = pkgData[ pkgSize: ]
+        #If we already have all the data we need decode it directly from the buffer
+        try:
+          data, pkgEnd = DEncode.decode( self.byteStream, pkgStart )
+        except Exception, e:
+          return S_ERROR( "Could not decode received data: %s" % str( e ) )
+        if pkgEnd != pkgStart + pkgSize:
+          return S_ERROR( "Could not decode received data: message length mismatch" )
+        self.byteStream = self.byteStream[ pkgEnd: ]
+        if idleReceive:
+          self.receivedMessages.append( data )
+          return S_OK()
+        return data
       else:
         #If we still need to read stuff
         pkgMem = cStringIO.StringIO()
-        pkgMem.write( pkgData )
+        pkgMem.write( self.byteStream[ pkgStart: ] )
         #Receive while there's still data to be received
         while readSize < pkgSize:
           retVal = self._read( pkgSize - readSize, skipReadyCheck = True )
@@ -139,6 +139,15 @@ class SSLTransport( BaseTransport ):
     finally:
       self.__unlock()
 
+  def waitForData( self, timeout = 0 ):
+    #Decrypted data may be waiting in the SSL buffers without the socket being readable
+    try:
+      if self.oSocket.pending():
+        return True
+    except Exception:
+      pass
+    return BaseTransport.waitForData( self, timeout )
+
   def isLocked( self ):
     return self.__locked
 
@@ -0,0 +1,127 @@
+########################################################################
+# $HeadURL $
+# File: ClientTransportPoolTests.py
+########################################################################
+
+""" :mod: ClientTransportPoolTests
+    =======================
+
+    .. module: ClientTransportPoolTests
+    :synopsis: test cases for ClientTransportPool
+
+    test cases for the pool of idle client transports
+"""
+
+__RCSID__ = "$Id $"
+
+## imports
+import os
+import time
+import unittest
+## SUT
+from DIRAC.Core.DISET.private import ClientTransportPool as ClientTransportPoolModule
+from DIRAC.Core.DISET.private.ClientTransportPool import ClientTransportPool
+
+class FakeTransport( object ):
+  """ transport whose server may have closed the connection """
+
+  def __init__( self ):
+    self.closedByPeer = False
+
+  def waitForData( self, timeout ):
+    return self.closedByPeer
+
+class FakeTransportPool( object ):
+  """ global transport pool holding fake transports """
+
+  def __init__( self ):
+    self.transports = {}
+    self.closed = []
+
+  def add( self, trid ):
+    self.transports[ trid ] = FakeTransport()
+    return self.transports[ trid ]
+
+  def get( self, trid ):
+    return self.transports.get( trid )
+
+  def close( self, trid ):
+    self.closed.append( trid )
+    self.transports.pop( trid, None )
+
+########################################################################
+class ClientTransportPoolTests( unittest.TestCase ):
+  """
+  .. class:: ClientTransportPoolTests
+
+  """
+
+  def setUp( self ):
+    """ test setup """
+    self.trPool = FakeTransportPool()
+    self.getGlobalTransportPool = ClientTransportPoolModule.getGlobalTransportPool
+    ClientTransportPoolModule.getGlobalTransportPool = lambda: self.trPool
+    self.pool = ClientTransportPool( maxIdleTime = 30, maxIdlePerKey = 2 )
+
+  def tearDown( self ):
+    """ test tear down """
+    ClientTransportPoolModule.getGlobalTransportPool = self.getGlobalTransportPool
+
+  def test01Reuse( self ):
+    """ idle transports are given back for their key only """
+    self.trPool.add( "tr1" )
+    self.assertEqual( self.pool.get( "key" ), False )
+    self.assertTrue( self.pool.put( "key", "tr1" ) )
+    self.assertEqual( self.pool.get( "other" ), False )
+    self.assertEqual( self.pool.get( "key" ), "tr1" )
+    self.assertEqual( self.pool.get( "key" ), False )
+    stats = self.pool.getStats()
+    self.assertEqual( ( stats[ 'hits' ], stats[ 'misses' ], stats[ 'idle' ] ), ( 1, 3, 0 ) )
+
+  def test02MaxIdle( self ):
+    """ at most maxIdlePerKey transports are kept """
+    for trid in ( "tr1", "tr2", "tr3" ):
+      self.trPool.add( trid )
+    self.assertTrue( self.pool.put( "key", "tr1" ) )
+    self.assertTrue( self.pool.put( "key", "tr2" ) )
+    self.assertFalse( self.pool.put( "key", "tr3" ) )
+
+  def test03ClosedByPeer( self ):
+    """ transports closed by the server are dropped """
+    self.trPool.add( "tr1" ).closedByPeer = True
+    self.pool.put( "key", "tr1" )
+    self.assertEqual( self.pool.get( "key" ), False )
+    self.assertEqual( self.trPool.closed, [ "tr1" ] )
+    self.assertEqual( self.pool.getStats()[ 'expired' ], 1 )
+
+  def test04Expired( self ):
+    """ transports idle for too long are dropped """
+    pool = ClientTransportPool( maxIdleTime = 0.1 )
+    self.trPool.add( "tr1" )
+    pool.put( "key", "tr1" )
+    time.sleep( 0.2 )
+    self.assertEqual( pool.get( "key" ), False )
+    self.assertEqual( self.trPool.closed, [ "tr1" ] )
+
+  def test05Fork( self ):
+    """ a forked child does not reuse nor close the transports of its parent """
+    self.trPool.add( "tr1" )
+    self.pool.put( "key", "tr1" )
+    pid = os.fork()
+    if not pid:
+      exitCode = 1
+      try:
+        if self.pool.get( "key" ) is False and not self.trPool.closed and self.pool.getStats()[ 'idle' ] == 0:
+          exitCode = 0
+      finally:
+        os._exit( exitCode )
+    _pid, status = os.waitpid( pid, 0 )
+    self.assertEqual( status, 0 )
+    self.assertEqual( self.pool.get( "key" ), "tr1" )
+
+# # test execution
+if __name__ == "__main__":
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( ClientTransportPoolTests )
+  gSuite = unittest.TestSuite( [ gSuite ] )
+  unittest.TextTestRunner( verbosity = 3 ).run( gSuite )
@@ -11,6 +11,12 @@ Encoding and decoding for dirac, Ids:
  l -> list
  t -> tuple
  d -> dictionary
+
+The most common types (strings, ints and containers) are encoded and decoded inline
+in the container functions to avoid one function call per element. Decoding can start
+at any offset of the data so receivers don't need to slice the message out of their
+buffers. Dictionary keys are sorted by default so the encoding of an object is
+deterministic; pass sortKeys = False to encode() when that is not needed.
 """
 __RCSID__ = "$Id$"
 
@@ -169,30 +175,94 @@ def decodeNone( data, i ):
 g_dEncodeFunctions[ types.NoneType ] = encodeNone
 g_dDecodeFunctions[ 'n' ] = decodeNone
 
+_stringType = types.StringType
+_intType = types.IntType
+_dictType = types.DictType
+_listType = types.ListType
+_tupleType = types.TupleType
+
+#Container encoding with inlined common types
+def _encodeSequence( lValue, eList, sortKeys, seqChar ):
+  append = eList.append
+  extend = eList.extend
+  append( seqChar )
+  for uObject in lValue:
+    oType = type( uObject )
+    if oType is _stringType:
+      extend( ( "s", str( len( uObject ) ), ":", uObject ) )
+    elif oType is _intType:
+      extend( ( "i", str( uObject ), "e" ) )
+    elif oType is _dictType:
+      _encodeDict( uObject, eList, sortKeys )
+    elif oType is _listType:
+      _encodeSequence( uObject, eList, sortKeys, "l" )
+    elif oType is _tupleType:
+      _encodeSequence( uObject, eList, sortKeys, "t" )
+    else:
+      g_dEncodeFunctions[ oType ]( uObject, eList )
+  append( "e" )
+
+def _encodeDict( dValue, eList, sortKeys ):
+  append = eList.append
+  extend = eList.extend
+  append( "d" )
+  if sortKeys:
+    keys = sorted( dValue )
+  else:
+    keys = dValue
+  for key in keys:
+    kType = type( key )
+    if kType is _stringType:
+      extend( ( "s", str( len( key ) ), ":", key ) )
+    elif kType is _intType:
+      extend( ( "i", str( key ), "e" ) )
+    else:
+      g_dEncodeFunctions[ kType ]( key, eList )
+    uObject = dValue[ key ]
+    oType = type( uObject )
+    if oType is _stringType:
+      extend( ( "s", str( len( uObject ) ), ":", uObject ) )
+    elif oType is _intType:
+      extend( ( "i", str( uObject ), "e" ) )
+    elif oType is _dictType:
+      _encodeDict( uObject, eList, sortKeys )
+    elif oType is _listType:
+      _encodeSequence( uObject, eList, sortKeys, "l" )
+    elif oType is _tupleType:
+      _encodeSequence( uObject, eList, sortKeys, "t" )
+    else:
+      g_dEncodeFunctions[ oType ]( uObject, eList )
+  append( "e" )
+
 #Encode and decode a list
 def encodeList( lValue, eList ):
-  eList.append( "l" )
-  for uObject in lValue:
-    g_dEncodeFunctions[ type( uObject ) ]( uObject, eList )
-  eList.append( "e" )
+  _encodeSequence( lValue, eList, True, "l" )
 
 def decodeList( data, i ):
   oL = []
   i += 1
-  while data[ i ] != "e":
-    ob, i = g_dDecodeFunctions[ data[ i ] ]( data, i )
-    oL.append( ob )
-  return( oL, i + 1 )
+  while True:
+    dataType = data[ i ]
+    if dataType == "s":
+      colon = data.index( ":", i + 1 )
+      i = colon + 1 + int( data[ i + 1 : colon ] )
+      oL.append( data[ colon + 1 : i ] )
+    elif dataType == "i":
+      end = data.index( "e", i + 1 )
+      oL.append( int( data[ i + 1 : end ] ) )
+      i = end + 1
+    elif dataType == "e":
+      return ( oL, i + 1 )
+    else:
+      ob, i = g_dDecodeFunctions[ dataType ]( data, i )
+      oL.append( ob )
 
 g_dEncodeFunctions[ types.ListType ] = encodeList
 g_dDecodeFunctions[ "l" ] = decodeList
 
 #Encode and decode a tuple
 def encodeTuple( lValue, eList ):
-  eList.append( "t" )
-  for uObject in lValue:
-    g_dEncodeFunctions[ type( uObject ) ]( uObject, eList )
-  eList.append( "e" )
+  _encodeSequence( lValue, eList, True, "t" )
 
 def decodeTuple( data, i ):
   oL, i = decodeList( data, i )
@@ -203,42 +273,68 @@ g_dDecodeFunctions[ "t" ] = decodeTuple
 
 #Encode and decode a dictionary
 def encodeDict( dValue, eList ):
-  eList.append( "d" )
-  for key in sorted( dValue ):
-    g_dEncodeFunctions[ type( key ) ]( key, eList )
-    g_dEncodeFunctions[ type( dValue[key] ) ]( dValue[key], eList )
-  eList.append( "e" )
+  _encodeDict( dValue, eList, True )
 
 def decodeDict( data, i ):
   oD = {}
   i += 1
-  while data[ i ] != "e":
-    k, i = g_dDecodeFunctions[ data[ i ] ]( data, i )
-    oD[ k ], i = g_dDecodeFunctions[ data[ i ] ]( data, i )
-  return ( oD, i + 1 )
+  while True:
+    dataType = data[ i ]
+    #Keys are nearly always strings or ints
+    if dataType == "s":
+      colon = data.index( ":", i + 1 )
+      i = colon + 1 + int( data[ i + 1 : colon ] )
+      k = data[ colon + 1 : i ]
+    elif dataType == "i":
+      end = data.index( "e", i + 1 )
+      k = int( data[ i + 1 : end ] )
+      i = end + 1
+    elif dataType == "e":
+      return ( oD, i + 1 )
+    else:
+      k, i = g_dDecodeFunctions[ dataType ]( data, i )
+    dataType = data[ i ]
+    if dataType == "s":
+      colon = data.index( ":", i + 1 )
+      i = colon + 1 + int( data[ i + 1 : colon ] )
+      oD[ k ] = data[ colon + 1 : i ]
+    elif dataType == "i":
+      end = data.index( "e", i + 1 )
+      oD[ k ] = int( data[ i + 1 : end ] )
+      i = end + 1
+    else:
+      oD[ k ], i = g_dDecodeFunctions[ dataType ]( data, i )
 
 g_dEncodeFunctions[ types.DictType ] = encodeDict
 g_dDecodeFunctions[ "d" ] = decodeDict
 
 
 #Encode function
-def encode( uObject ):
-  try:
-    eList = []
-    #print "ENCODE FUNCTION : %s" % g_dEncodeFunctions[ type( uObject ) ]
-    g_dEncodeFunctions[ type( uObject ) ]( uObject, eList )
-    return "".join( eList )
-  except Exception:
-    raise
-
-def decode( data ):
+def encode( uObject, sortKeys = True ):
+  """
+  Encode an object. If sortKeys is False dictionary keys are encoded in
+  whatever order they come, which is faster but not deterministic.
+  """
+  eList = []
+  oType = type( uObject )
+  if oType is _dictType:
+    _encodeDict( uObject, eList, sortKeys )
+  elif oType is _listType:
+    _encodeSequence( uObject, eList, sortKeys, "l" )
+  elif oType is _tupleType:
+    _encodeSequence( uObject, eList, sortKeys, "t" )
+  else:
+    g_dEncodeFunctions[ oType ]( uObject, eList )
+  return "".join( eList )
+
+def decode( data, start = 0 ):
+  """
+  Decode the object encoded in data starting at position start.
+  Returns the object and the position right after its encoded form.
+  """
   if not data:
     return data
-  try:
-    #print "DECODE FUNCTION : %s" % g_dDecodeFunctions[ sStream [ iIndex ] ]
-    return g_dDecodeFunctions[ data[ 0 ] ]( data, 0 )
-  except Exception:
-    raise
+  return g_dDecodeFunctions[ data[ start ] ]( data, start )
 
 
 if __name__ == "__main__":
@@ -168,6 +168,7 @@ import warnings
 with warnings.catch_warnings():
   warnings.simplefilter( 'ignore', DeprecationWarning )
   import MySQLdb
+  import MySQLdb.cursors
   
 # This is for proper initialization of embeded server, it should only be called once
 MySQLdb.server_init( ['--defaults-file=/opt/dirac/etc/my.cnf', '--datadir=/opt/mysql/db'], ['mysqld'] )
@@ -362,6 +363,44 @@ class MySQL:
         if now - data.last > self.__graceTime:
           self.__pop( thid )
 
+    def isInTransaction( self ):
+      connData = self.__assigned.get( self.__thid )
+      return bool( connData and connData.intrans )
+
+    def borrow( self, dbName ):
+      """ Get a connection out of the per thread assignment, for a streaming query
+          that keeps it busy while the thread runs other queries.
+          It has to be returned with giveBack
+      """
+      self.clean()
+      try:
+        try:
+          connData = self.__spares.pop()
+        except IndexError:
+          connData = self.__connData( self.__newConn(), "", time.time(), False )
+        if not self.__ping( connData.conn ):
+          connData.conn.close()
+          connData = self.__connData( self.__newConn(), "", time.time(), False )
+        if connData.dbName != dbName:
+          connData.conn.select_db( dbName )
+          connData.dbName = dbName
+      except MySQLdb.MySQLError, excp:
+        return S_ERROR( "Could not connect: %s" % excp )
+      connData.last = time.time()
+      return S_OK( connData )
+
+    def giveBack( self, connData, broken = False ):
+      """ Return a borrowed connection. Connections with pending results are closed
+      """
+      if not broken and len( self.__spares ) < self.__maxSpares:
+        connData.last = time.time()
+        self.__spares.append( connData )
+      else:
+        try:
+          connData.conn.close()
+        except Exception:
+          pass
+
     def transactionStart( self, dbName ):
       print "TRANS START"
       result = self.__getWithRetry( dbName )
@@ -604,8 +643,8 @@ class MySQL:
     """
     if debug:
       self.logger.debug( '_query:', cmd )
-    else:
-      if self.logger._minLevel == self.logger._logLevels.getLevelValue( 'DEBUG' ):
+    elif self.logger.shown( 'VERBOSE' ):
+      if self.logger.shown( 'DEBUG' ):
         self.logger.verbose( '_query:', cmd )
       else:
         self.logger.verbose( '_query:', cmd[:min( len( cmd ) , 512 )] )
@@ -655,6 +694,73 @@ class MySQL:
 
     return retDict
 
+  def _queryIter( self, cmd, batchSize = 1000, conn = None ):
+    """
+    execute MySQL query command with a server side cursor
+    generator yielding S_OK structures with tuples of at most batchSize rows,
+    the rows are read from the server as the batches are consumed, not all in memory
+    yield a S_ERROR upon error and stop
+    Other queries can be done while iterating, the result is read on a separate connection.
+    Inside a transaction, or if a connection is given, that connection is used and the
+    result is fully fetched first, to keep the consistent snapshot
+    """
+    self.logger.verbose( '_queryIter:', cmd[:min( len( cmd ) , 512 )] )
+
+    if not self.__initialized:
+      error = 'DB not properly initialized'
+      gLogger.error( error )
+      yield S_ERROR( error )
+      return
+
+    if conn or self.__connectionPool.isInTransaction():
+      result = self._query( cmd, conn )
+      if not result[ 'OK' ]:
+        yield result
+        return
+      rows = result[ 'Value' ]
+      for i in xrange( 0, len( rows ), batchSize ):
+        yield S_OK( rows[i:i + batchSize] )
+      return
+
+    result = self.__connectionPool.borrow( self.__dbName )
+    if not result[ 'OK' ]:
+      yield result
+      return
+    connData = result[ 'Value' ]
+
+    # The connection can only be reused once the whole result has been read
+    exhausted = False
+    cursor = None
+    try:
+      try:
+        cursor = connData.conn.cursor( MySQLdb.cursors.SSCursor )
+        cursor.execute( cmd )
+      except Exception, x:
+        self.log.warn( '_queryIter:', cmd )
+        yield self._except( '_queryIter', x, 'Execution failed.' )
+        return
+      nRows = 0
+      while True:
+        try:
+          rows = cursor.fetchmany( batchSize )
+        except Exception, x:
+          self.log.warn( '_queryIter:', cmd )
+          yield self._except( '_queryIter', x, 'Fetching failed.' )
+          return
+        if not rows:
+          exhausted = True
+          break
+        nRows += len( rows )
+        yield S_OK( tuple( rows ) )
+      self.logger.verbose( '_queryIter: Total %d records returned' % nRows )
+    finally:
+      try:
+        if cursor:
+          cursor.close()
+      except Exception:
+        exhausted = False
+      self.__connectionPool.giveBack( connData, broken = not exhausted )
+
 
   def _update( self, cmd, conn = None, debug = False ):
     """ execute MySQL update command
@@ -663,8 +769,8 @@ class MySQL:
     """
     if debug:
       self.logger.debug( '_update:', cmd )
-    else:
-      if self.logger._minLevel == self.logger._logLevels.getLevelValue( 'DEBUG' ):
+    elif self.logger.shown( 'VERBOSE' ):
+      if self.logger.shown( 'DEBUG' ):
         self.logger.verbose( '_update:', cmd )
       else:
         self.logger.verbose( '_update:', cmd[:min( len( cmd ) , 512 )] )
@@ -1331,6 +1437,33 @@ class MySQL:
       if limit is not False, the given limit is set
       inValues are properly escaped using the _escape_string method, they can be single values or lists of values.
     """
+    result = self.__getFieldsCmd( tableName, outFields, condDict, limit, older, newer,
+                                  timeStamp, orderAttribute )
+    if not result['OK']:
+      return result
+    return self._query( result['Value'], conn, debug = True )
+
+  def getFieldsIter( self, tableName, outFields = None,
+                     condDict = None,
+                     limit = False,
+                     older = None, newer = None,
+                     timeStamp = None, orderAttribute = None,
+                     batchSize = 1000 ):
+    """
+      Same as getFields, but streaming the records with _queryIter in batches of
+      at most batchSize records
+    """
+    result = self.__getFieldsCmd( tableName, outFields, condDict, limit, older, newer,
+                                  timeStamp, orderAttribute )
+    if not result['OK']:
+      return iter( [ result ] )
+    return self._queryIter( result['Value'], batchSize )
+
+  def __getFieldsCmd( self, tableName, outFields, condDict, limit,
+                      older, newer, timeStamp, orderAttribute ):
+    """
+      Build the SELECT command of getFields
+    """
     table = _quotedList( [tableName] )
     if not table:
       error = 'Invalid tableName argument'
@@ -1364,8 +1497,7 @@ class MySQL:
     except Exception, x:
       return S_ERROR( x )
 
-    return self._query( 'SELECT %s FROM %s %s' %
-                        ( quotedOutFields, table, condition ), conn, debug = True )
+    return S_OK( 'SELECT %s FROM %s %s' % ( quotedOutFields, table, condition ) )
 
 #############################################################################
   def deleteEntries( self, tableName,
@@ -1525,6 +1657,104 @@ class MySQL:
     return self._update( 'INSERT INTO %s %s VALUES %s' %
                          ( table, inFieldString, inValueString ), conn, debug = True )
 
+  def bulkInsert( self, tableName, inFields, rows, onDuplicate = None, chunkSize = 1000, conn = None ):
+    """
+      Insert many rows in "tableName", each row being a list of values of the fields
+      "inFields". The values are passed as parameters of executemany, which sends
+      multi-row INSERT statements of at most chunkSize rows, all within one transaction.
+
+      onDuplicate can be:
+        - None: rows with an existing key make the insertion fail
+        - 'Ignore': rows with an existing key are skipped ( INSERT IGNORE )
+        - a list of fields: they are updated with the new values for the rows with
+          an existing key ( ON DUPLICATE KEY UPDATE )
+        - a dict of field : SQL expression to update the rows with an existing key
+          with, e.g. { 'count' : '`count`+VALUES(`count`)' }
+
+      return S_OK with the number of affected rows
+    """
+    table = _quotedList( [tableName] )
+    if not table:
+      error = 'Invalid tableName argument'
+      self.log.warn( 'bulkInsert:', error )
+      return S_ERROR( error )
+
+    inFieldString = _quotedList( inFields )
+    if not inFieldString:
+      error = 'Invalid inFields arguments'
+      self.log.warn( 'bulkInsert:', error )
+      return S_ERROR( error )
+
+    rows = [ tuple( row ) for row in rows ]
+    if not rows:
+      return S_OK( 0 )
+    for row in rows:
+      if len( row ) != len( inFields ):
+        error = 'Mismatch between inFields and row values'
+        self.log.warn( 'bulkInsert:', '%s: %s' % ( error, str( row ) ) )
+        return S_ERROR( error )
+
+    insert = 'INSERT'
+    suffix = ''
+    if type( onDuplicate ) in StringTypes:
+      if onDuplicate.lower() != 'ignore':
+        return S_ERROR( 'Invalid onDuplicate argument: %s' % onDuplicate )
+      insert = 'INSERT IGNORE'
+    elif onDuplicate:
+      if type( onDuplicate ) == DictType:
+        updateList = [ ( _quotedList( [ field ] ), onDuplicate[ field ] ) for field in onDuplicate ]
+      else:
+        updateList = [ ( _quotedList( [ field ] ), 'VALUES(%s)' % _quotedList( [ field ] ) ) for field in onDuplicate ]
+      if None in [ field for field, _expr in updateList ]:
+        return S_ERROR( 'Invalid onDuplicate arguments' )
+      # executemany only formats the VALUES part, the expressions are sent as they are
+      suffix = ' ON DUPLICATE KEY UPDATE %s' % ', '.join( [ '%s=%s' % ( field, expr ) for field, expr in updateList ] )
+
+    cmd = '%s INTO %s ( %s ) VALUES ( %s )%s' % ( insert, table, inFieldString,
+                                                  ', '.join( [ '%s' ] * len( inFields ) ), suffix )
+    self.log.verbose( 'bulkInsert:', 'inserting %s rows into table %s' % ( len( rows ), table ) )
+
+    if gDebugFile:
+      start = time.time()
+
+    retDict = self.__getConnection( conn = conn )
+    if not retDict['OK']:
+      return retDict
+    connection = retDict['Value']
+
+    # Inside a transaction of the caller the rows are just part of it
+    ownTransaction = not self.__connectionPool.isInTransaction()
+    cursor = None
+    try:
+      cursor = connection.cursor()
+      if ownTransaction:
+        cursor.execute( 'START TRANSACTION' )
+      affected = 0
+      for i in xrange( 0, len( rows ), chunkSize ):
+        affected += cursor.executemany( cmd, rows[i:i + chunkSize] ) or 0
+      if ownTransaction:
+        connection.commit()
+      retDict = S_OK( affected )
+    except Exception, x:
+      self.log.warn( 'bulkInsert: %s: %s' % ( cmd, str( x ) ) )
+      retDict = self._except( 'bulkInsert', x, 'Execution failed.' )
+      if ownTransaction:
+        try:
+          connection.rollback()
+        except Exception:
+          pass
+
+    try:
+      cursor.close()
+    except Exception:
+      pass
+
+    if gDebugFile:
+      print >> gDebugFile, time.time() - start, cmd, len( rows )
+      gDebugFile.flush()
+
+    return retDict
+
 
   def executeStoredProcedure( self, packageName, parameters, outputIds, output = True, array = None, conn = False ):
     conDict = self._getConnection()
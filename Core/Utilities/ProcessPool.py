@@ -66,6 +66,15 @@ and process their result call::
 
 This function will block until all requests are finished and their result values have been processed.
 
+Instead of polling :getFreeSlots: and sleeping, a producer can block until a worker is free::
+
+  while pool.waitForFreeSlots( timeout ):
+    pool.createAndQueueTask( ... )
+
+Workers report every finished task through the results queue, so the waiting producer is
+woken up as soon as a task is done, and the results are processed meanwhile if the pool is
+not in daemon mode.
+
 It is also possible to set the ProcessPool in daemon mode, in which all results are automatically
 processed as soon they are available, just after finalization of task execution. To enable this mode one
 has to call::
@@ -148,16 +157,18 @@ class WorkingProcess( multiprocessing.Process ):
   
   """
 
-  def __init__( self, pendingQueue, resultsQueue, stopEvent, keepRunning ):
+  def __init__( self, pendingQueue, resultsQueue, stopEvent, keepRunning, queuedTasks = None ):
     """ c'tor
 
     :param self: self reference
     :param : pendingQueue: queue storing ProcessTask before exection
     :type multiprocessing.Queue pendingQueue
-    :param resultsQueue: queue storing callbacks and exceptionCallbacks
+    :param resultsQueue: queue storing the finished tasks
     :type multiprocessing.Queue 
     :param  stopEvent: event to stop processing
     :type multiprocessing.Event
+    :param queuedTasks: counter of the tasks in pendingQueue, decreased when a task is taken
+    :type multiprocessing.Value
     """
     multiprocessing.Process.__init__( self )
     ## daemonize
@@ -174,6 +185,8 @@ class WorkingProcess( multiprocessing.Process ):
     self.__stopEvent = stopEvent
     ## keep process running until stop event
     self.__keepRunning = keepRunning
+    ## tasks waiting in pending queue
+    self.__queuedTasks = queuedTasks
     ## placeholder for watchdog thread
     self.__watchdogThread = None
     ## placeholder for process thread
@@ -276,6 +289,13 @@ class WorkingProcess( multiprocessing.Process ):
 
       ## toggle __working flag
       self.__working.value = 1
+      ## the task is not pending anymore, it is already counted as working
+      if self.__queuedTasks is not None:
+        self.__queuedTasks.acquire()
+        try:
+          self.__queuedTasks.value -= 1
+        finally:
+          self.__queuedTasks.release()
       ## save task
       self.task = task
       ## reset idle loop counter
@@ -304,9 +324,10 @@ class WorkingProcess( multiprocessing.Process ):
         self.task.setResult( S_ERROR("Task produced no results") )  
         noResults = True
       
-      ## check results and callbacks presence, put task to results queue
-      if self.task.hasCallback() or self.task.hasPoolCallback():
-        self.__resultsQueue.put( task )
+      ## toggle __working flag, the slot is free before the pool hears about it
+      self.__working.value = 0
+      ## put task to results queue, also without callbacks to wake up the pool
+      self.__resultsQueue.put( task )
       if timeout or noResults:  
         # The task execution timed out, stop the process to prevent it from running 
         # in the background
@@ -316,8 +337,6 @@ class WorkingProcess( multiprocessing.Process ):
       ## increase task counter
       taskCounter += 1
       self.__taskCounter = taskCounter 
-      ## toggle __working flag
-      self.__working.value = 0
    
 class ProcessTask( object ):
   """ 
@@ -382,6 +401,7 @@ class ProcessTask( object ):
     self.__taskException = None
     self.__taskResult = None
     self.__usePoolCallbacks = usePoolCallbacks
+    self.__processTime = 0.0
 
   def taskResults( self ):
     """ 
@@ -456,6 +476,14 @@ class ProcessTask( object ):
     """
     return bool( self.__timeOut != 0 )
 
+  def getProcessTime( self ):
+    """ 
+    Time spent executing the task in seconds, 0 if it did not finish
+
+    :param self: self reference
+    """
+    return self.__processTime
+
   def getTaskID( self ):
     """ 
     TaskID getter
@@ -512,6 +540,7 @@ class ProcessTask( object ):
     :param self: self reference
     """ 
     self.__done = True
+    startTime = time.time()
     try:
       ## it's a function?
       if type( self.__taskFunction ) is FunctionType:
@@ -534,7 +563,8 @@ class ProcessTask( object ):
         retDict['Value'] = str( x )
         retDict['Exc_info'] = sys.exc_info()[1]
         self.__taskException = retDict
-        
+    self.__processTime = time.time() - startTime
+
 class ProcessPool( object ):
   """
   .. class:: ProcessPool
@@ -566,8 +596,15 @@ class ProcessPool( object ):
   active and idle workers and spawning new ones when required. The task is then read and processed on worker 
   side. If results are ready and callback functions are defined, task is put back to the resultsQueue and it is 
   ready to be picked up by ProcessPool again. To perform this last step one has to call :ProcessPool.processResults:,
-  or alternatively ask for daemon mode processing, when this function is called again and again in 
-  separate background thread.
+  or alternatively ask for daemon mode processing, when the results are processed by a background thread as
+  soon as they arrive. :ProcessPool.waitForFreeSlots: blocks until a worker is free and returns as soon as a
+  task has finished.
+
+  Pool size
+
+  Besides the tasks waiting in :pendingQueue:, the pool sizes itself on the observed load: it keeps
+  running as many workers as tasks are expected to be in execution at the same time, that is the mean
+  task processing time divided by the mean time between two queued tasks, within the min and max limits.
 
   Finalisation
 
@@ -619,8 +656,20 @@ class ProcessPool( object ):
     self.__stopEvent = multiprocessing.Event()
     ## keep processes running flag
     self.__keepRunning = keepProcessesRunning
+    ## tasks in pending queue, not yet taken by a worker
+    self.__queuedTasks = multiprocessing.Value( 'i', 0 )
     ## lock 
     self.__prListLock = threading.Lock()
+    ## condition notified each time a finished task is processed
+    self.__resultsCondition = threading.Condition()
+    ## number of finished tasks processed so far
+    self.__processedTasks = 0
+    ## number of tasks put in the pending queue so far
+    self.__acceptedTasks = 0
+    ## mean task processing time and mean time between queued tasks, in seconds
+    self.__meanTaskTime = 0.0
+    self.__meanQueueInterval = 0.0
+    self.__lastQueueTime = 0.0
     
     ## workers dict
     self.__workersDict = {}
@@ -720,7 +769,70 @@ class ProcessPool( object ):
 
     :param self: self reference
     """
-    return max( 0, self.__maxSize - self.getNumWorkingProcesses() )
+    return max( 0, self.__maxSize - self.getNumWorkingProcesses() - self.__queuedTasks.value )
+
+  def waitForFreeSlots( self, timeout = None ):
+    """ Block until there is a free slot, returning as soon as a finished task frees one.
+    If the pool is not in daemon mode the results are processed while waiting.
+
+    :param self: self reference
+    :param float timeout: maximum time to wait in seconds, no limit if None
+    :return: number of free slots, 0 if there is none after timeout
+    """
+    endTime = None
+    if timeout is not None:
+      endTime = time.time() + timeout
+    firstCheck = True
+    while True:
+      if not firstCheck:
+        ## workers that died in the middle of a task did not report it
+        self.__cleanDeadProcesses()
+      firstCheck = False
+      processedTasks = self.__processedTasks
+      freeSlots = self.getFreeSlots()
+      if freeSlots:
+        return freeSlots
+      waitTime = 1.0
+      if endTime is not None:
+        waitTime = min( waitTime, endTime - time.time() )
+        if waitTime <= 0:
+          return 0
+      if self.__daemonProcess:
+        self.__resultsCondition.acquire()
+        try:
+          if processedTasks == self.__processedTasks:
+            self.__resultsCondition.wait( waitTime )
+        finally:
+          self.__resultsCondition.release()
+      else:
+        try:
+          task = self.__resultsQueue.get( block = True, timeout = waitTime )
+        except Queue.Empty:
+          continue
+        self.__processResult( task )
+
+  def getStats( self ):
+    """ Workers and tasks statistics
+
+    :param self: self reference
+    """
+    return { 'Workers' : len( self.__workersDict ),
+             'WorkingProcesses' : self.getNumWorkingProcesses(),
+             'QueuedTasks' : self.__queuedTasks.value,
+             'ProcessedTasks' : self.__processedTasks,
+             'MeanTaskTime' : self.__meanTaskTime,
+             'MeanQueueInterval' : self.__meanQueueInterval,
+             'TargetSize' : self.__getTargetSize() }
+
+  def __getTargetSize( self ):
+    """ Number of workers needed for the observed load, within the pool limits
+
+    :param self: self reference
+    """
+    if not self.__meanTaskTime or not self.__meanQueueInterval:
+      return self.__minSize
+    expectedTasks = int( self.__meanTaskTime / max( self.__meanQueueInterval, 0.001 ) ) + 1
+    return max( self.__minSize, min( self.__maxSize, expectedTasks ) )
 
   def __spawnWorkingProcess( self ):
     """ 
@@ -730,7 +842,8 @@ class ProcessPool( object ):
     """
     self.__prListLock.acquire()
     try:
-      worker = WorkingProcess( self.__pendingQueue, self.__resultsQueue, self.__stopEvent, self.__keepRunning )
+      worker = WorkingProcess( self.__pendingQueue, self.__resultsQueue, self.__stopEvent, self.__keepRunning,
+                               self.__queuedTasks )
       while worker.pid == None:
         time.sleep(0.1)
       self.__workersDict[ worker.pid ] = worker
@@ -762,7 +875,8 @@ class ProcessPool( object ):
     if self.__draining or self.__stopEvent.is_set():
       return
 
-    while len( self.__workersDict ) < self.__minSize:
+    targetSize = self.__getTargetSize()
+    while len( self.__workersDict ) < targetSize:
       if self.__draining or self.__stopEvent.is_set():  
         return
       self.__spawnWorkingProcess()
@@ -791,18 +905,35 @@ class ProcessPool( object ):
 
     self.__prListLock.acquire()
     try:
-      self.__pendingQueue.put( task, block = blocking )
-    except Queue.Full:
-      self.__prListLock.release()
-      return S_ERROR( "Queue is full" )
+      ## counted before the put, a worker could take it at once
+      self.__queuedTasks.acquire()
+      self.__queuedTasks.value += 1
+      self.__queuedTasks.release()
+      try:
+        self.__pendingQueue.put( task, block = blocking )
+      except Queue.Full:
+        self.__queuedTasks.acquire()
+        self.__queuedTasks.value -= 1
+        self.__queuedTasks.release()
+        return S_ERROR( "Queue is full" )
+      self.__acceptedTasks += 1
     finally:
       self.__prListLock.release()
 
+    now = time.time()
+    if self.__lastQueueTime:
+      self.__meanQueueInterval = self.__updateMean( self.__meanQueueInterval, now - self.__lastQueueTime )
+    self.__lastQueueTime = now
     self.__spawnNeededWorkingProcesses()
-    ## throttle a bit to allow task state propagation
-    time.sleep( 0.1 )
     return S_OK()
 
+  @staticmethod
+  def __updateMean( mean, value ):
+    """ Exponentially weighted moving average, following the recent tasks """
+    if not mean:
+      return value
+    return 0.8 * mean + 0.2 * value
+
   def createAndQueueTask( self,
                           taskFunction,
                           args = None,
@@ -871,37 +1002,74 @@ class ProcessPool( object ):
       self.__cleanDeadProcesses()
       if not self.__pendingQueue.empty():
         self.__spawnNeededWorkingProcesses()
-      time.sleep( 0.1 )
-      if self.__resultsQueue.empty():
-        break
       ## get task
-      task = self.__resultsQueue.get()
-      ## execute callbacks
       try:
-        task.doExceptionCallback()
-        task.doCallback()
-        if task.usePoolCallbacks():
-          if self.__poolExceptionCallback and task.exceptionRaised():
-            self.__poolExceptionCallback( task.getTaskID(), task.taskException() )
-          if self.__poolCallback and task.taskResults():
-            self.__poolCallback( task.getTaskID(), task.taskResults() )
-      except Exception, error:
-        pass
+        task = self.__resultsQueue.get( block = False )
+      except Queue.Empty:
+        break
+      self.__processResult( task )
       processed += 1
     return processed
 
+  def __processResult( self, task ):
+    """ 
+    Execute callbacks of a finished task and wake up the ones waiting for free slots
+
+    :param self: self reference
+    :param ProcessTask task: task from the results queue
+    """
+    ## execute callbacks
+    try:
+      task.doExceptionCallback()
+      task.doCallback()
+      if task.usePoolCallbacks():
+        if self.__poolExceptionCallback and task.exceptionRaised():
+          self.__poolExceptionCallback( task.getTaskID(), task.taskException() )
+        if self.__poolCallback and task.taskResults():
+          self.__poolCallback( task.getTaskID(), task.taskResults() )
+    except Exception, error:
+      pass
+    if task.getProcessTime():
+      self.__meanTaskTime = self.__updateMean( self.__meanTaskTime, task.getProcessTime() )
+    self.__resultsCondition.acquire()
+    try:
+      self.__processedTasks += 1
+      self.__resultsCondition.notifyAll()
+    finally:
+      self.__resultsCondition.release()
+
   def processAllResults( self, timeout=10 ):
     """ 
     Process all enqueued tasks at once
 
+    The results are awaited until all the accepted tasks are processed: a task can be
+    in none of the queues nor in a worker, and a result put in the results queue may not
+    be readable yet
+
     :param self: self reference
+    :param timeout: seconds to wait for the results
     """
-    start = time.time()
-    while self.getNumWorkingProcesses() or not self.__pendingQueue.empty():
-      self.processResults()      
-      time.sleep( 1 )
-      if time.time() - start > timeout:
+    endTime = time.time() + timeout
+    while self.__processedTasks < self.__acceptedTasks:
+      waitTime = min( 1.0, endTime - time.time() )
+      if waitTime <= 0:
         break
+      if self.__daemonProcess and self.__daemonProcess.is_alive():
+        self.__resultsCondition.acquire()
+        try:
+          if self.__processedTasks < self.__acceptedTasks:
+            self.__resultsCondition.wait( waitTime )
+        finally:
+          self.__resultsCondition.release()
+        continue
+      self.__cleanDeadProcesses()
+      if not self.__pendingQueue.empty():
+        self.__spawnNeededWorkingProcesses()
+      try:
+        task = self.__resultsQueue.get( block = True, timeout = waitTime )
+      except Queue.Empty:
+        continue
+      self.__processResult( task )
     self.processResults()
 
   def finalize( self, timeout = 60 ):
@@ -973,8 +1141,15 @@ class ProcessPool( object ):
     while True:
       if self.__draining:
         return
-      self.processResults()
-      time.sleep( 1 )
+      ## block on the results queue, so the results are processed as soon as they arrive
+      try:
+        task = self.__resultsQueue.get( block = True, timeout = 1 )
+      except Queue.Empty:
+        self.__cleanDeadProcesses()
+        if not self.__pendingQueue.empty():
+          self.__spawnNeededWorkingProcesses()
+        continue
+      self.__processResult( task )
 
   def __del__( self ):
     """ 
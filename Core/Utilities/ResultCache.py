@@ -0,0 +1,419 @@
+"""
+  ResultCache
+
+  Cache of the results of expensive operations ( report data, plots... ), bounded
+  in number of entries and in bytes with least recently used eviction.
+
+  The entries can also be stored in a directory shared by all the processes of a
+  host ( e.g. the clones of a service ). In that case the directory is the
+  reference: entries generated by a process are seen by the others and the
+  deleteFunction is called when an entry leaves the directory.
+
+  Concurrent requests of the same key are coalesced: only one thread ( or process
+  with a shared directory ) generates the value, the others wait for it.
+"""
+__RCSID__ = "$Id$"
+
+import os
+import time
+import errno
+import threading
+try:
+  from hashlib import md5
+except ImportError:
+  from md5 import md5
+try:
+  import fcntl
+except ImportError:
+  fcntl = None
+
+from DIRAC import S_OK, gLogger
+from DIRAC.Core.Utilities import DEncode
+
+class ResultCache( object ):
+
+  def __init__( self, name, lifeTime = 600, maxEntries = 1000, maxBytes = 0, cacheDir = None, deleteFunction = None ):
+    """
+    :param str name: name of the cache for the logs
+    :param int lifeTime: default life time of the entries in seconds
+    :param int maxEntries: maximum number of entries, 0 for no limit
+    :param int maxBytes: maximum size of the encoded entries, 0 for no limit
+    :param str cacheDir: directory shared by the processes to store the entries in
+    :param deleteFunction: function called with the value of the entries leaving the cache
+    """
+    self.log = gLogger.getSubLogger( "ResultCache/%s" % name )
+    self.__lifeTime = lifeTime
+    self.__maxEntries = maxEntries
+    self.__maxBytes = maxBytes
+    self.__cacheDir = None
+    self.__deleteFunction = deleteFunction
+    # key -> [ expirationEpoch, size, lastUse, value ]
+    self.__entries = {}
+    self.__bytes = 0
+    self.__useCounter = 0
+    self.__lock = threading.RLock()
+    # key -> [ lock, number of threads using it ]
+    self.__keyLocks = {}
+    self.__stats = { 'hits' : 0, 'misses' : 0, 'coalesced' : 0, 'evictions' : 0 }
+    if cacheDir:
+      self.setCacheDir( cacheDir )
+
+  def setLimits( self, maxEntries = None, maxBytes = None ):
+    """ Change the limits of the cache
+    """
+    self.__lock.acquire()
+    try:
+      if maxEntries is not None:
+        self.__maxEntries = maxEntries
+      if maxBytes is not None:
+        self.__maxBytes = maxBytes
+      self.__evict()
+    finally:
+      self.__lock.release()
+
+  def setCacheDir( self, cacheDir ):
+    """ Store the entries in a directory shared by all the processes
+    """
+    try:
+      os.makedirs( cacheDir )
+    except OSError, excp:
+      if excp.errno != errno.EEXIST:
+        raise
+    self.__cacheDir = cacheDir
+    self.log.info( "Entries are shared in %s" % cacheDir )
+
+  def __getPath( self, cKey, extension = "cache" ):
+    return os.path.join( self.__cacheDir, "%s.%s" % ( md5( repr( cKey ) ).hexdigest(), extension ) )
+
+  def __readFile( self, filePath ):
+    """ Read an entry file, returns None if it does not exist or can't be read
+    """
+    try:
+      fd = open( filePath, "rb" )
+      try:
+        data = fd.read()
+      finally:
+        fd.close()
+      return DEncode.decode( data )[0]
+    except Exception:
+      return None
+
+  def __readShared( self, cKey ):
+    """ Get an entry from the shared directory
+    """
+    filePath = self.__getPath( cKey )
+    entry = self.__readFile( filePath )
+    if not entry or entry[1] != cKey or entry[0] <= time.time():
+      return None
+    try:
+      # Keep track of the use for the eviction from the directory
+      os.utime( filePath, None )
+    except OSError:
+      pass
+    return entry
+
+  def __writeShared( self, cKey, expiration, value ):
+    """ Write an entry in the shared directory atomically
+    """
+    filePath = self.__getPath( cKey )
+    tmpPath = "%s.%s.%s.tmp" % ( filePath, os.getpid(), threading.currentThread().getName() )
+    try:
+      fd = open( tmpPath, "wb" )
+      try:
+        fd.write( DEncode.encode( ( expiration, cKey, value ) ) )
+      finally:
+        fd.close()
+      os.rename( tmpPath, filePath )
+    except Exception, excp:
+      self.log.warn( "Cannot write shared entry", str( excp ) )
+      try:
+        os.unlink( tmpPath )
+      except OSError:
+        pass
+
+  def __sizeOf( self, value ):
+    try:
+      return len( DEncode.encode( value ) )
+    except Exception:
+      return 0
+
+  def __evict( self ):
+    """ Remove the least recently used entries to respect the limits. Lock has to be held
+    """
+    overEntries = self.__maxEntries and len( self.__entries ) > self.__maxEntries
+    overBytes = self.__maxBytes and self.__bytes > self.__maxBytes
+    if not overEntries and not overBytes:
+      return
+    # Evict down to 90% of the limits to not evict on every insertion
+    maxEntries = int( self.__maxEntries * 0.9 )
+    maxBytes = int( self.__maxBytes * 0.9 )
+    byUse = sorted( [ ( self.__entries[ cKey ][2], cKey ) for cKey in self.__entries ] )
+    for _lastUse, cKey in byUse:
+      if ( not self.__maxEntries or len( self.__entries ) <= maxEntries ) and \
+         ( not self.__maxBytes or self.__bytes <= maxBytes ):
+        break
+      self.__remove( cKey )
+      self.__stats[ 'evictions' ] += 1
+
+  def __remove( self, cKey, callDelete = True ):
+    """ Remove an entry from memory. Lock has to be held
+    """
+    entry = self.__entries.pop( cKey )
+    self.__bytes -= entry[1]
+    # With a shared directory the entries leave the cache when they leave the directory
+    if callDelete and self.__deleteFunction and not self.__cacheDir:
+      self.__callDelete( entry[3] )
+
+  def __callDelete( self, value ):
+    try:
+      self.__deleteFunction( value )
+    except Exception, excp:
+      self.log.warn( "Error while deleting entry", str( excp ) )
+
+  def __getFromMemory( self, cKey ):
+    """ Get an entry from memory, returns None if there is no valid one. Lock has to be held
+    """
+    entry = self.__entries.get( cKey )
+    if not entry:
+      return None
+    if entry[0] <= time.time():
+      self.__remove( cKey )
+      return None
+    self.__useCounter += 1
+    entry[2] = self.__useCounter
+    return entry
+
+  def __addToMemory( self, cKey, expiration, value ):
+    """ Lock has to be held
+    """
+    if cKey in self.__entries:
+      # Replaced by the new value
+      self.__remove( cKey, callDelete = False )
+    size = self.__sizeOf( value )
+    self.__useCounter += 1
+    self.__entries[ cKey ] = [ expiration, size, self.__useCounter, value ]
+    self.__bytes += size
+    self.__evict()
+
+  def __lookup( self, cKey ):
+    """ Get a value from memory or from the shared directory, returns ( found, value )
+    """
+    self.__lock.acquire()
+    try:
+      entry = self.__getFromMemory( cKey )
+      if entry:
+        # The other processes may have removed it from the shared directory
+        if not self.__cacheDir or os.path.isfile( self.__getPath( cKey ) ):
+          return True, entry[3]
+        self.__remove( cKey )
+    finally:
+      self.__lock.release()
+    if not self.__cacheDir:
+      return False, None
+    entry = self.__readShared( cKey )
+    if not entry:
+      return False, None
+    self.__lock.acquire()
+    try:
+      self.__addToMemory( cKey, entry[0], entry[2] )
+    finally:
+      self.__lock.release()
+    return True, entry[2]
+
+  def get( self, cKey ):
+    """ Get a value from the cache, False if it is not cached
+    """
+    found, value = self.__lookup( cKey )
+    self.__lock.acquire()
+    try:
+      if found:
+        self.__stats[ 'hits' ] += 1
+        return value
+      self.__stats[ 'misses' ] += 1
+      return False
+    finally:
+      self.__lock.release()
+
+  def add( self, cKey, value, lifeTime = None ):
+    """ Add a value to the cache
+    """
+    if lifeTime is None:
+      lifeTime = self.__lifeTime
+    if lifeTime <= 0:
+      return
+    expiration = time.time() + lifeTime
+    if self.__cacheDir:
+      self.__writeShared( cKey, expiration, value )
+    self.__lock.acquire()
+    try:
+      self.__addToMemory( cKey, expiration, value )
+    finally:
+      self.__lock.release()
+
+  def delete( self, cKey ):
+    """ Delete a value from the cache
+    """
+    self.__lock.acquire()
+    try:
+      if cKey in self.__entries:
+        self.__remove( cKey )
+    finally:
+      self.__lock.release()
+    if self.__cacheDir:
+      entry = self.__readFile( self.__getPath( cKey ) )
+      try:
+        os.unlink( self.__getPath( cKey ) )
+      except OSError:
+        return
+      if entry and self.__deleteFunction:
+        self.__callDelete( entry[2] )
+
+  def __acquireKeyLock( self, cKey ):
+    self.__lock.acquire()
+    try:
+      keyLock = self.__keyLocks.setdefault( cKey, [ threading.Lock(), 0 ] )
+      keyLock[1] += 1
+    finally:
+      self.__lock.release()
+    keyLock[0].acquire()
+
+  def __releaseKeyLock( self, cKey ):
+    self.__lock.acquire()
+    try:
+      keyLock = self.__keyLocks[ cKey ]
+      keyLock[0].release()
+      keyLock[1] -= 1
+      if keyLock[1] == 0:
+        del self.__keyLocks[ cKey ]
+    finally:
+      self.__lock.release()
+
+  def __lockShared( self, cKey ):
+    """ Lock the generation of a key for the other processes, returns the lock file or None
+    """
+    if not self.__cacheDir or not fcntl:
+      return None
+    try:
+      fd = open( self.__getPath( cKey, "lock" ), "a" )
+      fcntl.flock( fd.fileno(), fcntl.LOCK_EX )
+      return fd
+    except Exception, excp:
+      self.log.warn( "Cannot lock shared entry", str( excp ) )
+      return None
+
+  def getOrGenerate( self, cKey, generateFunc, lifeTime = None ):
+    """ Get a value from the cache or generate it with generateFunc, a function returning a
+        S_OK/S_ERROR structure. Only the successful results are cached
+
+    :return: S_OK( value ) or the error of generateFunc
+    """
+    found, value = self.__lookup( cKey )
+    if found:
+      self.__lock.acquire()
+      self.__stats[ 'hits' ] += 1
+      self.__lock.release()
+      return S_OK( value )
+    self.__acquireKeyLock( cKey )
+    try:
+      sharedLock = self.__lockShared( cKey )
+      try:
+        # Another thread or process may have generated it while waiting for the lock
+        found, value = self.__lookup( cKey )
+        self.__lock.acquire()
+        if found:
+          self.__stats[ 'coalesced' ] += 1
+        else:
+          self.__stats[ 'misses' ] += 1
+        self.__lock.release()
+        if found:
+          return S_OK( value )
+        result = generateFunc()
+        if result[ 'OK' ]:
+          self.add( cKey, result[ 'Value' ], lifeTime )
+        return result
+      finally:
+        if sharedLock:
+          sharedLock.close()
+    finally:
+      self.__releaseKeyLock( cKey )
+
+  def purgeExpired( self ):
+    """ Remove the expired entries, and the least recently used ones of the
+        shared directory if it is over the size limit
+    """
+    now = time.time()
+    self.__lock.acquire()
+    try:
+      for cKey in [ cKey for cKey in self.__entries if self.__entries[ cKey ][0] <= now ]:
+        self.__remove( cKey )
+    finally:
+      self.__lock.release()
+    if self.__cacheDir:
+      self.__purgeShared( now )
+
+  def __purgeShared( self, now ):
+    try:
+      fileNames = os.listdir( self.__cacheDir )
+    except OSError, excp:
+      self.log.warn( "Cannot list shared entries", str( excp ) )
+      return
+    files = []
+    totalBytes = 0
+    for fileName in fileNames:
+      filePath = os.path.join( self.__cacheDir, fileName )
+      try:
+        fileStat = os.stat( filePath )
+      except OSError:
+        continue
+      if not fileName.endswith( ".cache" ):
+        # Stale lock and temporary files
+        if fileStat.st_mtime < now - 3600:
+          self.__unlinkShared( filePath, False )
+        continue
+      files.append( ( fileStat.st_mtime, fileStat.st_size, filePath ) )
+      totalBytes += fileStat.st_size
+    files.sort()
+    for _mtime, size, filePath in files:
+      entry = self.__readFile( filePath )
+      if entry and entry[0] > now and ( not self.__maxBytes or totalBytes <= self.__maxBytes ):
+        continue
+      if entry and entry[0] > now:
+        self.__stats[ 'evictions' ] += 1
+      self.__unlinkShared( filePath, entry )
+      totalBytes -= size
+
+  def __unlinkShared( self, filePath, entry ):
+    try:
+      os.unlink( filePath )
+    except OSError:
+      return
+    if entry and self.__deleteFunction:
+      self.__callDelete( entry[2] )
+
+  def purgeAll( self ):
+    """ Remove all the entries kept in memory
+    """
+    self.__lock.acquire()
+    try:
+      for cKey in self.__entries.keys():
+        self.__remove( cKey )
+    finally:
+      self.__lock.release()
+
+  def getStats( self ):
+    """ Get the usage of the cache: hits, misses, coalesced ( requests that waited for
+        another one to generate the value ), evictions, entries, bytes and hitRate
+    """
+    self.__lock.acquire()
+    try:
+      stats = dict( self.__stats )
+      stats[ 'entries' ] = len( self.__entries )
+      stats[ 'bytes' ] = self.__bytes
+    finally:
+      self.__lock.release()
+    requests = stats[ 'hits' ] + stats[ 'misses' ] + stats[ 'coalesced' ]
+    if requests:
+      stats[ 'hitRate' ] = float( stats[ 'hits' ] + stats[ 'coalesced' ] ) / requests
+    else:
+      stats[ 'hitRate' ] = 0.0
+    return stats
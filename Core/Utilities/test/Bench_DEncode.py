@@ -0,0 +1,40 @@
+########################################################################
+# $HeadURL $
+# File: Bench_DEncode.py
+########################################################################
+
+""" :mod: Bench_DEncode
+    ===================
+
+    .. module: Bench_DEncode
+    :synopsis: benchmark of DEncode
+
+    encode and decode times of large replies, used to compare encoder/decoder
+    versions. Usage: python Bench_DEncode.py [ repetitions ]
+"""
+
+import sys
+import time
+
+from DIRAC.Core.Utilities import DEncode
+from DEncodeTests import jobsSummary, replicas
+
+def benchmark( repetitions = 10 ):
+  """ print encode and decode times for large replies """
+  for name, obj in ( ( "getJobsSummary(20k jobs)", jobsSummary( 20000 ) ),
+                     ( "getReplicas(50k LFNs)", replicas( 50000 ) ) ):
+    data = DEncode.encode( obj )
+    timings = {}
+    for label, func in ( ( "encode", lambda: DEncode.encode( obj ) ),
+                         ( "encode(sortKeys=False)", lambda: DEncode.encode( obj, sortKeys = False ) ),
+                         ( "decode", lambda: DEncode.decode( data ) ) ):
+      for _i in range( repetitions ):
+        start = time.clock()
+        func()
+        timings[ label ] = min( timings.get( label, 1e9 ), time.clock() - start )
+    print "%s %.1f MB: %s" % ( name, len( data ) / 1.0e6,
+                               ", ".join( [ "%s %.3fs" % ( label, timings[ label ] ) for label in sorted( timings ) ] ) )
+
+## benchmark execution
+if __name__ == "__main__":
+  benchmark( *[ int( arg ) for arg in sys.argv[1:] ] )
@@ -0,0 +1,95 @@
+########################################################################
+# $HeadURL $
+# File: DEncodeTests.py
+########################################################################
+
+""" :mod: DEncodeTests
+    =======================
+
+    .. module: DEncodeTests
+    :synopsis: test cases for DEncode
+
+    test cases for DEncode encoding and decoding
+"""
+
+__RCSID__ = "$Id $"
+
+## imports
+import time
+import datetime
+import unittest
+## SUT
+from DIRAC.Core.Utilities import DEncode
+
+def jobsSummary( nJobs ):
+  """ something looking like a large getJobsSummary reply """
+  return { 'OK' : True,
+           'Value' : dict( ( jobID, { 'Status' : 'Running', 'MinorStatus' : 'Application',
+                                      'Site' : 'LCG.CERN.ch', 'Owner' : 'someuser',
+                                      'JobGroup' : '00012345', 'CPUTime' : 1234.5,
+                                      'LastUpdateTime' : '2013-01-01 10:00:00', 'JobID' : jobID } )
+                           for jobID in xrange( nJobs ) ) }
+
+def replicas( nLFNs ):
+  """ something looking like a large getReplicas reply """
+  lfn = "/lhcb/MC/2012/ALLSTREAMS.DST/00012345/0000/00012345_%08d_1.allstreams.dst"
+  return { 'OK' : True,
+           'Value' : { 'Failed' : {},
+                       'Successful' : dict( ( lfn % i, { 'CERN-DST' : 'srm://srm-eoslhcb.cern.ch/eos/lhcb/file%d' % i,
+                                                         'CNAF-DST' : 'srm://storm-fe-lhcb.cr.cnaf.infn.it/file%d' % i } )
+                                            for i in xrange( nLFNs ) ) } }
+
+########################################################################
+class DEncodeTestCase( unittest.TestCase ):
+  """
+  .. class:: DEncodeTestCase
+
+  """
+  def setUp( self ):
+    """ test setup """
+    self.obj = { 'OK' : True,
+                 'Value' : [ 1, 2L, 3.5, -4, 1.0e22, 1.5e-10, "str", u"\xe9t\xe9", None, False,
+                             ( 1, "a", [] ), {}, { 1 : "one", ( 1, 2 ) : [ { 'a' : {} } ] } ],
+                 'date' : datetime.datetime( 2013, 1, 2, 3, 4, 5, 6 ),
+                 'day' : datetime.date( 2013, 1, 2 ),
+                 'time' : datetime.time( 3, 4, 5 ) }
+
+  def test01roundTrip( self ):
+    """ encode/decode round trip """
+    data = DEncode.encode( self.obj )
+    self.assertEqual( DEncode.decode( data ), ( self.obj, len( data ) ) )
+    data = DEncode.encode( self.obj, sortKeys = False )
+    self.assertEqual( DEncode.decode( data ), ( self.obj, len( data ) ) )
+
+  def test02wireFormat( self ):
+    """ wire format is unchanged """
+    self.assertEqual( DEncode.encode( { 'b' : [ 1, "xy" ], 'a' : ( None, True, 2L ), 1 : 1.5 } ),
+                      "di1ef1.5es1:atnb1I2ees1:bli1es2:xyee" )
+    self.assertEqual( DEncode.encode( "" ), "s0:" )
+    self.assertEqual( DEncode.encode( 7 ), "i7e" )
+    self.assertEqual( DEncode.decode( "f1e+22e" )[0], 1e22 )
+
+  def test03sortKeys( self ):
+    """ sorted keys make the encoding deterministic """
+    dOne = dict( ( "key%s" % i, i ) for i in range( 100 ) )
+    dTwo = dict( ( "key%s" % i, i ) for i in reversed( range( 100 ) ) )
+    self.assertEqual( DEncode.encode( dOne ), DEncode.encode( dTwo ) )
+    self.assertEqual( DEncode.decode( DEncode.encode( dTwo, sortKeys = False ) )[0], dOne )
+
+  def test04offset( self ):
+    """ decode starting at an offset """
+    data = DEncode.encode( self.obj )
+    buf = "12:garbage" + data + "i1e"
+    self.assertEqual( DEncode.decode( buf, 10 ), ( self.obj, 10 + len( data ) ) )
+    self.assertEqual( DEncode.decode( buf, 10 + len( data ) ), ( 1, len( buf ) ) )
+
+  def test05bigReplies( self ):
+    """ large replies survive the round trip """
+    for obj in ( jobsSummary( 1000 ), replicas( 1000 ) ):
+      self.assertEqual( DEncode.decode( DEncode.encode( obj, sortKeys = False ) )[0], obj )
+## test execution
+if __name__ == "__main__":
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( DEncodeTestCase )
+  gSuite = unittest.TestSuite( [ gSuite ] )
+  unittest.TextTestRunner( verbosity = 3 ).run( gSuite )
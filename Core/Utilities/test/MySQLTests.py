@@ -0,0 +1,276 @@
+""" Test cases for the MySQL class, with a fake MySQLdb recording the statements
+"""
+
+import re
+import imp
+import sys
+import unittest
+
+class FakeServer( object ):
+  """ Rows returned by the SELECT statements and statements run on the connections.
+      The statements containing failOn raise an error
+  """
+
+  def __init__( self ):
+    self.rows = ()
+    self.statements = []
+    self.connections = []
+    self.failOn = None
+
+class FakeCursor( object ):
+
+  def __init__( self, conn, streaming ):
+    self.conn = conn
+    self.streaming = streaming
+    self.rows = []
+    self.fetched = 0
+    self.lastrowid = None
+
+  def _run( self, cmd ):
+    server = self.conn.server
+    server.statements.append( ( self.conn, cmd ) )
+    if server.failOn and server.failOn in cmd:
+      raise fakeMySQLdb.MySQLError( 1062, "Failed: %s" % cmd )
+
+  def execute( self, cmd ):
+    self._run( cmd )
+    if cmd.startswith( 'SELECT' ):
+      self.rows = list( self.conn.server.rows )
+    return len( self.rows )
+
+  def executemany( self, cmd, rows ):
+    """ As MySQLdb, only the values of the statement are formatted with the rows
+    """
+    match = re.search( r"\sVALUES\s*(\([^()]*\))", cmd )
+    values = ", ".join( [ match.group( 1 ) % tuple( [ repr( value ) for value in row ] ) for row in rows ] )
+    self._run( cmd[ :match.start( 1 ) ] + values + cmd[ match.end( 1 ): ] )
+    return len( rows )
+
+  def fetchall( self ):
+    return self.fetchmany( len( self.rows ) )
+
+  def fetchmany( self, size ):
+    rows = tuple( self.rows[ self.fetched : self.fetched + size ] )
+    self.fetched += len( rows )
+    return rows
+
+  def close( self ):
+    pass
+
+class FakeConnection( object ):
+
+  def __init__( self, server ):
+    self.server = server
+    self.closed = False
+    self.cursors = []
+
+  def cursor( self, cursorClass = None ):
+    cursor = FakeCursor( self, cursorClass is fakeMySQLdb.cursors.SSCursor )
+    self.cursors.append( cursor )
+    return cursor
+
+  def commit( self ):
+    self.server.statements.append( ( self, 'COMMIT' ) )
+
+  def rollback( self ):
+    self.server.statements.append( ( self, 'ROLLBACK' ) )
+
+  def ping( self, reconnect = False ):
+    return not self.closed
+
+  def select_db( self, dbName ):
+    pass
+
+  def close( self ):
+    self.closed = True
+
+  def escape_string( self, value ):
+    return value.replace( '"', '\\"' )
+
+gServer = FakeServer()
+
+fakeMySQLdb = imp.new_module( 'MySQLdb' )
+fakeMySQLdb.cursors = imp.new_module( 'MySQLdb.cursors' )
+class SSCursor( object ):
+  pass
+fakeMySQLdb.cursors.SSCursor = SSCursor
+class Error( Exception ):
+  pass
+fakeMySQLdb.Error = Error
+fakeMySQLdb.MySQLError = Error
+fakeMySQLdb.server_init = lambda *args: None
+fakeMySQLdb.thread_safe = lambda: True
+def connect( **kwargs ):
+  conn = FakeConnection( gServer )
+  gServer.connections.append( conn )
+  return conn
+fakeMySQLdb.connect = connect
+
+try:
+  import MySQLdb
+except ImportError:
+  sys.modules[ 'MySQLdb' ] = fakeMySQLdb
+  sys.modules[ 'MySQLdb.cursors' ] = fakeMySQLdb.cursors
+
+from DIRAC.Core.Utilities import MySQL as MySQLModule
+from DIRAC.Core.Utilities.MySQL import MySQL
+
+class MySQLTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    global gServer
+    gServer = FakeServer()
+    self.realMySQLdb = MySQLModule.MySQLdb
+    MySQLModule.MySQLdb = fakeMySQLdb
+    MySQL._MySQL__connectionPools.clear()
+    self.db = MySQL( 'localhost', 'user', 'password', 'TestDB' )
+
+  def tearDown( self ):
+    MySQLModule.MySQLdb = self.realMySQLdb
+
+  def statements( self, conn = None ):
+    return [ cmd for stConn, cmd in gServer.statements if conn in ( None, stConn ) ]
+
+class QueryIterTestCase( MySQLTestCase ):
+
+  def test_batches( self ):
+    """ The rows are read as the batches are consumed, on a connection other than the one of the thread
+    """
+    gServer.rows = [ ( i, 'name%s' % i ) for i in range( 2500 ) ]
+    threadConn = self.db._getConnection()[ 'Value' ]
+    batches = self.db._queryIter( "SELECT * FROM Test", batchSize = 1000 )
+    result = batches.next()
+    self.assertTrue( result[ 'OK' ] )
+    self.assertEqual( result[ 'Value' ], tuple( gServer.rows[:1000] ) )
+    streamConn = gServer.connections[-1]
+    self.assertTrue( streamConn is not threadConn )
+    cursor = streamConn.cursors[-1]
+    self.assertTrue( cursor.streaming )
+    self.assertEqual( cursor.fetched, 1000 )
+    # Other queries of the thread can be done meanwhile
+    self.assertTrue( self.db._query( "SELECT * FROM Other" )[ 'OK' ] )
+    self.assertEqual( self.statements( threadConn )[-1], "SELECT * FROM Other" )
+    self.assertEqual( [ len( result[ 'Value' ] ) for result in batches ], [ 1000, 500 ] )
+    # The connection was given back and is reused
+    self.assertFalse( streamConn.closed )
+    numConnections = len( gServer.connections )
+    self.assertEqual( len( list( self.db._queryIter( "SELECT * FROM Test" ) ) ), 3 )
+    self.assertEqual( len( gServer.connections ), numConnections )
+    self.assertEqual( self.statements( streamConn )[-1], "SELECT * FROM Test" )
+
+  def test_abandoned( self ):
+    """ A connection with unread rows is closed and not reused
+    """
+    gServer.rows = [ ( i, ) for i in range( 2500 ) ]
+    batches = self.db._queryIter( "SELECT * FROM Test", batchSize = 1000 )
+    self.assertTrue( batches.next()[ 'OK' ] )
+    streamConn = gServer.connections[-1]
+    batches.close()
+    self.assertTrue( streamConn.closed )
+    self.assertEqual( [ len( result[ 'Value' ] ) for result in self.db._queryIter( "SELECT * FROM Test" ) ],
+                      [ 1000, 1000, 500 ] )
+    self.assertTrue( gServer.connections[-1] is not streamConn )
+    self.assertEqual( self.statements( streamConn ), [ "SET AUTOCOMMIT=1", "SELECT * FROM Test" ] )
+
+  def test_transaction( self ):
+    """ Inside a transaction the rows are read on the connection of the transaction
+    """
+    gServer.rows = [ ( i, ) for i in range( 2500 ) ]
+    self.assertTrue( self.db.transactionStart()[ 'OK' ] )
+    numConnections = len( gServer.connections )
+    threadConn = gServer.connections[-1]
+    batches = list( self.db._queryIter( "SELECT * FROM Test", batchSize = 1000 ) )
+    self.assertEqual( [ len( result[ 'Value' ] ) for result in batches ], [ 1000, 1000, 500 ] )
+    self.assertEqual( len( gServer.connections ), numConnections )
+    self.assertEqual( self.statements( threadConn )[-1], "SELECT * FROM Test" )
+    self.assertFalse( threadConn.cursors[-1].streaming )
+    self.assertTrue( self.db.transactionCommit()[ 'OK' ] )
+
+  def test_error( self ):
+    gServer.failOn = "FROM Test"
+    results = list( self.db._queryIter( "SELECT * FROM Test" ) )
+    self.assertEqual( len( results ), 1 )
+    self.assertFalse( results[0][ 'OK' ] )
+    self.assertTrue( gServer.connections[-1].closed )
+
+class BulkInsertTestCase( MySQLTestCase ):
+
+  def setUp( self ):
+    MySQLTestCase.setUp( self )
+    self.threadConn = self.db._getConnection()[ 'Value' ]
+    del gServer.statements[:]
+
+  def test_chunks( self ):
+    rows = [ ( i, 'name%s' % i ) for i in range( 25 ) ]
+    result = self.db.bulkInsert( 'Test', [ 'ID', 'Name' ], rows, chunkSize = 10 )
+    self.assertTrue( result[ 'OK' ] )
+    self.assertEqual( result[ 'Value' ], 25 )
+    statements = self.statements( self.threadConn )
+    self.assertEqual( statements[0], 'START TRANSACTION' )
+    self.assertEqual( statements[-1], 'COMMIT' )
+    inserts = statements[1:-1]
+    self.assertEqual( len( inserts ), 3 )
+    self.assertEqual( inserts[0], "INSERT INTO `Test` ( `ID`, `Name` ) VALUES %s" %
+                                  ", ".join( [ "( %s, 'name%s' )" % ( i, i ) for i in range( 10 ) ] ) )
+    self.assertTrue( inserts[2].endswith( "VALUES ( 20, 'name20' ), ( 21, 'name21' ), ( 22, 'name22' ), "
+                                          "( 23, 'name23' ), ( 24, 'name24' )" ) )
+    # Nothing to insert
+    self.assertEqual( self.db.bulkInsert( 'Test', [ 'ID', 'Name' ], [] )[ 'Value' ], 0 )
+    self.assertEqual( len( self.statements() ), 5 )
+
+  def test_onDuplicate( self ):
+    self.assertTrue( self.db.bulkInsert( 'Test', [ 'ID', 'Name' ], [ ( 1, 'a' ) ], onDuplicate = 'Ignore' )[ 'OK' ] )
+    self.assertEqual( self.statements()[1], "INSERT IGNORE INTO `Test` ( `ID`, `Name` ) VALUES ( 1, 'a' )" )
+    self.assertFalse( self.db.bulkInsert( 'Test', [ 'ID', 'Name' ], [ ( 1, 'a' ) ], onDuplicate = 'Replace' )[ 'OK' ] )
+
+    del gServer.statements[:]
+    self.assertTrue( self.db.bulkInsert( 'Test', [ 'ID', 'Name' ], [ ( 1, 'a' ) ], onDuplicate = [ 'Name' ] )[ 'OK' ] )
+    self.assertEqual( self.statements()[1], "INSERT INTO `Test` ( `ID`, `Name` ) VALUES ( 1, 'a' ) "
+                                            "ON DUPLICATE KEY UPDATE `Name`=VALUES(`Name`)" )
+
+    # The % of the expressions reach the server unchanged
+    del gServer.statements[:]
+    onDuplicate = { 'Name' : "CONCAT(`Name`, '%s', '%')" }
+    self.assertTrue( self.db.bulkInsert( 'Test', [ 'ID', 'Name' ], [ ( 1, 'a%' ) ], onDuplicate = onDuplicate )[ 'OK' ] )
+    self.assertEqual( self.statements()[1], "INSERT INTO `Test` ( `ID`, `Name` ) VALUES ( 1, 'a%' ) "
+                                            "ON DUPLICATE KEY UPDATE `Name`=CONCAT(`Name`, '%s', '%')" )
+
+  def test_mismatch( self ):
+    result = self.db.bulkInsert( 'Test', [ 'ID', 'Name' ], [ ( 1, 'a' ), ( 2, ) ] )
+    self.assertFalse( result[ 'OK' ] )
+    self.assertTrue( 'Mismatch' in result[ 'Message' ] )
+    self.assertEqual( self.statements(), [] )
+
+  def test_rollback( self ):
+    gServer.failOn = "'name15'"
+    rows = [ ( i, 'name%s' % i ) for i in range( 25 ) ]
+    result = self.db.bulkInsert( 'Test', [ 'ID', 'Name' ], rows, chunkSize = 10 )
+    self.assertFalse( result[ 'OK' ] )
+    statements = self.statements( self.threadConn )
+    self.assertEqual( len( statements ), 4 )
+    self.assertEqual( statements[0], 'START TRANSACTION' )
+    self.assertEqual( statements[-1], 'ROLLBACK' )
+
+  def test_callerTransaction( self ):
+    """ Inside a transaction of the caller the rows are just part of it
+    """
+    self.assertTrue( self.db.transactionStart()[ 'OK' ] )
+    del gServer.statements[:]
+    rows = [ ( i, 'name%s' % i ) for i in range( 25 ) ]
+    self.assertTrue( self.db.bulkInsert( 'Test', [ 'ID', 'Name' ], rows, chunkSize = 10 )[ 'OK' ] )
+    statements = self.statements( self.threadConn )
+    self.assertEqual( len( statements ), 3 )
+    self.assertFalse( [ cmd for cmd in statements if not cmd.startswith( 'INSERT' ) ] )
+    # A failure is left to the caller to roll back
+    gServer.failOn = "'name15'"
+    self.assertFalse( self.db.bulkInsert( 'Test', [ 'ID', 'Name' ], rows, chunkSize = 10 )[ 'OK' ] )
+    self.assertFalse( 'ROLLBACK' in self.statements() )
+    self.assertTrue( self.db.transactionRollback()[ 'OK' ] )
+    self.assertTrue( 'ROLLBACK' in self.statements( self.threadConn ) )
+
+if __name__ == '__main__':
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( QueryIterTestCase )
+  gSuite.addTest( gTestLoader.loadTestsFromTestCase( BulkInsertTestCase ) )
+  gSuite = unittest.TestSuite( [ gSuite ] )
+  unittest.TextTestRunner( verbosity = 3 ).run( gSuite )
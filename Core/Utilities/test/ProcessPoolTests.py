@@ -343,6 +343,79 @@ class TaskTimeOutTests( unittest.TestCase ):
     ## unlock
     gLock.release()
 
+class FreeSlotsTests( unittest.TestCase ):
+  """
+  .. class:: FreeSlotsTests
+  test case for ProcessPool.waitForFreeSlots
+  """
+
+  def setUp( self ):
+    self.results = []
+
+  def poolCallback( self, taskID, taskResult ):
+    """ collect results """
+    self.results.append( taskID )
+
+  def queueTasks( self, processPool, timeWait ):
+    """ fill all the slots """
+    for i in range( processPool.getMaxSize() ):
+      processPool.createAndQueueTask( CallableFunc, taskID = i, args = ( i, timeWait ), usePoolCallbacks = True )
+
+  def testWaitDaemon( self ):
+    """ waitForFreeSlots in daemon mode """
+    processPool = ProcessPool( 2, 2, 4, poolCallback = self.poolCallback )
+    processPool.daemonize()
+    self.queueTasks( processPool, 1 )
+    ## queued tasks are counted at once
+    self.assertEqual( processPool.getFreeSlots(), 0 )
+    self.assertEqual( processPool.waitForFreeSlots( 0.2 ), 0 )
+    start = time.time()
+    self.assert_( processPool.waitForFreeSlots( 10 ) > 0 )
+    self.assert_( time.time() - start < 1.5 )
+    self.assert_( self.results )
+    processPool.finalize( 2 )
+
+  def testWaitNoDaemon( self ):
+    """ waitForFreeSlots processing the results """
+    processPool = ProcessPool( 2, 2, 4, poolCallback = self.poolCallback )
+    self.queueTasks( processPool, 1 )
+    while len( self.results ) < 2:
+      processPool.waitForFreeSlots( 10 )
+      if processPool.getFreeSlots() == 2 and len( self.results ) < 2:
+        processPool.processResults()
+    self.assertEqual( sorted( self.results ), [ 0, 1 ] )
+    self.assertEqual( processPool.getStats()[ 'ProcessedTasks' ], 2 )
+    processPool.finalize( 2 )
+
+class ProcessAllResultsTests( unittest.TestCase ):
+  """
+  .. class:: ProcessAllResultsTests
+  test case for ProcessPool.processAllResults
+  """
+
+  def setUp( self ):
+    self.results = []
+
+  def poolCallback( self, taskID, taskResult ):
+    """ collect results """
+    self.results.append( taskID )
+
+  def testProcessAllResults( self ):
+    """ all the callbacks are done when processAllResults returns """
+    processPool = ProcessPool( 2, 2, 10, poolCallback = self.poolCallback )
+    for i in range( 4 ):
+      processPool.createAndQueueTask( CallableFunc, taskID = i, args = ( i, 0 ), usePoolCallbacks = True )
+    processPool.processAllResults( 5 )
+    self.assertEqual( sorted( self.results ), [ 0, 1, 2, 3 ] )
+    processPool.finalize( 2 )
+
+  def testFinalize( self ):
+    """ finalize processes the results of the queued tasks """
+    processPool = ProcessPool( 2, 2, 10, poolCallback = self.poolCallback )
+    for i in range( 4 ):
+      processPool.createAndQueueTask( CallableFunc, taskID = i, args = ( i, 0.5 ), usePoolCallbacks = True )
+    processPool.finalize( 5 )
+    self.assertEqual( sorted( self.results ), [ 0, 1, 2, 3 ] )
 
 ## SUT suite execution
 if __name__ == "__main__":
@@ -351,6 +424,8 @@ if __name__ == "__main__":
   suitePPCT = testLoader.loadTestsFromTestCase( ProcessPoolCallbacksTests )  
   suiteTCT = testLoader.loadTestsFromTestCase( TaskCallbacksTests )
   suiteTTOT = testLoader.loadTestsFromTestCase( TaskTimeOutTests )
-  suite = unittest.TestSuite( [ suitePPCT, suiteTCT, suiteTTOT ] )
+  suiteFST = testLoader.loadTestsFromTestCase( FreeSlotsTests )
+  suitePART = testLoader.loadTestsFromTestCase( ProcessAllResultsTests )
+  suite = unittest.TestSuite( [ suitePPCT, suiteTCT, suiteTTOT, suiteFST, suitePART ] )
   unittest.TextTestRunner(verbosity=3).run(suite)
 
@@ -0,0 +1,96 @@
+""" Test cases for the ResultCache
+"""
+
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.Core.Utilities.ResultCache import ResultCache
+
+class ResultCacheTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.cacheDir = tempfile.mkdtemp()
+    self.deleted = []
+
+  def tearDown( self ):
+    shutil.rmtree( self.cacheDir )
+
+  def test_lru( self ):
+    cache = ResultCache( "test", maxEntries = 10, deleteFunction = self.deleted.append )
+    for i in range( 10 ):
+      cache.add( i, "value%s" % i )
+    # 0 is used so 1 is the least recently used one
+    self.assertEqual( cache.get( 0 ), "value0" )
+    cache.add( 10, "value10" )
+    self.assertEqual( cache.get( 1 ), False )
+    self.assertEqual( cache.get( 0 ), "value0" )
+    self.assertEqual( cache.getStats()[ 'entries' ], 9 )
+    self.assertEqual( self.deleted, [ "value1", "value2" ] )
+
+  def test_bytes( self ):
+    cache = ResultCache( "test", maxEntries = 0, maxBytes = 1000 )
+    for i in range( 20 ):
+      cache.add( i, "x" * 100 )
+    stats = cache.getStats()
+    self.assert_( stats[ 'bytes' ] <= 1000 )
+    self.assert_( stats[ 'evictions' ] > 0 )
+    self.assertEqual( cache.get( 19 ), "x" * 100 )
+
+  def test_expiration( self ):
+    cache = ResultCache( "test", lifeTime = 1, deleteFunction = self.deleted.append )
+    cache.add( "key", "value" )
+    cache.add( "other", "value", lifeTime = 100 )
+    self.assertEqual( cache.get( "key" ), "value" )
+    time.sleep( 1.1 )
+    self.assertEqual( cache.get( "key" ), False )
+    self.assertEqual( cache.get( "other" ), "value" )
+    self.assertEqual( self.deleted, [ "value" ] )
+
+  def test_coalescing( self ):
+    cache = ResultCache( "test" )
+    calls = []
+    def generate():
+      calls.append( 1 )
+      time.sleep( 0.2 )
+      return S_OK( "report" )
+    results = []
+    threads = [ threading.Thread( target = lambda: results.append( cache.getOrGenerate( "hash", generate ) ) )
+                for _i in range( 10 ) ]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEqual( len( calls ), 1 )
+    self.assertEqual( [ result[ 'Value' ] for result in results ], [ "report" ] * 10 )
+    stats = cache.getStats()
+    self.assertEqual( stats[ 'misses' ], 1 )
+    self.assertEqual( stats[ 'hitRate' ], 0.9 )
+    # Errors are not cached
+    self.failIf( cache.getOrGenerate( "error", lambda: S_ERROR( "No data" ) )[ 'OK' ] )
+    self.assertEqual( cache.getOrGenerate( "error", lambda: S_OK( 1 ) )[ 'Value' ], 1 )
+
+  def test_shared( self ):
+    # Two caches using the same directory, as two processes would
+    first = ResultCache( "first", cacheDir = self.cacheDir, deleteFunction = self.deleted.append )
+    second = ResultCache( "second", cacheDir = self.cacheDir, deleteFunction = self.deleted.append )
+    first.add( "hash", { 'plot' : 'hash.png', 'data' : { 1 : [ 1.5, 2 ] } } )
+    result = second.getOrGenerate( "hash", lambda: S_ERROR( "Should be shared" ) )
+    self.assertEqual( result[ 'Value' ], { 'plot' : 'hash.png', 'data' : { 1 : [ 1.5, 2 ] } } )
+    # Only the shared directory purge calls the delete function
+    first.purgeAll()
+    self.assertEqual( self.deleted, [] )
+    second.add( "expired", "old", lifeTime = 1 )
+    time.sleep( 1.1 )
+    first.purgeExpired()
+    self.assertEqual( self.deleted, [ "old" ] )
+    self.assertEqual( first.get( "hash" )[ 'plot' ], 'hash.png' )
+    second.delete( "hash" )
+    self.assertEqual( first.get( "hash" ), False )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( ResultCacheTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -30,6 +30,8 @@ from DIRAC.Core.Utilities.File import makeGuid, getSize
 from DIRAC.Core.Utilities.List import randomize
 from DIRAC.Core.Utilities.SiteSEMapping import getSEsForSite, isSameSiteSE, getSEsForCountry
 from DIRAC.Resources.Catalog.FileCatalog import FileCatalog
+from DIRAC.Resources.Utilities import checkArgumentFormat
+from DIRAC.DataManagementSystem.Client.ReplicaCache import getGlobalReplicaCache
 from DIRAC.Resources.Storage.StorageElement import StorageElement
 from DIRAC.Resources.Storage.StorageFactory import StorageFactory
 from DIRAC.ResourceStatusSystem.Client.ResourceStatus import ResourceStatus
@@ -58,12 +60,21 @@ class DataManager( object ):
     catalogsToUse = FileCatalog( vo = self.vo ).getMasterCatalogNames()['Value'] if masterCatalogOnly else catalogs
 
     self.fc = FileCatalog( catalogs = catalogsToUse, vo = self.vo )
+    if type( catalogsToUse ) in StringTypes:
+      catalogsToUse = [ catalogsToUse ]
+    # No catalogs means the default catalogs of the VO
+    self.__catalogKey = ( self.vo, tuple( catalogsToUse ) if catalogsToUse else None )
     self.accountingClient = None
     self.registrationProtocol = getRegistrationProtocols()
     self.thirdPartyProtocols = getThirdPartyProtocols()
     self.resourceStatus = ResourceStatus()
     self.ignoreMissingInFC = Operations( self.vo ).getValue( 'DataManagement/IgnoreMissingInFC', False )
     self.useCatalogPFN = Operations( self.vo ).getValue( 'DataManagement/UseCatalogPFN', True )
+    self.replicaCache = None
+    if Operations( self.vo ).getValue( 'DataManagement/UseReplicaCache', False ):
+      self.replicaCache = getGlobalReplicaCache()
+      self.replicaCache.lifeTime = Operations( self.vo ).getValue( 'DataManagement/ReplicaCacheLifeTime', 60 )
+      self.replicaCache.maxSize = Operations( self.vo ).getValue( 'DataManagement/ReplicaCacheSize', 10000 )
 
   def setAccountingClient( self, client ):
     """ Set Accounting Client instance
@@ -145,6 +156,8 @@ class DataManager( object ):
     if failed:
       return S_ERROR( "Failed to clean storage directory at all SEs" )
     res = returnSingleResult( self.fc.removeDirectory( folder, recursive = True ) )
+    if self.replicaCache:
+      self.replicaCache.invalidateDirectory( folder )
     if not res['OK']:
       return res
     return S_OK()
@@ -888,6 +901,7 @@ class DataManager( object ):
       fileCatalog = self.fc
 
     res = fileCatalog.addFile( fileDict )
+    self.__invalidateReplicaCache( fileDict )
     if not res['OK']:
       errStr = "__registerFile: Completely failed to register files."
       self.log.debug( errStr, res['Message'] )
@@ -953,6 +967,7 @@ class DataManager( object ):
       res = fileCatalog.addReplica( replicaDict )
     else:
       res = self.fc.addReplica( replicaDict )
+    self.__invalidateReplicaCache( replicaDict )
     if not res['OK']:
       errStr = "__registerReplica: Completely failed to register replicas."
       self.log.debug( errStr, res['Message'] )
@@ -1064,6 +1079,7 @@ class DataManager( object ):
       completelyRemovedFiles.append( lfn )
     if completelyRemovedFiles:
       res = self.fc.removeFile( completelyRemovedFiles )
+      self.__invalidateReplicaCache( completelyRemovedFiles )
       if not res['OK']:
         for lfn in completelyRemovedFiles:
           failed[lfn] = "Failed to remove file from the catalog: %s" % res['Message']
@@ -1258,6 +1274,7 @@ class DataManager( object ):
     for lfn, pfn, se in replicaTuple:
       replicaDict[lfn] = {'SE':se, 'PFN':pfn}
     res = self.fc.removeReplica( replicaDict )
+    self.__invalidateReplicaCache( replicaDict )
     oDataOperation.setEndTime()
     oDataOperation.setValueByKey( 'RegistrationTime', time.time() - start )
     if not res['OK']:
@@ -1543,7 +1560,7 @@ class DataManager( object ):
 
   def getReplicas( self, lfns, allStatus = True ):
     """ get replicas from catalogue """
-    res = self.fc.getReplicas( lfns, allStatus = allStatus )
+    res = self.__getCatalogReplicas( lfns, allStatus = allStatus )
     if not self.useCatalogPFN:
       if res['OK']:
         se_lfn = {}
@@ -1563,6 +1580,52 @@ class DataManager( object ):
 
     return res
 
+  def __getCatalogReplicas( self, lfns, allStatus = None, defaultCatalogs = False ):
+    """ Get the replicas from the catalogs, or from the replica cache if it is enabled
+
+    :param allStatus: passed to the catalogs getReplicas if not None
+    :param defaultCatalogs: use the default catalogs of the VO instead of the DataManager ones
+    """
+    kwargs = {}
+    if allStatus is not None:
+      kwargs['allStatus'] = allStatus
+    if not self.replicaCache:
+      if defaultCatalogs:
+        return FileCatalog( vo = self.vo ).getReplicas( lfns, **kwargs )
+      return self.fc.getReplicas( lfns, **kwargs )
+
+    res = checkArgumentFormat( lfns )
+    if not res['OK']:
+      return res
+    if defaultCatalogs:
+      cacheKey = ( self.vo, None, allStatus )
+    else:
+      cacheKey = self.__catalogKey + ( allStatus, )
+    successful, missing = self.replicaCache.get( res['Value'].keys(), cacheKey )
+    failed = {}
+    if missing:
+      if defaultCatalogs:
+        res = FileCatalog( vo = self.vo ).getReplicas( missing, **kwargs )
+      else:
+        res = self.fc.getReplicas( missing, **kwargs )
+      if not res['OK']:
+        return res
+      self.replicaCache.add( res['Value']['Successful'], cacheKey )
+      successful.update( res['Value']['Successful'] )
+      failed = res['Value']['Failed']
+    return S_OK( { 'Successful' : successful, 'Failed' : failed } )
+
+  def __invalidateReplicaCache( self, lfns ):
+    """ Forget the cached replicas of LFNs modified in the catalogs """
+    if self.replicaCache:
+      self.replicaCache.invalidate( lfns )
+
+  def getReplicaCacheStats( self ):
+    """ Get the hit/miss counters of the replica cache """
+    if not self.replicaCache:
+      return S_ERROR( "Replica cache is not enabled" )
+    return S_OK( self.replicaCache.getStats() )
+
 
   ##################################################################################################3
   # Methods from the catalogToStorage. It would all work with the direct call to the SE, but this checks
@@ -1579,7 +1642,7 @@ class DataManager( object ):
     # # default value
     kwargs = kwargs if kwargs else {}
     # # get replicas for lfn
-    res = FileCatalog( vo = self.vo ).getReplicas( lfn )
+    res = self.__getCatalogReplicas( lfn, defaultCatalogs = True )
     if not res["OK"]:
       errStr = "__executeIfReplicaExists: Completely failed to get replicas for LFNs."
       self.log.debug( errStr, res["Message"] )
@@ -0,0 +1,137 @@
+""" Per process cache of the replicas returned by the file catalogs
+
+    The DataManager can keep the replicas of the LFNs it looked up for a short
+    time, so that the sequences of operations on the same files done by agents
+    and jobs (replicate, remove, check...) do not query the catalogs each time.
+    The entries expire after their life time, the least recently used ones are
+    evicted when the cache is full and the DataManager write operations
+    invalidate the LFNs they modify.
+"""
+
+__RCSID__ = "$Id$"
+
+import time
+import heapq
+import threading
+
+class ReplicaCache( object ):
+
+  def __init__( self, lifeTime = 60, maxSize = 10000 ):
+    """
+    :param lifeTime: seconds the replicas of a LFN are kept
+    :param maxSize: maximum number of LFNs in the cache
+    """
+    self.lifeTime = lifeTime
+    self.maxSize = maxSize
+    self.__lock = threading.Lock()
+    # lfn -> [ lastUse, { cacheKey : ( expirationTime, replicas ) } ]
+    self.__cache = {}
+    self.__stats = { 'Hits' : 0, 'Misses' : 0, 'Evictions' : 0, 'Invalidations' : 0 }
+
+  def get( self, lfns, cacheKey ):
+    """ Get the cached replicas of the LFNs
+
+    :param cacheKey: identifies the catalogs and options of the lookup
+    :return: ( { lfn : replicas } for the cached LFNs, list of the LFNs not cached )
+    """
+    now = time.time()
+    found = {}
+    missing = []
+    self.__lock.acquire()
+    try:
+      for lfn in lfns:
+        entry = self.__cache.get( lfn )
+        cached = entry and entry[1].get( cacheKey )
+        if cached and cached[0] > now:
+          entry[0] = now
+          found[ lfn ] = dict( cached[1] )
+        else:
+          missing.append( lfn )
+      self.__stats[ 'Hits' ] += len( found )
+      self.__stats[ 'Misses' ] += len( missing )
+    finally:
+      self.__lock.release()
+    return found, missing
+
+  def add( self, replicaDict, cacheKey ):
+    """ Keep the replicas of the LFNs in replicaDict ( { lfn : { se : pfn } } )
+    """
+    now = time.time()
+    expirationTime = now + self.lifeTime
+    self.__lock.acquire()
+    try:
+      for lfn, replicas in replicaDict.items():
+        entry = self.__cache.setdefault( lfn, [ now, {} ] )
+        entry[0] = now
+        entry[1][ cacheKey ] = ( expirationTime, dict( replicas ) )
+      if len( self.__cache ) > self.maxSize:
+        self.__evict()
+    finally:
+      self.__lock.release()
+
+  def __evict( self ):
+    """ Remove the expired entries and, if it is not enough, the least recently used ones.
+        Called with the lock held
+    """
+    now = time.time()
+    for lfn in self.__cache.keys():
+      entries = self.__cache[ lfn ][1]
+      for cacheKey in [ cacheKey for cacheKey in entries if entries[ cacheKey ][0] <= now ]:
+        del entries[ cacheKey ]
+      if not entries:
+        del self.__cache[ lfn ]
+        self.__stats[ 'Evictions' ] += 1
+    # Make room for a tenth of the size to not evict on each addition
+    toEvict = len( self.__cache ) - self.maxSize * 9 / 10
+    if toEvict > 0:
+      for _lastUse, lfn in heapq.nsmallest( toEvict, [ ( self.__cache[ lfn ][0], lfn ) for lfn in self.__cache ] ):
+        del self.__cache[ lfn ]
+      self.__stats[ 'Evictions' ] += toEvict
+
+  def invalidate( self, lfns ):
+    """ Forget the replicas of the LFNs
+    """
+    self.__lock.acquire()
+    try:
+      for lfn in lfns:
+        if self.__cache.pop( lfn, None ):
+          self.__stats[ 'Invalidations' ] += 1
+    finally:
+      self.__lock.release()
+
+  def invalidateDirectory( self, directory ):
+    """ Forget the replicas of all the LFNs in a directory tree
+    """
+    prefix = "%s/" % directory.rstrip( '/' )
+    self.__lock.acquire()
+    try:
+      lfns = [ lfn for lfn in self.__cache if lfn.startswith( prefix ) ]
+    finally:
+      self.__lock.release()
+    self.invalidate( lfns )
+
+  def purge( self ):
+    self.__lock.acquire()
+    try:
+      self.__cache = {}
+    finally:
+      self.__lock.release()
+
+  def getStats( self ):
+    """ Hits, Misses, Evictions and Invalidations counters and current Size
+    """
+    self.__lock.acquire()
+    try:
+      stats = dict( self.__stats )
+      stats[ 'Size' ] = len( self.__cache )
+    finally:
+      self.__lock.release()
+    return stats
+
+gReplicaCache = None
+
+def getGlobalReplicaCache():
+  global gReplicaCache
+  if not gReplicaCache:
+    gReplicaCache = ReplicaCache()
+  return gReplicaCache
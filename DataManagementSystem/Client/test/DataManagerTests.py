@@ -0,0 +1,80 @@
+########################################################################
+# File: DataManagerTests.py
+########################################################################
+
+""" :mod: DataManagerTests
+    ======================
+
+    .. module: DataManagerTests
+    :synopsis: unittest for the replica cache of the DataManager class
+
+    unittest for the replica cache of the DataManager class, with the catalogs mocked
+"""
+
+# # imports
+import unittest
+from mock import MagicMock, patch
+# # SUT
+from DIRAC import S_OK
+from DIRAC.DataManagementSystem.Client import DataManager as DataManagerModule
+from DIRAC.DataManagementSystem.Client.DataManager import DataManager
+from DIRAC.DataManagementSystem.Client.ReplicaCache import ReplicaCache
+
+########################################################################
+class DataManagerTests( unittest.TestCase ):
+  """
+  .. class:: DataManagerTests
+
+  """
+
+  def setUp( self ):
+    """ test set up """
+    self.options = {}
+    self.replicaCache = ReplicaCache()
+    operations = MagicMock()
+    operations.return_value.getValue.side_effect = lambda option, default = None: self.options.get( option, default )
+    self.fileCatalog = MagicMock()
+    self.fileCatalog.return_value.getReplicas.return_value = S_OK( { "Successful" : { "/lhcb/a" : { "CERN-DST" : "srm://cern/a" } },
+                                                                     "Failed" : {} } )
+    self.patches = [ patch.object( DataManagerModule, "Operations", operations ),
+                     patch.object( DataManagerModule, "FileCatalog", self.fileCatalog ),
+                     patch.object( DataManagerModule, "ResourceStatus", MagicMock() ),
+                     patch.object( DataManagerModule, "getRegistrationProtocols", MagicMock() ),
+                     patch.object( DataManagerModule, "getThirdPartyProtocols", MagicMock() ),
+                     patch.object( DataManagerModule, "getGlobalReplicaCache", lambda: self.replicaCache ) ]
+    for patcher in self.patches:
+      patcher.start()
+
+  def tearDown( self ):
+    """ test tear down """
+    for patcher in self.patches:
+      patcher.stop()
+
+  def test01noCatalogs( self ):
+    """ no catalogs, with and without replica cache """
+    for useReplicaCache in ( False, True ):
+      self.options["DataManagement/UseReplicaCache"] = useReplicaCache
+      dm = DataManager( catalogs = None )
+      self.assertEqual( bool( dm.replicaCache ), useReplicaCache )
+      res = dm.getReplicas( "/lhcb/a" )
+      self.assertTrue( res["OK"] )
+      self.assertEqual( res["Value"]["Successful"].keys(), [ "/lhcb/a" ] )
+
+  def test02catalogKey( self ):
+    """ no catalogs and an empty list of catalogs share the entries of the default catalogs """
+    self.options["DataManagement/UseReplicaCache"] = True
+    getReplicas = self.fileCatalog.return_value.getReplicas
+    DataManager( catalogs = None ).getReplicas( "/lhcb/a" )
+    DataManager( catalogs = [] ).getReplicas( "/lhcb/a" )
+    self.assertEqual( getReplicas.call_count, 1 )
+    DataManager( catalogs = "LcgFileCatalog" ).getReplicas( "/lhcb/a" )
+    self.assertEqual( getReplicas.call_count, 2 )
+    DataManager( catalogs = [ "LcgFileCatalog" ] ).getReplicas( "/lhcb/a" )
+    self.assertEqual( getReplicas.call_count, 2 )
+
+# # test execution
+if __name__ == "__main__":
+  testLoader = unittest.TestLoader()
+  suite = testLoader.loadTestsFromTestCase( DataManagerTests )
+  suite = unittest.TestSuite( [ suite ] )
+  unittest.TextTestRunner( verbosity = 3 ).run( suite )
@@ -0,0 +1,78 @@
+########################################################################
+# File: ReplicaCacheTests.py
+########################################################################
+
+""" :mod: ReplicaCacheTests
+    =======================
+
+    .. module: ReplicaCacheTests
+    :synopsis: unittest for ReplicaCache class
+
+    unittest for ReplicaCache class
+"""
+
+# # imports
+import time
+import unittest
+# # SUT
+from DIRAC.DataManagementSystem.Client.ReplicaCache import ReplicaCache
+
+########################################################################
+class ReplicaCacheTests( unittest.TestCase ):
+  """
+  .. class:: ReplicaCacheTests
+
+  """
+
+  def setUp( self ):
+    """ test set up """
+    self.replicas = { "/lhcb/a" : { "CERN-DST" : "srm://cern/a" },
+                      "/lhcb/dir/b" : { "CERN-DST" : "srm://cern/b", "CNAF-DST" : "srm://cnaf/b" } }
+
+  def test01getAdd( self ):
+    """ cached replicas are returned as copies """
+    cache = ReplicaCache()
+    self.assertEqual( cache.get( [ "/lhcb/a" ], "key" ), ( {}, [ "/lhcb/a" ] ) )
+    cache.add( self.replicas, "key" )
+    found, missing = cache.get( [ "/lhcb/a", "/lhcb/c" ], "key" )
+    self.assertEqual( found, { "/lhcb/a" : self.replicas["/lhcb/a"] } )
+    self.assertEqual( missing, [ "/lhcb/c" ] )
+    found["/lhcb/a"].pop( "CERN-DST" )
+    self.assertEqual( cache.get( [ "/lhcb/a" ], "key" )[0], { "/lhcb/a" : self.replicas["/lhcb/a"] } )
+    self.assertEqual( cache.get( [ "/lhcb/a" ], "otherKey" )[1], [ "/lhcb/a" ] )
+    stats = cache.getStats()
+    self.assertEqual( ( stats["Hits"], stats["Misses"], stats["Size"] ), ( 2, 3, 2 ) )
+
+  def test02expiration( self ):
+    """ entries expire after their life time """
+    cache = ReplicaCache( lifeTime = 0.1 )
+    cache.add( self.replicas, "key" )
+    time.sleep( 0.2 )
+    self.assertEqual( cache.get( [ "/lhcb/a" ], "key" )[0], {} )
+
+  def test03invalidate( self ):
+    """ invalidation of LFNs and directories """
+    cache = ReplicaCache()
+    cache.add( self.replicas, "key" )
+    cache.invalidate( [ "/lhcb/a" ] )
+    self.assertEqual( cache.get( self.replicas.keys(), "key" )[1], [ "/lhcb/a" ] )
+    cache.invalidateDirectory( "/lhcb/dir/" )
+    self.assertEqual( cache.getStats()["Size"], 0 )
+
+  def test04eviction( self ):
+    """ least recently used entries are evicted """
+    cache = ReplicaCache( maxSize = 10 )
+    for i in range( 10 ):
+      cache.add( { "/lhcb/%d" % i : {} }, "key" )
+    cache.get( [ "/lhcb/0" ], "key" )
+    cache.add( { "/lhcb/10" : {} }, "key" )
+    self.assertTrue( cache.getStats()["Size"] <= 10 )
+    self.assertEqual( cache.get( [ "/lhcb/0", "/lhcb/10" ], "key" )[1], [] )
+    self.assertEqual( cache.get( [ "/lhcb/1" ], "key" )[1], [ "/lhcb/1" ] )
+
+# # test execution
+if __name__ == "__main__":
+  testLoader = unittest.TestLoader()
+  suite = testLoader.loadTestsFromTestCase( ReplicaCacheTests )
+  suite = unittest.TestSuite( [ suite ] )
+  unittest.TextTestRunner( verbosity = 3 ).run( suite )
@@ -791,6 +791,22 @@ class FileManager( FileManagerBase ):
   def _getDirectoryReplicas( self, dirID, allStatus=False, connection=False ):
     """ Get replicas for files in a given directory
     """
+    result = self.__getDirectoryReplicasReq( dirID, allStatus, connection=connection )
+    if not result['OK']:
+      return result
+    return self.db._query( result['Value'], connection )
+
+  def _getDirectoryReplicasIter( self, dirID, allStatus=False, connection=False ):
+    """ Get replicas for files in a given directory, streamed in batches
+    """
+    result = self.__getDirectoryReplicasReq( dirID, allStatus, connection=connection )
+    if not result['OK']:
+      return iter( [ result ] )
+    return self.db._queryIter( result['Value'] )
+
+  def __getDirectoryReplicasReq( self, dirID, allStatus=False, connection=False ):
+    """ Build the query of the replicas for files in a given directory
+    """
     replicaStatusIDs = []
     if not allStatus:
       for status in self.db.visibleReplicaStatus:
@@ -821,5 +837,4 @@ class FileManager( FileManagerBase ):
       if fileStatusIDs:
         req += ' AND FF.Status in (%s)' % intListToString( fileStatusIDs )                                                                             
     
-    result = self.db._query( req, connection )
-    return result
+    return S_OK( req )
@@ -189,6 +189,12 @@ class FileManagerBase( object ):
 
     return S_ERROR( "To be implemented on derived class" )
 
+  def _getDirectoryReplicasIter( self, dirID, allStatus = False, connection = False ):
+    """ Same as _getDirectoryReplicas but returning an iterator over S_OK structures
+        with batches of replicas. Derived classes can stream the replicas from the DB
+    """
+    return iter( [ self._getDirectoryReplicas( dirID, allStatus, connection ) ] )
+
   def countFilesInDir( self, dirId ):
     """ Count how many files there is in a given Directory
 
@@ -1247,22 +1253,21 @@ class FileManagerBase( object ):
                           If False, take the visibleFileStatus and visibleReplicaStatus values from the configuration
     """
     connection = self._getConnection( connection )
-    result = self._getDirectoryReplicas( dirID, allStatus, connection)
-    if not result['OK']:
-      return result
-    
     resultDict = {}
     seDict = {}
-    for fileName, fileID, seID, pfn in result['Value']:
-      resultDict.setdefault( fileName, {} )
-      if not seID in seDict:
-        res = self.db.seManager.getSEName(seID)
-        if not res['OK']:
-          seDict[seID] = 'Unknown'
-        else:  
-          seDict[seID] = res['Value']
-      se = seDict[seID]    
-      resultDict[fileName][se] = pfn
+    for result in self._getDirectoryReplicasIter( dirID, allStatus, connection ):
+      if not result['OK']:
+        return result
+      for fileName, _fileID, seID, pfn in result['Value']:
+        resultDict.setdefault( fileName, {} )
+        if not seID in seDict:
+          res = self.db.seManager.getSEName(seID)
+          if not res['OK']:
+            seDict[seID] = 'Unknown'
+          else:  
+            seDict[seID] = res['Value']
+        se = seDict[seID]    
+        resultDict[fileName][se] = pfn
 
     return S_OK( resultDict )
 
@@ -4,6 +4,7 @@
     The following methods are provided
 
     insertMessage()
+    insertMessages()
     getMessagesByDate()
     getMessagesByFixedText()
     getMessages()
@@ -178,6 +179,11 @@ CREATE  TABLE IF NOT EXISTS `AgentPersistentData` (
     """
     DB.__init__( self, 'SystemLoggingDB', 'Framework/SystemLoggingDB',
                  maxQueueSize, debug = DEBUG )
+    # Keys of the rows of the auxiliary tables, by table and values
+    self.__auxiliaryIDs = {}
+    self.__maxAuxiliaryIDs = 10000
+    self.__messageFields = [ 'MessageTime', 'VariableText', 'UserDNID', 'ClientIPNumberID',
+                             'LogLevel', 'FixedTextID' ]
     if checkTables:
       result = self._checkTable()
       if not result['OK']:
@@ -505,6 +511,85 @@ CREATE  TABLE IF NOT EXISTS `AgentPersistentData` (
 
     return self.insertFields( 'MessageRepository', fieldsList, messageList )
 
+  def __getAuxiliaryID( self, tableName, outFields, inFields, inValues ):
+    """ Cached __insertIntoAuxiliaryTable, for the bulk insertion of messages
+    """
+    cacheKey = ( tableName, ) + tuple( inValues )
+    if cacheKey in self.__auxiliaryIDs:
+      return S_OK( self.__auxiliaryIDs[ cacheKey ] )
+    result = self.__insertIntoAuxiliaryTable( tableName, outFields, inFields, inValues )
+    if result['OK']:
+      if len( self.__auxiliaryIDs ) >= self.__maxAuxiliaryIDs:
+        self.__auxiliaryIDs.clear()
+      self.__auxiliaryIDs[ cacheKey ] = result['Value']
+    return result
+
+  def insertMessages( self, messageList, site, nodeFQDN, userDN, userGroup, remoteAddress ):
+    """ Insert a list of Log messages sent by the same client into the DB. The
+        keys of the auxiliary tables are resolved once per distinct value and kept
+        in a cache, and the messages are inserted in bulk
+    """
+    if not messageList:
+      return S_OK( 0 )
+    result = self.__getMessageRows( messageList, site, nodeFQDN, userDN, userGroup, remoteAddress )
+    if result['OK']:
+      result = self.bulkInsert( 'MessageRepository', self.__messageFields, result['Value'] )
+    if not result['OK']:
+      # The cached keys may refer to removed rows
+      self.__auxiliaryIDs.clear()
+      result = self.__getMessageRows( messageList, site, nodeFQDN, userDN, userGroup, remoteAddress )
+      if not result['OK']:
+        return result
+      result = self.bulkInsert( 'MessageRepository', self.__messageFields, result['Value'] )
+    return result
+
+  def __getMessageRows( self, messageList, site, nodeFQDN, userDN, userGroup, remoteAddress ):
+    """ Rows of the MessageRepository table for the messages, in the order of __messageFields
+    """
+    result = self.__getAuxiliaryID( 'UserDNs', [ 'UserDNID' ], [ 'OwnerDN', 'OwnerGroup' ], [ userDN, userGroup ] )
+    if not result['OK']:
+      return result
+    userDNID = result['Value']
+
+    if not site:
+      site = 'Unknown'
+    result = self.__getAuxiliaryID( 'Sites', [ 'SiteID' ], [ 'SiteName' ], [ site ] )
+    if not result['OK']:
+      return result
+    result = self.__getAuxiliaryID( 'ClientIPs', [ 'ClientIPNumberID' ],
+                                    [ 'ClientIPNumberString' , 'ClientFQDN', 'SiteID' ],
+                                    [ remoteAddress, nodeFQDN, result['Value'] ] )
+    if not result['OK']:
+      return result
+    clientIPNumberID = result['Value']
+
+    rows = []
+    for message in messageList:
+      messageDate = Time.toString( message.getTime() )
+      messageDate = messageDate[:messageDate.find( '.' )]
+      messageName = message.getName()
+      if not messageName:
+        messageName = 'Unknown'
+      messageSubSystemName = message.getSubSystemName()
+      if not messageSubSystemName:
+        messageSubSystemName = 'Unknown'
+
+      result = self.__getAuxiliaryID( 'Systems', [ 'SystemID' ], [ 'SystemName' ], [ messageName ] )
+      if not result['OK']:
+        return result
+      result = self.__getAuxiliaryID( 'SubSystems', [ 'SubSystemID' ], [ 'SubSystemName', 'SystemID' ],
+                                      [ messageSubSystemName, result['Value'] ] )
+      if not result['OK']:
+        return result
+      result = self.__getAuxiliaryID( 'FixedTextMessages', [ 'FixedTextID' ], [ 'FixedTextString' , 'SubSystemID' ],
+                                      [ message.getFixedMessage(), result['Value'] ] )
+      if not result['OK']:
+        return result
+
+      rows.append( [ messageDate, message.getVariableMessage(), userDNID, clientIPNumberID,
+                     message.getLevel(), result['Value'] ] )
+    return S_OK( rows )
+
   def _insertDataIntoAgentTable( self, agentName, data ):
     """Insert the persistent data needed by the agents running on top of
        the SystemLoggingDB.
@@ -11,7 +11,7 @@ import time
 import threading
 
 from DIRAC import S_OK, S_ERROR, gLogger, rootPath
-from DIRAC.Core.Utilities.DictCache import DictCache
+from DIRAC.Core.Utilities.ResultCache import ResultCache
 from DIRAC.Core.Utilities import Time
 from DIRAC.Core.Utilities.Graphs import graph
 
@@ -20,32 +20,45 @@ class PlotCache:
   def __init__( self, plotsLocation = False ):
     self.plotsLocation = plotsLocation
     self.alive = True
-    self.__graphCache = DictCache( deleteFunction = _deleteGraph )
     self.__graphLifeTime = 600
+    self.__graphCache = ResultCache( "Plots", self.__graphLifeTime, deleteFunction = self._deleteGraph )
     self.purgeThread = threading.Thread( target = self.purgeExpired )
     self.purgeThread.setDaemon( 1 )
     self.purgeThread.start()
 
-  def setPlotsLocation( self, plotsDir ):
+  def setPlotsLocation( self, plotsDir, shared = False ):
+    """
+    Set the directory of the plots. If shared, the plots are shared with the
+    other processes using it, the existing plots are kept
+    """
     self.plotsLocation = plotsDir
+    if shared:
+      self.__graphCache.setCacheDir( os.path.join( plotsDir, "cache" ) )
+      return
     for plot in os.listdir( self.plotsLocation ):
       if plot.find( ".png" ) > 0:
         plotLocation = "%s/%s" % ( self.plotsLocation, plot )
         gLogger.verbose( "Purging %s" % plotLocation )
         os.unlink( plotLocation )
 
+  def setLimits( self, maxEntries ):
+    self.__graphCache.setLimits( maxEntries )
+
   def purgeExpired( self ):
     while self.alive:
       time.sleep( self.__graphLifeTime )
       self.__graphCache.purgeExpired()
+      gLogger.info( "Plot cache usage", str( self.getStats() ) )
+
+  def getStats( self ):
+    return self.__graphCache.getStats()
 
   def getPlot( self, plotHash, plotData, plotMetadata, subplotMetadata ):
     """
-    Get plot from the cache if exists, else generate it
+    Get plot from the cache if exists, else generate it.
+    Concurrent requests of the same plot only generate it once
     """
-
-    plotDict = self.__graphCache.get( plotHash )
-    if plotDict == False:
+    def generatePlot():
       basePlotFileName = "%s/%s.png" % ( self.plotsLocation, plotHash )
       if subplotMetadata:
         retVal = graph( plotData, basePlotFileName, plotMetadata, metadata = subplotMetadata )
@@ -56,8 +69,9 @@ class PlotCache:
       plotDict = retVal[ 'Value' ]
       if plotDict[ 'plot' ]:
         plotDict[ 'plot' ] = os.path.basename( basePlotFileName )
-      self.__graphCache.add( plotHash, self.__graphLifeTime, plotDict )
-    return S_OK( plotDict )
+      return S_OK( plotDict )
+
+    return self.__graphCache.getOrGenerate( plotHash, generatePlot )
 
   def getPlotData( self, plotFileName ):
     filename = "%s/%s" % ( self.plotsLocation, plotFileName )
@@ -69,13 +83,15 @@ class PlotCache:
       return S_ERROR( "Can't open file %s: %s" % ( plotFileName, str( v ) ) )
     return S_OK( data )
 
-def _deleteGraph( plotDict ):
-  try:
-    for key in plotDict:
-      value = plotDict[ key ]
-      if value and os.path.isfile( value ):
-        os.unlink( value )
-  except:
-    pass
+  def _deleteGraph( self, plotDict ):
+    try:
+      for key in plotDict:
+        value = plotDict[ key ]
+        if value:
+          fPath = os.path.join( self.plotsLocation, str( value ) )
+          if os.path.isfile( fPath ):
+            os.unlink( fPath )
+    except:
+      pass
 
 gPlotCache = PlotCache()
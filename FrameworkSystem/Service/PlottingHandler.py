@@ -42,7 +42,9 @@ def initializePlottingHandler( serviceInfo ):
     gLogger.fatal( "Can't write to %s" % dataPath )
     return S_ERROR( "Data location is not writable" )
 
-  gPlotCache.setPlotsLocation( dataPath )
+  #Clones of the service on the same host can share the cached plots through the data location
+  gPlotCache.setPlotsLocation( dataPath, gConfig.getValue( "%s/SharedCache" % plottingSection, False ) )
+  gPlotCache.setLimits( gConfig.getValue( "%s/CacheMaxEntries" % plottingSection, 1000 ) )
   gMonitor.registerActivity( "plotsDrawn", "Drawn plot images", "Plotting requests", "plots", gMonitor.OP_SUM )
   return S_OK()
 
@@ -63,6 +65,12 @@ class PlottingHandler( RequestHandler ):
       return result
     return S_OK( result['Value']['plot'] )
 
+  types_getCacheStats = []
+  def export_getCacheStats( self ):
+    """ Get the usage of the plot cache
+    """
+    return S_OK( gPlotCache.getStats() )
+
   def transfer_toClient( self, fileId, token, fileHelper ):
     """
     Get graphs data
@@ -5,14 +5,20 @@ in the DISET framework.
 The following methods are available in the Service interface::
 
     addMessages()
+    addCompressedMessages()
+
+The MaxBundleSize option of the service limits the size of a decompressed bundle
+of messages, in bytes ( 10485760 ).
 
 """
 __RCSID__ = "$Id$"
 
+import zlib
 from types import ListType, StringTypes
 
 from DIRAC                                            import S_OK, S_ERROR, gLogger
 from DIRAC.Core.DISET.RequestHandler                  import RequestHandler
+from DIRAC.Core.Utilities                             import DEncode
 from DIRAC.FrameworkSystem.private.logging.Message    import tupleToMessage
 from DIRAC.FrameworkSystem.DB.SystemLoggingDB         import SystemLoggingDB
 
@@ -34,9 +40,9 @@ class SystemLoggingHandler( RequestHandler ):
   """ This is server
   """
 
-  def __addMessage( self, messageObject, site, nodeFQDN ):
+  def __addMessages( self, messageList, site, nodeFQDN ):
     """  
-    This is the function that actually adds the Message to 
+    This is the function that actually adds the Messages to 
     the log Database
     """
     credentials = self.getRemoteCredentials()
@@ -50,7 +56,7 @@ class SystemLoggingHandler( RequestHandler ):
       userGroup = 'unknown'
 
     remoteAddress = self.getRemoteAddress()[0]
-    return gLogDB.insertMessage( messageObject, site, nodeFQDN, userDN, userGroup, remoteAddress )
+    return gLogDB.insertMessages( messageList, site, nodeFQDN, userDN, userGroup, remoteAddress )
 
 
   types_addMessages = [ ListType, StringTypes, StringTypes ]
@@ -68,12 +74,32 @@ class SystemLoggingHandler( RequestHandler ):
       S_ERROR if an exception was raised
 
     """
-    for messageTuple in messagesList:
-      messageObject = tupleToMessage( messageTuple )
-      result = self.__addMessage( messageObject, site, nodeFQDN )
-      if not result['OK']:
-        gLogger.error( 'The Log Message could not be inserted into the DB',
-                       'because: "%s"' % result['Message'] )
-        return S_ERROR( result['Message'] )
+    try:
+      messageList = [ tupleToMessage( messageTuple ) for messageTuple in messagesList ]
+    except Exception, x:
+      return S_ERROR( 'Invalid Log Messages: %s' % str( x ) )
+    result = self.__addMessages( messageList, site, nodeFQDN )
+    if not result['OK']:
+      gLogger.error( 'The Log Messages could not be inserted into the DB',
+                     'because: "%s"' % result['Message'] )
+      return S_ERROR( result['Message'] )
     return S_OK()
 
+  types_addCompressedMessages = [ StringTypes, StringTypes, StringTypes ]
+  def export_addCompressedMessages( self, compressedMessages, site, nodeFQDN ):
+    """
+    Same as addMessages, for a list of Message tuples DEncoded and compressed with zlib
+    """
+    maxBundleSize = self.getCSOption( 'MaxBundleSize', 10485760 )
+    try:
+      decompressor = zlib.decompressobj()
+      encodedMessages = decompressor.decompress( compressedMessages, maxBundleSize )
+      if decompressor.unconsumed_tail:
+        return S_ERROR( 'Log Messages are larger than %s bytes once decompressed' % maxBundleSize )
+      messagesList = DEncode.decode( encodedMessages )[0]
+    except Exception, x:
+      return S_ERROR( 'Could not decode the Log Messages: %s' % str( x ) )
+    if type( messagesList ) != ListType:
+      return S_ERROR( 'Log Messages should be a list' )
+    return self.export_addMessages( messagesList, site, nodeFQDN )
+
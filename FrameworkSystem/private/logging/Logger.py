@@ -6,7 +6,6 @@ __RCSID__ = "$Id$"
 
 import sys
 import traceback
-import inspect
 from DIRAC.FrameworkSystem.private.logging.LogLevels import LogLevels
 from DIRAC.FrameworkSystem.private.logging.Message import Message
 from DIRAC.Core.Utilities import Time, List
@@ -16,12 +15,27 @@ import DIRAC
 
 DEBUG = 1
 
+# Absolute values of the levels, messages below the minimum level of the logger
+# are discarded before anything is built for them
+_levels = LogLevels()
+ALWAYS_VALUE = abs( _levels.getLevelValue( _levels.always ) )
+NOTICE_VALUE = abs( _levels.getLevelValue( _levels.notice ) )
+INFO_VALUE = abs( _levels.getLevelValue( _levels.info ) )
+VERBOSE_VALUE = abs( _levels.getLevelValue( _levels.verbose ) )
+DEBUG_VALUE = abs( _levels.getLevelValue( _levels.debug ) )
+WARN_VALUE = abs( _levels.getLevelValue( _levels.warn ) )
+ERROR_VALUE = abs( _levels.getLevelValue( _levels.error ) )
+EXCEPTION_VALUE = abs( _levels.getLevelValue( _levels.exception ) )
+FATAL_VALUE = abs( _levels.getLevelValue( _levels.fatal ) )
+
 class Logger:
 
   defaultLogLevel = 'NOTICE'
 
   def __init__( self ):
     self._minLevel = 0
+    # Minimum level of the logger the messages are processed by
+    self._levelGate = 0
     self._showCallingFrame = False
     self._systemName = False
     self._outputList = []
@@ -40,6 +54,12 @@ class Logger:
   def showThreadIDs( self, yesno = True ):
     self.__backendOptions[ 'showThreads' ] = yesno
 
+  def showCallingFrame( self, yesno = True ):
+    """ Add the file and line of the caller to the debug messages. It walks the
+        stack for each message so it is off unless LogShowLine is set
+    """
+    self._showCallingFrame = yesno
+
   def registerBackends( self, desiredBackends ):
     self._backendsDict = {}
     for backend in desiredBackends:
@@ -54,6 +74,7 @@ class Logger:
     self._systemName = "Framework"
     self.registerBackends( [ 'stdout' ] )
     self._minLevel = self._logLevels.getLevelValue( "NOTICE" )
+    self._refreshLevelGate()
     #HACK to take into account dev levels before the command line if fully parsed
     debLevs = 0
     for arg in sys.argv:
@@ -125,85 +146,75 @@ class Logger:
     levelName = levelName.upper()
     if levelName in self._logLevels.getLevels():
       self._minLevel = abs( self._logLevels.getLevelValue( levelName ) )
+      self._refreshLevelGate()
       return True
     return False
 
+  def _getEffectiveMinLevel( self ):
+    """ Minimum level of the messages processed by this logger
+    """
+    return self._minLevel
+
+  def _refreshLevelGate( self ):
+    self._levelGate = self._getEffectiveMinLevel()
+    for subLogger in self._subLoggersDict.values():
+      subLogger._refreshLevelGate()
+
   def getLevel( self ):
     return self._logLevels.getLevel( self._minLevel )
 
   def shown( self, levelName ):
+    """ Check if the messages of a level are shown, to avoid building expensive
+        messages that would be discarded
+    """
     levelName = levelName.upper()
     if levelName in self._logLevels.getLevels():
-      return self._logLevels.getLevelValue( levelName ) <= levelName
+      return abs( self._logLevels.getLevelValue( levelName ) ) >= self._levelGate
     return False
 
   def getName( self ):
     return self._systemName
 
   def always( self, sMsg, sVarMsg = '' ):
-    messageObject = Message( self._systemName,
-                             self._logLevels.always,
-                             Time.dateTime(),
-                             sMsg,
-                             sVarMsg,
-                             self.__discoverCallingFrame() )
-    return self.processMessage( messageObject )
+    if self._levelGate > ALWAYS_VALUE:
+      return True
+    return self.__logMessage( self._logLevels.always, sMsg, sVarMsg )
 
   def notice( self, sMsg, sVarMsg = '' ):
-    messageObject = Message( self._systemName,
-                             self._logLevels.notice,
-                             Time.dateTime(),
-                             sMsg,
-                             sVarMsg,
-                             self.__discoverCallingFrame() )
-    return self.processMessage( messageObject )
+    if self._levelGate > NOTICE_VALUE:
+      return True
+    return self.__logMessage( self._logLevels.notice, sMsg, sVarMsg )
 
   def info( self, sMsg, sVarMsg = '' ):
-    messageObject = Message( self._systemName,
-                             self._logLevels.info,
-                             Time.dateTime(),
-                             sMsg,
-                             sVarMsg,
-                             self.__discoverCallingFrame() )
-    return self.processMessage( messageObject )
+    if self._levelGate > INFO_VALUE:
+      return True
+    return self.__logMessage( self._logLevels.info, sMsg, sVarMsg )
 
   def verbose( self, sMsg, sVarMsg = '' ):
-    messageObject = Message( self._systemName,
-                             self._logLevels.verbose,
-                             Time.dateTime(),
-                             sMsg,
-                             sVarMsg,
-                             self.__discoverCallingFrame() )
-    return self.processMessage( messageObject )
+    if self._levelGate > VERBOSE_VALUE:
+      return True
+    return self.__logMessage( self._logLevels.verbose, sMsg, sVarMsg )
 
   def debug( self, sMsg, sVarMsg = '' ):
-    messageObject = Message( self._systemName,
-                             self._logLevels.debug,
-                             Time.dateTime(),
-                             sMsg,
-                             sVarMsg,
-                             self.__discoverCallingFrame() )
-    return self.processMessage( messageObject )
+    if self._levelGate > DEBUG_VALUE:
+      return True
+    return self.__logMessage( self._logLevels.debug, sMsg, sVarMsg )
 
   def warn( self, sMsg, sVarMsg = '' ):
-    messageObject = Message( self._systemName,
-                             self._logLevels.warn,
-                             Time.dateTime(),
-                             sMsg,
-                             sVarMsg,
-                             self.__discoverCallingFrame() )
-    return self.processMessage( messageObject )
+    if self._levelGate > WARN_VALUE:
+      return True
+    return self.__logMessage( self._logLevels.warn, sMsg, sVarMsg )
 
   def error( self, sMsg, sVarMsg = '' ):
-    messageObject = Message( self._systemName,
-                             self._logLevels.error,
-                             Time.dateTime(),
-                             sMsg,
-                             sVarMsg,
-                             self.__discoverCallingFrame() )
-    return self.processMessage( messageObject )
+    if self._levelGate > ERROR_VALUE:
+      return True
+    return self.__logMessage( self._logLevels.error, sMsg, sVarMsg )
 
   def exception( self, sMsg = "", sVarMsg = '', lException = False, lExcInfo = False ):
+    if self._levelGate > EXCEPTION_VALUE:
+      return True
+    if callable( sVarMsg ):
+      sVarMsg = sVarMsg()
     if sVarMsg:
       sVarMsg += "\n%s" % self.__getExceptionString( lException, lExcInfo )
     else:
@@ -213,27 +224,39 @@ class Logger:
                              Time.dateTime(),
                              sMsg,
                              sVarMsg,
-                             self.__discoverCallingFrame() )
+                             self.__discoverCallingFrame( 2 ) )
     return self.processMessage( messageObject )
 
   def fatal( self, sMsg, sVarMsg = '' ):
-    messageObject = Message( self._systemName,
-                             self._logLevels.fatal,
-                             Time.dateTime(),
-                             sMsg,
-                             sVarMsg,
-                             self.__discoverCallingFrame() )
-    return self.processMessage( messageObject )
+    if self._levelGate > FATAL_VALUE:
+      return True
+    return self.__logMessage( self._logLevels.fatal, sMsg, sVarMsg )
 
   def showStack( self ):
+    if self._levelGate > DEBUG_VALUE:
+      return
     messageObject = Message( self._systemName,
                              self._logLevels.debug,
                              Time.dateTime(),
                              "",
                              self.__getStackString(),
-                             self.__discoverCallingFrame() )
+                             self.__discoverCallingFrame( 2 ) )
     self.processMessage( messageObject )
 
+  def __logMessage( self, level, sMsg, sVarMsg ):
+    """ Build and process a message that passed the level check. The variable
+        part can be a callable returning it, so that it is only formatted here
+    """
+    if callable( sVarMsg ):
+      sVarMsg = sVarMsg()
+    messageObject = Message( self._systemName,
+                             level,
+                             Time.dateTime(),
+                             sMsg,
+                             sVarMsg,
+                             self.__discoverCallingFrame() )
+    return self.processMessage( messageObject )
+
   def processMessage( self, messageObject ):
     if self.__testLevel( messageObject.getLevel() ):
       if not messageObject.getName():
@@ -282,12 +305,16 @@ class Logger:
                          stack )
 
 
-  def __discoverCallingFrame( self ):
-    if self.__testLevel( self._logLevels.debug ) and self._showCallingFrame:
-      oActualFrame = inspect.currentframe()
-      lOuterFrames = inspect.getouterframes( oActualFrame )
-      lCallingFrame = lOuterFrames[2]
-      return "%s:%s" % ( lCallingFrame[1].replace( sys.path[0], "" )[1:], lCallingFrame[2] )
+  def __discoverCallingFrame( self, depth = 3 ):
+    """ File and line of the caller of the logger, depth is the number of
+        logger frames to skip including this one
+    """
+    if self._showCallingFrame and self._levelGate <= DEBUG_VALUE:
+      try:
+        callingFrame = sys._getframe( depth )
+      except ValueError:
+        return ""
+      return "%s:%s" % ( callingFrame.f_code.co_filename.replace( sys.path[0], "" )[1:], callingFrame.f_lineno )
     else:
       return ""
 
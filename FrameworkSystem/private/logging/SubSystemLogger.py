@@ -8,14 +8,19 @@ from DIRAC.FrameworkSystem.Client.Logger import Logger
 class SubSystemLogger( Logger ):
 
   def __init__( self, subName, masterLogger, child = True ):
+    self.__masterLogger = masterLogger
     Logger.__init__( self )
     self.__child = child
     for attrName in dir( masterLogger ):
       attrValue = getattr( masterLogger, attrName )
       if type( attrValue ) == types.StringType:
         setattr( self, attrName, attrValue )
-    self.__masterLogger = masterLogger
     self._subName = subName
+    self._refreshLevelGate()
+
+  def _getEffectiveMinLevel( self ):
+    # The messages are filtered by the master logger
+    return self.__masterLogger._getEffectiveMinLevel()
 
   def processMessage( self, messageObject ):
     if self.__child:
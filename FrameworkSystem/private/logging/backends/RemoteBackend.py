@@ -3,10 +3,26 @@ __RCSID__ = "$Id$"
 """This Backend sends the Log Messages to a Log Server
 It will only report to the server ERROR, EXCEPTION, FATAL
 and ALWAYS messages.
+
+The messages are kept in a bounded ring buffer and shipped in bundles limited
+in number of messages and bytes, using a single client. Large bundles are
+compressed. When the buffer is full the oldest messages are dropped and counted,
+and when the server can not be reached the bundles can be spooled to a local
+directory to be sent later. Options (in BackendsOptions):
+
+  MaxBundleMessages : maximum number of messages in a bundle ( 500 )
+  MaxBundleSize : maximum size of a bundle in bytes ( 1048576 )
+  CompressSize : size of the bundles that are compressed in bytes ( 65536 )
+  MaxQueuedMessages : size of the ring buffer ( 10000 )
+  SpoolDirectory : directory to spool the bundles to, no spooling if not defined
+  MaxSpoolSize : maximum size of the spool in MB ( 50 )
 """
+import os
+import time
+import zlib
 import threading
-import Queue
-from DIRAC.Core.Utilities import Time, Network
+from collections import deque
+from DIRAC.Core.Utilities import Time, Network, DEncode
 from DIRAC.FrameworkSystem.private.logging.backends.BaseBackend import BaseBackend
 from DIRAC.FrameworkSystem.private.logging.LogLevels import LogLevels
 
@@ -17,64 +33,196 @@ class RemoteBackend( BaseBackend, threading.Thread ):
     threading.Thread.__init__( self )
     self.__interactive = optionsDictionary[ 'Interactive' ]
     self.__sleep = optionsDictionary[ 'SleepTime' ]
-    self._messageQueue = Queue.Queue()
-    self._Transactions = []
+    self._maxBundledMessages = self.__getIntOption( 'MaxBundleMessages', 500 )
+    self._maxBundleSize = self.__getIntOption( 'MaxBundleSize', 1048576 )
+    self._compressSize = self.__getIntOption( 'CompressSize', 65536 )
+    self._maxSpoolSize = self.__getIntOption( 'MaxSpoolSize', 50 ) * 1048576
+    self._spoolDirectory = optionsDictionary.get( 'SpoolDirectory', '' )
+    self._maxQueuedMessages = max( 1, self.__getIntOption( 'MaxQueuedMessages', 10000 ) )
+    self._messageQueue = deque( maxlen = self._maxQueuedMessages )
+    self._queueLock = threading.Lock()
+    self._wakeUp = threading.Event()
+    self._sendLock = threading.Lock()
+    # Bundle that could not be sent nor spooled, it is retried before the new messages
+    self._pendingBundle = []
+    self._client = None
+    self._compress = True
+    self._stats = { 'sent' : 0, 'dropped' : 0, 'spooled' : 0, 'spoolDropped' : 0 }
+    self._reportedDrops = 0
     self._alive = True
     self._site = optionsDictionary[ 'Site' ]
     self._hostname = Network.getFQDN()
     self._logLevels = LogLevels()
     self._negativeLevel = self._logLevels.getLevelValue( 'ERROR' )
     self._positiveLevel = self._logLevels.getLevelValue( 'ALWAYS' )
-    self._maxBundledMessages = 20
     self.setDaemon(1)
     self.start()
 
+  def __getIntOption( self, optionName, defaultValue ):
+    try:
+      return int( self._optionsDictionary.get( optionName, defaultValue ) )
+    except ( TypeError, ValueError ):
+      return defaultValue
+
   def doMessage( self, messageObject ):
-    self._messageQueue.put( messageObject )
+    if not self._testLevel( messageObject.getLevel() ):
+      return
+    self._queueLock.acquire()
+    try:
+      if len( self._messageQueue ) == self._maxQueuedMessages:
+        # The oldest message is overwritten
+        self._stats[ 'dropped' ] += 1
+      self._messageQueue.append( messageObject )
+      queued = len( self._messageQueue )
+    finally:
+      self._queueLock.release()
+    if queued >= self._maxBundledMessages:
+      self._wakeUp.set()
+
+  def getStats( self ):
+    """ Counters of the messages sent, dropped and spooled
+    """
+    stats = dict( self._stats )
+    stats[ 'queued' ] = len( self._messageQueue )
+    return stats
 
   def run( self ):
-    import time
     while self._alive:
+      self._wakeUp.wait( self.__sleep )
+      self._wakeUp.clear()
       self._bundleMessages()
-      time.sleep( self.__sleep )
+
+  def __getBundle( self ):
+    """ Take the next bundle of messages out of the buffer
+    """
+    bundle = []
+    bundleSize = 0
+    self._queueLock.acquire()
+    try:
+      numDropped = self._stats[ 'dropped' ] + self._stats[ 'spoolDropped' ]
+      if numDropped > self._reportedDrops:
+        bundle.append( ( 'Framework', self._logLevels.warn, Time.toString( Time.dateTime() ),
+                         'Log messages dropped by the RemoteBackend',
+                         '%s in total' % numDropped, '', 'RemoteBackend' ) )
+        self._reportedDrops = numDropped
+      while self._messageQueue and len( bundle ) < self._maxBundledMessages and bundleSize < self._maxBundleSize:
+        messageTuple = self._messageQueue.popleft().toTuple()
+        bundleSize += sum( [ len( str( field ) ) for field in messageTuple ] )
+        bundle.append( messageTuple )
+    finally:
+      self._queueLock.release()
+    return bundle
 
   def _bundleMessages( self ):
-    while not self._messageQueue.empty():
-      bundle = []
-      while ( len( bundle ) < self._maxBundledMessages ) and \
-                ( not self._messageQueue.empty() ):
-        message = self._messageQueue.get()
-        if self._testLevel( message.getLevel() ):
-          bundle.append( message.toTuple() )
-
-      if len( bundle ):
-        self._sendMessageToServer( bundle )
-
-    if len( self._Transactions ):
-      self._sendMessageToServer()
-
-  def _sendMessageToServer( self, messageBundle=None ):
-    from DIRAC.Core.DISET.RPCClient import RPCClient
-    if messageBundle:
-      self._Transactions.append( messageBundle )
-    TransactionsLength = len( self._Transactions )
-    if TransactionsLength > 100:
-      del self._Transactions[:TransactionsLength-100]
-      TransactionsLength = 100
+    self._sendLock.acquire()
+    try:
+      return self.__sendBundles()
+    finally:
+      self._sendLock.release()
+
+  def __sendBundles( self ):
+    if self._pendingBundle:
+      if not self._sendMessageToServer( self._pendingBundle ):
+        return False
+      self._pendingBundle = []
+    serverUp = True
+    while True:
+      bundle = self.__getBundle()
+      if not bundle:
+        break
+      if serverUp:
+        serverUp = self._sendMessageToServer( bundle )
+        if serverUp:
+          continue
+      if not self.__spoolBundle( bundle ):
+        # Keep it and let the new messages fill the ring buffer until the server is back
+        self._pendingBundle = bundle
+        return False
+    if serverUp:
+      return self.__sendSpool()
+    return False
+
+  def __getClient( self ):
+    if not self._client:
+      from DIRAC.Core.DISET.RPCClient import RPCClient
+      self._client = RPCClient( "Framework/SystemLogging" )
+    return self._client
 
+  def _sendMessageToServer( self, messageBundle ):
     try:
-      oSock = RPCClient( "Framework/SystemLogging" )
-    except Exception,v:
+      client = self.__getClient()
+      data = DEncode.encode( messageBundle )
+      if self._compress and len( data ) >= self._compressSize:
+        result = client.addCompressedMessages( zlib.compress( data ), self._site, self._hostname )
+        if not result[ 'OK' ] and 'Unknown method' in result[ 'Message' ]:
+          # Server not supporting compressed bundles
+          self._compress = False
+          result = client.addMessages( messageBundle, self._site, self._hostname )
+      else:
+        result = client.addMessages( messageBundle, self._site, self._hostname )
+    except Exception:
+      self._client = None
+      return False
+    if not result[ 'OK' ]:
       return False
+    self._stats[ 'sent' ] += len( messageBundle )
+    return True
 
-    while TransactionsLength:
-      result = oSock.addMessages( self._Transactions[0],
-                                  self._site, self._hostname )
-      if result['OK']:
-        TransactionsLength = TransactionsLength - 1
-        self._Transactions.pop(0) 
-      else:
+  def __getSpoolFiles( self ):
+    try:
+      return sorted( [ fileName for fileName in os.listdir( self._spoolDirectory ) if fileName.endswith( '.bundle' ) ] )
+    except OSError:
+      return []
+
+  def __spoolBundle( self, messageBundle ):
+    """ Write a bundle to the spool directory, if there is one with some space left
+    """
+    if not self._spoolDirectory:
+      return False
+    try:
+      if not os.path.isdir( self._spoolDirectory ):
+        os.makedirs( self._spoolDirectory )
+      spoolSize = 0
+      for fileName in self.__getSpoolFiles():
+        spoolSize += os.path.getsize( os.path.join( self._spoolDirectory, fileName ) )
+      if spoolSize >= self._maxSpoolSize:
+        self._stats[ 'spoolDropped' ] += len( messageBundle )
+        return True
+      fileName = "%.6f_%s.bundle" % ( time.time(), os.getpid() )
+      filePath = os.path.join( self._spoolDirectory, fileName )
+      spoolFile = open( "%s.tmp" % filePath, "wb" )
+      try:
+        spoolFile.write( zlib.compress( DEncode.encode( messageBundle ) ) )
+      finally:
+        spoolFile.close()
+      os.rename( "%s.tmp" % filePath, filePath )
+    except ( IOError, OSError ):
+      return False
+    self._stats[ 'spooled' ] += len( messageBundle )
+    return True
+
+  def __sendSpool( self ):
+    """ Send the spooled bundles, oldest first
+    """
+    if not self._spoolDirectory:
+      return True
+    for fileName in self.__getSpoolFiles():
+      filePath = os.path.join( self._spoolDirectory, fileName )
+      try:
+        spoolFile = open( filePath, "rb" )
+        try:
+          messageBundle = DEncode.decode( zlib.decompress( spoolFile.read() ) )[0]
+        finally:
+          spoolFile.close()
+      except Exception:
+        # Unreadable, nothing to do with it
+        messageBundle = []
+      if messageBundle and not self._sendMessageToServer( messageBundle ):
         return False
+      try:
+        os.unlink( filePath )
+      except OSError:
+        pass
     return True
 
   def _testLevel( self, sLevel ):
@@ -84,7 +232,5 @@ class RemoteBackend( BaseBackend, threading.Thread ):
 
   def flush( self ):
     self._alive = False
-    if not self.__interactive and self._sendMessageToServer():
-      while not self._messageQueue.empty():
-        self._bundleMessages()
-
+    if not self.__interactive:
+      self._bundleMessages()
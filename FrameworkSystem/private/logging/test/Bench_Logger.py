@@ -0,0 +1,33 @@
+""" Benchmark of the level checks of the Logger
+
+    Usage: python Bench_Logger.py [ numCalls ]
+    times debug calls when the debug level is off, with the level check done
+    first and with the message built before it
+"""
+
+import sys
+import time
+
+from Test_Logger import getLogger
+
+def benchmark( numCalls = 100000 ):
+  """ Time debug calls discarded by the level check and by processMessage
+  """
+  numCalls = int( numCalls )
+  logger, backend = getLogger( 'NOTICE' )
+  subLogger = logger.getSubLogger( 'Sub' )
+  cmd = "SELECT * FROM Jobs WHERE JobID = 1"
+  start = time.time()
+  for _i in xrange( numCalls ):
+    subLogger.debug( '_query:', cmd )
+  gated = time.time() - start
+  start = time.time()
+  for _i in xrange( numCalls ):
+    subLogger._Logger__logMessage( 'DEBUG', '_query:', cmd )
+  built = time.time() - start
+  print "%s disabled debug calls" % numCalls
+  print "Level checked first: %.3fs (%.2f us/call)" % ( gated, gated * 1e6 / numCalls )
+  print "Message built first: %.3fs (%.2f us/call)" % ( built, built * 1e6 / numCalls )
+
+if __name__ == '__main__':
+  benchmark( *sys.argv[1:] )
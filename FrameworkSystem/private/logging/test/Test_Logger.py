@@ -0,0 +1,75 @@
+""" Test cases for the level checks of the Logger
+"""
+
+import unittest
+
+from DIRAC.FrameworkSystem.private.logging.Logger import Logger
+
+class RecordingBackend:
+
+  def __init__( self ):
+    self.messages = []
+
+  def doMessage( self, messageObject ):
+    self.messages.append( messageObject.getMessage() )
+
+  def flush( self ):
+    pass
+
+def getLogger( levelName ):
+  logger = Logger()
+  backend = RecordingBackend()
+  logger._backendsDict = { 'test' : backend }
+  logger.setLevel( levelName )
+  return logger, backend
+
+class LoggerTestCase( unittest.TestCase ):
+
+  def test_levels( self ):
+    logger, backend = getLogger( 'INFO' )
+    logger.debug( "debug" )
+    logger.verbose( "verbose" )
+    logger.info( "info" )
+    logger.always( "always" )
+    self.assertEqual( backend.messages, [ "info ", "always " ] )
+    self.assert_( logger.shown( 'INFO' ) )
+    self.failIf( logger.shown( 'VERBOSE' ) )
+    logger.setLevel( 'DEBUG' )
+    logger.debug( "debug" )
+    self.assertEqual( backend.messages[-1], "debug " )
+
+  def test_defaultLevel( self ):
+    """ A new logger filters with the default level before any setLevel
+    """
+    logger = Logger()
+    self.assert_( logger.shown( 'NOTICE' ) )
+    self.failIf( logger.shown( 'DEBUG' ) )
+
+  def test_lazy( self ):
+    logger, backend = getLogger( 'INFO' )
+    calls = []
+    def format():
+      calls.append( 1 )
+      return "formatted"
+    logger.debug( "Lazy", format )
+    self.assertEqual( calls, [] )
+    logger.info( "Lazy", format )
+    self.assertEqual( calls, [ 1 ] )
+    self.assertEqual( backend.messages, [ "Lazy formatted" ] )
+
+  def test_subLogger( self ):
+    logger, backend = getLogger( 'INFO' )
+    subLogger = logger.getSubLogger( 'Sub' )
+    subSubLogger = subLogger.getSubLogger( 'SubSub' )
+    subSubLogger.verbose( "verbose" )
+    self.failIf( subSubLogger.shown( 'VERBOSE' ) )
+    # The messages are filtered by the level of the master logger
+    logger.setLevel( 'VERBOSE' )
+    self.assert_( subSubLogger.shown( 'VERBOSE' ) )
+    subSubLogger.verbose( "verbose" )
+    self.assertEqual( backend.messages, [ "verbose " ] )
+if __name__ == '__main__':
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( LoggerTestCase )
+  gSuite = unittest.TestSuite( [ gSuite ] )
+  unittest.TextTestRunner( verbosity = 2 ).run( gSuite )
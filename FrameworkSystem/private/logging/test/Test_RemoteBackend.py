@@ -0,0 +1,103 @@
+""" Test cases for the bundling, buffering and spooling of the RemoteBackend
+"""
+
+import zlib
+import shutil
+import tempfile
+import unittest
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.Core.Utilities import Time, DEncode
+from DIRAC.FrameworkSystem.private.logging.Message import Message
+from DIRAC.FrameworkSystem.private.logging.backends.RemoteBackend import RemoteBackend
+
+class FakeClient:
+
+  def __init__( self ):
+    self.up = True
+    self.bundles = []
+
+  def addMessages( self, messagesList, site, nodeFQDN ):
+    if not self.up:
+      return S_ERROR( "Can't connect" )
+    self.bundles.append( list( messagesList ) )
+    return S_OK()
+
+  def addCompressedMessages( self, compressedMessages, site, nodeFQDN ):
+    return self.addMessages( DEncode.decode( zlib.decompress( compressedMessages ) )[0], site, nodeFQDN )
+
+def getMessage( text, level = 'ERROR' ):
+  return Message( 'Test', level, Time.dateTime(), text, '', '' )
+
+class RemoteBackendTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.spoolDir = tempfile.mkdtemp()
+    self.client = FakeClient()
+
+  def tearDown( self ):
+    shutil.rmtree( self.spoolDir )
+
+  def getBackend( self, **options ):
+    optionsDictionary = { 'Interactive' : True, 'SleepTime' : 1000, 'Site' : 'DIRAC.Test.org' }
+    optionsDictionary.update( options )
+    backend = RemoteBackend( optionsDictionary )
+    # The bundles are sent by the test, not by the thread
+    backend._alive = False
+    backend._wakeUp.set()
+    backend.join()
+    backend._client = self.client
+    return backend
+
+  def test_bundles( self ):
+    backend = self.getBackend( MaxBundleMessages = 3, CompressSize = 100 )
+    backend.doMessage( getMessage( "info", 'INFO' ) )
+    for i in range( 7 ):
+      backend.doMessage( getMessage( "error %s" % i ) )
+    self.failUnless( backend._bundleMessages() )
+    self.assertEqual( [ len( bundle ) for bundle in self.client.bundles ], [ 3, 3, 1 ] )
+    self.assertEqual( self.client.bundles[0][0][3], "error 0" )
+    self.assertEqual( backend.getStats()[ 'sent' ], 7 )
+
+  def test_ringBuffer( self ):
+    backend = self.getBackend( MaxQueuedMessages = 5 )
+    for i in range( 8 ):
+      backend.doMessage( getMessage( "error %s" % i ) )
+    self.assertEqual( backend.getStats()[ 'dropped' ], 3 )
+    backend._bundleMessages()
+    texts = [ messageTuple[3] for messageTuple in self.client.bundles[0] ]
+    # The drops are reported before the newest messages
+    self.assertEqual( texts[1:], [ "error %s" % i for i in range( 3, 8 ) ] )
+    self.assertEqual( self.client.bundles[0][0][4], "3 in total" )
+
+  def test_spool( self ):
+    backend = self.getBackend( MaxBundleMessages = 2, SpoolDirectory = self.spoolDir )
+    self.client.up = False
+    for i in range( 5 ):
+      backend.doMessage( getMessage( "error %s" % i ) )
+    self.failIf( backend._bundleMessages() )
+    self.assertEqual( backend.getStats()[ 'spooled' ], 5 )
+    self.client.up = True
+    backend.doMessage( getMessage( "error 5" ) )
+    self.failUnless( backend._bundleMessages() )
+    texts = [ messageTuple[3] for bundle in self.client.bundles for messageTuple in bundle ]
+    self.assertEqual( sorted( texts ), [ "error %s" % i for i in range( 6 ) ] )
+    backend._bundleMessages()
+    self.assertEqual( len( self.client.bundles ), 4 )
+
+  def test_noSpool( self ):
+    backend = self.getBackend( MaxQueuedMessages = 2 )
+    self.client.up = False
+    for i in range( 2 ):
+      backend.doMessage( getMessage( "error %s" % i ) )
+    backend._bundleMessages()
+    for i in range( 2, 5 ):
+      backend.doMessage( getMessage( "error %s" % i ) )
+    self.client.up = True
+    backend._bundleMessages()
+    texts = [ messageTuple[3] for bundle in self.client.bundles for messageTuple in bundle ]
+    self.assertEqual( texts, [ "error 0", "error 1", "Log messages dropped by the RemoteBackend", "error 3", "error 4" ] )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( RemoteBackendTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -0,0 +1,215 @@
+# $HeadURL$
+""" RRDManager storing the activities in RoundRobinFiles and plotting them with
+    the DIRAC Graphs, instead of running rrdtool for each update and plot
+
+    Selected with StorageBackend = native in the Monitoring service section. The
+    round robin files sit next to the rrd ones with a .rrs extension, activities
+    only having an rrd file are reported as unregistered so the clients register
+    them again and the new files are created.
+"""
+__RCSID__ = "$Id$"
+
+import os
+import threading
+try:
+  import hashlib as md5
+except:
+  import md5
+from DIRAC import S_OK, S_ERROR
+from DIRAC.FrameworkSystem.private.monitoring.RRDManager import RRDManager
+from DIRAC.FrameworkSystem.private.monitoring.RoundRobinFile import RoundRobinFile
+
+# The files are shared by all the managers of the process
+gStoreLock = threading.Lock()
+
+class NativeRRDManager( RRDManager ):
+
+  __sizesList = [ [ 200, 'small' ], [ 400, 'small' ], [ 600, 'normal' ], [ 800, 'large' ] ]
+
+  def __getFilePath( self, rrdFile ):
+    return "%s/%s.rrs" % ( self.rrdLocation, rrdFile )
+
+  def existsRRDFile( self, rrdFile ):
+    return os.path.isfile( self.__getFilePath( rrdFile ) )
+
+  def create( self, type, rrdFile, bucketLength ):
+    """
+    Create a round robin file holding a year of buckets
+    """
+    filePath = self.__getFilePath( rrdFile )
+    if os.path.isfile( filePath ):
+      return S_OK()
+    try:
+      os.makedirs( os.path.dirname( filePath ) )
+    except:
+      pass
+    self.log.info( "Creating round robin file %s" % rrdFile )
+    gStoreLock.acquire()
+    try:
+      try:
+        if not os.path.isfile( filePath ):
+          RoundRobinFile.create( filePath, type, bucketLength, 31536000 / bucketLength,
+                                 self.getCurrentBucketTime( bucketLength ) - 86400 ).close()
+      except Exception, e:
+        return S_ERROR( "Can't create round robin file %s: %s" % ( rrdFile, str( e ) ) )
+    finally:
+      gStoreLock.release()
+    return S_OK()
+
+  def update( self, type, rrdFile, bucketLength, valuesList, lastUpdate = 0 ):
+    """
+    Add marks to a round robin file
+    """
+    result = self.updateMany( [ ( type, rrdFile, bucketLength, valuesList, lastUpdate ) ] )
+    if not result[ 'OK' ]:
+      return result
+    if rrdFile not in result[ 'Value' ]:
+      return S_ERROR( "Could not update %s" % rrdFile )
+    return S_OK( result[ 'Value' ][ rrdFile ] )
+
+  def updateMany( self, updatesList ):
+    """
+    Add the marks of several activities at once
+
+    :param list updatesList: ( type, rrdFile, bucketLength, [ ( time, value ), ... ], lastUpdate )
+                             tuples, as the arguments of update
+    :return: S_OK with the last update time of each file that was updated
+    """
+    lastUpdates = {}
+    gStoreLock.acquire()
+    try:
+      for _type, rrdFile, _bucketLength, valuesList, _lastUpdate in sorted( updatesList ):
+        if not valuesList:
+          continue
+        try:
+          rrFile = RoundRobinFile( self.__getFilePath( rrdFile ) )
+        except Exception, e:
+          self.log.warn( "Error opening round robin file", "%s: %s" % ( rrdFile, str( e ) ) )
+          continue
+        try:
+          written = rrFile.update( valuesList )
+          if written < len( valuesList ):
+            self.log.verbose( "Skipped marks older than the last update", "%s: %s" % ( rrdFile, len( valuesList ) - written ) )
+          lastUpdates[ rrdFile ] = rrFile.lastUpdate
+        finally:
+          rrFile.close()
+    finally:
+      gStoreLock.release()
+    self.log.info( "Updated round robin files", len( lastUpdates ) )
+    return S_OK( lastUpdates )
+
+  def fetch( self, rrdFile, fromSecs, toSecs ):
+    """
+    Get the stored values of an activity between two times
+
+    :return: S_OK with a list of ( bucket time, value ), None for unknown buckets
+    """
+    gStoreLock.acquire()
+    try:
+      try:
+        rrFile = RoundRobinFile( self.__getFilePath( rrdFile ) )
+      except Exception, e:
+        return S_ERROR( "Can't open round robin file %s: %s" % ( rrdFile, str( e ) ) )
+      try:
+        return S_OK( rrFile.fetch( fromSecs, toSecs ) )
+      finally:
+        rrFile.close()
+    finally:
+      gStoreLock.release()
+
+  def getPlotData( self, activity, fromSecs, toSecs, plotWidth ):
+    """
+    Values of an activity as they are plotted: the buckets are merged so that
+    there are at most plotWidth of them, "sum" activities show the total of the
+    merged buckets, "acum" ones accumulate it and "mean" and "rate" ones average
+    the buckets. Unknown buckets count as 0
+
+    :return: S_OK with ( { time : value }, plot bucket length )
+    """
+    bucketLength = activity.getBucketLength()
+    mergedBuckets = max( 1, -( -( toSecs - fromSecs ) // ( plotWidth * bucketLength ) ) )
+    activity.setBucketScaleFactor( mergedBuckets )
+    result = self.fetch( activity.getFile(), fromSecs, toSecs )
+    if not result[ 'OK' ]:
+      return result
+    plotBucketLength = bucketLength * mergedBuckets
+    acType = activity.getType()
+    plotData = {}
+    for bucketTime, value in result[ 'Value' ]:
+      if value is None:
+        value = 0.0
+      if acType in ( 'sum', 'acum' ):
+        value *= bucketLength
+      else:
+        value /= float( mergedBuckets )
+      plotTime = bucketTime - bucketTime % plotBucketLength
+      plotData[ plotTime ] = plotData.get( plotTime, 0.0 ) + value
+    if acType == 'acum':
+      total = 0.0
+      for plotTime in sorted( plotData ):
+        total += plotData[ plotTime ]
+        plotData[ plotTime ] = total
+    return S_OK( ( plotData, plotBucketLength ) )
+
+  def __generateName( self, *args ):
+    m = md5.md5()
+    m.update( str( args ) )
+    return m.hexdigest()
+
+  def __drawGraph( self, fromSecs, toSecs, activitiesList, stackActivities, size, title, graphFilename ):
+    from DIRAC.Core.Utilities.Graphs import lineGraph, curveGraph
+    width, graphSize = self.__sizesList[ size ]
+    plotsData = {}
+    span = 0
+    for activity in activitiesList:
+      result = self.getPlotData( activity, fromSecs, toSecs, width )
+      if not result[ 'OK' ]:
+        return result
+      plotData, span = result[ 'Value' ]
+      plotsData[ activity.getLabel() ] = plotData
+    metadata = { 'title' : title,
+                 'starttime' : fromSecs,
+                 'endtime' : toSecs,
+                 'span' : span,
+                 'graph_size' : graphSize,
+                 'limit_labels' : 9999999 }
+    if len( activitiesList ) == 1:
+      # The unit depends on the buckets merged by getPlotData
+      metadata[ 'ylabel' ] = activitiesList[0].getUnit()
+    try:
+      graphFile = open( "%s/%s" % ( self.graphLocation, graphFilename ), "wb" )
+      try:
+        if stackActivities:
+          lineGraph( plotsData, graphFile, **metadata )
+        else:
+          curveGraph( plotsData, graphFile, **metadata )
+      finally:
+        graphFile.close()
+    except Exception, e:
+      return S_ERROR( "Can't generate plot %s: %s" % ( graphFilename, str( e ) ) )
+    return S_OK( graphFilename )
+
+  def groupPlot( self, fromSecs, toSecs, activitiesList, stackActivities, size, graphFilename = "" ):
+    """
+    Generate a group plot
+    """
+    if not graphFilename:
+      graphFilename = "%s.png" % self.__generateName( fromSecs, toSecs, activitiesList, stackActivities )
+    activitiesList.sort()
+    return self.__drawGraph( fromSecs, toSecs, activitiesList, stackActivities, size,
+                             activitiesList[ 0 ].getGroupLabel(), graphFilename )
+
+  def plot( self, fromSecs, toSecs, activity, stackActivities , size, graphFilename = "" ):
+    """
+    Generate a non grouped plot
+    """
+    if not graphFilename:
+      graphFilename = "%s.png" % self.__generateName( fromSecs, toSecs, activity, stackActivities )
+    return self.__drawGraph( fromSecs, toSecs, [ activity ], stackActivities, size,
+                             activity.getLabel(), graphFilename )
+
+  def deleteRRD( self, rrdFile ):
+    try:
+      os.unlink( self.__getFilePath( rrdFile ) )
+    except Exception, e:
+      self.log.error( "Could not delete round robin file", "%s: %s" % ( rrdFile, str( e ) ) )
@@ -157,6 +157,21 @@ class RRDManager:
         self.log.warn( "Error updating rrd file", "%s rrd: %s" % ( rrdFile, retVal[ 'Message' ] ) )
     return S_OK( valuesList[-1][0] )
 
+  def updateMany( self, updatesList ):
+    """
+    Add the marks of several activities
+
+    :param list updatesList: ( type, rrdFile, bucketLength, valuesList, lastUpdate )
+                             tuples, as the arguments of update
+    :return: S_OK with the last update time of each file that was updated
+    """
+    lastUpdates = {}
+    for updateArgs in updatesList:
+      retVal = self.update( *updateArgs )
+      if retVal[ 'OK' ]:
+        lastUpdates[ updateArgs[1] ] = retVal[ 'Value' ]
+    return S_OK( lastUpdates )
+
   def __generateName( self, *args, **kwargs ):
     """
     Generate a random name
@@ -0,0 +1,137 @@
+# $HeadURL$
+""" Round robin file of fixed length buckets, a pure python replacement for the
+    single archive rrd files of the Monitoring service
+
+    The file is a header followed by one double per bucket, the slot of a bucket
+    being its number modulo the number of buckets. It is accessed through mmap so
+    an update only touches the header and the slots it writes. As with the rrd
+    files, "mean" activities store the values as they are and "sum", "acum" and
+    "rate" ones store them as a rate per second.
+"""
+__RCSID__ = "$Id$"
+
+import os
+import mmap
+import struct
+
+MAGIC = "DRR1"
+# magic, type code, bucket length, number of buckets, start time, last update
+HEADER_FORMAT = "<4sIIIqq"
+HEADER_SIZE = struct.calcsize( HEADER_FORMAT )
+VALUE_SIZE = struct.calcsize( "<d" )
+
+# Types stored as a rate per second
+RATE_TYPES = ( 'sum', 'acum', 'rate' )
+TYPE_CODES = { 'mean' : 0, 'sum' : 1, 'acum' : 2, 'rate' : 3 }
+
+class RoundRobinFile( object ):
+
+  def __init__( self, filePath ):
+    """ Open an existing round robin file, use create for new ones
+    """
+    self.filePath = filePath
+    self.__fd = open( filePath, "r+b" )
+    try:
+      self.__map = mmap.mmap( self.__fd.fileno(), 0 )
+    except:
+      self.__fd.close()
+      raise
+    try:
+      magic, typeCode, self.bucketLength, self.numBuckets, self.startTime, self.lastUpdate = \
+             struct.unpack_from( HEADER_FORMAT, self.__map, 0 )
+      if magic != MAGIC or len( self.__map ) != HEADER_SIZE + self.numBuckets * VALUE_SIZE:
+        raise ValueError( "%s is not a round robin file" % filePath )
+    except:
+      self.close()
+      raise
+    self.type = 'mean'
+    for acType in TYPE_CODES:
+      if TYPE_CODES[ acType ] == typeCode:
+        self.type = acType
+
+  @classmethod
+  def create( cls, filePath, acType, bucketLength, numBuckets, startTime ):
+    """ Create a round robin file with all the buckets up to startTime unknown
+    """
+    startTime = int( startTime ) - int( startTime ) % bucketLength
+    tmpPath = "%s.tmp" % filePath
+    fd = open( tmpPath, "wb" )
+    try:
+      fd.write( struct.pack( HEADER_FORMAT, MAGIC, TYPE_CODES.get( acType, 0 ), bucketLength, numBuckets,
+                             startTime, startTime ) )
+      # Sparse file, the buckets are zero until written
+      fd.truncate( HEADER_SIZE + numBuckets * VALUE_SIZE )
+    finally:
+      fd.close()
+    os.rename( tmpPath, filePath )
+    return cls( filePath )
+
+  def close( self ):
+    if self.__map is not None:
+      self.__map.close()
+      self.__map = None
+    self.__fd.close()
+
+  def __slotOffset( self, bucketTime ):
+    return HEADER_SIZE + ( bucketTime / self.bucketLength % self.numBuckets ) * VALUE_SIZE
+
+  def update( self, valuesList, fillValue = 0.0 ):
+    """ Add ( time, value ) pairs, sorted by time. Buckets already written are
+        not modified and the ones skipped are set to fillValue, like the zeros
+        the rrd files were filled with
+
+    :return: number of values written
+    """
+    bucketLength = self.bucketLength
+    written = 0
+    for instant, value in valuesList:
+      bucketTime = int( instant ) - int( instant ) % bucketLength
+      if bucketTime <= self.lastUpdate:
+        continue
+      # Fill the skipped buckets, at most a whole round
+      fillFrom = max( self.lastUpdate + bucketLength, bucketTime - ( self.numBuckets - 1 ) * bucketLength )
+      for fillTime in xrange( fillFrom, bucketTime, bucketLength ):
+        struct.pack_into( "<d", self.__map, self.__slotOffset( fillTime ), fillValue )
+      if self.type in RATE_TYPES:
+        value = float( value ) / bucketLength
+      struct.pack_into( "<d", self.__map, self.__slotOffset( bucketTime ), float( value ) )
+      self.lastUpdate = bucketTime
+      written += 1
+    if written:
+      struct.pack_into( "<q", self.__map, HEADER_SIZE - 8, self.lastUpdate )
+    return written
+
+  def getFirstTime( self ):
+    """ Time of the oldest bucket still in the file
+    """
+    return max( self.startTime + self.bucketLength,
+                self.lastUpdate - ( self.numBuckets - 1 ) * self.bucketLength )
+
+  def fetch( self, fromSecs, toSecs ):
+    """ Values of the buckets between fromSecs and toSecs, as a list of
+        ( bucket time, value ) with None for the unknown buckets
+    """
+    bucketLength = self.bucketLength
+    fromSecs = int( fromSecs ) - int( fromSecs ) % bucketLength
+    toSecs = int( toSecs ) - int( toSecs ) % bucketLength
+    firstTime = self.getFirstTime()
+    # Contiguous slots are read at once
+    data = []
+    bucketTime = fromSecs
+    while bucketTime <= toSecs:
+      if bucketTime < firstTime or bucketTime > self.lastUpdate:
+        data.append( ( bucketTime, None ) )
+        bucketTime += bucketLength
+        continue
+      lastTime = min( toSecs, self.lastUpdate )
+      firstSlot = bucketTime / bucketLength % self.numBuckets
+      numSlots = min( ( lastTime - bucketTime ) / bucketLength + 1, self.numBuckets - firstSlot )
+      offset = HEADER_SIZE + firstSlot * VALUE_SIZE
+      values = struct.unpack( "<%dd" % numSlots, self.__map[ offset : offset + numSlots * VALUE_SIZE ] )
+      for value in values:
+        data.append( ( bucketTime, value ) )
+        bucketTime += bucketLength
+    return data
+
+  def flush( self ):
+    self.__map.flush()
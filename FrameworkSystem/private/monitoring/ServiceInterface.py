@@ -2,7 +2,9 @@
 __RCSID__ = "$Id$"
 import DIRAC
 from DIRAC import gLogger, rootPath, gConfig
+from DIRAC.ConfigurationSystem.Client.PathFinder import getServiceSection
 from DIRAC.FrameworkSystem.private.monitoring.RRDManager import RRDManager
+from DIRAC.FrameworkSystem.private.monitoring.NativeRRDManager import NativeRRDManager
 from DIRAC.Core.Utilities.ReturnValues import S_OK, S_ERROR
 from DIRAC.Core.Utilities import DEncode, List
 
@@ -19,8 +21,11 @@ class ServiceInterface:
 
   def __createRRDManager( self ):
     """
-    Generate an RRDManager
+    Generate an RRDManager for the configured storage backend
     """
+    backend = gConfig.getValue( "%s/StorageBackend" % getServiceSection( "Framework/Monitoring" ), "rrdtool" )
+    if backend.lower() == "native":
+      return NativeRRDManager( self.rrdPath, self.plotsPath )
     return RRDManager( self.rrdPath, self.plotsPath )
 
   def __createCatalog( self ):
@@ -44,7 +49,7 @@ class ServiceInterface:
     from DIRAC.FrameworkSystem.DB.ComponentMonitoringDB import ComponentMonitoringDB
 
     self.dataPath = dataPath
-    self.plotCache = PlotCache( RRDManager( self.rrdPath, self.plotsPath ) )
+    self.plotCache = PlotCache( self.__createRRDManager() )
     self.srvUp = True
     try:
       self.compmonDB = ComponentMonitoringDB()
@@ -127,6 +132,9 @@ class ServiceInterface:
     acCatalog = self.__createCatalog()
     rrdManager = self.__createRRDManager()
     unregisteredActivities = []
+    # The marks of all the activities are written at once
+    updatesList = []
+    updatedActivities = {}
     for acName in activitiesDict:
       acData = activitiesDict[ acName ]
       acInfo = acCatalog.findActivity( sourceId, acName )
@@ -147,11 +155,16 @@ class ServiceInterface:
         entries.append( ( instant , acData[ instant ] ) )
       if len( entries ) > 0:
         gLogger.verbose( "There are %s entries for %s" % ( len( entries ), acName ) )
-        retDict = rrdManager.update( acInfo[4], rrdFile, acInfo[7], entries, long( acInfo[8] ) )
-        if not retDict[ 'OK' ]:
+        updatesList.append( ( acInfo[4], rrdFile, acInfo[7], entries, long( acInfo[8] ) ) )
+        updatedActivities[ rrdFile ] = acName
+    if updatesList:
+      lastUpdates = rrdManager.updateMany( updatesList )[ 'Value' ]
+      for rrdFile in updatedActivities:
+        acName = updatedActivities[ rrdFile ]
+        if rrdFile not in lastUpdates:
           gLogger.error( "There was an error updating", "%s:%s activity [%s]" % ( sourceId, acName, rrdFile ) )
         else:
-          acCatalog.setLastUpdate( sourceId, acName, retDict[ 'Value' ] )
+          acCatalog.setLastUpdate( sourceId, acName, lastUpdates[ rrdFile ] )
     if not self.__cmdb_heartbeatComponent( sourceId, componentExtraInfo ):
       for acName in activitiesDict:
         if acName not in unregisteredActivities:
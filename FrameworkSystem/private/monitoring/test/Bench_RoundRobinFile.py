@@ -0,0 +1,46 @@
+""" Benchmark of the round robin files of the Monitoring service
+
+    Usage: python Bench_RoundRobinFile.py [ numActivities [ numMarks ] ]
+    times the update of numActivities files with numMarks marks each, as a
+    commitMarks call would
+"""
+
+import sys
+import os
+import time
+import shutil
+import tempfile
+
+from DIRAC.FrameworkSystem.private.monitoring.RoundRobinFile import RoundRobinFile
+from Test_RoundRobinFile import START
+
+def benchmark( numActivities = 1000, numMarks = 5 ):
+  """ Time the update of numActivities files of a year of 1 minute buckets
+  """
+  numActivities = int( numActivities )
+  numMarks = int( numMarks )
+  dataDir = tempfile.mkdtemp()
+  try:
+    filePaths = []
+    for i in range( numActivities ):
+      filePaths.append( os.path.join( dataDir, "%s.rrs" % i ) )
+      RoundRobinFile.create( filePaths[-1], 'sum', 60, 525600, START ).close()
+    # The first commit allocates the pages of the sparse files
+    lastTime = START
+    for commit in ( "First", "Next" ):
+      marks = [ ( lastTime + 60 * ( i + 1 ), i ) for i in range( numMarks ) ]
+      lastTime = marks[-1][0]
+      start = time.time()
+      for filePath in filePaths:
+        rrFile = RoundRobinFile( filePath )
+        rrFile.update( marks )
+        rrFile.close()
+      elapsed = time.time() - start
+      print "%s commit of %s files with %s marks: %.3fs (%.3f ms/file)" % ( commit, numActivities, numMarks, elapsed,
+                                                                          elapsed * 1000 / numActivities )
+
+  finally:
+    shutil.rmtree( dataDir )
+
+if __name__ == '__main__':
+  benchmark( *sys.argv[1:] )
@@ -0,0 +1,65 @@
+""" Test cases for the round robin files of the Monitoring service
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from DIRAC.FrameworkSystem.private.monitoring.RoundRobinFile import RoundRobinFile
+
+START = 1400000000 - 1400000000 % 60
+
+class RoundRobinFileTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.dataDir = tempfile.mkdtemp()
+
+  def tearDown( self ):
+    shutil.rmtree( self.dataDir )
+
+  def createFile( self, acType, numBuckets = 10 ):
+    return RoundRobinFile.create( os.path.join( self.dataDir, "%s.rrs" % acType ), acType, 60, numBuckets, START )
+
+  def test_update( self ):
+    rrFile = self.createFile( 'mean' )
+    self.assertEqual( rrFile.update( [ ( START + 60, 1 ), ( START + 185, 3 ) ] ), 2 )
+    # Already written buckets are not modified
+    self.assertEqual( rrFile.update( [ ( START + 120, 5 ), ( START + 240, 4 ) ] ), 1 )
+    rrFile.close()
+    rrFile = RoundRobinFile( rrFile.filePath )
+    self.assertEqual( rrFile.lastUpdate, START + 240 )
+    self.assertEqual( rrFile.fetch( START, START + 300 ), [ ( START, None ), ( START + 60, 1.0 ), ( START + 120, 0.0 ),
+                                                            ( START + 180, 3.0 ), ( START + 240, 4.0 ),
+                                                            ( START + 300, None ) ] )
+    rrFile.close()
+
+  def test_rate( self ):
+    rrFile = self.createFile( 'sum' )
+    rrFile.update( [ ( START + 60, 30 ) ] )
+    self.assertEqual( rrFile.fetch( START + 60, START + 60 ), [ ( START + 60, 0.5 ) ] )
+    rrFile.close()
+
+  def test_wrap( self ):
+    rrFile = self.createFile( 'mean' )
+    rrFile.update( [ ( START + i * 60, i ) for i in range( 1, 16 ) ] )
+    data = rrFile.fetch( START, START + 15 * 60 )
+    # Only the last 10 buckets are kept
+    self.assertEqual( [ value for _t, value in data ], [ None ] * 6 + [ float( i ) for i in range( 6, 16 ) ] )
+    # A gap longer than the file only fills a round
+    rrFile.update( [ ( START + 1000 * 60, 7 ) ] )
+    data = rrFile.fetch( START + 990 * 60, START + 1000 * 60 )
+    self.assertEqual( [ value for _t, value in data ], [ None ] + [ 0.0 ] * 9 + [ 7.0 ] )
+    rrFile.close()
+
+  def test_invalid( self ):
+    filePath = os.path.join( self.dataDir, "test.rrd" )
+    fd = open( filePath, "w" )
+    fd.write( "RRD\0" * 20 )
+    fd.close()
+    self.assertRaises( ValueError, RoundRobinFile, filePath )
+if __name__ == '__main__':
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( RoundRobinFileTestCase )
+  gSuite = unittest.TestSuite( [ gSuite ] )
+  unittest.TextTestRunner( verbosity = 2 ).run( gSuite )
@@ -280,17 +280,17 @@ class RequestExecutingAgent( AgentModule ):
         self.log.info( "processPool tasks idle = %s working = %s" % ( self.processPool().getNumIdleProcesses(),
                                                                       self.processPool().getNumWorkingProcesses() ) )
 
-        looping = 0
+        waitStart = 0
         while True:
-          if not self.processPool().getFreeSlots():
-            if not looping:
-              self.log.info( "No free slots available in processPool, will wait %d seconds to proceed" % self.__poolSleep )
-            time.sleep( self.__poolSleep )
-            looping += 1
+          # # blocks until a task finishes, at most poolSleep seconds
+          if not self.processPool().waitForFreeSlots( self.__poolSleep ):
+            if not waitStart:
+              self.log.info( "No free slots available in processPool, waiting for a task to finish" )
+              waitStart = time.time()
           else:
-            if looping:
-              self.log.info( "Free slot found after %d seconds" % looping * self.__poolSleep )
-            looping = 0
+            if waitStart:
+              self.log.info( "Free slot found after %.1f seconds" % ( time.time() - waitStart ) )
+            waitStart = 0
             self.log.info( "spawning task for request '%s/%s'" % ( request.RequestID, request.RequestName ) )
             timeOut = self.getTimeout( request )
             enqueue = self.processPool().createAndQueueTask( RequestTask,
@@ -310,8 +310,6 @@ class RequestExecutingAgent( AgentModule ):
               gMonitor.addMark( "Processed", 1 )
               # # update request counter
               taskCounter += 1
-              # # task created, a little time kick to proceed
-              time.sleep( 0.1 )
               break
 
     # # clean return
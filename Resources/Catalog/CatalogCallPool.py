@@ -0,0 +1,95 @@
+""" Pool of threads calling the file catalogs concurrently for the FileCatalog
+
+    The pool is shared by the process. A forked child gets a new pool: the
+    threads of the parent do not exist in the child, and the queue and lock it
+    inherits may have been held by them at the time of the fork.
+"""
+
+__RCSID__ = "$Id$"
+
+import os
+import time
+import Queue
+import threading
+
+from DIRAC                            import gLogger, S_ERROR
+from DIRAC.Core.DISET.ThreadConfig    import ThreadConfig
+
+class CatalogCallPool( object ):
+  """ Bounded pool of threads executing catalog calls. The identity and setup of the
+      calling thread are passed to the thread doing the call
+  """
+
+  def __init__( self, maxThreads = 10 ):
+    self.__maxThreads = maxThreads
+    self.__threads = []
+    self.__queue = Queue.Queue()
+    self.__lock = threading.Lock()
+    self.pid = os.getpid()
+
+  def __startThreads( self, numCalls ):
+    self.__lock.acquire()
+    try:
+      # Threads gone for any reason are replaced
+      self.__threads = [ thread for thread in self.__threads if thread.isAlive() ]
+      queued = self.__queue.qsize()
+      while len( self.__threads ) < min( self.__maxThreads, numCalls + queued ):
+        thread = threading.Thread( target = self.__work )
+        thread.setDaemon( True )
+        thread.start()
+        self.__threads.append( thread )
+    finally:
+      self.__lock.release()
+
+  def __work( self ):
+    threadConfig = ThreadConfig()
+    while True:
+      method, parms, kws, index, resultQueue, callerConfig = self.__queue.get()
+      threadConfig.reset()
+      threadConfig.load( callerConfig )
+      try:
+        result = method( *parms, **kws )
+      except Exception, x:
+        gLogger.exception( "CatalogCallPool: exception in catalog call" )
+        result = S_ERROR( "Exception in catalog call: %s" % x )
+      resultQueue.put( ( index, result ) )
+
+  def execute( self, calls, timeout, isFinal = None ):
+    """ Execute the ( method, parms, kws ) calls concurrently
+
+    :param isFinal: function telling if a result makes it useless to wait for the other ones
+    :return: list with the result of each call, in the order of the calls. The results not
+             received when a final one arrives are None, the ones not received in time are errors
+    """
+    resultQueue = Queue.Queue()
+    callerConfig = ThreadConfig().dump()
+    self.__startThreads( len( calls ) )
+    for index in range( len( calls ) ):
+      method, parms, kws = calls[index]
+      self.__queue.put( ( method, parms, kws, index, resultQueue, callerConfig ) )
+    results = [ None ] * len( calls )
+    pending = len( calls )
+    deadline = time.time() + timeout
+    while pending:
+      try:
+        index, result = resultQueue.get( True, max( 0, deadline - time.time() ) )
+      except Queue.Empty:
+        for index in range( len( calls ) ):
+          if results[index] is None:
+            results[index] = S_ERROR( "Timeout waiting for the catalog answer" )
+        break
+      results[index] = result
+      pending -= 1
+      if isFinal and isFinal( result ):
+        break
+    return results
+
+gCatalogCallPool = None
+
+def getCatalogCallPool():
+  """ Pool of the process, created again after a fork
+  """
+  global gCatalogCallPool
+  if not gCatalogCallPool or gCatalogCallPool.pid != os.getpid():
+    gCatalogCallPool = CatalogCallPool()
+  return gCatalogCallPool
@@ -1,5 +1,13 @@
 """ File catalog class. This is a simple dispatcher for the file catalog plug-ins.
     It ensures that all operations are performed on the desired catalogs.
+
+    By default the catalogs are called one after the other. With the
+    /Services/Catalogs/ParallelExecution Operations option the read catalogs, and
+    the non master write catalogs once the master ones succeeded, are called
+    concurrently by a pool of threads shared by the process. The results are
+    merged exactly as in the sequential mode. With /Services/Catalogs/ReadMode set
+    to FirstAnswer, a read call returns the first complete answer received from a
+    catalog instead of waiting for all the catalogs.
 """
 
 import types, re
@@ -9,6 +17,7 @@ from DIRAC.ConfigurationSystem.Client.Helpers.Operations    import Operations
 from DIRAC.Core.Security.ProxyInfo                          import getVOfromProxyGroup
 from DIRAC.Resources.Utilities                              import checkArgumentFormat
 from DIRAC.Resources.Catalog.FileCatalogFactory             import FileCatalogFactory
+from DIRAC.Resources.Catalog.CatalogCallPool                import getCatalogCallPool
 from DIRAC.ConfigurationSystem.Client.Helpers.Resources     import Resources
 
 class FileCatalog( object ):
@@ -43,10 +52,14 @@ class FileCatalog( object ):
     self.readCatalogs = []
     self.writeCatalogs = []
     self.metaCatalogs = []
+    self.parallel = False
+    self.firstAnswer = False
     self.vo = vo if vo else getVOfromProxyGroup().get( 'Value', None )
     if self.vo:
       self.opHelper = Operations( vo = self.vo )
       self.reHelper = Resources( vo = self.vo ) 
+      self.parallel = self.opHelper.getValue( '/Services/Catalogs/ParallelExecution', False )
+      self.firstAnswer = self.opHelper.getValue( '/Services/Catalogs/ReadMode', 'Merge' ) == 'FirstAnswer'
       
       if catalogs is None:
         catalogList = []
@@ -108,34 +121,34 @@ class FileCatalog( object ):
     fileInfo = res['Value']
     allLfns = fileInfo.keys()
     parms = parms[1:]
+    # The master catalogs are always called first and one after the other
+    slaveCatalogs = []
     for catalogName, oCatalog, master in self.writeCatalogs:
 
       # Skip if metadata related method on pure File Catalog
       if self.call in FileCatalog.write_meta_methods and not catalogName in self.metaCatalogs:
         continue
 
+      if self.parallel and not master:
+        slaveCatalogs.append( ( catalogName, oCatalog ) )
+        continue
+
       method = getattr( oCatalog, self.call )
       res = method( fileInfo, *parms, **kws )
+      if not res['OK'] and master:
+        # If this is the master catalog and it fails we dont want to continue with the other catalogs
+        gLogger.error( "FileCatalog.w_execute: Failed to execute call on master catalog",
+                       "%s on %s" % ( self.call, catalogName ), res['Message'] )
+        return res
+      self.__addWriteResult( catalogName, master, res, fileInfo, successful, failed, failedCatalogs )
+
+    if slaveCatalogs and fileInfo:
+      calls = [ ( getattr( oCatalog, self.call ), ( dict( fileInfo ), ) + parms, kws )
+                for _catalogName, oCatalog in slaveCatalogs ]
+      results = getCatalogCallPool().execute( calls, self.timeout )
+      for i in range( len( slaveCatalogs ) ):
+        self.__addWriteResult( slaveCatalogs[i][0], False, results[i], fileInfo, successful, failed, failedCatalogs )
 
-      if not res['OK']:
-        if master:
-          # If this is the master catalog and it fails we dont want to continue with the other catalogs
-          gLogger.error( "FileCatalog.w_execute: Failed to execute call on master catalog",
-                         "%s on %s" % ( self.call, catalogName ), res['Message'] )
-          return res
-        else:
-          # Otherwise we keep the failed catalogs so we can update their state later
-          failedCatalogs.append( ( catalogName, res['Message'] ) )
-      else:
-        for lfn, message in res['Value']['Failed'].items():
-          # Save the error message for the failed operations
-          failed.setdefault( lfn, {} )[catalogName] = message
-          if master:
-            # If this is the master catalog then we should not attempt the operation on other catalogs
-            fileInfo.pop( lfn, None )
-        for lfn, result in res['Value']['Successful'].items():
-          # Save the result return for each file for the successful operations
-          successful.setdefault( lfn, {} )[catalogName] = result
     # This recovers the states of the files that completely failed i.e. when S_ERROR is returned by a catalog
     for catalogName, errorMessage in failedCatalogs:
       for lfn in allLfns:
@@ -143,20 +156,57 @@ class FileCatalog( object ):
     resDict = {'Failed':failed, 'Successful':successful}
     return S_OK( resDict )
 
+  def __addWriteResult( self, catalogName, master, res, fileInfo, successful, failed, failedCatalogs ):
+    """ Merge the result of a write call on a catalog
+    """
+    if not res['OK']:
+      # We keep the failed catalogs so we can update their state later
+      failedCatalogs.append( ( catalogName, res['Message'] ) )
+      return
+    for lfn, message in res['Value']['Failed'].items():
+      # Save the error message for the failed operations
+      failed.setdefault( lfn, {} )[catalogName] = message
+      if master:
+        # If this is the master catalog then we should not attempt the operation on other catalogs
+        fileInfo.pop( lfn, None )
+    for lfn, result in res['Value']['Successful'].items():
+      # Save the result return for each file for the successful operations
+      successful.setdefault( lfn, {} )[catalogName] = result
+
   def r_execute( self, *parms, **kws ):
     """ Read method executor.
     """
     successful = {}
     failed = {}
+    catalogs = []
     for catalogName, oCatalog, _master in self.readCatalogs:
 
       # Skip if metadata related method on pure File Catalog
       if self.call in FileCatalog.ro_meta_methods and not catalogName in self.metaCatalogs:
         continue
-
-      method = getattr( oCatalog, self.call )
-      res = method( *parms, **kws )
-      if res['OK']:
+      catalogs.append( oCatalog )
+
+    if self.parallel and len( catalogs ) > 1:
+      calls = [ ( getattr( oCatalog, self.call ), parms, kws ) for oCatalog in catalogs ]
+      isFinal = None
+      if self.firstAnswer:
+        isFinal = self.__isCompleteAnswer
+      results = getCatalogCallPool().execute( calls, self.timeout, isFinal = isFinal )
+      if self.firstAnswer:
+        for res in results:
+          if res and self.__isCompleteAnswer( res ):
+            return res
+    else:
+      results = []
+      for oCatalog in catalogs:
+        method = getattr( oCatalog, self.call )
+        res = method( *parms, **kws )
+        results.append( res )
+        if res['OK'] and 'Successful' not in res['Value']:
+          break
+
+    for res in results:
+      if res and res['OK']:
         if 'Successful' in res['Value']:
           for key, item in res['Value']['Successful'].items():
             successful.setdefault( key, item )
@@ -170,6 +220,16 @@ class FileCatalog( object ):
       return S_ERROR( "Failed to perform %s from any catalog" % self.call )
     return S_OK( {'Failed':failed, 'Successful':successful} )
 
+  @staticmethod
+  def __isCompleteAnswer( res ):
+    """ A read answer is complete if it succeeded for all the arguments
+    """
+    if not res['OK']:
+      return False
+    if type( res['Value'] ) == types.DictType and 'Successful' in res['Value']:
+      return not res['Value']['Failed']
+    return True
+
   ###########################################################################################
   #
   # Below is the method for obtaining the objects instantiated for a provided catalogue configuration
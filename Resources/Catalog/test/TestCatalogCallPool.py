@@ -0,0 +1,83 @@
+""" Test cases for the pool of threads calling the file catalogs
+"""
+
+__RCSID__ = "$Id$"
+
+import os
+import time
+import threading
+import unittest
+
+from DIRAC import S_OK
+from DIRAC.Core.DISET.ThreadConfig import ThreadConfig
+from DIRAC.Resources.Catalog.CatalogCallPool import CatalogCallPool, getCatalogCallPool
+
+class CatalogCallPoolTestCase( unittest.TestCase ):
+  """ Base class for the CatalogCallPool test cases
+  """
+
+  def call( self, value, delay = 0 ):
+    time.sleep( delay )
+    return S_OK( value )
+
+  def test_execute( self ):
+    pool = CatalogCallPool( maxThreads = 3 )
+    calls = [ ( self.call, ( i, 0.1 ), {} ) for i in range( 6 ) ]
+    start = time.time()
+    results = pool.execute( calls, 10 )
+    self.assertEqual( [ result[ 'Value' ] for result in results ], range( 6 ) )
+    # Two rounds of three calls
+    self.assertTrue( time.time() - start < 0.5 )
+
+  def test_exception( self ):
+    def fail():
+      raise ValueError( "catalog down" )
+    results = CatalogCallPool().execute( [ ( fail, (), {} ), ( self.call, ( 1, ), {} ) ], 10 )
+    self.assertFalse( results[0][ 'OK' ] )
+    self.assertTrue( "catalog down" in results[0][ 'Message' ] )
+    self.assertEqual( results[1][ 'Value' ], 1 )
+
+  def test_timeout( self ):
+    results = CatalogCallPool().execute( [ ( self.call, ( 0, 1 ), {} ), ( self.call, ( 1, ), {} ) ], 0.3 )
+    self.assertFalse( results[0][ 'OK' ] )
+    self.assertEqual( results[1][ 'Value' ], 1 )
+
+  def test_firstAnswer( self ):
+    calls = [ ( self.call, ( 0, 1 ), {} ), ( self.call, ( 1, ), {} ) ]
+    start = time.time()
+    results = CatalogCallPool().execute( calls, 10, isFinal = lambda result: result[ 'OK' ] )
+    self.assertTrue( time.time() - start < 0.5 )
+    self.assertEqual( results[0], None )
+    self.assertEqual( results[1][ 'Value' ], 1 )
+
+  def test_callerIdentity( self ):
+    threadConfig = ThreadConfig()
+    threadConfig.setDN( "/DN/of/caller" )
+    try:
+      results = CatalogCallPool().execute( [ ( lambda: S_OK( ThreadConfig().getDN() ), (), {} ) ], 10 )
+    finally:
+      threadConfig.reset()
+    self.assertEqual( results[0][ 'Value' ], "/DN/of/caller" )
+
+  def test_fork( self ):
+    """ The calls are still served in a forked child
+    """
+    pool = getCatalogCallPool()
+    self.assertTrue( pool.execute( [ ( self.call, ( 1, ), {} ) ], 10 )[0][ 'OK' ] )
+    pid = os.fork()
+    if not pid:
+      exitCode = 1
+      try:
+        childPool = getCatalogCallPool()
+        result = childPool.execute( [ ( self.call, ( 2, ), {} ) ], 2 )[0]
+        if childPool is not pool and result[ 'OK' ] and result[ 'Value' ] == 2:
+          exitCode = 0
+      finally:
+        os._exit( exitCode )
+    _pid, status = os.waitpid( pid, 0 )
+    self.assertEqual( status, 0 )
+    self.assertTrue( getCatalogCallPool() is pool )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( CatalogCallPoolTestCase )
+  testResult = unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -618,13 +618,14 @@ class StorageElementItem( object ):
 
     # args should normaly be empty to avoid problem...
     if len( args ):
-      self.log.verbose( "StorageElement.__executeMethod: args should be empty!%s" % args )
+      self.log.verbose( "StorageElement.__executeMethod: args should be empty!", args )
       # because there is normally only one kw argument, I can move it from args to kwargs
       methDefaultArgs = StorageElementItem.__defaultsArguments.get( self.methodName, {} ).keys()
       if len( methDefaultArgs ):
         kwargs[methDefaultArgs[0] ] = args[0]
         args = args[1:]
-      self.log.verbose( "StorageElement.__executeMethod: put it in kwargs, but dirty and might be dangerous!args %s kwargs %s" % ( args, kwargs ) )
+      self.log.verbose( "StorageElement.__executeMethod: put it in kwargs, but dirty and might be dangerous!",
+                        lambda: "args %s kwargs %s" % ( args, kwargs ) )
 
 
     # We check the deprecated arguments
@@ -640,8 +641,8 @@ class StorageElementItem( object ):
     methDefaultArgs = StorageElementItem.__defaultsArguments.get( self.methodName, {} )
     for argName in methDefaultArgs:
       if argName not in kwargs:
-        self.log.debug( "StorageElement.__executeMethod : default argument %s for %s not present.\
-         Setting value %s." % ( argName, self.methodName, methDefaultArgs[argName] ) )
+        self.log.debug( "StorageElement.__executeMethod : default argument not present.",
+                        lambda: "%s for %s, setting value %s" % ( argName, self.methodName, methDefaultArgs[argName] ) )
         kwargs[argName] = methDefaultArgs[argName]
 
     res = checkArgumentFormat( lfn )
@@ -13,10 +13,12 @@ from DIRAC                                                import gLogger, S_OK,
 from DIRAC.Core.Base.DB                                   import DB
 from DIRAC.Resources.Catalog.FileCatalog                  import FileCatalog
 from DIRAC.Core.Security.ProxyInfo                        import getProxyInfo
-from DIRAC.Core.Utilities.List                            import stringListToString, intListToString, breakListIntoChunks
+from DIRAC.Core.Utilities.List                            import stringListToString, intListToString
+from DIRAC.Core.Utilities                                 import Time
 from DIRAC.Core.Utilities.Shifter                         import setupShifterProxyInEnv
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations  import Operations
 from DIRAC.Core.Utilities.Subprocess                      import pythonCall
+from DIRAC.TransformationSystem.private.LFNFilterEngine   import LFNFilterEngine
 
 __RCSID__ = "$Id$"
 
@@ -37,7 +39,8 @@ class TransformationDB( DB ):
       DB.__init__( self, 'TransformationDB', 'Transformation/TransformationDB', maxQueueSize )
 
     self.lock = threading.Lock()
-    self.filters = ()
+    self.filters = []
+    self.filterEngine = LFNFilterEngine( [] )
     res = self.__updateFilters()
     if not res['OK']:
       gLogger.fatal( "Failed to create filters" )
@@ -354,7 +357,7 @@ class TransformationDB( DB ):
     self.lock.release()
     # If the transformation has an input data specification
     if fileMask:
-      self.filters.append( ( transID, re.compile( fileMask ) ) )
+      self.__setFilters( self.filters + [ ( transID, re.compile( fileMask ) ) ] )
 
     if inheritedFrom:
       res = self._getTransformationID( inheritedFrom, connection = connection )
@@ -551,9 +554,18 @@ class TransformationDB( DB ):
       if mask:
         refilter = re.compile( mask )
         resultList.append( ( transID, refilter ) )
-    self.filters = resultList
+    self.__setFilters( resultList )
     return S_OK( resultList )
 
+  def __setFilters( self, filters ):
+    ''' Set the active filters, the filter engine is only rebuilt if they changed '''
+    newMasks = [ ( transID, refilter.pattern ) for transID, refilter in filters ]
+    oldMasks = [ ( transID, refilter.pattern ) for transID, refilter in self.filters ]
+    if newMasks != oldMasks:
+      self.filterEngine = LFNFilterEngine( filters )
+      gLogger.verbose( "Rebuilt the LFN filter engine with %s filters" % len( filters ) )
+    self.filters = filters
+
   def __filterFile( self, lfn, filters = None ):
     '''Pass the input file through a supplied filter or those currently active '''
     result = []
@@ -562,9 +574,7 @@ class TransformationDB( DB ):
         if refilter.search( lfn ):
           result.append( transID )
     else:
-      for transID, refilter in self.filters:
-        if refilter.search( lfn ):
-          result.append( transID )
+      result = self.filterEngine.match( lfn )
     return result
 
   ###########################################################################
@@ -869,10 +879,7 @@ class TransformationDB( DB ):
   def __addExistingFiles( self, transID, connection = False ):
     ''' Add files that already exist in the DataFiles table to the transformation specified by the transID
     '''
-    for tID, _filter in self.filters:
-      if tID == transID:
-        filters = [( tID, filter )]
-        break
+    filters = [ ( tID, refilter ) for tID, refilter in self.filters if tID == transID ]
     if not filters:
       return S_ERROR( 'No filters defined for transformation %d' % transID )
     res = self.__getAllFileIDs( connection = connection )
@@ -890,33 +897,21 @@ class TransformationDB( DB ):
     """
     gLogger.info( "Inserting %d files in TransformationFiles" % len( fileTuplesList ) )
 
-    # splitting in various chunks, in case it is too big
-    for fileTuples in breakListIntoChunks( fileTuplesList, 10000 ):
-
-      gLogger.verbose( "Adding first %d files in TransformationFiles (out of %d)" % ( len( fileTuples ),
-                                                                                      len( fileTuplesList ) ) )
-      req = "INSERT INTO TransformationFiles (TransformationID,Status,TaskID,FileID,TargetSE,UsedSE,LastUpdate) VALUES"
-      candidates = False
-
-      for ft in fileTuples:
-        _lfn, originalID, fileID, status, taskID, targetSE, usedSE, _errorCount, _lastUpdate, _insertTime = ft[:10]
-        if status not in ( 'Unused', 'Removed' ):
-          candidates = True
-          if not re.search( '-', status ):
-            status = "%s-inherited" % status
-            if taskID:
-              taskID = str( int( originalID ) ).zfill( 8 ) + '_' + str( int( taskID ) ).zfill( 8 )
-          req = "%s (%d,'%s','%s',%d,'%s','%s',UTC_TIMESTAMP())," % ( req, transID, status, taskID,
-                                                                      fileID, targetSE, usedSE )
-      if not candidates:
-        continue
-
-      req = req.rstrip( "," )
-      res = self._update( req, connection )
-      if not res['OK']:
-        return res
-
-    return S_OK()
+    rows = []
+    now = Time.dateTime()
+    for ft in fileTuplesList:
+      _lfn, originalID, fileID, status, taskID, targetSE, usedSE, _errorCount, _lastUpdate, _insertTime = ft[:10]
+      if status not in ( 'Unused', 'Removed' ):
+        if not re.search( '-', status ):
+          status = "%s-inherited" % status
+          if taskID:
+            taskID = str( int( originalID ) ).zfill( 8 ) + '_' + str( int( taskID ) ).zfill( 8 )
+        rows.append( ( transID, status, taskID, fileID, targetSE, usedSE, now ) )
+
+    # The rows are sent in chunks, in case it is too big
+    return self.bulkInsert( 'TransformationFiles', [ 'TransformationID', 'Status', 'TaskID', 'FileID',
+                                                     'TargetSE', 'UsedSE', 'LastUpdate' ],
+                            rows, chunkSize = 10000, conn = connection )
 
   def __assignTransformationFile( self, transID, taskID, se, fileIDs, connection = False ):
     ''' Make necessary updates to the TransformationFiles table for the newly created task
@@ -1685,8 +1680,9 @@ class TransformationDB( DB ):
     # Determine which files pass the filters and are to be added to transformations
     transFiles = {}
     filesToAdd = []
+    lfnTrans = self.filterEngine.matchLFNs( fileDicts.keys() )
     for lfn in fileDicts.keys():
-      fileTrans = self.__filterFile( lfn )
+      fileTrans = lfnTrans[lfn]
       if not ( fileTrans or force ):
         successful[lfn] = True
       else:
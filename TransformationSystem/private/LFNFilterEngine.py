@@ -0,0 +1,131 @@
+""" Compiled set of LFN filters of the transformations
+
+    The TransformationDB routes each new file to the transformations whose
+    FileMask regular expression matches its LFN. Instead of trying all the
+    masks one after the other, the engine selects the candidate masks of a LFN
+    in one pass:
+
+    - masks anchored at the start of the LFN with a literal prefix
+      ( e.g. '^/lhcb/MC/2012/.*\.dst$' ) are stored in a trie of their prefixes,
+      only the masks whose prefix starts the LFN are evaluated;
+    - the other masks are combined in alternations that are used to discard at
+      once the LFNs matching none of them.
+
+    The result is the same as evaluating re.search of every mask, in the order
+    of the filters.
+"""
+
+__RCSID__ = "$Id$"
+
+import re
+
+# Characters ending the literal prefix of a regular expression
+REGEX_SPECIAL = '.^$*+?{}[]\\|()'
+# Escaped characters that stand for themselves
+REGEX_ESCAPED_LITERALS = './-_+*?^$|()[]{}\\'
+# Number of masks per combined alternation, the re module limits the number of groups
+MAX_COMBINED_MASKS = 50
+
+def getLiteralPrefix( pattern ):
+  """ Get the literal prefix every string matched by re.search( pattern ) starts with.
+      Returns None if the pattern is not anchored at the start
+  """
+  if not pattern.startswith( '^' ) or '|' in pattern or '(?' in pattern:
+    return None
+  prefix = []
+  i = 1
+  while i < len( pattern ):
+    char = pattern[i]
+    if char == '\\':
+      if i + 1 < len( pattern ) and pattern[i + 1] in REGEX_ESCAPED_LITERALS:
+        prefix.append( pattern[i + 1] )
+        i += 2
+        continue
+      break
+    if char in REGEX_SPECIAL:
+      # A quantifier makes the previous character optional
+      if char in '*?{' and prefix:
+        prefix.pop()
+      break
+    prefix.append( char )
+    i += 1
+  return ''.join( prefix )
+
+class LFNFilterEngine( object ):
+
+  def __init__( self, filters ):
+    """
+    :param list filters: ( transID, mask ) tuples, the mask being a pattern or a compiled regular expression
+    """
+    self.filters = []
+    self.__trie = {}
+    self.__combined = []
+    for index, ( transID, mask ) in enumerate( filters ):
+      if type( mask ) in ( str, unicode ):
+        refilter = re.compile( mask )
+      else:
+        refilter = mask
+      self.filters.append( ( transID, refilter ) )
+      prefix = getLiteralPrefix( refilter.pattern )
+      if prefix is None or refilter.flags:
+        self.__addCombined( index, refilter )
+      else:
+        node = self.__trie
+        for char in prefix:
+          node = node.setdefault( char, {} )
+        node.setdefault( None, [] ).append( ( index, refilter ) )
+    self.__compileCombined()
+
+  def __addCombined( self, index, refilter ):
+    if not self.__combined or len( self.__combined[-1][1] ) >= MAX_COMBINED_MASKS:
+      self.__combined.append( [ None, [] ] )
+    self.__combined[-1][1].append( ( index, refilter ) )
+
+  def __compileCombined( self ):
+    """ Compile the alternation of each group of masks. Masks that can not be combined
+        ( back references, too many groups... ) are always evaluated one by one
+    """
+    for group in self.__combined:
+      if [ refilter for _index, refilter in group[1] if refilter.flags ]:
+        continue
+      patterns = [ refilter.pattern for _index, refilter in group[1] ]
+      if [ pattern for pattern in patterns if re.search( r'\\[1-9]|\(\?P=', pattern ) ]:
+        continue
+      try:
+        group[0] = re.compile( '|'.join( [ '(?:%s)' % pattern for pattern in patterns ] ) )
+      except Exception:
+        group[0] = None
+
+  def getNumFilters( self ):
+    return len( self.filters )
+
+  def match( self, lfn ):
+    """ Get the IDs of the transformations whose filter matches the LFN
+    """
+    matched = []
+    node = self.__trie
+    for char in lfn:
+      if None in node:
+        matched.extend( [ ( index, refilter ) for index, refilter in node[None] if refilter.search( lfn ) ] )
+      node = node.get( char )
+      if node is None:
+        break
+    else:
+      if None in node:
+        matched.extend( [ ( index, refilter ) for index, refilter in node[None] if refilter.search( lfn ) ] )
+    for combined, group in self.__combined:
+      if combined and not combined.search( lfn ):
+        continue
+      matched.extend( [ ( index, refilter ) for index, refilter in group if refilter.search( lfn ) ] )
+    matched.sort()
+    return [ self.filters[index][0] for index, _refilter in matched ]
+
+  def matchLFNs( self, lfns ):
+    """ Get the IDs of the transformations whose filter matches each LFN
+
+    :return: { lfn : [ transIDs ] }
+    """
+    result = {}
+    for lfn in lfns:
+      result[ lfn ] = self.match( lfn )
+    return result
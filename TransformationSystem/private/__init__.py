@@ -0,0 +1,9 @@
+############################################################
+# $HeadURL$
+############################################################
+
+"""
+   DIRAC.TransformationSystem.private package
+"""
+
+__RCSID__ = "$Id$"
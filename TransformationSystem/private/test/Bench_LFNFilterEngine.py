@@ -0,0 +1,30 @@
+""" Benchmark of the LFN filter engine
+
+    Usage: python Bench_LFNFilterEngine.py [ numMasks [ numLFNs ] ]
+    compares the engine with the evaluation of every mask
+"""
+
+import sys
+import re
+import time
+
+from DIRAC.TransformationSystem.private.LFNFilterEngine import LFNFilterEngine
+from Test_LFNFilterEngine import makeMasks, makeLFNs, bruteForce
+
+def benchmark( numMasks = 3000, numLFNs = 10000 ):
+  masks = makeMasks( numMasks )
+  lfns = makeLFNs( numLFNs, numMasks )
+  start = time.time()
+  engine = LFNFilterEngine( masks )
+  print "Engine built with %s masks in %.3fs" % ( numMasks, time.time() - start )
+  start = time.time()
+  engine.matchLFNs( lfns )
+  print "Engine: %s LFNs in %.3fs" % ( numLFNs, time.time() - start )
+  compiled = [ ( transID, re.compile( mask ) ) for transID, mask in masks ]
+  start = time.time()
+  for lfn in lfns:
+    bruteForce( compiled, lfn )
+  print "Mask by mask: %s LFNs in %.3fs" % ( numLFNs, time.time() - start )
+
+if __name__ == '__main__':
+  benchmark( *[ int( arg ) for arg in sys.argv[1:] ] )
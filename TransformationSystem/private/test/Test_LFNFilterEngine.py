@@ -0,0 +1,72 @@
+""" Test cases for the LFN filter engine
+"""
+
+import re
+import random
+import unittest
+
+from DIRAC.TransformationSystem.private.LFNFilterEngine import LFNFilterEngine, getLiteralPrefix
+
+def makeMasks( numMasks ):
+  """ Masks looking like the FileMask of production transformations """
+  masks = []
+  for transID in range( 1, numMasks + 1 ):
+    year = random.choice( [ '2011', '2012', '2013' ] )
+    stream = random.choice( [ 'BHADRON', 'DIMUON', 'CHARM', 'EW' ] )
+    kind = random.random()
+    if kind < 0.7:
+      mask = r'^/lhcb/LHCb/Collision%s/%s\.DST/%08d/.*\.dst$' % ( year[2:], stream, transID )
+    elif kind < 0.9:
+      mask = r'^/lhcb/MC/%s/.*/%08d_\d+_\d\.%s' % ( year, transID, stream.lower() )
+    else:
+      mask = r'%s\.DST/%08d' % ( stream, transID )
+    masks.append( ( transID, mask ) )
+  return masks
+
+def makeLFNs( numLFNs, numMasks ):
+  lfns = []
+  for i in range( numLFNs ):
+    transID = random.randint( 1, numMasks * 2 )
+    stream = random.choice( [ 'BHADRON', 'DIMUON', 'CHARM', 'EW' ] )
+    if random.random() < 0.5:
+      lfns.append( '/lhcb/LHCb/Collision12/%s.DST/%08d/0000/%08d_%08d_1.%s.dst' % ( stream, transID, transID,
+                                                                                   i, stream.lower() ) )
+    else:
+      lfns.append( '/lhcb/MC/2012/ALLSTREAMS.DST/%08d/0000/%08d_%08d_1.%s' % ( transID, transID, i,
+                                                                              stream.lower() ) )
+  return lfns
+
+def bruteForce( compiled, lfn ):
+  return [ transID for transID, refilter in compiled if refilter.search( lfn ) ]
+
+class LFNFilterEngineTestCase( unittest.TestCase ):
+
+  def test_prefix( self ):
+    self.assertEqual( getLiteralPrefix( r'^/lhcb/MC/2012/.*\.dst$' ), '/lhcb/MC/2012/' )
+    self.assertEqual( getLiteralPrefix( r'^/lhcb/data\.2012/x' ), '/lhcb/data.2012/x' )
+    self.assertEqual( getLiteralPrefix( r'^/lhcb/ab?' ), '/lhcb/a' )
+    self.assertEqual( getLiteralPrefix( r'^/lhcb/ab+' ), '/lhcb/ab' )
+    self.assertEqual( getLiteralPrefix( r'^/lhcb/\d+' ), '/lhcb/' )
+    self.assertEqual( getLiteralPrefix( r'^/lhcb/a|^/lhcb/b' ), None )
+    self.assertEqual( getLiteralPrefix( r'/lhcb/MC' ), None )
+
+  def test_match( self ):
+    masks = [ ( 1, r'^/lhcb/MC/2012/.*\.dst$' ), ( 2, r'\.dst$' ), ( 3, r'^/lhcb/MC/' ),
+              ( 4, r'^/lhcb/LHCb' ), ( 5, r'(a)\1' ), ( 6, re.compile( 'LHCB', re.I ) ), ( 7, '^' ) ]
+    engine = LFNFilterEngine( masks )
+    self.assertEqual( engine.match( '/lhcb/MC/2012/x.dst' ), [ 1, 2, 3, 6, 7 ] )
+    self.assertEqual( engine.match( '/lhcb/LHCb/aa.raw' ), [ 4, 5, 6, 7 ] )
+    self.assertEqual( engine.matchLFNs( [ '/lhcb/MC', '' ] ), { '/lhcb/MC' : [ 6, 7 ], '' : [ 7 ] } )
+    self.assertEqual( LFNFilterEngine( [] ).match( '/lhcb/MC' ), [] )
+
+  def test_random( self ):
+    masks = makeMasks( 300 )
+    engine = LFNFilterEngine( masks )
+    compiled = [ ( transID, re.compile( mask ) ) for transID, mask in masks ]
+    for lfn in makeLFNs( 2000, 300 ):
+      self.assertEqual( engine.match( lfn ), bruteForce( compiled, lfn ) )
+if __name__ == '__main__':
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( LFNFilterEngineTestCase )
+  gSuite = unittest.TestSuite( [ gSuite ] )
+  unittest.TextTestRunner( verbosity = 2 ).run( gSuite )
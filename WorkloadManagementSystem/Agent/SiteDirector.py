@@ -19,7 +19,8 @@ from DIRAC.Resources.Computing.ComputingElementFactory     import ComputingEleme
 from DIRAC.WorkloadManagementSystem.Client.ServerUtils     import pilotAgentsDB
 from DIRAC.WorkloadManagementSystem.Service.WMSUtilities   import getGridEnv
 from DIRAC.WorkloadManagementSystem.private.ConfigHelper   import findGenericPilotCredentials
-from DIRAC                                                 import S_OK, S_ERROR, gConfig
+from DIRAC.WorkloadManagementSystem.private.QueueTaskRunner import QueueTaskRunner
+from DIRAC                                                 import S_OK, S_ERROR, gConfig, gMonitor
 from DIRAC.FrameworkSystem.Client.ProxyManagerClient       import gProxyManager
 from DIRAC.AccountingSystem.Client.Types.Pilot             import Pilot as PilotAccounting
 from DIRAC.AccountingSystem.Client.DataStoreClient         import gDataStoreClient
@@ -29,7 +30,7 @@ from DIRAC.Core.Utilities.SiteCEMapping                    import getSiteForCE
 from DIRAC.Core.Utilities.Time                             import dateTime, second
 from DIRAC.ResourceStatusSystem.Client.SiteStatus          import SiteStatus
 from DIRAC.Core.Utilities.List                             import fromChar
-import os, base64, bz2, tempfile, random, socket, types
+import os, base64, bz2, tempfile, random, socket, types, time
 import DIRAC
 
 __RCSID__ = "$Id$"
@@ -43,6 +44,9 @@ WAITING_PILOT_STATUS = ['Submitted', 'Waiting', 'Scheduled', 'Ready']
 FINAL_PILOT_STATUS = ['Aborted', 'Failed', 'Done']
 MAX_PILOTS_TO_SUBMIT = 100
 MAX_JOBS_IN_FILLMODE = 5
+# Fields of the CE description used by the TaskQueueDB to match the task queues
+TQ_MATCH_FIELDS = ( 'OwnerDN', 'OwnerGroup', 'Setup', 'CPUTime', 'GridCE', 'Site', 'GridMiddleware',
+                    'Platform', 'PilotType', 'SubmitPool', 'JobType', 'Tag' )
 
 class SiteDirector( AgentModule ):
   """
@@ -68,6 +72,14 @@ class SiteDirector( AgentModule ):
     self.maxJobsInFillMode = MAX_JOBS_IN_FILLMODE
     self.maxPilotsToSubmit = MAX_PILOTS_TO_SUBMIT
     self.siteStatus = SiteStatus()
+    self.queueRunner = None
+    self.monitoredCEs = set()
+    gMonitor.registerActivity( "SubmissionCycleTime", "Pilot submission cycle time",
+                               "SiteDirector", "seconds", gMonitor.OP_MEAN )
+    gMonitor.registerActivity( "StatusCycleTime", "Pilot status update cycle time",
+                               "SiteDirector", "seconds", gMonitor.OP_MEAN )
+    gMonitor.registerActivity( "BusyQueues", "Queues with a call still running",
+                               "SiteDirector", "queues", gMonitor.OP_MEAN )
     return S_OK()
 
   def beginExecution( self ):
@@ -125,6 +137,16 @@ class SiteDirector( AgentModule ):
     self.failedQueueCycleFactor = self.am_getOption( 'FailedQueueCycleFactor', 10 )
     self.pilotStatusUpdateCycleFactor = self.am_getOption( 'PilotStatusUpdateCycleFactor', 10 ) 
 
+    # The queues are served concurrently, the runner is kept across cycles so that
+    # the queues whose calls are still running are skipped
+    maxQueueThreads = self.am_getOption( 'MaxQueueThreads', 10 )
+    ceTimeout = self.am_getOption( 'CETimeout', 300 )
+    if not self.queueRunner:
+      self.queueRunner = QueueTaskRunner( maxThreads = maxQueueThreads, timeout = ceTimeout )
+    else:
+      self.queueRunner.maxThreads = max( 1, maxQueueThreads )
+      self.queueRunner.timeout = ceTimeout
+
     # Flags
     self.updateStatus = self.am_getOption( 'UpdatePilotStatus', True )
     self.getOutput = self.am_getOption( 'GetPilotOutput', True )
@@ -381,202 +403,273 @@ class SiteDirector( AgentModule ):
     #  self.log.info( 'No more pilots to be submitted in this cycle' )
     #  return S_OK()
 
-    # Check if the site is allowed in the mask
-    result = jobDB.getSiteMask()
-    if not result['OK']:
-      return S_ERROR( 'Can not get the site mask' )
-    siteMaskList = result['Value']
-
     queues = self.queueDict.keys()
     random.shuffle( queues )
-    totalSubmittedPilots = 0
+    # Data shared by the queues in this cycle
+    cycleData = { 'AnySite' : anySite,
+                  'JobSites' : jobSites,
+                  'TestSites' : testSites,
+                  'SiteMask' : {},
+                  'TaskQueues' : {},
+                  'WaitingPilots' : {} }
     for queue in queues:
-
-      # Check if the queue failed previously
-      failedCount = self.failedQueues.setdefault( queue, 0 ) % self.failedQueueCycleFactor
-      if failedCount != 0:
-        self.log.warn( "%s queue failed recently, skipping %d cycles" % ( queue, 10-failedCount ) )
-        self.failedQueues[queue] += 1
-        continue
-
-      ce = self.queueDict[queue]['CE']
-      ceName = self.queueDict[queue]['CEName']
-      ceType = self.queueDict[queue]['CEType']
-      queueName = self.queueDict[queue]['QueueName']
       siteName = self.queueDict[queue]['Site']
-      siteMask = self.siteStatus.isUsableSite( siteName, 'ComputingAccess' )
-      platform = self.queueDict[queue]['Platform']
+      if siteName not in cycleData['SiteMask']:
+        cycleData['SiteMask'][siteName] = self.siteStatus.isUsableSite( siteName, 'ComputingAccess' )
 
-      if not anySite and siteName not in jobSites:
-        self.log.verbose( "Skipping queue %s at %s: no workload expected" % (queueName, siteName) )
-        continue
-      if not siteMask and siteName not in testSites:
-        self.log.verbose( "Skipping queue %s at site %s not in the mask" % (queueName, siteName) )
-        continue
-
-      if 'CPUTime' in self.queueDict[queue]['ParametersDict'] :
-        queueCPUTime = int( self.queueDict[queue]['ParametersDict']['CPUTime'] )
-      else:
-        self.log.warn( 'CPU time limit is not specified for queue %s, skipping...' % queue )
+    startTime = time.time()
+    results = self.queueRunner.run( lambda queue: self.__submitPilotsToQueue( queue, cycleData ), queues )
+    totalSubmittedPilots = 0
+    for queue, ( result, _seconds ) in results.items():
+      if not result['OK']:
+        self.log.error( 'Failed to submit pilots to queue %s:' % queue, result['Message'] )
+        if self.queueRunner.isBusy( queue ):
+          self.failedQueues[queue] += 1
         continue
-      if queueCPUTime > self.maxQueueLength:
-        queueCPUTime = self.maxQueueLength
-
-      # Prepare the queue description to look for eligible jobs
-      ceDict = ce.getParameterDict()
-      ceDict[ 'GridCE' ] = ceName
-      #if not siteMask and 'Site' in ceDict:
-      #  self.log.info( 'Site not in the mask %s' % siteName )
-      #  self.log.info( 'Removing "Site" from matching Dict' )
-      #  del ceDict[ 'Site' ]
-      if not siteMask:
-        ceDict['JobType'] = "Test"
-      if self.vo:
-        ceDict['Community'] = self.vo
-      if self.voGroups:
-        ceDict['OwnerGroup'] = self.voGroups
+      totalSubmittedPilots += result['Value']
+    self.__reportCycle( 'Submission', startTime, results )
 
-      # This is a hack to get rid of !
-      ceDict['SubmitPool'] = self.defaultSubmitPools
-      
-      if "Tag" in ceDict and type( ceDict['Tag'] ) in types.StringTypes:
-        ceDict['Tag'] = fromChar( ceDict['Tag'] )
+    self.log.info( "%d pilots submitted in total in this cycle" % totalSubmittedPilots )
+    return S_OK()
 
-      result = Resources.getCompatiblePlatforms( platform )
+  def __getMatchingTaskQueues( self, ceDict, cycleData ):
+    """ Task queues matching a queue, the queues with the same matching parameters
+        sharing the result within a cycle
+    """
+    matchKey = str( sorted( [ ( key, ceDict[key] ) for key in TQ_MATCH_FIELDS if key in ceDict ] ) )
+    if matchKey not in cycleData['TaskQueues']:
+      result = RPCClient( "WorkloadManagement/Matcher" ).getMatchingTaskQueues( ceDict )
       if not result['OK']:
-        continue
-      ceDict['Platform'] = result['Value']
+        return result
+      cycleData['TaskQueues'][matchKey] = result['Value']
+    return S_OK( cycleData['TaskQueues'][matchKey] )
 
-      # Get the number of eligible jobs for the target site/queue
-      result = rpcMatcher.getMatchingTaskQueues( ceDict )
+  def __getWaitingPilots( self, tqIDList, cycleData ):
+    """ Number of waiting pilots for the task queues, shared within a cycle
+    """
+    tqKey = tuple( sorted( tqIDList ) )
+    if tqKey not in cycleData['WaitingPilots']:
+      lastUpdateTime = dateTime() - self.pilotWaitingTime * second
+      result = pilotAgentsDB.countPilots( { 'TaskQueueID': tqIDList,
+                                            'Status': WAITING_PILOT_STATUS },
+                                            None, lastUpdateTime )
       if not result['OK']:
-        self.log.error( 'Could not retrieve TaskQueues from TaskQueueDB', result['Message'] )
         return result
-      taskQueueDict = result['Value']
-      if not taskQueueDict:
-        self.log.verbose( 'No matching TQs found for %s' % queue )
-        continue
+      cycleData['WaitingPilots'][tqKey] = result['Value']
+    return S_OK( cycleData['WaitingPilots'][tqKey] )
 
-      totalTQJobs = 0
-      tqIDList = taskQueueDict.keys()
-      for tq in taskQueueDict:
-        totalTQJobs += taskQueueDict[tq]['Jobs']
+  def __submitPilotsToQueue( self, queue, cycleData ):
+    """ Submit the pilots needed by a queue, called concurrently for the queues
+
+    :return: S_OK with the number of pilots submitted
+    """
+    queueDict = self.queueDict[queue]
+
+    # Check if the queue failed previously
+    failedCount = self.failedQueues.setdefault( queue, 0 ) % self.failedQueueCycleFactor
+    if failedCount != 0:
+      self.log.warn( "%s queue failed recently, skipping %d cycles" % ( queue, 10-failedCount ) )
+      self.failedQueues[queue] += 1
+      return S_OK( 0 )
+
+    ce = queueDict['CE']
+    ceName = queueDict['CEName']
+    ceType = queueDict['CEType']
+    queueName = queueDict['QueueName']
+    siteName = queueDict['Site']
+    siteMask = cycleData['SiteMask'][siteName]
+    platform = queueDict['Platform']
+
+    if not cycleData['AnySite'] and siteName not in cycleData['JobSites']:
+      self.log.verbose( "Skipping queue %s at %s: no workload expected" % (queueName, siteName) )
+      return S_OK( 0 )
+    if not siteMask and siteName not in cycleData['TestSites']:
+      self.log.verbose( "Skipping queue %s at site %s not in the mask" % (queueName, siteName) )
+      return S_OK( 0 )
+
+    if 'CPUTime' in queueDict['ParametersDict'] :
+      queueCPUTime = int( queueDict['ParametersDict']['CPUTime'] )
+    else:
+      self.log.warn( 'CPU time limit is not specified for queue %s, skipping...' % queue )
+      return S_OK( 0 )
+    if queueCPUTime > self.maxQueueLength:
+      queueCPUTime = self.maxQueueLength
+
+    # Prepare the queue description to look for eligible jobs
+    ceDict = ce.getParameterDict()
+    ceDict[ 'GridCE' ] = ceName
+    #if not siteMask and 'Site' in ceDict:
+    #  self.log.info( 'Site not in the mask %s' % siteName )
+    #  self.log.info( 'Removing "Site" from matching Dict' )
+    #  del ceDict[ 'Site' ]
+    if not siteMask:
+      ceDict['JobType'] = "Test"
+    if self.vo:
+      ceDict['Community'] = self.vo
+    if self.voGroups:
+      ceDict['OwnerGroup'] = self.voGroups
 
-      self.log.verbose( '%d job(s) from %d task queue(s) are eligible for %s queue' % (totalTQJobs, len( tqIDList ), queue) )
+    # This is a hack to get rid of !
+    ceDict['SubmitPool'] = self.defaultSubmitPools
 
-      # Get the number of already waiting pilots for these task queues
-      totalWaitingPilots = 0
-      if self.pilotWaitingFlag:
-        lastUpdateTime = dateTime() - self.pilotWaitingTime * second
-        result = pilotAgentsDB.countPilots( { 'TaskQueueID': tqIDList,
-                                              'Status': WAITING_PILOT_STATUS },
-                                              None, lastUpdateTime )
-        if not result['OK']:
-          self.log.error( 'Failed to get Number of Waiting pilots', result['Message'] )
-          totalWaitingPilots = 0
-        else:
-          totalWaitingPilots = result['Value']
-          self.log.verbose( 'Waiting Pilots for TaskQueue %s:' % tqIDList, totalWaitingPilots )
-      if totalWaitingPilots >= totalTQJobs:
-        self.log.verbose( "%d waiting pilots already for all the available jobs" % totalWaitingPilots )
-        continue
+    if "Tag" in ceDict and type( ceDict['Tag'] ) in types.StringTypes:
+      ceDict['Tag'] = fromChar( ceDict['Tag'] )
 
-      self.log.verbose( "%d waiting pilots for the total of %d eligible jobs for %s" % (totalWaitingPilots, totalTQJobs, queue) )
+    result = Resources.getCompatiblePlatforms( platform )
+    if not result['OK']:
+      return S_OK( 0 )
+    ceDict['Platform'] = result['Value']
 
-      # Get the working proxy
-      cpuTime = queueCPUTime + 86400
-      self.log.verbose( "Getting pilot proxy for %s/%s %d long" % ( self.pilotDN, self.pilotGroup, cpuTime ) )
-      result = gProxyManager.getPilotProxyFromDIRACGroup( self.pilotDN, self.pilotGroup, cpuTime )
+    # Get the number of eligible jobs for the target site/queue
+    result = self.__getMatchingTaskQueues( ceDict, cycleData )
+    if not result['OK']:
+      self.log.error( 'Could not retrieve TaskQueues from TaskQueueDB', result['Message'] )
+      return result
+    taskQueueDict = result['Value']
+    if not taskQueueDict:
+      self.log.verbose( 'No matching TQs found for %s' % queue )
+      return S_OK( 0 )
+
+    totalTQJobs = 0
+    tqIDList = taskQueueDict.keys()
+    for tq in taskQueueDict:
+      totalTQJobs += taskQueueDict[tq]['Jobs']
+
+    self.log.verbose( '%d job(s) from %d task queue(s) are eligible for %s queue' % (totalTQJobs, len( tqIDList ), queue) )
+
+    # Get the number of already waiting pilots for these task queues
+    totalWaitingPilots = 0
+    if self.pilotWaitingFlag:
+      result = self.__getWaitingPilots( tqIDList, cycleData )
       if not result['OK']:
-        return result
-      self.proxy = result['Value']
-      ce.setProxy( self.proxy, cpuTime - 60 )
+        self.log.error( 'Failed to get Number of Waiting pilots', result['Message'] )
+        totalWaitingPilots = 0
+      else:
+        totalWaitingPilots = result['Value']
+        self.log.verbose( 'Waiting Pilots for TaskQueue %s:' % tqIDList, totalWaitingPilots )
+    if totalWaitingPilots >= totalTQJobs:
+      self.log.verbose( "%d waiting pilots already for all the available jobs" % totalWaitingPilots )
+      return S_OK( 0 )
+
+    self.log.verbose( "%d waiting pilots for the total of %d eligible jobs for %s" % (totalWaitingPilots, totalTQJobs, queue) )
+
+    # Get the working proxy
+    cpuTime = queueCPUTime + 86400
+    self.log.verbose( "Getting pilot proxy for %s/%s %d long" % ( self.pilotDN, self.pilotGroup, cpuTime ) )
+    result = gProxyManager.getPilotProxyFromDIRACGroup( self.pilotDN, self.pilotGroup, cpuTime )
+    if not result['OK']:
+      return result
+    proxy = result['Value']
+    ce.setProxy( proxy, cpuTime - 60 )
 
-      # Get the number of available slots on the target site/queue
-      totalSlots = self.__getQueueSlots( queue )
-      if totalSlots == 0:
-        self.log.debug( '%s: No slots available' % queue )
-        continue
+    # Get the number of available slots on the target site/queue
+    totalSlots = self.__getQueueSlots( queue )
+    if totalSlots == 0:
+      self.log.debug( '%s: No slots available' % queue )
+      return S_OK( 0 )
 
-      pilotsToSubmit = max( 0, min( totalSlots, totalTQJobs - totalWaitingPilots ) )
-      self.log.info( '%s: Slots=%d, TQ jobs=%d, Pilots: waiting %d, to submit=%d' % \
-                              ( queue, totalSlots, totalTQJobs, totalWaitingPilots, pilotsToSubmit ) )
+    pilotsToSubmit = max( 0, min( totalSlots, totalTQJobs - totalWaitingPilots ) )
+    self.log.info( '%s: Slots=%d, TQ jobs=%d, Pilots: waiting %d, to submit=%d' % \
+                            ( queue, totalSlots, totalTQJobs, totalWaitingPilots, pilotsToSubmit ) )
 
-      # Limit the number of pilots to submit to MAX_PILOTS_TO_SUBMIT
-      pilotsToSubmit = min( self.maxPilotsToSubmit, pilotsToSubmit )
+    # Limit the number of pilots to submit to MAX_PILOTS_TO_SUBMIT
+    pilotsToSubmit = min( self.maxPilotsToSubmit, pilotsToSubmit )
 
-      while pilotsToSubmit > 0:
-        self.log.info( 'Going to submit %d pilots to %s queue' % ( pilotsToSubmit, queue ) )
+    submittedPilots = 0
+    while pilotsToSubmit > 0:
+      self.log.info( 'Going to submit %d pilots to %s queue' % ( pilotsToSubmit, queue ) )
 
-        bundleProxy = self.queueDict[queue].get( 'BundleProxy', False )
-        jobExecDir = ''
-        if ceType == 'CREAM':
-          jobExecDir = '.'
-        jobExecDir = self.queueDict[queue].get( 'JobExecDir', jobExecDir )
-        httpProxy = self.queueDict[queue].get( 'HttpProxy', '' )
+      bundleProxy = queueDict.get( 'BundleProxy', False )
+      jobExecDir = ''
+      if ceType == 'CREAM':
+        jobExecDir = '.'
+      jobExecDir = queueDict.get( 'JobExecDir', jobExecDir )
+      httpProxy = queueDict.get( 'HttpProxy', '' )
 
-        result = self.__getExecutable( queue, pilotsToSubmit, bundleProxy, httpProxy, jobExecDir )
-        if not result['OK']:
-          return result
+      result = self.__getExecutable( queue, pilotsToSubmit, proxy, bundleProxy, httpProxy, jobExecDir )
+      if not result['OK']:
+        return result
 
-        executable, pilotSubmissionChunk = result['Value']
-        result = ce.submitJob( executable, '', pilotSubmissionChunk )
-        os.unlink( executable )
-        if not result['OK']:
-          self.log.error( 'Failed submission to queue %s:\n' % queue, result['Message'] )
-          pilotsToSubmit = 0
-          self.failedQueues[queue] += 1
-          continue
+      executable, pilotSubmissionChunk = result['Value']
+      result = ce.submitJob( executable, '', pilotSubmissionChunk )
+      os.unlink( executable )
+      if not result['OK']:
+        self.log.error( 'Failed submission to queue %s:\n' % queue, result['Message'] )
+        pilotsToSubmit = 0
+        self.failedQueues[queue] += 1
+        continue
 
-        pilotsToSubmit = pilotsToSubmit - pilotSubmissionChunk
-        # Add pilots to the PilotAgentsDB assign pilots to TaskQueue proportionally to the
-        # task queue priorities
-        pilotList = result['Value']
-        self.queueSlots[queue]['AvailableSlots'] -= len( pilotList )
-        totalSubmittedPilots += len( pilotList )
-        self.log.info( 'Submitted %d pilots to %s@%s' % ( len( pilotList ), queueName, ceName ) )
-        stampDict = {}
-        if result.has_key( 'PilotStampDict' ):
-          stampDict = result['PilotStampDict']
-        tqPriorityList = []
-        sumPriority = 0.
-        for tq in taskQueueDict:
-          sumPriority += taskQueueDict[tq]['Priority']
-          tqPriorityList.append( ( tq, sumPriority ) )
+      pilotsToSubmit = pilotsToSubmit - pilotSubmissionChunk
+      # Add pilots to the PilotAgentsDB assign pilots to TaskQueue proportionally to the
+      # task queue priorities
+      pilotList = result['Value']
+      self.queueSlots[queue]['AvailableSlots'] -= len( pilotList )
+      submittedPilots += len( pilotList )
+      self.log.info( 'Submitted %d pilots to %s@%s' % ( len( pilotList ), queueName, ceName ) )
+      stampDict = {}
+      if result.has_key( 'PilotStampDict' ):
+        stampDict = result['PilotStampDict']
+      tqPriorityList = []
+      sumPriority = 0.
+      for tq in taskQueueDict:
+        sumPriority += taskQueueDict[tq]['Priority']
+        tqPriorityList.append( ( tq, sumPriority ) )
+      rndm = random.random()*sumPriority
+      tqDict = {}
+      for pilotID in pilotList:
         rndm = random.random()*sumPriority
-        tqDict = {}
-        for pilotID in pilotList:
-          rndm = random.random()*sumPriority
-          for tq, prio in tqPriorityList:
-            if rndm < prio:
-              tqID = tq
-              break
-          if not tqDict.has_key( tqID ):
-            tqDict[tqID] = []
-          tqDict[tqID].append( pilotID )
-
-        for tqID, pilotList in tqDict.items():
-          result = pilotAgentsDB.addPilotTQReference( pilotList,
-                                                     tqID,
-                                                     self.pilotDN,
-                                                     self.pilotGroup,
-                                                     self.localhost,
-                                                     ceType,
-                                                     '',
-                                                     stampDict )
+        for tq, prio in tqPriorityList:
+          if rndm < prio:
+            tqID = tq
+            break
+        if not tqDict.has_key( tqID ):
+          tqDict[tqID] = []
+        tqDict[tqID].append( pilotID )
+
+      for tqID, pilotList in tqDict.items():
+        result = pilotAgentsDB.addPilotTQReference( pilotList,
+                                                   tqID,
+                                                   self.pilotDN,
+                                                   self.pilotGroup,
+                                                   self.localhost,
+                                                   ceType,
+                                                   '',
+                                                   stampDict )
+        if not result['OK']:
+          self.log.error( 'Failed add pilots to the PilotAgentsDB: ', result['Message'] )
+          continue
+        for pilot in pilotList:
+          result = pilotAgentsDB.setPilotStatus( pilot, 'Submitted', ceName,
+                                                'Successfully submitted by the SiteDirector',
+                                                siteName, queueName )
           if not result['OK']:
-            self.log.error( 'Failed add pilots to the PilotAgentsDB: ', result['Message'] )
+            self.log.error( 'Failed to set pilot status: ', result['Message'] )
             continue
-          for pilot in pilotList:
-            result = pilotAgentsDB.setPilotStatus( pilot, 'Submitted', ceName,
-                                                  'Successfully submitted by the SiteDirector',
-                                                  siteName, queueName )
-            if not result['OK']:
-              self.log.error( 'Failed to set pilot status: ', result['Message'] )
-              continue
 
-    self.log.info( "%d pilots submitted in total in this cycle" % totalSubmittedPilots )
-    return S_OK()
+    return S_OK( submittedPilots )
+
+  def __reportCycle( self, cycleName, startTime, results ):
+    """ Report the cycle time and the time spent with each CE
+    """
+    cycleTime = time.time() - startTime
+    ceTimes = {}
+    for queue, ( _result, seconds ) in results.items():
+      if queue in self.queueDict:
+        ceName = self.queueDict[queue]['CEName']
+        ceTimes[ceName] = max( ceTimes.get( ceName, 0 ), seconds )
+    slowest = sorted( [ ( seconds, ceName ) for ceName, seconds in ceTimes.items() ], reverse = True )[:5]
+    self.log.info( "%s cycle over %d queues took %.1f seconds, slowest CEs: %s" % \
+                   ( cycleName, len( results ), cycleTime,
+                     ", ".join( [ "%s %.1fs" % ( ceName, seconds ) for seconds, ceName in slowest ] ) ) )
+    gMonitor.addMark( "%sCycleTime" % cycleName, cycleTime )
+    gMonitor.addMark( "BusyQueues", len( self.queueRunner.getBusyKeys() ) )
+    for ceName, seconds in ceTimes.items():
+      activity = "CETime-%s" % ceName
+      if activity not in self.monitoredCEs:
+        gMonitor.registerActivity( activity, "Time spent with %s per cycle" % ceName,
+                                   "SiteDirector", "seconds", gMonitor.OP_MEAN, 600 )
+        self.monitoredCEs.add( activity )
+      gMonitor.addMark( activity, seconds )
 
   def __getQueueSlots( self, queue ):
     """ Get the number of available slots in the queue
@@ -615,13 +708,12 @@ class SiteDirector( AgentModule ):
     return totalSlots
 
 #####################################################################################
-  def __getExecutable( self, queue, pilotsToSubmit, bundleProxy = True, httpProxy = '', jobExecDir = '' ):
+  def __getExecutable( self, queue, pilotsToSubmit, proxy, bundleProxy = True, httpProxy = '', jobExecDir = '' ):
     """ Prepare the full executable for queue
     """
 
-    proxy = None
-    if bundleProxy:
-      proxy = self.proxy
+    if not bundleProxy:
+      proxy = None
     pilotOptions, pilotsToSubmit = self._getPilotOptions( queue, pilotsToSubmit )
     if pilotOptions is None:
       self.log.error( "Pilot options empty, error in compilation" )
@@ -835,142 +927,122 @@ EOF
   def updatePilotStatus( self ):
     """ Update status of pilots in transient states
     """
-    for queue in self.queueDict:
-      ce = self.queueDict[queue]['CE']
-      ceName = self.queueDict[queue]['CEName']
-      queueName = self.queueDict[queue]['QueueName']
-      ceType = self.queueDict[queue]['CEType']
-      siteName = self.queueDict[queue]['Site']
-      abortedPilots = 0
-
-      result = pilotAgentsDB.selectPilots( {'DestinationSite':ceName,
-                                            'Queue':queueName,
-                                            'GridType':ceType,
-                                            'GridSite':siteName,
-                                            'Status':TRANSIENT_PILOT_STATUS,
-                                            'OwnerDN': self.pilotDN,
-                                            'OwnerGroup': self.pilotGroup } )
+    startTime = time.time()
+    results = self.queueRunner.run( self.__updateQueuePilotStatus, self.queueDict.keys() )
+    # The accounting records are sent at once for all the queues
+    accountingDict = {}
+    for queue, ( result, _seconds ) in results.items():
       if not result['OK']:
-        self.log.error( 'Failed to select pilots: %s' % result['Message'] )
+        self.log.error( 'Failed to update the pilots of queue %s:' % queue, result['Message'] )
         continue
+      accountingDict.update( result['Value'] )
+    self.__reportCycle( 'Status', startTime, results )
+
+    if accountingDict:
+      result = self.sendPilotAccounting( accountingDict )
+      if not result['OK']:
+        self.log.error( 'Failed to send pilot agent accounting' )
+
+    return S_OK()
+
+  def __checkCEProxy( self, ce ):
+    """ Renew the proxy of a CE if needed
+    """
+    result = ce.isProxyValid()
+    if not result['OK']:
+      result = gProxyManager.getPilotProxyFromDIRACGroup( self.pilotDN, self.pilotGroup, 23400 )
+      if not result['OK']:
+        return result
+      ce.setProxy( result['Value'], 23300 )
+    return S_OK()
+
+  def __updateQueuePilotStatus( self, queue ):
+    """ Update the status of the pilots of a queue and retrieve their output,
+        called concurrently for the queues
+
+    :return: S_OK with the info of the pilots of the queue whose accounting is to be sent
+    """
+    queueDict = self.queueDict[queue]
+    ce = queueDict['CE']
+    ceName = queueDict['CEName']
+    queueName = queueDict['QueueName']
+    ceType = queueDict['CEType']
+    siteName = queueDict['Site']
+    abortedPilots = 0
+
+    result = pilotAgentsDB.selectPilots( {'DestinationSite':ceName,
+                                          'Queue':queueName,
+                                          'GridType':ceType,
+                                          'GridSite':siteName,
+                                          'Status':TRANSIENT_PILOT_STATUS,
+                                          'OwnerDN': self.pilotDN,
+                                          'OwnerGroup': self.pilotGroup } )
+    if not result['OK']:
+      self.log.error( 'Failed to select pilots: %s' % result['Message'] )
+      pilotRefs = []
+    else:
       pilotRefs = result['Value']
-      if not pilotRefs:
-        continue
 
+    pilotDict = {}
+    if pilotRefs:
       result = pilotAgentsDB.getPilotInfo( pilotRefs )
       if not result['OK']:
         self.log.error( 'Failed to get pilots info from DB', result['Message'] )
-        continue
-      pilotDict = result['Value']
+        pilotRefs = []
+      else:
+        pilotDict = result['Value']
 
-      stampedPilotRefs = []
-      for pRef in pilotDict:
-        if pilotDict[pRef]['PilotStamp']:
-          stampedPilotRefs.append( pRef + ":::" + pilotDict[pRef]['PilotStamp'] )
-        else:
-          stampedPilotRefs = list( pilotRefs )
-          break
+    stampedPilotRefs = []
+    for pRef in pilotDict:
+      if pilotDict[pRef]['PilotStamp']:
+        stampedPilotRefs.append( pRef + ":::" + pilotDict[pRef]['PilotStamp'] )
+      else:
+        stampedPilotRefs = list( pilotRefs )
+        break
 
-      result = ce.isProxyValid()
+    pilotCEDict = {}
+    if pilotRefs:
+      result = self.__checkCEProxy( ce )
       if not result['OK']:
-        result = gProxyManager.getPilotProxyFromDIRACGroup( self.pilotDN, self.pilotGroup, 23400 )
-        if not result['OK']:
-          return result
-        self.proxy = result['Value']
-        ce.setProxy( self.proxy, 23300 )
-
+        return result
       result = ce.getJobStatus( stampedPilotRefs )
       if not result['OK']:
         self.log.error( 'Failed to get pilots status from CE', '%s: %s' % ( ceName, result['Message'] ) )
-        continue
-      pilotCEDict = result['Value']
-
-      for pRef in pilotRefs:
-        newStatus = ''
-        oldStatus = pilotDict[pRef]['Status']
-        ceStatus = pilotCEDict[pRef]
-        lastUpdateTime = pilotDict[pRef]['LastUpdateTime']
-        sinceLastUpdate = dateTime() - lastUpdateTime
-
-        if oldStatus == ceStatus and ceStatus != "Unknown":
-          # Normal status did not change, continue
-          continue
-        elif ceStatus == "Unknown" and oldStatus == "Unknown":
-          if sinceLastUpdate < 3600*second:
-            # Allow 1 hour of Unknown status assuming temporary problems on the CE
-            continue
-          else:
-            newStatus = 'Aborted'
-        elif ceStatus == "Unknown" and not oldStatus in FINAL_PILOT_STATUS:
-          # Possible problems on the CE, let's keep the Unknown status for a while
-          newStatus = 'Unknown'
-        elif ceStatus != 'Unknown' :
-          # Update the pilot status to the new value
-          newStatus = ceStatus
-
-        if newStatus:
-          self.log.info( 'Updating status to %s for pilot %s' % ( newStatus, pRef ) )
-          result = pilotAgentsDB.setPilotStatus( pRef, newStatus, '', 'Updated by SiteDirector' )
-          if newStatus == "Aborted":
-            abortedPilots += 1
-        # Retrieve the pilot output now
-        if newStatus in FINAL_PILOT_STATUS:
-          if pilotDict[pRef]['OutputReady'].lower() == 'false' and self.getOutput:
-            self.log.info( 'Retrieving output for pilot %s' % pRef )
-            pilotStamp = pilotDict[pRef]['PilotStamp']
-            pRefStamp = pRef
-            if pilotStamp:
-              pRefStamp = pRef + ':::' + pilotStamp
-            result = ce.getJobOutput( pRefStamp )
-            if not result['OK']:
-              self.log.error( 'Failed to get pilot output', '%s: %s' % ( ceName, result['Message'] ) )
-            else:
-              output, error = result['Value']
-              if output:
-                result = pilotAgentsDB.storePilotOutput( pRef, output, error )
-                if not result['OK']:
-                  self.log.error( 'Failed to store pilot output', result['Message'] )
-              else:
-                self.log.warn( 'Empty pilot output not stored to PilotDB' )
-
-      # If something wrong in the queue, make a pause for the job submission
-      if abortedPilots:
-        self.failedQueues[queue] += 1 
-
-    # The pilot can be in Done state set by the job agent check if the output is retrieved
-    for queue in self.queueDict:
-      ce = self.queueDict[queue]['CE']
-
-      if not ce.isProxyValid( 120 ):
-        result = gProxyManager.getPilotProxyFromDIRACGroup( self.pilotDN, self.pilotGroup, 1000 )
-        if not result['OK']:
-          return result
-        ce.setProxy( self.proxy, 940 )
+        pilotRefs = []
+      else:
+        pilotCEDict = result['Value']
 
-      ceName = self.queueDict[queue]['CEName']
-      queueName = self.queueDict[queue]['QueueName']
-      ceType = self.queueDict[queue]['CEType']
-      siteName = self.queueDict[queue]['Site']
-      result = pilotAgentsDB.selectPilots( {'DestinationSite':ceName,
-                                           'Queue':queueName,
-                                           'GridType':ceType,
-                                           'GridSite':siteName,
-                                           'OutputReady':'False',
-                                           'Status':FINAL_PILOT_STATUS} )
+    for pRef in pilotRefs:
+      newStatus = ''
+      oldStatus = pilotDict[pRef]['Status']
+      ceStatus = pilotCEDict[pRef]
+      lastUpdateTime = pilotDict[pRef]['LastUpdateTime']
+      sinceLastUpdate = dateTime() - lastUpdateTime
 
-      if not result['OK']:
-        self.log.error( 'Failed to select pilots', result['Message'] )
+      if oldStatus == ceStatus and ceStatus != "Unknown":
+        # Normal status did not change, continue
         continue
-      pilotRefs = result['Value']
-      if not pilotRefs:
-        continue
-      result = pilotAgentsDB.getPilotInfo( pilotRefs )
-      if not result['OK']:
-        self.log.error( 'Failed to get pilots info from DB', result['Message'] )
-        continue
-      pilotDict = result['Value']
-      if self.getOutput:
-        for pRef in pilotRefs:
+      elif ceStatus == "Unknown" and oldStatus == "Unknown":
+        if sinceLastUpdate < 3600*second:
+          # Allow 1 hour of Unknown status assuming temporary problems on the CE
+          continue
+        else:
+          newStatus = 'Aborted'
+      elif ceStatus == "Unknown" and not oldStatus in FINAL_PILOT_STATUS:
+        # Possible problems on the CE, let's keep the Unknown status for a while
+        newStatus = 'Unknown'
+      elif ceStatus != 'Unknown' :
+        # Update the pilot status to the new value
+        newStatus = ceStatus
+
+      if newStatus:
+        self.log.info( 'Updating status to %s for pilot %s' % ( newStatus, pRef ) )
+        result = pilotAgentsDB.setPilotStatus( pRef, newStatus, '', 'Updated by SiteDirector' )
+        if newStatus == "Aborted":
+          abortedPilots += 1
+      # Retrieve the pilot output now
+      if newStatus in FINAL_PILOT_STATUS:
+        if pilotDict[pRef]['OutputReady'].lower() == 'false' and self.getOutput:
           self.log.info( 'Retrieving output for pilot %s' % pRef )
           pilotStamp = pilotDict[pRef]['PilotStamp']
           pRefStamp = pRef
@@ -981,35 +1053,76 @@ EOF
             self.log.error( 'Failed to get pilot output', '%s: %s' % ( ceName, result['Message'] ) )
           else:
             output, error = result['Value']
-            result = pilotAgentsDB.storePilotOutput( pRef, output, error )
-            if not result['OK']:
-              self.log.error( 'Failed to store pilot output', result['Message'] )
+            if output:
+              result = pilotAgentsDB.storePilotOutput( pRef, output, error )
+              if not result['OK']:
+                self.log.error( 'Failed to store pilot output', result['Message'] )
+            else:
+              self.log.warn( 'Empty pilot output not stored to PilotDB' )
 
-      # Check if the accounting is to be sent
-      if self.sendAccounting:
-        result = pilotAgentsDB.selectPilots( {'DestinationSite':ceName,
-                                             'Queue':queueName,
-                                             'GridType':ceType,
-                                             'GridSite':siteName,
-                                             'AccountingSent':'False',
-                                             'Status':FINAL_PILOT_STATUS} )
+    # If something wrong in the queue, make a pause for the job submission
+    if abortedPilots:
+      self.failedQueues[queue] = self.failedQueues.get( queue, 0 ) + 1
 
-        if not result['OK']:
-          self.log.error( 'Failed to select pilots', result['Message'] )
-          continue
-        pilotRefs = result['Value']
-        if not pilotRefs:
-          continue
-        result = pilotAgentsDB.getPilotInfo( pilotRefs )
-        if not result['OK']:
-          self.log.error( 'Failed to get pilots info from DB', result['Message'] )
-          continue
+    # The pilot can be in Done state set by the job agent check if the output is retrieved
+    result = pilotAgentsDB.selectPilots( {'DestinationSite':ceName,
+                                         'Queue':queueName,
+                                         'GridType':ceType,
+                                         'GridSite':siteName,
+                                         'OutputReady':'False',
+                                         'Status':FINAL_PILOT_STATUS} )
+
+    if not result['OK']:
+      self.log.error( 'Failed to select pilots', result['Message'] )
+      pilotRefs = []
+    else:
+      pilotRefs = result['Value']
+    if pilotRefs and self.getOutput:
+      result = pilotAgentsDB.getPilotInfo( pilotRefs )
+      if not result['OK']:
+        self.log.error( 'Failed to get pilots info from DB', result['Message'] )
+        pilotRefs = []
+      else:
         pilotDict = result['Value']
-        result = self.sendPilotAccounting( pilotDict )
+        result = self.__checkCEProxy( ce )
         if not result['OK']:
-          self.log.error( 'Failed to send pilot agent accounting' )
+          return result
+      for pRef in pilotRefs:
+        self.log.info( 'Retrieving output for pilot %s' % pRef )
+        pilotStamp = pilotDict[pRef]['PilotStamp']
+        pRefStamp = pRef
+        if pilotStamp:
+          pRefStamp = pRef + ':::' + pilotStamp
+        result = ce.getJobOutput( pRefStamp )
+        if not result['OK']:
+          self.log.error( 'Failed to get pilot output', '%s: %s' % ( ceName, result['Message'] ) )
+        else:
+          output, error = result['Value']
+          result = pilotAgentsDB.storePilotOutput( pRef, output, error )
+          if not result['OK']:
+            self.log.error( 'Failed to store pilot output', result['Message'] )
+
+    # Check if the accounting is to be sent
+    if not self.sendAccounting:
+      return S_OK( {} )
+    result = pilotAgentsDB.selectPilots( {'DestinationSite':ceName,
+                                         'Queue':queueName,
+                                         'GridType':ceType,
+                                         'GridSite':siteName,
+                                         'AccountingSent':'False',
+                                         'Status':FINAL_PILOT_STATUS} )
 
-    return S_OK()
+    if not result['OK']:
+      self.log.error( 'Failed to select pilots', result['Message'] )
+      return S_OK( {} )
+    pilotRefs = result['Value']
+    if not pilotRefs:
+      return S_OK( {} )
+    result = pilotAgentsDB.getPilotInfo( pilotRefs )
+    if not result['OK']:
+      self.log.error( 'Failed to get pilots info from DB', result['Message'] )
+      return S_OK( {} )
+    return S_OK( result['Value'] )
 
   def sendPilotAccounting( self, pilotDict ):
     """ Send pilot accounting record
@@ -7,6 +7,10 @@
 """ The Download Input Data module wraps around the Replica Management
     components to provide access to datasets by available site protocols as
     defined in the CS for the VO.
+
+    The files are downloaded concurrently by StagingThreads threads and, if a
+    StagingCacheDir is given in the configuration, through the node local cache
+    of the files with a known Adler32 checksum.
 """
 
 __RCSID__ = "$Id$"
@@ -14,9 +18,10 @@ __RCSID__ = "$Id$"
 from DIRAC.Core.DISET.RPCClient                                     import RPCClient
 from DIRAC.Resources.Storage.StorageElement                         import StorageElement
 from DIRAC.Core.Utilities.Os                                        import getDiskSpace
+from DIRAC.WorkloadManagementSystem.Client.StagingCache             import StagingCache, executeInParallel, adler32Check
 from DIRAC                                                          import S_OK, S_ERROR, gLogger
 
-import os, tempfile, random
+import os, tempfile, random, threading
 
 COMPONENT_NAME = 'DownloadInputData'
 
@@ -37,11 +42,26 @@ class DownloadInputData:
     # By default put each input data file into a separate directory
     self.inputDataDirectory = argumentsDict.get( 'InputDataDirectory', 'PerFile' )
     self.jobID = None
-    self.storageElements = {}
+    # The StorageElement objects are not thread safe, each thread has its own ones
+    self.threadData = threading.local()
     self.counter = 1
+    self.counterLock = threading.Lock()
+    self.stagingThreads = self.configuration.get( 'StagingThreads', 4 )
+    self.stagingCache = None
+    if self.configuration.get( 'StagingCacheDir' ):
+      try:
+        self.stagingCache = StagingCache( self.configuration['StagingCacheDir'],
+                                          self.configuration.get( 'StagingCacheSize', 10240 ) * 1048576 )
+      except Exception, x:
+        self.log.warn( 'Cannot use the staging cache %s: %s' % ( self.configuration['StagingCacheDir'], str( x ) ) )
 
   def __storageElement( self, seName ):
-    return self.storageElements.setdefault( seName, StorageElement( seName ) )
+    storageElements = getattr( self.threadData, 'storageElements', None )
+    if storageElements is None:
+      storageElements = self.threadData.storageElements = {}
+    if seName not in storageElements:
+      storageElements[seName] = StorageElement( seName )
+    return storageElements[seName]
 
   #############################################################################
   def execute( self, dataToResolve = None ):
@@ -147,64 +167,17 @@ class DownloadInputData:
 
     resolvedData = {}
     localSECount = 0
-    for lfn in downloadReplicas:
-      seName = downloadReplicas[lfn]['SE']
-      guid = downloadReplicas[lfn]['GUID']
-      reps = replicas.get( lfn, {} )
-      if seName:
-        result = self.__storageElement( seName ).getFileMetadata( lfn )
-        if not result['OK']:
-          self.log.error( "Error getting metadata", result['Message'] )
-          failedReplicas.add( lfn )
-          continue
-        if lfn in result['Value']['Failed']:
-          self.log.error( 'Could not get Storage Metadata for %s at %s: %s' % ( lfn, seName, result['Value']['Failed'][lfn] ) )
-          failedReplicas.add( lfn )
-          continue
-        metadata = result['Value']['Successful'][lfn]
-        if metadata['Lost']:
-          error = "PFN has been Lost by the StorageElement"
-        elif metadata['Unavailable']:
-          error = "PFN is declared Unavailable by the StorageElement"
-        elif seName in tapeSEs and not metadata['Cached']:
-          error = "PFN is no longer in StorageElement Cache"
-        else:
-          error = ''
-        if error:
-          self.log.error( error, lfn )
-          failedReplicas.add( lfn )
-          continue
-
-        self.log.info( 'Preliminary checks OK, download %s from %s:' % ( lfn, seName ) )
-        result = self.__downloadPFN( lfn, seName, reps, guid )
-        if not result['OK']:
-          self.log.error( 'Download from %s failed:' % seName, result['Message'] )
-      else:
-        result = {'OK':False}
-
+    lfnList = downloadReplicas.keys()
+    stagingFunctions = [ lambda lfn = lfn: self.__stageFile( lfn, downloadReplicas[lfn], replicas.get( lfn, {} ), tapeSEs )
+                         for lfn in lfnList ]
+    for lfn, result in zip( lfnList, executeInParallel( stagingFunctions, self.stagingThreads ) ):
       if not result['OK']:
-        reps.pop( seName, None )
-        # Check the other SEs
-        if reps:
-          self.log.info( 'Trying to download from any SE' )
-          result = self.__downloadLFN( lfn, reps, guid )
-          if not result['OK']:
-            self.log.error( 'Download from any SE failed', result['Message'] )
-            failedReplicas.add( lfn )
-        else:
-          failedReplicas.add( lfn )
-      else:
+        failedReplicas.add( lfn )
+        continue
+      fileDict, fromLocalSE = result['Value']
+      if fromLocalSE:
         localSECount += 1
-      if result['OK']:
-        # Rename file if downloaded FileName does not match the LFN... How can this happen?
-        lfnName = os.path.basename( lfn )
-        oldPath = result['Value']['path']
-        fileName = os.path.basename( oldPath )
-        if lfnName != fileName:
-          newPath = os.path.join( os.path.dirname( oldPath ), lfnName )
-          os.rename( oldPath, newPath )
-          result['Value']['path'] = newPath
-        resolvedData[lfn] = result['Value']
+      resolvedData[lfn] = fileDict
 
     # Report datasets that could not be downloaded
     report = ''
@@ -220,6 +193,64 @@ class DownloadInputData:
     failedReplicas = [lfn for lfn in sorted( failedReplicas ) if lfn not in resolvedData]
     return S_OK( {'Successful': resolvedData, 'Failed':failedReplicas} )
 
+  #############################################################################
+  def __stageFile( self, lfn, downloadReplica, reps, tapeSEs ):
+    """ Download a file from the selected local SE or else from any SE, it is
+        called concurrently for all the files
+
+    :return: S_OK( ( file dictionary, True if downloaded from the selected local SE ) )
+    """
+    seName = downloadReplica['SE']
+    guid = downloadReplica['GUID']
+    if seName:
+      result = self.__storageElement( seName ).getFileMetadata( lfn )
+      if not result['OK']:
+        self.log.error( "Error getting metadata", result['Message'] )
+        return result
+      if lfn in result['Value']['Failed']:
+        self.log.error( 'Could not get Storage Metadata for %s at %s: %s' % ( lfn, seName, result['Value']['Failed'][lfn] ) )
+        return S_ERROR( result['Value']['Failed'][lfn] )
+      metadata = result['Value']['Successful'][lfn]
+      if metadata['Lost']:
+        error = "PFN has been Lost by the StorageElement"
+      elif metadata['Unavailable']:
+        error = "PFN is declared Unavailable by the StorageElement"
+      elif seName in tapeSEs and not metadata['Cached']:
+        error = "PFN is no longer in StorageElement Cache"
+      else:
+        error = ''
+      if error:
+        self.log.error( error, lfn )
+        return S_ERROR( error )
+
+      self.log.info( 'Preliminary checks OK, download %s from %s:' % ( lfn, seName ) )
+      result = self.__downloadPFN( lfn, seName, reps, guid )
+      if not result['OK']:
+        self.log.error( 'Download from %s failed:' % seName, result['Message'] )
+    else:
+      result = S_ERROR( 'No local replica' )
+
+    fromLocalSE = result['OK']
+    if not result['OK']:
+      reps.pop( seName, None )
+      # Check the other SEs
+      if not reps:
+        return result
+      self.log.info( 'Trying to download from any SE' )
+      result = self.__downloadLFN( lfn, reps, guid )
+      if not result['OK']:
+        self.log.error( 'Download from any SE failed', result['Message'] )
+        return result
+    # Rename file if downloaded FileName does not match the LFN... How can this happen?
+    lfnName = os.path.basename( lfn )
+    oldPath = result['Value']['path']
+    fileName = os.path.basename( oldPath )
+    if lfnName != fileName:
+      newPath = os.path.join( os.path.dirname( oldPath ), lfnName )
+      os.rename( oldPath, newPath )
+      result['Value']['path'] = newPath
+    return S_OK( ( result['Value'], fromLocalSE ) )
+
   #############################################################################
   def __checkDiskSpace( self, totalSize ):
     """Compare available disk space to the file size reported from the catalog
@@ -242,9 +273,14 @@ class DownloadInputData:
 
   def __getDownloadDir( self, incrementCounter = True ):
     if self.inputDataDirectory == "PerFile":
-      if incrementCounter:
-        self.counter += 1
-      return tempfile.mkdtemp( prefix = 'InputData_%s' % ( self.counter ), dir = os.getcwd() )
+      self.counterLock.acquire()
+      try:
+        if incrementCounter:
+          self.counter += 1
+        counter = self.counter
+      finally:
+        self.counterLock.release()
+      return tempfile.mkdtemp( prefix = 'InputData_%s' % ( counter ), dir = os.getcwd() )
     elif self.inputDataDirectory == "CWD":
       return os.getcwd()
     else:
@@ -297,13 +333,23 @@ class DownloadInputData:
         return S_OK( fileDict )
 
 
-    result = self.__storageElement( seName ).getFile( lfn, localPath = downloadDir )
-    if not result['OK']:
-      self.log.warn( 'Problem getting %s at %s:\n%s' % ( lfn, seName, result['Message'] ) )
-      return result
-    if lfn in result['Value']['Failed']:
-      self.log.warn( 'Problem getting %s at %s:\n%s' % ( lfn, seName, result['Value']['Failed'][lfn] ) )
-      return S_ERROR( result['Value']['Failed'][lfn] )
+    checksum = reps.get( 'Checksum' )
+    checkFunction = adler32Check( checksum, reps.get( 'ChecksumType' ) )
+    if self.stagingCache and checkFunction:
+      # Files with the same LFN and checksum are the same file
+      result = self.stagingCache.getOrAdd( 'LFN:%s:%s' % ( lfn, checksum ),
+                                           lambda: self.__getFile( lfn, seName, downloadDir ), checkFunction )
+      if not result['OK']:
+        return result
+      cachedPath, downloadedPath = result['Value']
+      if not downloadedPath:
+        self.log.info( 'File %s found in the staging cache' % fileName )
+        if not self.stagingCache.getFile( 'LFN:%s:%s' % ( lfn, checksum ), localFile ):
+          return S_ERROR( 'Could not copy %s from the staging cache' % cachedPath )
+    else:
+      result = self.__getFile( lfn, seName, downloadDir )
+      if not result['OK']:
+        return result
 
     if os.path.exists( localFile ):
       self.log.verbose( 'File %s exists in download directory' % ( fileName ) )
@@ -313,6 +359,20 @@ class DownloadInputData:
       self.log.warn( 'File does not exist in local directory after download' )
       return S_ERROR( 'OK download result but file missing in current directory' )
 
+  def __getFile( self, lfn, seName, downloadDir ):
+    """ Download a file from a Storage Element to downloadDir
+
+    :return: S_OK( local file path )
+    """
+    result = self.__storageElement( seName ).getFile( lfn, localPath = downloadDir )
+    if not result['OK']:
+      self.log.warn( 'Problem getting %s at %s:\n%s' % ( lfn, seName, result['Message'] ) )
+      return result
+    if lfn in result['Value']['Failed']:
+      self.log.warn( 'Problem getting %s at %s:\n%s' % ( lfn, seName, result['Value']['Failed'][lfn] ) )
+      return S_ERROR( result['Value']['Failed'][lfn] )
+    return S_OK( os.path.join( downloadDir, os.path.basename( lfn ) ) )
+
   #############################################################################
   def __setJobParam( self, name, value ):
     """Wraps around setJobParameter of state update client
@@ -0,0 +1,95 @@
+""" Announces the new and rescheduled jobs to the OptimizationMind, so that their
+    optimization starts at once instead of at the next periodic load of the mind
+
+    The jobs are sent in an OptimizeJobs message through a connection kept open.
+    If the mind can not be reached, the jobs are kept and sent with the next
+    notification, the connection being retried at most every ReconnectPeriod
+    seconds. At most maxPendingJobs jobs are kept, the oldest ones are dropped
+    beyond that. The periodic load of the mind picks up the jobs that are lost.
+
+    In the process running the OptimizationMind the jobs are given directly to
+    the mind with setLocalReceiver.
+"""
+
+__RCSID__ = "$Id$"
+
+import time
+import threading
+
+from DIRAC import S_OK, gLogger
+
+class JobOptimizationNotifier( object ):
+
+  def __init__( self, reconnectPeriod = 60, maxPendingJobs = 10000 ):
+    self.log = gLogger.getSubLogger( "JobOptimizationNotifier" )
+    self.__reconnectPeriod = reconnectPeriod
+    self.__maxPendingJobs = maxPendingJobs
+    self.__msgClient = None
+    self.__lastConnection = 0
+    self.__localReceiver = None
+    self.__pendingJobs = set()
+    self.__lock = threading.Lock()
+
+  def setLocalReceiver( self, receiver ):
+    """ Give the jobs to receiver( jids ) instead of sending them
+    """
+    self.__localReceiver = receiver
+
+  def __connect( self ):
+    if self.__msgClient and self.__msgClient.connected:
+      return True
+    if time.time() - self.__lastConnection < self.__reconnectPeriod:
+      return False
+    self.__lastConnection = time.time()
+    if not self.__msgClient:
+      from DIRAC.Core.DISET.MessageClient import MessageClient
+      self.__msgClient = MessageClient( "WorkloadManagement/OptimizationMind" )
+    result = self.__msgClient.connect( JobManager = True )
+    if not result[ 'OK' ]:
+      self.log.warn( "Cannot connect to OptimizationMind", result[ 'Message' ] )
+      return False
+    return True
+
+  def optimizeJobs( self, jids ):
+    """ Announce jobs to the OptimizationMind, along with the ones that could not
+        be sent before
+
+    :return: S_OK with the number of jobs sent
+    """
+    if self.__localReceiver:
+      self.__localReceiver( list( jids ) )
+      return S_OK( len( jids ) )
+    self.__lock.acquire()
+    try:
+      self.__pendingJobs.update( [ long( jid ) for jid in jids ] )
+      if len( self.__pendingJobs ) > self.__maxPendingJobs:
+        # The periodic load of the mind finds the dropped jobs
+        pendingJobs = sorted( self.__pendingJobs )
+        self.log.warn( "Too many jobs not sent to OptimizationMind, dropping the oldest",
+                       "%s jobs" % ( len( pendingJobs ) - self.__maxPendingJobs ) )
+        self.__pendingJobs = set( pendingJobs[ -self.__maxPendingJobs: ] )
+      if not self.__pendingJobs or not self.__connect():
+        return S_OK( 0 )
+      result = self.__msgClient.createMessage( "OptimizeJobs" )
+      if not result[ 'OK' ]:
+        self.log.error( "Cannot create Optimize message", result[ 'Message' ] )
+        return S_OK( 0 )
+      msgObj = result[ 'Value' ]
+      msgObj.jids = sorted( self.__pendingJobs )
+      result = self.__msgClient.sendMessage( msgObj )
+      if not result[ 'OK' ]:
+        self.log.error( "Cannot send Optimize message", result[ 'Message' ] )
+        return S_OK( 0 )
+      numJobs = len( self.__pendingJobs )
+      self.__pendingJobs = set()
+    finally:
+      self.__lock.release()
+    self.log.info( "Optimize msg sent for %s jobs" % numJobs )
+    return S_OK( numJobs )
+
+  def flush( self ):
+    """ Send the jobs not sent yet
+    """
+    return self.optimizeJobs( [] )
+
+gJobOptimizationNotifier = JobOptimizationNotifier()
@@ -58,10 +58,76 @@ class CachedJobState( object ):
   def getDirtyKeys( self ):
     return set( self.__dirtyKeys )
 
-  def commitChanges( self ):
+  @classmethod
+  def loadMany( cls, jidList ):
+    """ CachedJobStates for the jobs in jidList with their attributes, optimizer
+        parameters, manifest and input data already cached, all of them fetched with
+        a few bulk queries. Without local access to the DBs the states are created
+        one by one
+
+    :return: S_OK with a dict jid -> CachedJobState
+    """
+    if not JobState.hasLocalAccess():
+      return S_OK( dict( [ ( jid, cls( jid ) ) for jid in jidList ] ) )
+    result = JobState.getJobsData( jidList )
+    if not result[ 'OK' ]:
+      return result
+    jobsData = result[ 'Value' ]
+    states = {}
+    for jid in jidList:
+      if jid not in jobsData:
+        #Let the usual path deal with it
+        states[ jid ] = cls( jid )
+        continue
+      cjs = cls( jid, skipInitState = True )
+      cjs.__preload( jobsData[ jid ] )
+      states[ jid ] = cjs
+    return S_OK( states )
+
+  def __preload( self, jobData ):
+    #Cached as if they had been read, nothing is dirty
+    for prefix in ( 'att', 'optp' ):
+      for key in jobData[ prefix ]:
+        self.__cache[ "%s.%s" % ( prefix, key ) ] = jobData[ prefix ][ key ]
+    self.__cache[ 'inputData' ] = jobData[ 'inputData' ]
+    if jobData[ 'jdl' ]:
+      manifest = JobManifest()
+      if manifest.loadJDL( jobData[ 'jdl' ] )[ 'OK' ]:
+        self.__manifest = manifest
+    self.__initState = dict( [ ( key, jobData[ 'att' ].get( key ) ) for key in ( "Status", "MinorStatus", "LastUpdateTime" ) ] )
+
+  @classmethod
+  def commitMany( cls, cjsList ):
+    """ Commit the changes of several CachedJobStates, the cached changes of all
+        of them being written at once with JobState.commitCaches. Without local
+        access to the DBs each state is committed on its own
+
+    :return: S_OK with a dict jid -> result of the commit of the job
+    """
+    if not JobState.hasLocalAccess():
+      return S_OK( dict( [ ( cjs.jid, cjs.commitChanges() ) for cjs in cjsList ] ) )
+    results = {}
+    toCommit = []
+    for cjs in cjsList:
+      result = cjs.__saveManifest()
+      if not result[ 'OK' ]:
+        results[ cjs.jid ] = result
+      else:
+        toCommit.append( cjs )
+    result = JobState.commitCaches( [ ( cjs.jid, cjs.__initState, cjs.__getChanges(), cjs.__jobLog ) for cjs in toCommit ] )
+    if not result[ 'OK' ]:
+      for cjs in toCommit:
+        cjs.cleanState()
+        results[ cjs.jid ] = result
+      return S_OK( results )
+    newStates = result[ 'Value' ]
+    for cjs in toCommit:
+      results[ cjs.jid ] = cjs.__cacheCommitted( newStates.get( cjs.jid, False ) )
+    return S_OK( results )
+
+  def __saveManifest( self ):
     if self.__initState == None:
       return S_ERROR( "CachedJobState( %d ) is not valid" % self.__jid )
-    #Save manifest
     if self.__manifest and self.__manifest.isDirty():
       result = self.__jobState.setManifest( self.__manifest )
       if not result[ 'OK' ]:
@@ -71,11 +137,21 @@ class CachedJobState( object ):
             break
         return result
       self.__manifest.clearDirty()
-    #Save changes
+    return S_OK()
+
+  def __getChanges( self ):
     changes = {}
     for k in self.__dirtyKeys:
       changes[ k ] = self.__cache[ k ]
-    result = self.__jobState.commitCache( self.__initState, changes, self.__jobLog )
+    return changes
+
+  def commitChanges( self ):
+    #Save manifest
+    result = self.__saveManifest()
+    if not result[ 'OK' ]:
+      return result
+    #Save changes
+    result = self.__jobState.commitCache( self.__initState, self.__getChanges(), self.__jobLog )
     try:
       result.pop( 'rpcStub' )
     except KeyError:
@@ -83,10 +159,15 @@ class CachedJobState( object ):
     if not result[ 'OK' ]:
       self.cleanState()
       return result
-    if not result[ 'Value' ]:
+    return self.__cacheCommitted( result[ 'Value' ] )
+
+  def __cacheCommitted( self, newState ):
+    """ Bookkeeping once the cache is written, newState being False if the
+        initial state was different
+    """
+    if not newState:
       self.cleanState()
       return S_ERROR( "Initial state was different" )
-    newState = result[ 'Value' ]
     self.__jobLog = []
     self.__dirtyKeys.clear()
     #Insert into TQ
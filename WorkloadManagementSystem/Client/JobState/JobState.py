@@ -97,6 +97,12 @@ class JobState( object ):
       return True
     return False
 
+  @classmethod
+  def hasLocalAccess( cls ):
+    """ Whether the DBs are accessed directly, as needed by the bulk methods
+    """
+    return not JobState._sDisableLocal and bool( JobState.__db.job )
+
   def __getDB( self ):
     return JobState.__db.job
 
@@ -132,7 +138,8 @@ class JobState( object ):
 
 #Execute traces
 
-  def __retryFunction( self, retries, functor, args = False, kwargs = False ):
+  @staticmethod
+  def __retryFunction( retries, functor, args = False, kwargs = False ):
     retries = max( 1, retries )
     if not args:
       args = tuple()
@@ -206,6 +213,121 @@ class JobState( object ):
     gLogger.info( "Job %s: Ended trace execution" % self.__jid )
     #We return a new initial state
     return self.getAttributes( initialState.keys() )
+
+  @classmethod
+  def getJobsData( cls, jidList ):
+    """ Attributes, optimizer parameters, JDL and input data of several jobs, with
+        a single query for each kind of data. Needs local access to the DBs
+
+    :return: S_OK with a dict jid -> { 'att', 'optp', 'jdl', 'inputData' } for the jobs found
+    """
+    jobDB = JobState.__db.job
+    result = jobDB.getJobsAttributes( jidList )
+    if not result[ 'OK' ]:
+      return result
+    jobsData = {}
+    for jid in result[ 'Value' ]:
+      jobsData[ jid ] = { 'att' : result[ 'Value' ][ jid ] }
+    if not jobsData:
+      return S_OK( jobsData )
+    jids = jobsData.keys()
+    for dataKey, functor, defValue in ( ( 'optp', jobDB.getJobsOptParameters, {} ),
+                                        ( 'jdl', jobDB.getJobJDLs, '' ),
+                                        ( 'inputData', jobDB.getJobsInputData, {} ) ):
+      result = functor( jids )
+      if not result[ 'OK' ]:
+        return result
+      for jid in jids:
+        jobsData[ jid ][ dataKey ] = result[ 'Value' ].get( jid, defValue )
+    return S_OK( jobsData )
+
+  @classmethod
+  def commitCaches( cls, commitList ):
+    """ Bulk version of commitCache for the ( jid, initialState, cache, jobLog )
+        tuples in commitList. The changes of the jobs still in their initial state
+        are written with multi-row statements, the jobs with the same attribute
+        changes being updated at once. Needs local access to the DBs
+
+    :return: S_OK with a dict jid -> new initial state, or False if the state was different
+    """
+    newStates = {}
+    if not commitList:
+      return S_OK( newStates )
+    jobDB = JobState.__db.job
+    stateKeys = set()
+    for jid, initialState, cache, jobLog in commitList:
+      stateKeys.update( initialState )
+    stateKeys = list( stateKeys )
+    result = jobDB.getJobsAttributes( [ commitData[0] for commitData in commitList ], stateKeys )
+    if not result[ 'OK' ]:
+      return result
+    currentStates = result[ 'Value' ]
+
+    attGroups = {}
+    jobParameters = {}
+    optParameters = {}
+    inputData = {}
+    logRecords = []
+    committedJobs = []
+    for jid, initialState, cache, jobLog in commitList:
+      currentState = currentStates.get( jid, {} )
+      if dict( [ ( key, currentState.get( key ) ) for key in initialState ] ) != initialState:
+        newStates[ jid ] = False
+        continue
+      committedJobs.append( ( jid, initialState ) )
+      data = { 'att': [], 'jobp': [], 'optp': [] }
+      for key in cache:
+        for dk in data:
+          if key.find( "%s." % dk ) == 0:
+            data[ dk ].append( ( key[ len( dk ) + 1:], cache[ key ] ) )
+      if data[ 'att' ]:
+        attGroups.setdefault( tuple( sorted( data[ 'att' ] ) ), [] ).append( jid )
+      if data[ 'jobp' ]:
+        jobParameters[ jid ] = data[ 'jobp' ]
+      if data[ 'optp' ]:
+        optParameters[ jid ] = data[ 'optp' ]
+      if 'inputData' in cache:
+        inputData[ jid ] = cache[ 'inputData' ]
+      for record, updateTime, source in jobLog:
+        logRecords.append( ( jid, record.get( 'status', 'idem' ), record.get( 'minor', 'idem' ),
+                             record.get( 'application', 'idem' ), updateTime, source ) )
+    if not committedJobs:
+      return S_OK( newStates )
+    gLogger.verbose( "About to execute the traces of %s jobs" % len( committedJobs ) )
+
+    for attData, jids in attGroups.items():
+      attN = [ t[0] for t in attData ]
+      attV = [ t[1] for t in attData ]
+      result = cls.__retryFunction( 5, jobDB.setJobsAttributes, ( jids, attN, attV ), { 'update' : True } )
+      if not result[ 'OK' ]:
+        return result
+
+    result = cls.__retryFunction( 5, jobDB.setJobsParameters, ( jobParameters, ) )
+    if not result[ 'OK' ]:
+      return result
+
+    result = cls.__retryFunction( 5, jobDB.setJobsOptParameters, ( optParameters, ) )
+    if not result[ 'OK' ]:
+      return result
+
+    for jid in inputData:
+      result = cls.__retryFunction( 5, jobDB.setInputData, ( jid, inputData[ jid ] ) )
+      if not result[ 'OK' ]:
+        return result
+
+    result = cls.__retryFunction( 5, JobState.__db.log.addLoggingRecords, ( logRecords, ) )
+    if not result[ 'OK' ]:
+      return result
+
+    gLogger.info( "Ended trace execution for %s jobs" % len( committedJobs ) )
+    #The new initial states
+    result = jobDB.getJobsAttributes( [ jid for jid, initialState in committedJobs ], stateKeys )
+    if not result[ 'OK' ]:
+      return result
+    for jid, initialState in committedJobs:
+      currentState = result[ 'Value' ].get( jid, {} )
+      newStates[ jid ] = dict( [ ( key, currentState.get( key ) ) for key in initialState ] )
+    return S_OK( newStates )
 #
 # Status
 #
@@ -0,0 +1,248 @@
+########################################################################
+# $HeadURL$
+# File :    StagingCache.py
+########################################################################
+
+""" Helpers to stage the input sandboxes and the input data of the jobs
+
+    StagingCache is a node local cache of downloaded files shared by all the
+    jobs running on the node. The entries are content addressed: sandboxes by
+    their URL, whose path is the MD5 of the archive, and input data by their LFN
+    and checksum, so an entry never has to be invalidated. A downloaded file is
+    only added once its content matches its checksum, and the entries are trusted
+    afterwards, so the cache directory has to be owned by the user of the jobs
+    and not writable by anybody else: it is created so, and refused otherwise.
+    Concurrent downloads
+    of the same entry, from threads or from other jobs, are coalesced with a
+    lock file per entry and the cache is kept under a maximum size by removing
+    the least recently used entries.
+
+    adler32Check and md5Check give the functions checking the content of the
+    downloaded files for getOrAdd.
+
+    executeInParallel runs a list of functions in a bounded number of threads
+    and gives back their results in order, as soon as each one is available.
+"""
+
+__RCSID__ = "$Id$"
+
+import os
+import stat
+import fcntl
+import shutil
+import tempfile
+import threading
+try:
+  import hashlib as md5
+except:
+  import md5
+
+from DIRAC import S_OK, S_ERROR, gLogger
+from DIRAC.Core.Utilities.Adler import fileAdler, compareAdler
+from DIRAC.Core.Utilities.File import getMD5ForFiles
+
+class StagingCache( object ):
+
+  def __init__( self, cacheDir, maxSize = 0 ):
+    """ Cache in cacheDir, with a maximum size in bytes, no limit if 0
+    """
+    self.cacheDir = cacheDir
+    self.maxSize = maxSize
+    self.log = gLogger.getSubLogger( 'StagingCache' )
+    self.__evictionLock = threading.Lock()
+    if not os.path.isdir( cacheDir ):
+      try:
+        os.makedirs( cacheDir, 0700 )
+      except OSError:
+        # Created by some other job in the meantime
+        if not os.path.isdir( cacheDir ):
+          raise
+    # Files written by somebody else could be given to the jobs
+    dirStat = os.stat( cacheDir )
+    if dirStat.st_uid != os.getuid() or dirStat.st_mode & ( stat.S_IWGRP | stat.S_IWOTH ):
+      raise OSError( "Staging cache %s must be owned by the user and not writable by others" % cacheDir )
+
+  def __getEntryPath( self, key ):
+    return os.path.join( self.cacheDir, md5.md5( key ).hexdigest() )
+
+  def getPath( self, key ):
+    """ Path of the cached file of an entry, None if it is not cached. The file
+        must not be modified
+    """
+    entryPath = self.__getEntryPath( key )
+    try:
+      # Keep track of the last use for the eviction
+      os.utime( entryPath, None )
+    except OSError:
+      return None
+    return entryPath
+
+  def getFile( self, key, destPath ):
+    """ Copy the cached file of an entry to destPath
+
+    :return: True if the entry was cached
+    """
+    entryPath = self.getPath( key )
+    if not entryPath:
+      return False
+    try:
+      shutil.copyfile( entryPath, destPath )
+    except ( IOError, OSError ), e:
+      self.log.warn( "Can't copy cached file", "%s: %s" % ( key, str( e ) ) )
+      return False
+    return True
+
+  def addFile( self, key, filePath ):
+    """ Add a copy of a file to the cache
+    """
+    entryPath = self.__getEntryPath( key )
+    try:
+      fd, tmpPath = tempfile.mkstemp( prefix = ".%s." % os.path.basename( entryPath ), dir = self.cacheDir )
+      os.close( fd )
+      try:
+        shutil.copyfile( filePath, tmpPath )
+        os.rename( tmpPath, entryPath )
+      except:
+        os.unlink( tmpPath )
+        raise
+    except ( IOError, OSError ), e:
+      return S_ERROR( "Can't add %s to the cache: %s" % ( key, str( e ) ) )
+    self.purge()
+    return S_OK( entryPath )
+
+  def getOrAdd( self, key, downloadFunction, checkFunction ):
+    """ Path of the cached file of an entry. If it is not cached, it is added
+        with the file downloaded by downloadFunction, that has to return S_OK
+        with the path of the file, if checkFunction tells that the content of the
+        file is the one of the entry. Only one of the threads or processes asking
+        for the same entry calls downloadFunction, the others wait for it
+
+    :return: S_OK( ( cached file path, downloaded file path or None if it was cached ) )
+    """
+    entryPath = self.getPath( key )
+    if entryPath:
+      return S_OK( ( entryPath, None ) )
+    lockFD = self.__lock( key )
+    try:
+      entryPath = self.getPath( key )
+      if entryPath:
+        return S_OK( ( entryPath, None ) )
+      result = downloadFunction()
+      if not result[ 'OK' ]:
+        return result
+      downloadedPath = result[ 'Value' ]
+      if not checkFunction( downloadedPath ):
+        return S_ERROR( "Downloaded file of %s does not match its checksum" % key )
+      result = self.addFile( key, downloadedPath )
+      if not result[ 'OK' ]:
+        return result
+      return S_OK( ( result[ 'Value' ], downloadedPath ) )
+    finally:
+      self.__unlock( lockFD )
+
+  def __lock( self, key ):
+    lockFD = None
+    try:
+      lockFD = os.open( "%s.lock" % self.__getEntryPath( key ), os.O_RDWR | os.O_CREAT, 0644 )
+      fcntl.flock( lockFD, fcntl.LOCK_EX )
+    except OSError, e:
+      # Not worth failing the download
+      self.log.warn( "Can't lock cache entry", "%s: %s" % ( key, str( e ) ) )
+    return lockFD
+
+  def __unlock( self, lockFD ):
+    if lockFD is not None:
+      os.close( lockFD )
+
+  def purge( self ):
+    """ Remove the least recently used entries until the cache is under 90% of
+        its maximum size
+    """
+    if not self.maxSize:
+      return S_OK( 0 )
+    self.__evictionLock.acquire()
+    try:
+      entries = []
+      totalSize = 0
+      for fileName in os.listdir( self.cacheDir ):
+        if fileName.startswith( '.' ) or fileName.endswith( '.lock' ):
+          continue
+        try:
+          fileStat = os.stat( os.path.join( self.cacheDir, fileName ) )
+        except OSError:
+          continue
+        entries.append( ( fileStat.st_mtime, fileStat.st_size, fileName ) )
+        totalSize += fileStat.st_size
+      if totalSize <= self.maxSize:
+        return S_OK( 0 )
+      removed = 0
+      for _mtime, fileSize, fileName in sorted( entries ):
+        if totalSize <= self.maxSize * 0.9:
+          break
+        try:
+          # Jobs using the file keep it until they close it
+          os.unlink( os.path.join( self.cacheDir, fileName ) )
+        except OSError:
+          continue
+        totalSize -= fileSize
+        removed += 1
+      self.log.verbose( "Removed entries from the staging cache", removed )
+      return S_OK( removed )
+    finally:
+      self.__evictionLock.release()
+
+def adler32Check( checksum, checksumType = None ):
+  """ Function checking that a file has an Adler32 checksum, None if the checksum
+      is not known or is of another type
+  """
+  if not checksum or ( checksumType or 'Adler32' ).upper() not in ( 'AD', 'ADLER32' ):
+    return None
+  return lambda filePath: compareAdler( fileAdler( filePath ), checksum )
+
+def md5Check( md5Hash ):
+  """ Function checking that a file has an MD5 hash
+  """
+  return lambda filePath: getMD5ForFiles( [ filePath ] ) == md5Hash
+
+def executeInParallel( functionList, numThreads ):
+  """ Call the functions in at most numThreads threads and yield their results
+      in the order of the list, each one as soon as it is available. An exception
+      raised by a function is returned as S_ERROR. If the caller stops iterating,
+      the functions not yet started are not called
+  """
+  numFunctions = len( functionList )
+  results = [ None ] * numFunctions
+  doneEvents = [ threading.Event() for _i in range( numFunctions ) ]
+  nextFunction = [ 0 ]
+  cancelled = []
+  indexLock = threading.Lock()
+
+  def worker():
+    while True:
+      indexLock.acquire()
+      try:
+        index = nextFunction[0]
+        if cancelled or index >= numFunctions:
+          return
+        nextFunction[0] += 1
+      finally:
+        indexLock.release()
+      try:
+        results[ index ] = functionList[ index ]()
+      except Exception, e:
+        gLogger.exception( "Exception in staging function" )
+        results[ index ] = S_ERROR( str( e ) )
+      doneEvents[ index ].set()
+
+  for _i in range( max( 1, min( numThreads, numFunctions ) ) ):
+    thread = threading.Thread( target = worker )
+    thread.setDaemon( 1 )
+    thread.start()
+  try:
+    for index in range( numFunctions ):
+      # Wait with a timeout so the main thread still gets the signals
+      while not doneEvents[ index ].isSet():
+        doneEvents[ index ].wait( 1 )
+      yield results[ index ]
+  finally:
+    cancelled.append( True )
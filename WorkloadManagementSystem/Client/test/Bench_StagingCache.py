@@ -0,0 +1,45 @@
+""" Benchmark of the staging cache and the parallel staging of the JobWrapper
+
+    Usage: python Bench_StagingCache.py [ numFiles [ numThreads [ latency ] ] ]
+    times the staging of numFiles files taking latency seconds each to download
+"""
+
+import sys
+import os
+import time
+import shutil
+import tempfile
+
+from DIRAC import S_OK
+from DIRAC.Core.Utilities.Adler import stringAdler
+from DIRAC.WorkloadManagementSystem.Client.StagingCache import StagingCache, executeInParallel, adler32Check
+
+def benchmark( numFiles = 20, numThreads = 4, latency = 0.1 ):
+  numFiles = int( numFiles )
+  numThreads = int( numThreads )
+  latency = float( latency )
+  workDir = tempfile.mkdtemp()
+  try:
+    def download( i ):
+      time.sleep( latency )
+      filePath = os.path.join( workDir, "file%s" % i )
+      open( filePath, "w" ).write( "x" * 1048576 )
+      return S_OK( filePath )
+    cache = StagingCache( os.path.join( workDir, "cache" ) )
+    checkFunction = adler32Check( stringAdler( "x" * 1048576 ) )
+    for title, threads, useCache in ( ( "Sequential", 1, False ), ( "Parallel", numThreads, False ),
+                                      ( "Parallel, empty cache", numThreads, True ),
+                                      ( "Parallel, full cache", numThreads, True ) ):
+      if useCache:
+        functions = [ lambda i = i: cache.getOrAdd( "LFN:file%s" % i, lambda: download( i ), checkFunction ) for i in range( numFiles ) ]
+      else:
+        functions = [ lambda i = i: download( i ) for i in range( numFiles ) ]
+      start = time.time()
+      for result in executeInParallel( functions, threads ):
+        assert result[ 'OK' ]
+      print "%s staging of %s files: %.3fs" % ( title, numFiles, time.time() - start )
+  finally:
+    shutil.rmtree( workDir )
+
+if __name__ == '__main__':
+  benchmark( *sys.argv[1:] )
@@ -0,0 +1,262 @@
+""" Test cases for the bulk loading and committing of the job states
+"""
+
+import unittest
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.WorkloadManagementSystem.Client.JobState.JobState import JobState
+from DIRAC.WorkloadManagementSystem.Client.JobState.CachedJobState import CachedJobState
+
+STATE_KEYS = [ 'Status', 'MinorStatus', 'LastUpdateTime' ]
+
+class FakeJobDB( object ):
+  """ Jobs kept in memory, with the JobDB methods used by the job states.
+      The attribute writes with a value in failAttributes fail
+  """
+
+  def __init__( self, jids ):
+    self.jobs = {}
+    for jid in jids:
+      self.jobs[ jid ] = { 'att' : { 'Status' : 'Received', 'MinorStatus' : 'Job accepted',
+                                     'ApplicationStatus' : 'Unknown', 'LastUpdateTime' : '2014-01-01 00:00:00' },
+                           'jobp' : {}, 'optp' : {}, 'inputData' : {} }
+    self.calls = []
+    self.failAttributes = {}
+
+  def __select( self, data, keys ):
+    if not keys:
+      return dict( data )
+    return dict( [ ( key, data[ key ] ) for key in keys if key in data ] )
+
+  def getJobAttributes( self, jobID, attrList = None ):
+    self.calls.append( ( 'getJobAttributes', jobID ) )
+    if jobID not in self.jobs:
+      return S_OK( {} )
+    return S_OK( self.__select( self.jobs[ jobID ][ 'att' ], attrList ) )
+
+  def getJobsAttributes( self, jobIDList, attrList = None ):
+    self.calls.append( ( 'getJobsAttributes', sorted( jobIDList ) ) )
+    return S_OK( dict( [ ( jid, self.__select( self.jobs[ jid ][ 'att' ], attrList ) )
+                         for jid in jobIDList if jid in self.jobs ] ) )
+
+  def getJobsOptParameters( self, jobIDList, paramList = None ):
+    return S_OK( dict( [ ( jid, dict( self.jobs[ jid ][ 'optp' ] ) ) for jid in jobIDList ] ) )
+
+  def getJobJDLs( self, jobIDList, original = False ):
+    return S_OK( {} )
+
+  def getJobsInputData( self, jobIDList ):
+    return S_OK( dict( [ ( jid, dict( self.jobs[ jid ][ 'inputData' ] ) ) for jid in jobIDList ] ) )
+
+  def setJobAttributes( self, jobID, attrNames, attrValues, update = False, myDate = None ):
+    return self.setJobsAttributes( [ jobID ], attrNames, attrValues, update = update )
+
+  def setJobsAttributes( self, jobIDList, attrNames, attrValues, update = False, heartBeat = False ):
+    self.calls.append( ( 'setJobsAttributes', sorted( jobIDList ), dict( zip( attrNames, attrValues ) ) ) )
+    for name, value in zip( attrNames, attrValues ):
+      if self.failAttributes.get( name ) == value:
+        return S_ERROR( "Cannot set %s" % name )
+    for jid in jobIDList:
+      self.jobs[ jid ][ 'att' ].update( zip( attrNames, attrValues ) )
+      if update:
+        self.jobs[ jid ][ 'att' ][ 'LastUpdateTime' ] = '2014-01-02 00:00:00'
+    return S_OK()
+
+  def setJobParameters( self, jobID, parameters ):
+    return self.setJobsParameters( { jobID : parameters } )
+
+  def setJobsParameters( self, parametersDict ):
+    for jid in parametersDict:
+      self.jobs[ jid ][ 'jobp' ].update( parametersDict[ jid ] )
+    return S_OK()
+
+  def setJobOptParameter( self, jobID, name, value ):
+    return self.setJobsOptParameters( { jobID : [ ( name, value ) ] } )
+
+  def setJobsOptParameters( self, optParametersDict ):
+    for jid in optParametersDict:
+      self.jobs[ jid ][ 'optp' ].update( optParametersDict[ jid ] )
+    return S_OK()
+
+  def setInputData( self, jid, lfnData ):
+    self.jobs[ jid ][ 'inputData' ] = dict( lfnData )
+    return S_OK()
+
+class FakeJobLoggingDB( object ):
+
+  def __init__( self ):
+    self.records = []
+
+  def addLoggingRecord( self, jobID, status = 'idem', minor = 'idem', application = 'idem', date = '', source = 'Unknown' ):
+    self.records.append( ( jobID, status, minor, application, date, source ) )
+    return S_OK()
+
+  def addLoggingRecords( self, recordList ):
+    self.records.extend( recordList )
+    return S_OK()
+
+def useDBs( jobDB, logDB ):
+  """ Make the job states access the fake DBs directly
+  """
+  JobState._JobState__db.checked = True
+  JobState._JobState__db.job = jobDB
+  JobState._JobState__db.log = logDB
+
+def resetDBs():
+  JobState._JobState__db.reset()
+  JobState._JobState__db.checked = False
+
+class CachedJobStateTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.jobDB = FakeJobDB( range( 1, 6 ) )
+    self.logDB = FakeJobLoggingDB()
+    useDBs( self.jobDB, self.logDB )
+
+  def tearDown( self ):
+    resetDBs()
+
+  def test_loadMany( self ):
+    self.jobDB.jobs[ 2 ][ 'optp' ][ 'InputData' ] = 'Done'
+    result = CachedJobState.loadMany( [ 1, 2, 1000 ] )
+    self.assertTrue( result[ 'OK' ] )
+    states = result[ 'Value' ]
+    self.assertEqual( sorted( states ), [ 1, 2, 1000 ] )
+    self.assertTrue( states[ 1 ].valid )
+    # The known jobs are read with the bulk queries only
+    self.assertFalse( [ call for call in self.jobDB.calls if call[0] == 'getJobAttributes' and call[1] != 1000 ] )
+    self.assertEqual( states[ 1 ].getAttributes( [ 'Status' ] )[ 'Value' ], { 'Status' : 'Received' } )
+    self.assertEqual( states[ 2 ].getOptParameter( 'InputData' )[ 'Value' ], 'Done' )
+    self.assertFalse( [ call for call in self.jobDB.calls if call[0] == 'getJobAttributes' and call[1] != 1000 ] )
+    self.assertEqual( states[ 1 ].getDirtyKeys(), set() )
+
+  def test_initialStateChanged( self ):
+    states = CachedJobState.loadMany( [ 1, 2 ] )[ 'Value' ]
+    for jid in states:
+      states[ jid ].setStatus( 'Checking', 'JobSanity', source = 'Test' )
+    # Job 2 is changed by someone else meanwhile
+    self.jobDB.jobs[ 2 ][ 'att' ][ 'Status' ] = 'Killed'
+    result = CachedJobState.commitMany( states.values() )
+    self.assertTrue( result[ 'OK' ] )
+    self.assertTrue( result[ 'Value' ][ 1 ][ 'OK' ] )
+    self.assertFalse( result[ 'Value' ][ 2 ][ 'OK' ] )
+    self.assertTrue( 'Initial state was different' in result[ 'Value' ][ 2 ][ 'Message' ] )
+    self.assertEqual( self.jobDB.jobs[ 1 ][ 'att' ][ 'Status' ], 'Checking' )
+    self.assertEqual( self.jobDB.jobs[ 2 ][ 'att' ][ 'Status' ], 'Killed' )
+    self.assertEqual( [ record[0] for record in self.logDB.records ], [ 1 ] )
+    # The state of the changed job is read again
+    self.assertEqual( states[ 2 ].getAttributes( [ 'Status' ] )[ 'Value' ], { 'Status' : 'Killed' } )
+
+  def test_groupedAttributes( self ):
+    states = CachedJobState.loadMany( range( 1, 6 ) )[ 'Value' ]
+    for jid in range( 1, 5 ):
+      states[ jid ].setStatus( 'Checking', 'JobSanity' )
+    states[ 5 ].setStatus( 'Checking', 'JobPath' )
+    states[ 5 ].setParameter( 'Site', 'ANY' )
+    result = CachedJobState.commitMany( states.values() )
+    self.assertTrue( result[ 'OK' ] )
+    self.assertTrue( all( [ jobResult[ 'OK' ] for jobResult in result[ 'Value' ].values() ] ) )
+    attributeCalls = [ call for call in self.jobDB.calls if call[0] == 'setJobsAttributes' ]
+    self.assertEqual( len( attributeCalls ), 2 )
+    self.assertTrue( ( 'setJobsAttributes', [ 1, 2, 3, 4 ], { 'Status' : 'Checking',
+                                                             'MinorStatus' : 'JobSanity' } ) in attributeCalls )
+    self.assertTrue( ( 'setJobsAttributes', [ 5 ], { 'Status' : 'Checking',
+                                                    'MinorStatus' : 'JobPath' } ) in attributeCalls )
+    self.assertEqual( self.jobDB.jobs[ 5 ][ 'jobp' ], { 'Site' : 'ANY' } )
+    # The new initial states are the committed ones
+    self.assertEqual( states[ 1 ].getDirtyKeys(), set() )
+    self.assertTrue( states[ 1 ].recheckValidity( 0 )[ 'Value' ] )
+
+  def test_failedBatch( self ):
+    self.jobDB.failAttributes = { 'MinorStatus' : 'JobPath' }
+    states = CachedJobState.loadMany( [ 1, 2, 3 ] )[ 'Value' ]
+    states[ 1 ].setStatus( 'Checking', 'JobSanity' )
+    states[ 2 ].setStatus( 'Checking', 'JobPath' )
+    states[ 3 ].setStatus( 'Checking', 'JobSanity' )
+    result = CachedJobState.commitMany( [ states[ 1 ], states[ 2 ], states[ 3 ] ] )
+    self.assertTrue( result[ 'OK' ] )
+    # A failure in the middle of the batch is the failure of all its jobs
+    for jid in ( 1, 2, 3 ):
+      self.assertFalse( result[ 'Value' ][ jid ][ 'OK' ] )
+      self.assertTrue( 'Cannot set MinorStatus' in result[ 'Value' ][ jid ][ 'Message' ] )
+      # The cached changes are dropped
+      self.assertEqual( states[ jid ].getDirtyKeys(), set() )
+    self.assertEqual( self.logDB.records, [] )
+
+  def test_sameResultsAsCommitChanges( self ):
+    bulkJobDB = FakeJobDB( range( 1, 6 ) )
+    bulkLogDB = FakeJobLoggingDB()
+    def makeChanges( states ):
+      for jid in states:
+        states[ jid ].setStatus( 'Checking', 'Job %d' % ( jid % 2 ), source = 'Test' )
+        states[ jid ].setParameter( 'Param', str( jid ) )
+        states[ jid ].setOptParameter( 'OptParam', str( jid ) )
+        states[ jid ].setInputData( { '/lfn/%d' % jid : { 'Replicas' : {} } } )
+    jids = range( 1, 6 )
+
+    states = dict( [ ( jid, CachedJobState( jid ) ) for jid in jids ] )
+    makeChanges( states )
+    # Job 3 is not in its initial state anymore
+    self.jobDB.jobs[ 3 ][ 'att' ][ 'MinorStatus' ] = 'Changed'
+    singleResults = dict( [ ( jid, states[ jid ].commitChanges() ) for jid in jids ] )
+    singleInternals = dict( [ ( jid, states[ jid ]._internals ) for jid in jids ] )
+
+    useDBs( bulkJobDB, bulkLogDB )
+    states = CachedJobState.loadMany( jids )[ 'Value' ]
+    makeChanges( states )
+    bulkJobDB.jobs[ 3 ][ 'att' ][ 'MinorStatus' ] = 'Changed'
+    result = CachedJobState.commitMany( states.values() )
+    self.assertTrue( result[ 'OK' ] )
+    bulkResults = result[ 'Value' ]
+
+    for jid in jids:
+      self.assertEqual( bulkResults[ jid ][ 'OK' ], singleResults[ jid ][ 'OK' ] )
+      self.assertEqual( bulkResults[ jid ].get( 'Message' ), singleResults[ jid ].get( 'Message' ) )
+      # Same state and pending changes afterwards, only the cached values may differ
+      self.assertEqual( states[ jid ]._internals[3:], singleInternals[ jid ][3:] )
+    self.assertFalse( bulkResults[ 3 ][ 'OK' ] )
+    self.assertEqual( bulkJobDB.jobs, self.jobDB.jobs )
+    # The records only differ by the time they were made at
+    self.assertEqual( sorted( [ record[:4] + record[5:] for record in bulkLogDB.records ] ),
+                      sorted( [ record[:4] + record[5:] for record in self.logDB.records ] ) )
+
+class JobStateCommitCachesTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.jobDB = FakeJobDB( range( 1, 4 ) )
+    self.logDB = FakeJobLoggingDB()
+    useDBs( self.jobDB, self.logDB )
+
+  def tearDown( self ):
+    resetDBs()
+
+  def getInitialState( self, jid ):
+    return dict( [ ( key, self.jobDB.jobs[ jid ][ 'att' ][ key ] ) for key in STATE_KEYS ] )
+
+  def test_empty( self ):
+    result = JobState.commitCaches( [] )
+    self.assertEqual( result, S_OK( {} ) )
+    self.assertEqual( self.jobDB.calls, [] )
+
+  def test_commitCaches( self ):
+    cache = { 'att.Status' : 'Checking', 'jobp.Param' : 'value' }
+    jobLog = [ ( { 'status' : 'Checking' }, '2014-01-01 10:00:00', 'Test' ) ]
+    commitList = [ ( jid, self.getInitialState( jid ), dict( cache ), list( jobLog ) ) for jid in ( 1, 2, 3 ) ]
+    self.jobDB.jobs[ 3 ][ 'att' ][ 'Status' ] = 'Killed'
+    result = JobState.commitCaches( commitList )
+    self.assertTrue( result[ 'OK' ] )
+    self.assertEqual( result[ 'Value' ][ 1 ], { 'Status' : 'Checking', 'MinorStatus' : 'Job accepted',
+                                                'LastUpdateTime' : '2014-01-02 00:00:00' } )
+    self.assertEqual( result[ 'Value' ][ 3 ], False )
+    self.assertEqual( [ call for call in self.jobDB.calls if call[0] == 'setJobsAttributes' ],
+                      [ ( 'setJobsAttributes', [ 1, 2 ], { 'Status' : 'Checking' } ) ] )
+    self.assertEqual( self.jobDB.jobs[ 2 ][ 'jobp' ], { 'Param' : 'value' } )
+    self.assertEqual( self.jobDB.jobs[ 3 ][ 'jobp' ], {} )
+    self.assertEqual( sorted( self.logDB.records ), [ ( 1, 'Checking', 'idem', 'idem', '2014-01-01 10:00:00', 'Test' ),
+                                                      ( 2, 'Checking', 'idem', 'idem', '2014-01-01 10:00:00', 'Test' ) ] )
+
+if __name__ == '__main__':
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( CachedJobStateTestCase )
+  gSuite.addTest( gTestLoader.loadTestsFromTestCase( JobStateCommitCachesTestCase ) )
+  unittest.TextTestRunner( verbosity = 2 ).run( gSuite )
@@ -0,0 +1,181 @@
+""" Test cases for the announcement of the jobs to the OptimizationMind
+"""
+
+import sys
+import types
+import unittest
+
+from mock import MagicMock, patch
+
+from DIRAC import S_OK, S_ERROR
+import DIRAC.WorkloadManagementSystem.Client.JobOptimizationNotifier as sut
+from DIRAC.WorkloadManagementSystem.DB.JobDB import JobDB
+
+class FakeMessage( object ):
+  pass
+
+class FakeMessageClient( object ):
+  """ Records the jobs of the OptimizeJobs messages sent. The connections and the
+      sendings fail while the mind is down
+  """
+
+  instances = []
+  startDown = False
+
+  def __init__( self, serviceName ):
+    self.serviceName = serviceName
+    self.connected = False
+    self.down = FakeMessageClient.startDown
+    self.connections = 0
+    self.sent = []
+    FakeMessageClient.instances.append( self )
+
+  def connect( self, **extraArgs ):
+    self.connections += 1
+    if self.down:
+      return S_ERROR( "Mind is down" )
+    self.connected = True
+    return S_OK()
+
+  def createMessage( self, msgName ):
+    return S_OK( FakeMessage() )
+
+  def sendMessage( self, msgObj ):
+    if self.down:
+      self.connected = False
+      return S_ERROR( "Connection lost" )
+    self.sent.append( msgObj.jids )
+    return S_OK()
+
+class JobOptimizationNotifierTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    FakeMessageClient.instances = []
+    FakeMessageClient.startDown = False
+    msgClientModule = types.ModuleType( "DIRAC.Core.DISET.MessageClient" )
+    msgClientModule.MessageClient = FakeMessageClient
+    self.patches = [ patch.dict( sys.modules, { "DIRAC.Core.DISET.MessageClient" : msgClientModule } ),
+                     patch.object( sut.time, "time", lambda: self.now ) ]
+    for patcher in self.patches:
+      patcher.start()
+    self.now = 1000.
+    self.notifier = sut.JobOptimizationNotifier( reconnectPeriod = 60, maxPendingJobs = 5 )
+
+  def tearDown( self ):
+    for patcher in self.patches:
+      patcher.stop()
+
+  def msgClient( self ):
+    self.assertEqual( len( FakeMessageClient.instances ), 1 )
+    return FakeMessageClient.instances[0]
+
+  def test_send( self ):
+    result = self.notifier.optimizeJobs( [ 3, "1", 2 ] )
+    self.assertTrue( result[ 'OK' ] )
+    self.assertEqual( result[ 'Value' ], 3 )
+    msgClient = self.msgClient()
+    self.assertEqual( msgClient.serviceName, "WorkloadManagement/OptimizationMind" )
+    self.assertEqual( msgClient.sent, [ [ 1, 2, 3 ] ] )
+    # The connection is kept
+    self.assertEqual( self.notifier.optimizeJobs( [ 4 ] )[ 'Value' ], 1 )
+    self.assertEqual( msgClient.sent, [ [ 1, 2, 3 ], [ 4 ] ] )
+    self.assertEqual( msgClient.connections, 1 )
+    # Nothing to send
+    self.assertEqual( self.notifier.flush()[ 'Value' ], 0 )
+    self.assertEqual( len( msgClient.sent ), 2 )
+
+  def test_retry( self ):
+    """ The jobs not sent go out with the next notification
+    """
+    self.notifier.optimizeJobs( [ 1 ] )
+    msgClient = self.msgClient()
+    msgClient.down = True
+    self.assertEqual( self.notifier.optimizeJobs( [ 2 ] )[ 'Value' ], 0 )
+    msgClient.down = False
+    self.now += 60
+    self.assertEqual( self.notifier.optimizeJobs( [ 3 ] )[ 'Value' ], 2 )
+    self.assertEqual( msgClient.sent, [ [ 1 ], [ 2, 3 ] ] )
+    self.assertEqual( self.notifier.flush()[ 'Value' ], 0 )
+
+  def test_reconnect( self ):
+    """ The connection is retried at most once every reconnect period
+    """
+    FakeMessageClient.startDown = True
+    self.assertEqual( self.notifier.optimizeJobs( [ 1 ] )[ 'Value' ], 0 )
+    msgClient = self.msgClient()
+    self.assertEqual( msgClient.connections, 1 )
+    msgClient.down = False
+    self.now += 30
+    self.assertEqual( self.notifier.optimizeJobs( [ 2 ] )[ 'Value' ], 0 )
+    self.assertEqual( msgClient.connections, 1 )
+    self.now += 30
+    self.assertEqual( self.notifier.flush()[ 'Value' ], 2 )
+    self.assertEqual( msgClient.connections, 2 )
+    self.assertEqual( msgClient.sent, [ [ 1, 2 ] ] )
+
+  def test_maxPendingJobs( self ):
+    """ Beyond maxPendingJobs the oldest jobs are dropped
+    """
+    FakeMessageClient.startDown = True
+    self.notifier.optimizeJobs( range( 1, 5 ) )
+    self.notifier.optimizeJobs( range( 5, 9 ) )
+    self.msgClient().down = False
+    self.now += 60
+    self.assertEqual( self.notifier.flush()[ 'Value' ], 5 )
+    self.assertEqual( self.msgClient().sent, [ range( 4, 9 ) ] )
+
+  def test_localReceiver( self ):
+    received = []
+    self.notifier.setLocalReceiver( received.extend )
+    self.assertEqual( self.notifier.optimizeJobs( ( 1, 2 ) )[ 'Value' ], 2 )
+    self.assertEqual( received, [ 1, 2 ] )
+    self.assertEqual( FakeMessageClient.instances, [] )
+
+class JobDBNotifyTestCase( unittest.TestCase ):
+  """ The jobs rescheduled together are announced in one notification
+  """
+
+  def setUp( self ):
+    self.notifier = MagicMock()
+    self.patcher = patch( "DIRAC.WorkloadManagementSystem.DB.JobDB.gJobOptimizationNotifier", self.notifier )
+    self.patcher.start()
+    self.jobDB = JobDB.__new__( JobDB )
+    self.jobDB.rescheduleJob = MagicMock( side_effect = self.rescheduleJob )
+    self.failJobs = set()
+
+  def tearDown( self ):
+    self.patcher.stop()
+
+  def rescheduleJob( self, jid, notify = True ):
+    if jid in self.failJobs:
+      return S_ERROR( "Cannot reschedule" )
+    result = S_OK( jid )
+    result[ 'JobID' ] = jid
+    return result
+
+  def test_rescheduleJobs( self ):
+    self.failJobs = set( [ 2 ] )
+    self.jobDB.rescheduleJobs( [ 1, 2, 3 ] )
+    for call in self.jobDB.rescheduleJob.call_args_list:
+      self.assertEqual( call[1], { 'notify' : False } )
+    self.notifier.optimizeJobs.assert_called_once_with( [ 1, 3 ] )
+
+  def test_rescheduleJobsFailed( self ):
+    self.failJobs = set( [ 1, 2 ] )
+    self.jobDB.rescheduleJobs( [ 1, 2 ] )
+    self.assertFalse( self.notifier.optimizeJobs.called )
+
+  def test_resetJob( self ):
+    self.jobDB.setJobAttributes = MagicMock( return_value = S_OK() )
+    self.jobDB.clearAtticParameters = MagicMock( return_value = S_OK() )
+    for notify in ( False, True ):
+      self.assertTrue( self.jobDB.resetJob( 1, notify = notify )[ 'OK' ] )
+      self.jobDB.rescheduleJob.assert_called_with( 1, notify = notify )
+    self.jobDB.resetJob( 1 )
+    self.jobDB.rescheduleJob.assert_called_with( 1, notify = True )
+
+if __name__ == '__main__':
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( JobOptimizationNotifierTestCase )
+  gSuite.addTest( gTestLoader.loadTestsFromTestCase( JobDBNotifyTestCase ) )
+  unittest.TextTestRunner( verbosity = 2 ).run( gSuite )
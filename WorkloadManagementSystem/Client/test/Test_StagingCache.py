@@ -0,0 +1,142 @@
+""" Test cases for the staging cache and the parallel staging of the JobWrapper
+"""
+
+import os
+import stat
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.Core.Utilities.Adler import stringAdler
+from DIRAC.WorkloadManagementSystem.Client.StagingCache import StagingCache, executeInParallel, adler32Check, md5Check
+
+class StagingCacheTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.workDir = tempfile.mkdtemp()
+    self.cacheDir = os.path.join( self.workDir, "cache" )
+
+  def tearDown( self ):
+    shutil.rmtree( self.workDir )
+
+  def download( self, name, data, calls = None ):
+    if calls is not None:
+      calls.append( name )
+      time.sleep( 0.2 )
+    filePath = os.path.join( tempfile.mkdtemp( dir = self.workDir ), name )
+    dataFile = open( filePath, "w" )
+    dataFile.write( data )
+    dataFile.close()
+    return S_OK( filePath )
+
+  def test_cache( self ):
+    cache = StagingCache( self.cacheDir )
+    self.assertEqual( cache.getPath( "SB:SE|/a/b/c" ), None )
+    result = cache.getOrAdd( "SB:SE|/a/b/c", lambda: self.download( "c.tar.bz2", "data" ), self.check )
+    cachedPath, downloadedPath = result[ 'Value' ]
+    self.assert_( os.path.isfile( downloadedPath ) )
+    self.assertEqual( open( cachedPath ).read(), "data" )
+    result = cache.getOrAdd( "SB:SE|/a/b/c", lambda: S_ERROR( "Should be cached" ), self.check )
+    self.assertEqual( result[ 'Value' ], ( cachedPath, None ) )
+    destPath = os.path.join( self.workDir, "copy" )
+    self.assert_( cache.getFile( "SB:SE|/a/b/c", destPath ) )
+    self.assertEqual( open( destPath ).read(), "data" )
+    # Errors are not cached
+    self.failIf( cache.getOrAdd( "LFN:/vo/f:1234", lambda: S_ERROR( "No replica" ), self.check )[ 'OK' ] )
+    self.assertEqual( cache.getPath( "LFN:/vo/f:1234" ), None )
+
+  def check( self, filePath ):
+    return True
+
+  def test_checksum( self ):
+    """ Only the downloaded files with the expected content are added
+    """
+    cache = StagingCache( self.cacheDir )
+    checkFunction = adler32Check( stringAdler( "data" ) )
+    result = cache.getOrAdd( "LFN:/vo/f:1", lambda: self.download( "f", "partial" ), checkFunction )
+    self.failIf( result[ 'OK' ] )
+    self.assertEqual( cache.getPath( "LFN:/vo/f:1" ), None )
+    self.assert_( cache.getOrAdd( "LFN:/vo/f:1", lambda: self.download( "f", "data" ), checkFunction )[ 'OK' ] )
+    self.assert_( cache.getPath( "LFN:/vo/f:1" ) )
+    # Checksums that cannot be verified
+    self.assertEqual( adler32Check( "" ), None )
+    self.assertEqual( adler32Check( "1234", "MD5" ), None )
+    self.assert_( adler32Check( stringAdler( "data" ), "AD" ) )
+    filePath = self.download( "c.tar.bz2", "data" )[ 'Value' ]
+    self.assert_( md5Check( "8d777f385d3dfec8815d20f7496026dc" )( filePath ) )
+    self.failIf( md5Check( "8d777f385d3dfec8815d20f7496026dd" )( filePath ) )
+
+  def test_permissions( self ):
+    """ The cache directory is only writable by the user
+    """
+    StagingCache( self.cacheDir )
+    self.assertEqual( stat.S_IMODE( os.stat( self.cacheDir ).st_mode ) & 077, 0 )
+    os.chmod( self.cacheDir, 0777 )
+    self.assertRaises( OSError, StagingCache, self.cacheDir )
+
+  def test_coalescing( self ):
+    # Two caches in the same directory, as two jobs of the node would have
+    caches = [ StagingCache( self.cacheDir ), StagingCache( self.cacheDir ) ]
+    calls = []
+    results = []
+    threads = [ threading.Thread( target = lambda cache = cache: results.append(
+                  cache.getOrAdd( "LFN:/vo/f:1234", lambda: self.download( "f", "data", calls ), self.check ) ) )
+                for cache in caches * 5 ]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEqual( calls, [ "f" ] )
+    self.assertEqual( len( set( [ result[ 'Value' ][0] for result in results ] ) ), 1 )
+
+  def test_purge( self ):
+    cache = StagingCache( self.cacheDir, maxSize = 1000 )
+    for i in range( 5 ):
+      cache.getOrAdd( "key%s" % i, lambda: self.download( "f", "x" * 300 ), self.check )
+      # The last use is what matters
+      entryPath = cache.getPath( "key0" )
+      os.utime( entryPath, ( time.time() + 10, time.time() + 10 ) )
+    self.failIf( cache.getPath( "key0" ) is None )
+    self.assertEqual( len( [ key for key in range( 5 ) if cache.getPath( "key%s" % key ) ] ), 3 )
+    self.assertEqual( cache.getPath( "key1" ), None )
+
+  def test_parallel( self ):
+    running = []
+    maxRunning = []
+    lock = threading.Lock()
+    def stage( i ):
+      lock.acquire()
+      running.append( i )
+      maxRunning.append( len( running ) )
+      lock.release()
+      time.sleep( 0.05 * ( 5 - i % 5 ) )
+      lock.acquire()
+      running.remove( i )
+      lock.release()
+      if i == 3:
+        raise Exception( "Download error" )
+      return S_OK( i )
+    results = list( executeInParallel( [ lambda i = i: stage( i ) for i in range( 10 ) ], 4 ) )
+    self.assertEqual( max( maxRunning ), 4 )
+    self.assertEqual( [ result.get( 'Value' ) for result in results ], [ 0, 1, 2, None, 4, 5, 6, 7, 8, 9 ] )
+    self.failIf( results[3][ 'OK' ] )
+    # Stopping the iteration does not start the remaining functions
+    started = []
+    def slowStage( i ):
+      started.append( i )
+      time.sleep( 0.01 )
+      return S_OK( i )
+    stagingResults = executeInParallel( [ lambda i = i: slowStage( i ) for i in range( 100 ) ], 1 )
+    stagingResults.next()
+    stagingResults.close()
+    time.sleep( 0.1 )
+    self.assert_( len( started ) < 100 )
+
+if __name__ == '__main__':
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( StagingCacheTestCase )
+  gSuite = unittest.TestSuite( [ gSuite ] )
+  unittest.TextTestRunner( verbosity = 2 ).run( gSuite )
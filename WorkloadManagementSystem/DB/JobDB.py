@@ -52,6 +52,7 @@ from DIRAC.Core.Base.DB                                          import DB
 from DIRAC.ConfigurationSystem.Client.Helpers.Resources          import getSites
 from DIRAC.ResourceStatusSystem.Client.SiteStatus                import SiteStatus
 from DIRAC.WorkloadManagementSystem.Client.JobState.JobManifest  import JobManifest
+from DIRAC.WorkloadManagementSystem.Client.JobOptimizationNotifier import gJobOptimizationNotifier
 from DIRAC.Core.Utilities                                        import Time
 
 DEBUG = False
@@ -737,6 +738,27 @@ class JobDB( DB ):
       ret[ attrList[iP] ] = jobData[ iP ]
     return S_OK( ret )
 
+#############################################################################
+  def getJobsAttributes( self, jobIDList, attrList = None ):
+    """ Get the attributes of the jobs in jobIDList with a single query. Unlike
+        getAttributesForJobList the values are returned as getJobAttributes does.
+        Returns a dictionary of dictionaries: ValueDict[jobID][attribute_name] = value
+        for the jobs found
+    """
+    if not jobIDList:
+      return S_OK( {} )
+    if not attrList:
+      attrList = self.jobAttributeNames
+    attrList = list( attrList )
+    result = self.getFields( "Jobs", outFields = [ 'JobID' ] + attrList,
+                             condDict = { 'JobID' : [ int( jobID ) for jobID in jobIDList ] } )
+    if not result[ 'OK' ]:
+      return result
+    retDict = {}
+    for jobData in result[ 'Value' ]:
+      retDict[ int( jobData[0] ) ] = dict( zip( attrList, jobData[1:] ) )
+    return S_OK( retDict )
+
 #############################################################################
   def getJobAttribute( self, jobID, attribute ):
     """ Get the given attribute of a job specified by its jobID
@@ -811,6 +833,36 @@ class JobDB( DB ):
     else:
       return S_ERROR( 'JobDB.getJobOptParameters: failed to retrieve parameters' )
 
+#############################################################################
+  def getJobsOptParameters( self, jobIDList, paramList = None ):
+    """ Get optimizer parameters for the jobs in jobIDList with a single query.
+        Returns a dictionary of dictionaries: ValueDict[jobID][name] = value
+    """
+    if not jobIDList:
+      return S_OK( {} )
+    jobList = ','.join( [ str( int( jobID ) ) for jobID in jobIDList ] )
+    cmd = "SELECT JobID, Name, Value from OptimizerParameters WHERE JobID in (%s)" % jobList
+    if paramList:
+      paramNameList = []
+      for x in paramList:
+        ret = self._escapeString( x )
+        if not ret['OK']:
+          return ret
+        paramNameList.append( ret['Value'] )
+      cmd += " and Name in (%s)" % ','.join( paramNameList )
+
+    result = self._query( cmd )
+    if not result['OK']:
+      return S_ERROR( 'JobDB.getJobsOptParameters: failed to retrieve parameters' )
+    resultDict = dict( [ ( int( jobID ), {} ) for jobID in jobIDList ] )
+    for jobID, name, value in result['Value']:
+      try:
+        value = value.tostring()
+      except Exception:
+        pass
+      resultDict.setdefault( int( jobID ), {} )[name] = value
+    return S_OK( resultDict )
+
 #############################################################################
   def __checkInputDataStructure( self, pDict ):
     if type( pDict ) != types.DictType:
@@ -847,6 +899,28 @@ class JobDB( DB ):
       rD[ SEName ] = { 'SURL' : surl, 'Disk' : onDisk }
     return S_OK( data )
 
+#############################################################################
+  def getJobsInputData( self, jobIDList ):
+    """ Get the input data of the jobs in jobIDList with a single query.
+        Returns a dictionary ValueDict[jobID] = input data as given by getInputData
+    """
+    if not jobIDList:
+      return S_OK( {} )
+    jobList = ','.join( [ str( int( jobID ) ) for jobID in jobIDList ] )
+    result = self._query( "SELECT l.JobID, l.LFN, l.Checksum, l.CreationDate, l.ModificationDate, l.Size, r.SURL, r.SEName, r.Disk FROM LFN l, Replicas r WHERE l.JobID in (%s) AND l.LFNID = r.LFNID" % jobList )
+    if not result[ 'OK' ]:
+      return result
+    retDict = dict( [ ( int( jobID ), {} ) for jobID in jobIDList ] )
+    for jid, lfn, checksum, creationDate, modifDate, size, surl, SEName, onDisk in result[ 'Value' ]:
+      data = retDict.setdefault( int( jid ), {} )
+      if lfn not in data:
+        data[ lfn ] = { 'Metadata' : { 'Checksum' : checksum, 'CreationDate' : creationDate,
+                                       'ModificationDate' : modifDate, 'Size' : size },
+                        'Replicas' : {} }
+      rD = data[ lfn ][ 'Replicas' ]
+      rD[ SEName ] = { 'SURL' : surl, 'Disk' : onDisk }
+    return S_OK( retDict )
+
 #############################################################################
 
   def __cleanInputData( self, jid ):
@@ -1041,6 +1115,38 @@ class JobDB( DB ):
     else:
       return S_ERROR( 'JobDB.setAttributes: failed to set attribute' )
 
+#############################################################################
+  def setJobsAttributes( self, jobIDList, attrNames, attrValues, update = False, heartBeat = False ):
+    """ Set the same attribute values for all the jobs in jobIDList with a single update.
+        The LastUpdate and HeartBeat time stamps are refreshed if explicitely requested
+    """
+    if not jobIDList:
+      return S_OK( 0 )
+
+    if len( attrNames ) != len( attrValues ):
+      return S_ERROR( 'JobDB.setJobsAttributes: incompatible Argument length' )
+
+    attr = []
+    for i in range( len( attrNames ) ):
+      ret = self._escapeString( attrValues[i] )
+      if not ret['OK']:
+        return ret
+      attr.append( "%s=%s" % ( attrNames[i], ret['Value'] ) )
+    if update:
+      attr.append( "LastUpdateTime=UTC_TIMESTAMP()" )
+    if heartBeat:
+      attr.append( "HeartBeatTime=UTC_TIMESTAMP()" )
+    if len( attr ) == 0:
+      return S_ERROR( 'JobDB.setJobsAttributes: Nothing to do' )
+
+    jobList = ','.join( [ str( int( jobID ) ) for jobID in jobIDList ] )
+    cmd = 'UPDATE Jobs SET %s WHERE JobID in ( %s )' % ( ', '.join( attr ), jobList )
+    res = self._update( cmd )
+    if res['OK']:
+      return res
+    else:
+      return S_ERROR( 'JobDB.setJobsAttributes: failed to set attributes' )
+
 #############################################################################
   def setJobStatus( self, jobID, status = '', minor = '', application = '', appCounter = None ):
     """ Set status of the job specified by its jobID
@@ -1114,6 +1220,20 @@ class JobDB( DB ):
     result = self._update( req )
     return result
 
+#############################################################################
+  def setJobsExecTime( self, jobIDList, attribute ):
+    """ Set the StartExecTime or EndExecTime time stamp of the jobs in jobIDList
+        to the current time, unless it is already set
+    """
+    if attribute not in ( 'StartExecTime', 'EndExecTime' ):
+      return S_ERROR( 'JobDB.setJobsExecTime: invalid attribute %s' % attribute )
+    if not jobIDList:
+      return S_OK( 0 )
+
+    jobList = ','.join( [ str( int( jobID ) ) for jobID in jobIDList ] )
+    req = "UPDATE Jobs SET %s=UTC_TIMESTAMP() WHERE JobID in ( %s ) AND %s IS NULL" % ( attribute, jobList, attribute )
+    return self._update( req )
+
 #############################################################################
   def setJobParameter( self, jobID, key, value ):
     """ Set a parameter specified by name,value pair for the job JobID
@@ -1162,6 +1282,35 @@ class JobDB( DB ):
 
     return result
 
+#############################################################################
+  def setJobsParameters( self, parametersDict ):
+    """ Set parameters for several jobs with a single statement. parametersDict
+        holds a list of name/value pairs for each JobID
+    """
+
+    insertValueList = []
+    for jobID in parametersDict:
+      for name, value in parametersDict[jobID]:
+        ret = self._escapeString( name )
+        if not ret['OK']:
+          return ret
+        e_name = ret['Value']
+        ret = self._escapeString( value )
+        if not ret['OK']:
+          return ret
+        e_value = ret['Value']
+        insertValueList.append( '(%d,%s,%s)' % ( int( jobID ), e_name, e_value ) )
+
+    if not insertValueList:
+      return S_OK()
+
+    cmd = 'REPLACE JobParameters (JobID,Name,Value) VALUES %s' % ', '.join( insertValueList )
+    result = self._update( cmd )
+    if not result['OK']:
+      return S_ERROR( 'JobDB.setJobsParameters: operation failed.' )
+
+    return result
+
 #############################################################################
   def setJobOptParameter( self, jobID, name, value ):
     """ Set an optimzer parameter specified by name,value pair for the job JobID
@@ -1186,6 +1335,24 @@ class JobDB( DB ):
 
     return S_OK()
 
+#############################################################################
+  def setJobsOptParameters( self, optParametersDict ):
+    """ Set optimizer parameters for several jobs with a single statement.
+        optParametersDict holds a list of name/value pairs for each JobID
+    """
+    rows = []
+    for jobID in optParametersDict:
+      for name, value in optParametersDict[jobID]:
+        rows.append( ( int( jobID ), name, value ) )
+    if not rows:
+      return S_OK()
+
+    result = self.bulkInsert( 'OptimizerParameters', ['JobID', 'Name', 'Value'], rows, onDuplicate = ['Value'] )
+    if not result['OK']:
+      return S_ERROR( 'JobDB.setJobsOptParameters: operation failed.' )
+
+    return result
+
 #############################################################################
   def removeJobOptParameter( self, jobID, name ):
     """ Remove the specified optimizer parameter for jobID
@@ -1369,6 +1536,24 @@ class JobDB( DB ):
       return result
 
 
+#############################################################################
+  def getJobJDLs( self, jobIDList, original = False ):
+    """ Get the JDLs of the jobs in jobIDList with a single query.
+        Returns a dictionary ValueDict[jobID] = JDL for the jobs found
+    """
+    if not jobIDList:
+      return S_OK( {} )
+    jobList = ','.join( [ str( int( jobID ) ) for jobID in jobIDList ] )
+    if original:
+      cmd = "SELECT JobID, OriginalJDL FROM JobJDLs WHERE JobID in (%s)" % jobList
+    else:
+      cmd = "SELECT JobID, JDL FROM JobJDLs WHERE JobID in (%s)" % jobList
+
+    result = self._query( cmd )
+    if not result['OK']:
+      return result
+    return S_OK( dict( [ ( int( jobID ), jdl ) for jobID, jdl in result['Value'] ] ) )
+
   def getJobsInHerd( self, jid ):
     try:
       jid = int( jid )
@@ -1626,10 +1811,16 @@ class JobDB( DB ):
     """
 
     failedJobs = []
+    rescheduledJobs = []
     for jobID in jobIDs:
-      result = self.rescheduleJob( jobID )
+      result = self.rescheduleJob( jobID, notify = False )
       if not result['OK']:
         failedJobs.append( jobID )
+      else:
+        rescheduledJobs.append( result['JobID'] )
+    # The rescheduled jobs are announced together
+    if rescheduledJobs:
+      gJobOptimizationNotifier.optimizeJobs( rescheduledJobs )
 
     if failedJobs:
       result = S_ERROR( 'JobDB.rescheduleJobs: Not all the jobs were rescheduled' )
@@ -1646,20 +1837,21 @@ class JobDB( DB ):
     return ret
 
 #############################################################################
-  def resetJob( self, jid ):
+  def resetJob( self, jid, notify = True ):
     result = self.setJobAttributes( jid, [ 'RescheduleCounter' ], [ -1 ] )
     if not result[ 'OK' ]:
       return self.__failJob( jid, "Error resetting job", "Error setting reschedule counter: %s" % result[ 'Message' ] )
     result = self.clearAtticParameters( jid )
     if not result[ 'OK' ]:
       return self.__failJob( jid, "Error cleaning attic", "Error cleaning attic: %s" % result[ 'Message' ] )
-    return self.rescheduleJob( jid )
+    return self.rescheduleJob( jid, notify = notify )
 
 
 #############################################################################
-  def rescheduleJob ( self, jid ):
+  def rescheduleJob ( self, jid, notify = True ):
     """ Reschedule the given job to run again from scratch. Retain the already
-        defined parameters in the parameter Attic
+        defined parameters in the parameter Attic. Unless notify is False, the job
+        is announced to the OptimizationMind
     """
     #I feel dirty after looking at this method
 
@@ -1767,6 +1959,10 @@ class JobDB( DB ):
     if not result['OK']:
       return self.__failJob( jid, "Error setting attrs", "Can't set attributes: %s" % res[ 'Value' ] )
 
+    # Start the optimization at once
+    if notify:
+      gJobOptimizationNotifier.optimizeJobs( [ jid ] )
+
     retVal = S_OK( jid )
     retVal['JobID'] = jid
     retVal['InputData'] = jobManifest.getOption( "InputData" )
@@ -2137,6 +2333,32 @@ class JobDB( DB ):
     else:
       return S_ERROR( 'Failed to store some or all the parameters' )
 
+#####################################################################################
+  def addHeartBeatRecords( self, recordList ):
+    """ Add the dynamic heart beat data of several jobs with a single statement.
+        Each record is a ( jobID, name, value ) tuple
+    """
+    valueList = []
+    for jobID, key, value in recordList:
+      result = self._escapeString( key )
+      if not result['OK']:
+        self.log.warn( 'Failed to escape string ' + key )
+        continue
+      e_key = result['Value']
+      result = self._escapeString( value )
+      if not result['OK']:
+        self.log.warn( 'Failed to escape string ' + value )
+        continue
+      e_value = result['Value']
+      valueList.append( "( %d, %s,%s,UTC_TIMESTAMP())" % ( int( jobID ), e_key, e_value ) )
+
+    if not valueList:
+      return S_OK()
+
+    req = "INSERT INTO HeartBeatLoggingInfo (JobID,Name,Value,HeartBeatTime) VALUES "
+    req += ','.join( valueList )
+    return self._update( req )
+
 #####################################################################################
   def getHeartBeatData( self, jobID ):
     """ Retrieve the job's heart beat data
@@ -75,8 +75,31 @@ class JobLoggingDB( DB ):
         UTC time is used.
     """
 
-    event = 'status/minor/app=%s/%s/%s' % ( status, minor, application )
-    self.gLogger.info( "Adding record for job " + str( jobID ) + ": '" + event + "' from " + source )
+    return self.addLoggingRecords( [ ( jobID, status, minor, application, date, source ) ] )
+
+#############################################################################
+  def addLoggingRecords( self, recordList ):
+    """ Add several entries to the JobLoggingDB table with a bulk insertion.
+        Each record is a ( jobID, status, minor, application, date, source ) tuple
+        with the same meaning as the addLoggingRecord arguments
+    """
+    if not recordList:
+      return S_OK( 0 )
+
+    rows = []
+    for jobID, status, minor, application, date, source in recordList:
+      event = 'status/minor/app=%s/%s/%s' % ( status, minor, application )
+      self.gLogger.info( "Adding record for job " + str( jobID ) + ": '" + event + "' from " + source )
+      _date, time_order = self.__getTimeStamps( date )
+      rows.append( ( int( jobID ), status, minor, application, _date, time_order, source ) )
+
+    return self.bulkInsert( 'LoggingInfo', [ 'JobId', 'Status', 'MinorStatus', 'ApplicationStatus',
+                                             'StatusTime', 'StatusTimeOrder', 'StatusSource' ], rows )
+
+#############################################################################
+  def __getTimeStamps( self, date ):
+    """ Get the UTC datetime and the time ordering float for a logging record
+    """
 
     if not date:
       # Make the UTC datetime string and float
@@ -105,11 +128,7 @@ class JobLoggingDB( DB ):
         epoc = time.mktime( _date.timetuple() ) - MAGIC_EPOC_NUMBER
         time_order = round( epoc, 3 )
 
-    cmd = "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, " + \
-          "StatusTime, StatusTimeOrder, StatusSource) VALUES (%d,'%s','%s','%s','%s',%f,'%s')" % \
-           ( int( jobID ), status, minor, application, str( _date ), time_order, source )
-
-    return self._update( cmd )
+    return _date, time_order
 
 #############################################################################
   def getJobLoggingInfo( self, jobID ):
@@ -44,6 +44,7 @@ class SandboxMetadataDB( DB ):
                                                         },
                                             'PrimaryKey' : 'SBId',
                                             'Indexes': { 'SBOwner': [ 'OwnerId' ],
+                                                         'LastAccess': [ 'LastAccessTime' ],
                                                        },
                                             'UniqueIndexes' : { 'Location' : [ 'SEName', 'SEPFN' ] }
 
@@ -297,9 +298,11 @@ class SandboxMetadataDB( DB ):
     """
     Get sandboxes that have been assigned but the job is no longer there
     """
-    sqlCond = [ "Assigned AND SBId NOT IN ( SELECT SBId FROM `sb_EntityMapping` ) AND TIMESTAMPDIFF( DAY, LastAccessTime, UTC_TIMESTAMP() ) >= %d" % self.__assignedSBGraceDays,
-                "! Assigned AND TIMESTAMPDIFF( DAY, LastAccessTime, UTC_TIMESTAMP() ) >= %s" % self.__unassignedSBGraceDays]
-    sqlCmd = "SELECT SBId, SEName, SEPFN FROM `sb_SandBoxes` WHERE ( %s )" % " ) OR ( ".join( sqlCond )
+    # Conditions on LastAccessTime itself so that its index can be used
+    sqlCond = [ "s.Assigned AND e.SBId IS NULL AND s.LastAccessTime <= UTC_TIMESTAMP() - INTERVAL %d DAY" % self.__assignedSBGraceDays,
+                "! s.Assigned AND s.LastAccessTime <= UTC_TIMESTAMP() - INTERVAL %d DAY" % self.__unassignedSBGraceDays ]
+    sqlCmd = "SELECT DISTINCT s.SBId, s.SEName, s.SEPFN FROM `sb_SandBoxes` s LEFT JOIN `sb_EntityMapping` e ON s.SBId = e.SBId"
+    sqlCmd = "%s WHERE ( %s )" % ( sqlCmd, " ) OR ( ".join( sqlCond ) )
     return self._query( sqlCmd )
 
   def deleteSandboxes( self, SBIdList ):
@@ -5,9 +5,11 @@ __RCSID__ = "ebed3a8 (2012-07-06 20:33:11 +0200) Adri Casajs <adria@ecm.ub.es>"
 
 import types
 import random
+import threading
 from DIRAC  import gConfig, gLogger, S_OK, S_ERROR
 from DIRAC.WorkloadManagementSystem.private.SharesCorrector import SharesCorrector
 from DIRAC.WorkloadManagementSystem.private.Queues import maxCPUSegments
+from DIRAC.WorkloadManagementSystem.private.TaskQueueIndex import TaskQueueIndex
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
 from DIRAC.Core.Utilities import List
 from DIRAC.Core.Utilities.DictCache import DictCache
@@ -41,6 +43,8 @@ class TaskQueueDB( DB ):
     self.__opsHelper = Operations()
     self.__ensureInsertionIsSingle = False
     self.__sharesCorrector = SharesCorrector( self.__opsHelper )
+    self.__tqIndex = False
+    self.__tqIndexLock = threading.Lock()
     result = self.__initializeDB()
     if not result[ 'OK' ]:
       raise Exception( "Can't create tables: %s" % result[ 'Message' ] )
@@ -73,6 +77,43 @@ class TaskQueueDB( DB ):
   def __getCSOption( self, optionName, defValue ):
     return self.__opsHelper.getValue( "JobScheduling/%s" % optionName, defValue )
 
+  def __isJobSharingGroup( self, group ):
+    return Properties.JOB_SHARING in CS.getPropertiesForGroup( group )
+
+  def __getTaskQueueIndex( self ):
+    """
+    Get the in-memory index of task queues if it's enabled, reloading it when it's too old
+    """
+    if not self.__getCSOption( "UseTaskQueueIndex", False ):
+      self.__tqIndex = False
+      return False
+    if not self.__tqIndex:
+      self.__tqIndex = TaskQueueIndex( self.__singleValueDefFields, self.__multiValueMatchFields,
+                                       tagMatchFields = self.__tagMatchFields,
+                                       bannedJobMatchFields = self.__bannedJobMatchFields,
+                                       strictRequireMatchFields = self.__strictRequireMatchFields,
+                                       isJobSharingGroup = self.__isJobSharingGroup )
+    tqIndex = self.__tqIndex
+    tqIndex.maxAge = self.__getCSOption( "TaskQueueIndexMaxAge", 15 )
+    if not tqIndex.isExpired():
+      return tqIndex
+    #Only one thread reloads, the rest keep using the current contents if there are any
+    if not self.__tqIndexLock.acquire( False ):
+      if tqIndex.isLoaded():
+        return tqIndex
+      return False
+    try:
+      if tqIndex.isExpired():
+        result = self.retrieveTaskQueues()
+        if not result[ 'OK' ]:
+          self.log.error( "Cannot load task queue index, matching in the DB", result[ 'Message' ] )
+          return False
+        tqIndex.load( result[ 'Value' ] )
+        self.log.verbose( "Loaded %s task queues in the index" % tqIndex.getNumTaskQueues() )
+    finally:
+      self.__tqIndexLock.release()
+    return tqIndex
+
   def getPrivatePilots( self ):
     return self.__getCSOption( "PrivatePilotTypes", [ 'private' ] )
 
@@ -218,6 +259,16 @@ class TaskQueueDB( DB ):
           return S_ERROR( "PilotType %s is invalid" % pilotType )
     return S_OK( tqDefDict )
 
+  def __setMatchPlatform( self, tqMatchDict ):
+    """
+    Confine the LHCbPlatform legacy option here, use Platform everywhere else
+    until the LHCbPlatform is no more used in the TaskQueueDB
+    """
+    if 'LHCbPlatform' in tqMatchDict and not "Platform" in tqMatchDict:
+      tqMatchDict['Platform'] = tqMatchDict['LHCbPlatform']
+    if 'SystemConfig' in tqMatchDict and not "Platform" in tqMatchDict:
+      tqMatchDict['Platform'] = tqMatchDict['SystemConfig']
+
   def _checkMatchDefinition( self, tqMatchDict ):
     """
     Check a task queue match dict is valid
@@ -239,12 +290,7 @@ class TaskQueueDB( DB ):
           return self._escapeString( value )
         return S_OK( value )
 
-    # Confine the LHCbPlatform legacy option here, use Platform everywhere else
-    # until the LHCbPlatform is no more used in the TaskQueueDB
-    if 'LHCbPlatform' in tqMatchDict and not "Platform" in tqMatchDict:
-      tqMatchDict['Platform'] = tqMatchDict['LHCbPlatform']
-    if 'SystemConfig' in tqMatchDict and not "Platform" in tqMatchDict:
-      tqMatchDict['Platform'] = tqMatchDict['SystemConfig']
+    self.__setMatchPlatform( tqMatchDict )
 
     for field in self.__singleValueDefFields:
       if field not in tqMatchDict:
@@ -401,6 +447,8 @@ class TaskQueueDB( DB ):
         return result
       if newTQ:
         self.recalculateTQSharesForEntity( tqDefDict[ 'OwnerDN' ], tqDefDict[ 'OwnerGroup' ], connObj = connObj )
+      if self.__tqIndex:
+        self.__tqIndex.jobInserted( tqId )
     finally:
       self.__setTaskQueueEnabled( tqId, True )
     return S_OK()
@@ -500,11 +548,15 @@ class TaskQueueDB( DB ):
     """
     #Make a copy to avoid modification of original if escaping needs to be done
     tqMatchDict = dict( tqMatchDict )
-    self.log.info( "Starting match for requirements", self.__strDict( tqMatchDict ) )
+    #The task queue index works with the values before escaping
+    rawMatchDict = dict( tqMatchDict )
+    self.__setMatchPlatform( rawMatchDict )
+    self.log.info( "Starting match for requirements", lambda: self.__strDict( tqMatchDict ) )
     retVal = self._checkMatchDefinition( tqMatchDict )
     if not retVal[ 'OK' ]:
       self.log.error( "TQ match request check failed", retVal[ 'Message' ] )
       return retVal
+    tqIndex = self.__getTaskQueueIndex()
     retVal = self._getConnection()
     if not retVal[ 'OK' ]:
       return S_ERROR( "Can't connect to DB: %s" % retVal[ 'Message' ] )
@@ -515,8 +567,13 @@ class TaskQueueDB( DB ):
     for _ in range( self.__maxMatchRetry ):
       if 'JobID' in tqMatchDict:
         # A certain JobID is required by the resource, so all TQ are to be considered
-        retVal = self.matchAndGetTaskQueue( tqMatchDict, numQueuesToGet = 0, skipMatchDictDef = True, connObj = connObj )
+        if tqIndex:
+          retVal = S_OK( tqIndex.match( rawMatchDict, numQueuesToGet = 0 ) )
+        else:
+          retVal = self.matchAndGetTaskQueue( tqMatchDict, numQueuesToGet = 0, skipMatchDictDef = True, connObj = connObj )
         preJobSQL = "%s AND `tq_Jobs`.JobId = %s " % ( preJobSQL, tqMatchDict['JobID'] )
+      elif tqIndex:
+        retVal = S_OK( tqIndex.match( rawMatchDict, numQueuesToGet = numQueuesPerTry, negativeCond = negativeCond ) )
       else:
         retVal = self.matchAndGetTaskQueue( tqMatchDict,
                                             numQueuesToGet = numQueuesPerTry,
@@ -535,6 +592,8 @@ class TaskQueueDB( DB ):
         if not retVal[ 'OK' ]:
           return S_ERROR( "Can't retrieve winning priority for matching job: %s" % retVal[ 'Message' ] )
         if len( retVal[ 'Value' ] ) == 0:
+          if tqIndex:
+            tqIndex.dropTaskQueue( tqId )
           continue
         prio = retVal[ 'Value' ][0][0]
         retVal = self._query( "%s %s" % ( preJobSQL % ( tqId, prio ), postJobSQL ), conn = connObj )
@@ -544,10 +603,12 @@ class TaskQueueDB( DB ):
         if len( jobTQList ) == 0:
           gLogger.info( "Task queue %s seems to be empty, triggering a cleaning" % tqId )
           self.__deleteTQWithDelay.add( tqId, 300, ( tqId, tqOwnerDN, tqOwnerGroup ) )
+          if tqIndex:
+            tqIndex.dropTaskQueue( tqId )
         while len( jobTQList ) > 0:
           jobId, tqId = jobTQList.pop( random.randint( 0, len( jobTQList ) - 1 ) )
           self.log.info( "Trying to extract job %s from TQ %s" % ( jobId, tqId ) )
-          retVal = self.deleteJob( jobId, connObj = connObj )
+          retVal = self.__extractJob( jobId, tqId, tqOwnerDN, tqOwnerGroup, connObj = connObj )
           if not retVal[ 'OK' ]:
             msgFix = "Could not take job"
             msgVar = " %s out from the TQ %s: %s" % ( jobId, tqId, retVal[ 'Message' ] )
@@ -761,8 +822,15 @@ class TaskQueueDB( DB ):
     if not data:
       return S_OK( False )
     tqId, tqOwnerDN, tqOwnerGroup = data[0]
+    return self.__extractJob( jobId, tqId, tqOwnerDN, tqOwnerGroup, connObj = connObj )
+
+  def __extractJob( self, jobId, tqId, tqOwnerDN, tqOwnerGroup, connObj = False ):
+    """
+    Take a job out of the task queue it's known to be in
+    Return S_OK( True/False ) / S_ERROR
+    """
     self.log.info( "Deleting job %s" % jobId )
-    retVal = self._update( "DELETE FROM `tq_Jobs` WHERE JobId = %s" % jobId, conn = connObj )
+    retVal = self._update( "DELETE FROM `tq_Jobs` WHERE JobId = %s AND TQId = %s" % ( jobId, tqId ), conn = connObj )
     if not retVal[ 'OK' ]:
       return S_ERROR( "Could not delete job from task queue %s: %s" % ( jobId, retVal[ 'Message' ] ) )
     if retVal['Value'] == 0:
@@ -770,6 +838,8 @@ class TaskQueueDB( DB ):
       return S_OK( False )
     #Always return S_OK() because job has already been taken out from the TQ
     self.__deleteTQWithDelay.add( tqId, 300, ( tqId, tqOwnerDN, tqOwnerGroup ) )
+    if self.__tqIndex:
+      self.__tqIndex.jobExtracted( tqId )
     return S_OK( True )
 
   def getTaskQueueForJob( self, jobId, connObj = False ):
@@ -866,6 +936,8 @@ class TaskQueueDB( DB ):
         retVal = self._update( "DELETE FROM `tq_TQTo%s` WHERE TQId = %s" % ( mvField, tqId ), conn = connObj )
         if not retVal[ 'OK' ]:
           return retVal
+      if self.__tqIndex:
+        self.__tqIndex.dropTaskQueue( tqId )
       self.recalculateTQSharesForEntity( tqOwnerDN, tqOwnerGroup, connObj = connObj )
       self.log.info( "Deleted empty and enabled TQ %s" % tqId )
       return S_OK( True )
@@ -902,6 +974,8 @@ class TaskQueueDB( DB ):
       retVal = self._update( "DELETE FROM `tq_TQTo%s` WHERE TQId = %s" % ( field, tqId ), conn = connObj )
       if not retVal[ 'OK' ]:
         return retVal
+    if self.__tqIndex:
+      self.__tqIndex.dropTaskQueue( tqId )
     if delTQ > 0:
       self.recalculateTQSharesForEntity( tqOwnerDN, tqOwnerGroup, connObj = connObj )
       return S_OK( True )
@@ -1146,6 +1220,8 @@ class TaskQueueDB( DB ):
       tqList = ", ".join( [ str( tqId ) for tqId in prioDict[ prio ] ] )
       updateSQL = "UPDATE `tq_TaskQueues` SET Priority=%.4f WHERE TQId in ( %s )" % ( prio, tqList )
       self._update( updateSQL, conn = connObj )
+    if self.__tqIndex:
+      self.__tqIndex.setPriorities( tqDict )
     return S_OK()
 
   def getGroupShares( self ):
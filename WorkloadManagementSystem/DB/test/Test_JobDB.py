@@ -0,0 +1,79 @@
+""" Test cases for the JobDB queries on several jobs at once, with the SQL layer faked
+"""
+
+import unittest
+
+from mock import MagicMock
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.WorkloadManagementSystem.DB.JobDB import JobDB
+
+OPT_PARAMETERS = [ ( 1L, 'CPUTime', '100' ), ( 1L, 'Platform', 'x86_64' ), ( 3L, 'CPUTime', '300' ) ]
+JDLS = { 1 : '[ JobID = 1; ]', 3 : '[ JobID = 3; ]' }
+
+class JobsQueriesTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.jobDB = JobDB.__new__( JobDB )
+    self.jobDB._escapeString = lambda value: S_OK( "'%s'" % value )
+    self.jobDB._query = MagicMock( side_effect = self.query )
+    self.jobDB._update = MagicMock( return_value = S_OK( 2 ) )
+
+  def query( self, cmd ):
+    if 'OptimizerParameters' in cmd:
+      return S_OK( tuple( OPT_PARAMETERS ) )
+    if 'JobJDLs' in cmd:
+      return S_OK( tuple( [ ( long( jobID ), JDLS[ jobID ] ) for jobID in sorted( JDLS ) ] ) )
+    return S_ERROR( "Unexpected query" )
+
+  def test_getJobsOptParameters( self ):
+    """ Jobs without parameters get an empty dictionary
+    """
+    result = self.jobDB.getJobsOptParameters( [ 1, 2, 3 ] )
+    self.assertTrue( result[ 'OK' ] )
+    self.assertEqual( result[ 'Value' ], { 1 : { 'CPUTime' : '100', 'Platform' : 'x86_64' },
+                                           2 : {},
+                                           3 : { 'CPUTime' : '300' } } )
+    cmd = self.jobDB._query.call_args[0][0]
+    self.assertTrue( 'JobID in (1,2,3)' in cmd )
+    self.assertFalse( 'Name in' in cmd )
+    self.jobDB.getJobsOptParameters( [ 1 ], [ 'CPUTime' ] )
+    self.assertTrue( "Name in ('CPUTime')" in self.jobDB._query.call_args[0][0] )
+
+  def test_getJobJDLs( self ):
+    """ Only the jobs found are returned
+    """
+    result = self.jobDB.getJobJDLs( [ 1, 2, 3 ] )
+    self.assertTrue( result[ 'OK' ] )
+    self.assertEqual( result[ 'Value' ], JDLS )
+    self.assertTrue( 'SELECT JobID, JDL FROM' in self.jobDB._query.call_args[0][0] )
+    self.jobDB.getJobJDLs( [ 1 ], original = True )
+    self.assertTrue( 'OriginalJDL' in self.jobDB._query.call_args[0][0] )
+
+  def test_setJobsAttributes( self ):
+    result = self.jobDB.setJobsAttributes( [ 1, 2 ], [ 'Status', 'Site' ], [ 'Matched', 'LCG.CERN.ch' ] )
+    self.assertTrue( result[ 'OK' ] )
+    self.assertEqual( self.jobDB._update.call_count, 1 )
+    self.assertEqual( self.jobDB._update.call_args[0][0],
+                      "UPDATE Jobs SET Status='Matched', Site='LCG.CERN.ch' WHERE JobID in ( 1,2 )" )
+    self.jobDB.setJobsAttributes( [ 1 ], [ 'Status' ], [ 'Running' ], update = True, heartBeat = True )
+    cmd = self.jobDB._update.call_args[0][0]
+    self.assertTrue( 'LastUpdateTime=UTC_TIMESTAMP()' in cmd )
+    self.assertTrue( 'HeartBeatTime=UTC_TIMESTAMP()' in cmd )
+
+  def test_setJobsAttributesErrors( self ):
+    self.assertFalse( self.jobDB.setJobsAttributes( [ 1 ], [ 'Status', 'Site' ], [ 'Matched' ] )[ 'OK' ] )
+    self.jobDB._update.return_value = S_ERROR( "DB is gone" )
+    self.assertFalse( self.jobDB.setJobsAttributes( [ 1 ], [ 'Status' ], [ 'Matched' ] )[ 'OK' ] )
+
+  def test_noJobs( self ):
+    self.assertEqual( self.jobDB.getJobsOptParameters( [] )[ 'Value' ], {} )
+    self.assertEqual( self.jobDB.getJobJDLs( [] )[ 'Value' ], {} )
+    self.assertEqual( self.jobDB.setJobsAttributes( [], [ 'Status' ], [ 'Matched' ] )[ 'Value' ], 0 )
+    self.assertFalse( self.jobDB._query.called )
+    self.assertFalse( self.jobDB._update.called )
+
+if __name__ == '__main__':
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( JobsQueriesTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( gSuite )
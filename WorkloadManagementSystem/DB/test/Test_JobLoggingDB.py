@@ -0,0 +1,51 @@
+""" Test cases for the bulk insertion of the job logging records
+"""
+
+import datetime
+import unittest
+
+from mock import MagicMock
+
+from DIRAC import S_OK
+from DIRAC.WorkloadManagementSystem.DB.JobLoggingDB import JobLoggingDB
+
+COLUMNS = [ 'JobId', 'Status', 'MinorStatus', 'ApplicationStatus', 'StatusTime', 'StatusTimeOrder', 'StatusSource' ]
+
+class AddLoggingRecordsTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.jobLoggingDB = JobLoggingDB.__new__( JobLoggingDB )
+    self.jobLoggingDB.gLogger = MagicMock()
+    self.jobLoggingDB.bulkInsert = MagicMock( return_value = S_OK( 2 ) )
+
+  def test_records( self ):
+    """ All the records go in one insertion
+    """
+    result = self.jobLoggingDB.addLoggingRecords( [ ( 1, 'Matched', 'Assigned', 'idem', '2014-01-01 10:00:00', 'Matcher' ),
+                                                    ( '2', 'Matched', 'Assigned', 'idem', '', 'Matcher' ) ] )
+    self.assertTrue( result[ 'OK' ] )
+    self.assertEqual( self.jobLoggingDB.bulkInsert.call_count, 1 )
+    table, columns, rows = self.jobLoggingDB.bulkInsert.call_args[0]
+    self.assertEqual( table, 'LoggingInfo' )
+    self.assertEqual( columns, COLUMNS )
+    self.assertEqual( [ row[0] for row in rows ], [ 1, 2 ] )
+    self.assertEqual( rows[0][1:4], ( 'Matched', 'Assigned', 'idem' ) )
+    self.assertEqual( rows[0][4], datetime.datetime( 2014, 1, 1, 10 ) )
+    self.assertEqual( rows[0][6], 'Matcher' )
+    # The records without a date get the current time, which orders them later
+    self.assertTrue( rows[1][5] > rows[0][5] )
+
+  def test_singleRecord( self ):
+    self.jobLoggingDB.addLoggingRecord( 1, status = 'Running', source = 'JobWrapper' )
+    rows = self.jobLoggingDB.bulkInsert.call_args[0][2]
+    self.assertEqual( len( rows ), 1 )
+    self.assertEqual( rows[0][1:4], ( 'Running', 'idem', 'idem' ) )
+
+  def test_noRecords( self ):
+    self.assertTrue( self.jobLoggingDB.addLoggingRecords( [] )[ 'OK' ] )
+    self.assertFalse( self.jobLoggingDB.bulkInsert.called )
+
+if __name__ == '__main__':
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( AddLoggingRecordsTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( gSuite )
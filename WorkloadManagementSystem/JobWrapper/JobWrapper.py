@@ -17,6 +17,7 @@ from DIRAC.RequestManagementSystem.Client.Operation                 import Opera
 from DIRAC.RequestManagementSystem.Client.ReqClient                 import ReqClient
 from DIRAC.RequestManagementSystem.private.RequestValidator         import RequestValidator
 from DIRAC.WorkloadManagementSystem.Client.SandboxStoreClient       import SandboxStoreClient
+from DIRAC.WorkloadManagementSystem.Client.StagingCache             import StagingCache, executeInParallel, adler32Check, md5Check
 from DIRAC.WorkloadManagementSystem.JobWrapper.WatchdogFactory      import WatchdogFactory
 from DIRAC.AccountingSystem.Client.Types.Job                        import Job as AccountingJob
 from DIRAC.ConfigurationSystem.Client.PathFinder                    import getSystemSection
@@ -44,6 +45,7 @@ import time
 import shutil
 import threading
 import tarfile
+import tempfile
 import glob
 import types
 import urllib
@@ -106,6 +108,12 @@ class JobWrapper( object ):
     self.defaultCatalog = gConfig.getValue( self.section + '/DefaultCatalog', [] )
     self.masterCatalogOnlyFlag = gConfig.getValue( self.section + '/MasterCatalogOnlyFlag', True )
     self.defaultFailoverSE = gConfig.getValue( '/Resources/StorageElementGroups/Tier1-Failover', [] )
+    # Input sandboxes and LFNs downloaded at the same time
+    self.stagingThreads = gConfig.getValue( self.section + '/StagingThreads', 4 )
+    # Cache of the downloaded files shared by the jobs of the node, disabled if no directory is defined
+    self.stagingCacheDir = gConfig.getValue( '/LocalSite/StagingCacheDir', '' )
+    self.stagingCacheSize = gConfig.getValue( '/LocalSite/StagingCacheSize', 10240 )
+    self.stagingCache = None
     self.defaultOutputPath = ''
     self.dm = DataManager()
     self.fc = FileCatalog()
@@ -585,7 +593,9 @@ class JobWrapper( object ):
             self.log.info( 'File size for LFN:%s was not a long integer, setting size to 0' % ( lfn ) )
         self.inputDataSize += lfnSize
 
-    configDict = {'JobID':self.jobID, 'LocalSEList':localSEList, 'DiskSEList':self.diskSE, 'TapeSEList':self.tapeSE}
+    configDict = {'JobID':self.jobID, 'LocalSEList':localSEList, 'DiskSEList':self.diskSE, 'TapeSEList':self.tapeSE,
+                  'StagingThreads':self.stagingThreads, 'StagingCacheDir':self.stagingCacheDir,
+                  'StagingCacheSize':self.stagingCacheSize}
     self.log.info( configDict )
     argumentsDict = {'FileCatalog':resolvedData, 'Configuration':configDict, 'InputData':lfns, 'Job':self.jobArgs}
     self.log.info( argumentsDict )
@@ -999,6 +1009,94 @@ class JobWrapper( object ):
 
     return ( lfn, localfile )
 
+  #############################################################################
+  def __getStagingCache( self ):
+    """ Node local cache of the downloaded files, None if it is not used
+    """
+    if self.stagingCache is None and self.stagingCacheDir:
+      try:
+        self.stagingCache = StagingCache( self.stagingCacheDir, self.stagingCacheSize * 1048576 )
+      except Exception, x:
+        self.log.warn( 'Cannot use the staging cache %s: %s' % ( self.stagingCacheDir, str( x ) ) )
+        self.stagingCacheDir = ''
+    return self.stagingCache
+
+  def __downloadSandbox( self, sandboxClient, isb ):
+    """ Download a registered input sandbox archive, through the staging cache if there is one
+
+    :return: S_OK( ( archive path, downloaded archive to remove or None ) )
+    """
+    stagingCache = self.__getStagingCache()
+    if not stagingCache:
+      result = sandboxClient.downloadSandbox( isb, unpack = False )
+      if not result['OK']:
+        return result
+      return S_OK( ( result['Value'], result['Value'] ) )
+    # The sandbox path is the MD5 of the archive
+    sandboxMD5 = os.path.basename( isb ).split( '.' )[0]
+    return stagingCache.getOrAdd( isb, lambda: sandboxClient.downloadSandbox( isb, unpack = False ),
+                                  md5Check( sandboxMD5 ) )
+
+  def __downloadSandboxLFN( self, lfn, metadata ):
+    """ Download an input sandbox LFN to the current directory, through the staging
+        cache if there is one and the Adler32 checksum of the file is in its metadata
+    """
+    def download( destinationDir = '' ):
+      # The DataManager and its catalogs are not thread safe
+      result = DataManager().getFile( lfn, destinationDir = destinationDir )
+      if not result['OK']:
+        return result
+      if lfn in result['Value']['Failed']:
+        return S_ERROR( result['Value']['Failed'][lfn] )
+      return S_OK( result['Value']['Successful'][lfn] )
+
+    stagingCache = self.__getStagingCache()
+    checksum = metadata.get( 'Checksum' )
+    checkFunction = adler32Check( checksum, metadata.get( 'ChecksumType' ) )
+    if not stagingCache or not checkFunction:
+      return download()
+    localFile = os.path.join( os.getcwd(), os.path.basename( lfn ) )
+    tmpDir = tempfile.mkdtemp( prefix = 'ISB.', dir = os.getcwd() )
+    try:
+      result = stagingCache.getOrAdd( 'LFN:%s:%s' % ( lfn, checksum ), lambda: download( tmpDir ), checkFunction )
+      if not result['OK']:
+        return result
+      cachedPath, downloadedPath = result['Value']
+      if downloadedPath:
+        os.rename( downloadedPath, localFile )
+      else:
+        shutil.copyfile( cachedPath, localFile )
+    finally:
+      shutil.rmtree( tmpDir, ignore_errors = True )
+    return S_OK( localFile )
+
+  def __unpackSandbox( self, tarFileName ):
+    """ Extract an archive to the current directory, in one sequential pass
+
+    :return: total size of the extracted files
+    """
+    try:
+      tarFile = tarfile.open( tarFileName, 'r|*' )
+      try:
+        sandboxSize = 0
+        for member in tarFile:
+          tarFile.extract( member, os.getcwd() )
+          sandboxSize += member.size
+        return sandboxSize
+      finally:
+        tarFile.close()
+    except tarfile.StreamError:
+      # Members that need to go back in the archive, like some hard links
+      tarFile = tarfile.open( tarFileName, 'r' )
+      try:
+        sandboxSize = 0
+        for member in tarFile.getmembers():
+          tarFile.extract( member, os.getcwd() )
+          sandboxSize += member.size
+        return sandboxSize
+      finally:
+        tarFile.close()
+
   #############################################################################
   def transferInputSandbox( self, inputSandbox ):
     """Downloads the input sandbox for the job
@@ -1028,45 +1126,87 @@ class JobWrapper( object ):
           self.log.info( 'Getting InputSandbox file %s from local directory for testing' % ( inputFile ) )
           shutil.copy( self.root + '/inputsandbox/' + inputFile, inputFile )
       result = S_OK( sandboxFiles )
-    else:
-      if registeredISB:
-        for isb in registeredISB:
-          self.log.info( "Downloading Input SandBox %s" % isb )
-          result = SandboxStoreClient().downloadSandbox( isb )
-          if not result[ 'OK' ]:
-            self.__report( 'Running', 'Failed Downloading InputSandbox' )
-            return S_ERROR( "Cannot download Input sandbox %s: %s" % ( isb, result[ 'Message' ] ) )
-          else:
-            self.inputSandboxSize += result[ 'Value' ]
+      registeredISB = []
 
+    lfns = [fname.replace( 'LFN:', '' ).replace( 'lfn:', '' ) for fname in lfns]
+    lfnMetadata = {}
     if lfns:
       self.log.info( "Downloading Input SandBox LFNs, number of files to get", len( lfns ) )
       self.__report( 'Running', 'Downloading InputSandbox LFN(s)' )
-      lfns = [fname.replace( 'LFN:', '' ).replace( 'lfn:', '' ) for fname in lfns]
-      download = self.dm.getFile( lfns )
-      if not download['OK']:
-        self.log.warn( download )
-        self.__report( 'Running', 'Failed Downloading InputSandbox LFN(s)' )
-        return S_ERROR( download['Message'] )
-      failed = download['Value']['Failed']
+      if self.__getStagingCache():
+        # The cached LFNs are identified by their checksum
+        result = self.fc.getFileMetadata( lfns )
+        if result['OK']:
+          lfnMetadata = result['Value']['Successful']
+
+    # All the sandboxes and LFNs are downloaded concurrently and each one is
+    # unpacked as soon as it is there, in the order of the input sandbox
+    sandboxClient = SandboxStoreClient()
+    stagingFunctions = []
+    for isb in registeredISB:
+      self.log.info( "Downloading Input SandBox %s" % isb )
+      stagingFunctions.append( lambda isb = isb: self.__downloadSandbox( sandboxClient, isb ) )
+    for lfn in lfns:
+      stagingFunctions.append( lambda lfn = lfn: self.__downloadSandboxLFN( lfn, lfnMetadata.get( lfn, {} ) ) )
+
+    failed = {}
+    unpackedFiles = []
+    stagingResults = executeInParallel( stagingFunctions, self.stagingThreads )
+    for isb in registeredISB:
+      result = stagingResults.next()
+      if not result[ 'OK' ]:
+        stagingResults.close()
+        self.__report( 'Running', 'Failed Downloading InputSandbox' )
+        return S_ERROR( "Cannot download Input sandbox %s: %s" % ( isb, result[ 'Message' ] ) )
+      tarFileName, downloadedFile = result['Value']
+      try:
+        try:
+          self.inputSandboxSize += self.__unpackSandbox( tarFileName )
+        except Exception, x:
+          stagingResults.close()
+          self.__report( 'Running', 'Failed Downloading InputSandbox' )
+          return S_ERROR( "Cannot download Input sandbox %s: Could not open bundle: %s" % ( isb, str( x ) ) )
+      finally:
+        if downloadedFile:
+          try:
+            os.unlink( downloadedFile )
+            os.rmdir( os.path.dirname( downloadedFile ) )
+          except OSError, x:
+            self.log.warn( "Could not remove temporary sandbox %s: %s" % ( downloadedFile, str( x ) ) )
+    for lfn in lfns:
+      result = stagingResults.next()
+      if not result['OK']:
+        failed[lfn] = result['Message']
+        continue
+      localFile = result['Value']
+      if os.path.exists( '%s/%s' % ( self.root, os.path.basename( localFile ) ) ):
+        sandboxFiles.append( os.path.basename( localFile ) )
       if failed:
-        self.log.warn( 'Could not download InputSandbox LFN(s)' )
-        self.log.warn( failed )
-        return S_ERROR( str( failed ) )
-      for lfn in lfns:
-        if os.path.exists( '%s/%s' % ( self.root, os.path.basename( download['Value']['Successful'][lfn] ) ) ):
-          sandboxFiles.append( os.path.basename( download['Value']['Successful'][lfn] ) )
+        # Nothing more to unpack
+        continue
+      try:
+        if tarfile.is_tarfile( localFile ):
+          self.log.info( 'Unpacking input sandbox file %s' % ( localFile ) )
+          self.__unpackSandbox( localFile )
+          unpackedFiles.append( os.path.basename( localFile ) )
+      except Exception, x :
+        stagingResults.close()
+        return S_ERROR( 'Could not untar %s with exception %s' % ( localFile, str( x ) ) )
+    if failed:
+      self.log.warn( 'Could not download InputSandbox LFN(s)' )
+      self.log.warn( failed )
+      self.__report( 'Running', 'Failed Downloading InputSandbox LFN(s)' )
+      return S_ERROR( str( failed ) )
 
     userFiles = sandboxFiles + [ os.path.basename( lfn ) for lfn in lfns ]
     for possibleTarFile in userFiles:
-      if not os.path.exists( possibleTarFile ) :
+      if not os.path.exists( possibleTarFile ) or possibleTarFile in unpackedFiles:
         continue
       try:
         if os.path.isfile( possibleTarFile ) and tarfile.is_tarfile( possibleTarFile ):
           self.log.info( 'Unpacking input sandbox file %s' % ( possibleTarFile ) )
-          tarFile = tarfile.open( possibleTarFile, 'r' )
-          for member in tarFile.getmembers():
-            tarFile.extract( member, os.getcwd() )
+          self.__unpackSandbox( possibleTarFile )
+          unpackedFiles.append( possibleTarFile )
       except Exception, x :
         return S_ERROR( 'Could not untar %s with exception %s' % ( possibleTarFile, str( x ) ) )
 
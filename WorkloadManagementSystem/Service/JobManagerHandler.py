@@ -18,7 +18,7 @@ from DIRAC import gLogger, S_OK, S_ERROR
 from DIRAC.WorkloadManagementSystem.DB.JobDB import JobDB
 from DIRAC.WorkloadManagementSystem.DB.JobLoggingDB import JobLoggingDB
 from DIRAC.WorkloadManagementSystem.DB.TaskQueueDB     import TaskQueueDB
-from DIRAC.Core.DISET.MessageClient import MessageClient
+from DIRAC.WorkloadManagementSystem.Client.JobOptimizationNotifier import gJobOptimizationNotifier
 from DIRAC.WorkloadManagementSystem.Service.JobPolicy import JobPolicy, \
                                                              RIGHT_SUBMIT, RIGHT_RESCHEDULE, \
                                                              RIGHT_DELETE, RIGHT_KILL, RIGHT_RESET
@@ -46,19 +46,10 @@ class JobManagerHandler( RequestHandler ):
 
   @classmethod
   def initializeHandler( cls, serviceInfoDict ):
-    cls.msgClient = MessageClient( "WorkloadManagement/OptimizationMind" )
-    cls.__connectToOptMind()
-    gThreadScheduler.addPeriodicTask( 60, cls.__connectToOptMind )
+    # Send the jobs that could not be announced to the OptimizationMind
+    gThreadScheduler.addPeriodicTask( 60, gJobOptimizationNotifier.flush )
     return S_OK()
 
-
-  @classmethod
-  def __connectToOptMind( cls ):
-    if not cls.msgClient.connected:
-      result = cls.msgClient.connect( JobManager = True )
-      if not result[ 'OK' ]:
-        cls.log.warn( "Cannot connect to OptimizationMind!", result[ 'Message' ] )
-
   def initialize( self ):
     credDict = self.getRemoteCredentials()
     self.ownerDN = credDict['DN']
@@ -73,19 +64,7 @@ class JobManagerHandler( RequestHandler ):
     return S_OK()
 
   def __sendJobsToOptimizationMind( self, jids ):
-    if not self.msgClient.connected:
-      return
-    result = self.msgClient.createMessage( "OptimizeJobs" )
-    if not result[ 'OK' ]:
-      self.log.error( "Cannot create Optimize message: %s" % result[ 'Message' ] )
-      return
-    msgObj = result[ 'Value' ]
-    msgObj.jids = list( sorted( jids ) )
-    result = self.msgClient.sendMessage( msgObj )
-    if not result[ 'OK' ]:
-      self.log.error( "Cannot send Optimize message: %s" % result[ 'Message' ] )
-      return
-    self.log.info( "Optimize msg sent for %s jobs" % len( jids ) )
+    gJobOptimizationNotifier.optimizeJobs( jids )
 
   ###########################################################################
   types_submitJob = [ StringType ]
@@ -180,15 +159,23 @@ class JobManagerHandler( RequestHandler ):
 
     validJobList, invalidJobList, nonauthJobList, ownerJobList = self.jobPolicy.evaluateJobRights( jobList,
                                                                                                    RIGHT_RESCHEDULE )
+    rescheduledJobs = []
+    result = S_OK()
     for jobID in validJobList:
       gtaskQueueDB.deleteJob( jobID )
       #gJobDB.deleteJobFromQueue(jobID)
-      result = gJobDB.rescheduleJob( jobID )
+      result = gJobDB.rescheduleJob( jobID, notify = False )
       gLogger.debug( str( result ) )
       if not result['OK']:
-        return result
+        break
+      rescheduledJobs.append( result['JobID'] )
       gJobLoggingDB.addLoggingRecord( result['JobID'], result['Status'], result['MinorStatus'],
                                       application = 'Unknown', source = 'JobManager' )
+    # The rescheduled jobs are announced to the OptimizationMind at once
+    if rescheduledJobs:
+      self.__sendJobsToOptimizationMind( rescheduledJobs )
+    if not result['OK']:
+      return result
 
     if invalidJobList or nonauthJobList:
       result = S_ERROR( 'Some jobs failed reschedule' )
@@ -200,7 +187,6 @@ class JobManagerHandler( RequestHandler ):
 
     result = S_OK( validJobList )
     result[ 'requireProxyUpload' ] = len( ownerJobList ) > 0 and self.__checkIfProxyUploadIsRequired()
-    self.__sendJobsToOptimizationMind( validJobList )
     return result
 
   def __deleteJob( self, jobID ):
@@ -328,7 +314,7 @@ class JobManagerHandler( RequestHandler ):
     good_ids = []
     for jobID in validJobList:
       gtaskQueueDB.deleteJob( jobID )
-      result = gJobDB.resetJob( jobID )
+      result = gJobDB.resetJob( jobID, notify = False )
       if not result['OK']:
         self.log.warn( "Could not reset job %d: %s" % ( jobID, result[ 'Message' ] ) )
         bad_ids.append( jobID )
@@ -338,7 +324,9 @@ class JobManagerHandler( RequestHandler ):
         gJobLoggingDB.addLoggingRecord( jobID, result['Status'], result['MinorStatus'],
                                         application = 'Unknown', source = 'JobManager' )
 
-    self.__sendJobsToOptimizationMind( good_ids )
+    # The reset jobs are announced to the OptimizationMind at once
+    if good_ids:
+      self.__sendJobsToOptimizationMind( good_ids )
     if invalidJobList or nonauthJobList or bad_ids:
       result = S_ERROR( 'Some jobs failed resetting' )
       if invalidJobList:
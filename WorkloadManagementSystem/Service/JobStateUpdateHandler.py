@@ -17,13 +17,16 @@ from types import StringType, IntType, LongType, ListType, DictType
 # from types import *
 import time
 from DIRAC.Core.DISET.RequestHandler import RequestHandler
-from DIRAC import gLogger, S_OK, S_ERROR
+from DIRAC import gConfig, gLogger, S_OK, S_ERROR
 from DIRAC.WorkloadManagementSystem.DB.JobDB import JobDB
 from DIRAC.WorkloadManagementSystem.DB.JobLoggingDB import JobLoggingDB
+from DIRAC.WorkloadManagementSystem.private.JobStateUpdateBuffer import JobStateUpdateBuffer
 
 # This is a global instance of the JobDB class
 jobDB = False
 logDB = False
+# Coalescing buffer for the updates, if enabled
+updateBuffer = False
 
 JOB_FINAL_STATES = ['Done', 'Completed', 'Failed']
 
@@ -31,8 +34,14 @@ def initializeJobStateUpdateHandler( serviceInfo ):
 
   global jobDB
   global logDB
+  global updateBuffer
   jobDB = JobDB()
   logDB = JobLoggingDB()
+
+  serviceCS = serviceInfo[ 'serviceSectionPath' ]
+  if gConfig.getValue( "%s/CoalesceUpdates" % serviceCS, False ):
+    updateBuffer = JobStateUpdateBuffer( jobDB, logDB )
+    gLogger.info( "Job state updates are coalesced by the update buffer" )
   return S_OK()
 
 class JobStateUpdateHandler( RequestHandler ):
@@ -92,12 +101,19 @@ class JobStateUpdateHandler( RequestHandler ):
         Set optionally the status date and source component which sends the
         status information.
     """
+    if updateBuffer:
+      updateBuffer.setJobsStatus( [ int( jobID ) for jobID in jobIDs ], status, minorStatus,
+                                  source = source, date = datetime )
+      return S_OK()
     for jobID in jobIDs:
       self.__setJobStatus( int( jobID ), status, minorStatus, source, datetime )
     return S_OK()
 
   def __setJobStatus( self, jobID, status, minorStatus, source, datetime ):
     """ update the job status. """
+    if updateBuffer:
+      return updateBuffer.setJobStatus( jobID, status, minorStatus, source = source, date = datetime )
+
     result = jobDB.setJobStatus( jobID, status, minorStatus )
     if not result['OK']:
       return result
@@ -204,6 +220,7 @@ class JobStateUpdateHandler( RequestHandler ):
       result = jobDB.setStartExecTime( jobID, startDate )
 
     # Update the JobLoggingDB records
+    records = []
     for date in dates:
       sDict = statusDict[date]
       status = sDict['Status']
@@ -219,9 +236,10 @@ class JobStateUpdateHandler( RequestHandler ):
         status = "Running"
         minor = "Application"
       source = sDict['Source']
-      result = logDB.addLoggingRecord( jobID, status, minor, application, date, source )
-      if not result['OK']:
-        return result
+      records.append( ( jobID, status, minor, application, date, source ) )
+    result = logDB.addLoggingRecords( records )
+    if not result['OK']:
+      return result
 
     return S_OK()
 
@@ -270,6 +288,9 @@ class JobStateUpdateHandler( RequestHandler ):
       new_status = status
     minorStatus = result['Value']['MinorStatus']
 
+    if updateBuffer:
+      return updateBuffer.setJobStatus( int( jobID ), new_status, application = appStatus, source = source )
+
     result = jobDB.setJobStatus( int( jobID ), new_status, application = appStatus )
     if not result['OK']:
       return result
@@ -284,6 +305,9 @@ class JobStateUpdateHandler( RequestHandler ):
         for job specified by its JobId
     """
 
+    if updateBuffer:
+      return updateBuffer.setJobParameters( int( jobID ), [ ( name, value ) ] )
+
     result = jobDB.setJobParameter( int( jobID ), name, value )
     return result
 
@@ -293,8 +317,10 @@ class JobStateUpdateHandler( RequestHandler ):
     """ Set arbitrary parameter specified by name/value pair
         for job specified by its JobId
     """
+    parametersDict = {}
     for jobID in jobsParameterDict:
-      jobDB.setJobParameter( jobID, str( jobsParameterDict[jobID][0] ), str( jobsParameterDict[jobID][1] ) )
+      parametersDict[jobID] = [ ( str( jobsParameterDict[jobID][0] ), str( jobsParameterDict[jobID][1] ) ) ]
+    jobDB.setJobsParameters( parametersDict )
     return S_OK()
 
   ###########################################################################
@@ -304,7 +330,10 @@ class JobStateUpdateHandler( RequestHandler ):
         for job specified by its JobId
     """
 
-    result = jobDB.setJobParameters( int( jobID ), parameters )
+    if updateBuffer:
+      result = updateBuffer.setJobParameters( int( jobID ), parameters )
+    else:
+      result = jobDB.setJobParameters( int( jobID ), parameters )
     if not result['OK']:
       return S_ERROR( 'Failed to store some of the parameters' )
 
@@ -316,7 +345,10 @@ class JobStateUpdateHandler( RequestHandler ):
     """ Send a heart beat sign of life for a job jobID
     """
 
-    result = jobDB.setHeartBeatData( int( jobID ), staticData, dynamicData )
+    if updateBuffer:
+      result = updateBuffer.setHeartBeatData( int( jobID ), staticData, dynamicData )
+    else:
+      result = jobDB.setHeartBeatData( int( jobID ), staticData, dynamicData )
     if not result['OK']:
       gLogger.warn( 'Failed to set the heart beat data for job %d ' % int( jobID ) )
 
@@ -10,7 +10,7 @@ It also provides an XMLRPC interface to the Matcher
 __RCSID__ = "$Id$"
 
 import time
-from   types import StringType, DictType, StringTypes
+from   types import StringType, DictType, StringTypes, IntType, LongType
 import threading
 
 from DIRAC.ConfigurationSystem.Client.Helpers          import Registry, Operations
@@ -372,6 +372,15 @@ class MatcherHandler( RequestHandler ):
     """ Main job selection function to find the highest priority job
         matching the resource capacity
     """
+    result = self.selectJobs( resourceDescription, 1 )
+    if not result[ 'OK' ]:
+      return result
+    return S_OK( result[ 'Value' ][0] )
+
+  def selectJobs( self, resourceDescription, numJobs ):
+    """ Find up to numJobs jobs matching the resource capacity. The resource is
+        checked once and the matched jobs are handled with bulk queries
+    """
 
     startTime = time.time()
     resourceDict = self.__processResourceDescription( resourceDescription )
@@ -455,7 +464,7 @@ class MatcherHandler( RequestHandler ):
     usableSites = result['Value']
 
     siteName = resourceDict['Site']
-    if siteName not in maskList:
+    if siteName not in usableSites:
       
       # if 'GridCE' not in resourceDict:
       #  return S_ERROR( 'Site not in mask and GridCE not specified' )
@@ -471,75 +480,93 @@ class MatcherHandler( RequestHandler ):
     for key in resourceDict:
       gLogger.verbose( "%s : %s" % ( key.rjust( 20 ), resourceDict[ key ] ) )
 
-    negativeCond = self.__limiter.getNegativeCondForSite( siteName )
-    result = gTaskQueueDB.matchAndGetJob( resourceDict, negativeCond = negativeCond )
+    checkMatchingDelay = self.__opsHelper.getValue( "JobScheduling/CheckMatchingDelay", True )
+    jobIDs = []
+    for _i in range( numJobs ):
+      # The limits have to be evaluated again after each match
+      negativeCond = self.__limiter.getNegativeCondForSite( siteName )
+      result = gTaskQueueDB.matchAndGetJob( resourceDict, negativeCond = negativeCond )
 
-    if DEBUG:
-      print result
+      if DEBUG:
+        print result
 
-    if not result['OK']:
-      return result
-    result = result['Value']
-    if not result['matchFound']:
+      if not result['OK']:
+        if not jobIDs:
+          return result
+        break
+      result = result['Value']
+      if not result['matchFound']:
+        break
+      jobID = result['jobId']
+      jobIDs.append( jobID )
+      if checkMatchingDelay:
+        self.__limiter.updateDelayCounters( siteName, jobID )
+
+    if not jobIDs:
       return S_ERROR( 'No match found' )
 
-    jobID = result['jobId']
-    resAtt = gJobDB.getJobAttributes( jobID, ['OwnerDN', 'OwnerGroup', 'Status'] )
+    resAtt = gJobDB.getAttributesForJobList( jobIDs, ['OwnerDN', 'OwnerGroup', 'Status'] )
     if not resAtt['OK']:
       return S_ERROR( 'Could not retrieve job attributes' )
-    if not resAtt['Value']:
-      return S_ERROR( 'No attributes returned for job' )
-    if not resAtt['Value']['Status'] == 'Waiting':
-      gLogger.error( 'Job matched by the TQ is not in Waiting state', str( jobID ) )
-      result = gTaskQueueDB.deleteJob( jobID )
-      if not result[ 'OK' ]:
-        return result
-      return S_ERROR( "Job %s is not in Waiting state" % str( jobID ) )
+    jobAttributes = resAtt['Value']
+    matchedJobs = []
+    for jobID in jobIDs:
+      if jobID not in jobAttributes:
+        gLogger.error( 'No attributes returned for job', str( jobID ) )
+        failure = S_ERROR( 'No attributes returned for job' )
+        continue
+      if not jobAttributes[jobID]['Status'] == 'Waiting':
+        gLogger.error( 'Job matched by the TQ is not in Waiting state', str( jobID ) )
+        failure = gTaskQueueDB.deleteJob( jobID )
+        if failure[ 'OK' ]:
+          failure = S_ERROR( "Job %s is not in Waiting state" % str( jobID ) )
+        continue
+      matchedJobs.append( jobID )
+    if not matchedJobs:
+      return failure
 
     attNames = ['Status','MinorStatus','ApplicationStatus','Site']
     attValues = ['Matched','Assigned','Unknown',siteName]
-    result = gJobDB.setJobAttributes( jobID, attNames, attValues )
-    # result = gJobDB.setJobStatus( jobID, status = 'Matched', minor = 'Assigned' )
-    result = gJobLoggingDB.addLoggingRecord( jobID,
-                                             status = 'Matched',
-                                             minor = 'Assigned',
-                                             source = 'Matcher' )
-
-    result = gJobDB.getJobJDL( jobID )
+    result = gJobDB.setJobsAttributes( matchedJobs, attNames, attValues )
+    result = gJobLoggingDB.addLoggingRecords( [ ( jobID, 'Matched', 'Assigned', 'idem', '', 'Matcher' )
+                                                for jobID in matchedJobs ] )
+
+    result = gJobDB.getJobJDLs( matchedJobs )
     if not result['OK']:
       return S_ERROR( 'Failed to get the job JDL' )
-
-    resultDict = {}
-    resultDict['JDL'] = result['Value']
-    resultDict['JobID'] = jobID
+    jobJDLs = result['Value']
 
     matchTime = time.time() - startTime
-    gLogger.info( "Match time: [%s]" % str( matchTime ) )
+    gLogger.info( "Match time for %s jobs: [%s]" % ( len( matchedJobs ), str( matchTime ) ) )
     gMonitor.addMark( "matchTime", matchTime )
 
     # Get some extra stuff into the response returned
-    resOpt = gJobDB.getJobOptParameters( jobID )
+    optParameters = {}
+    resOpt = gJobDB.getJobsOptParameters( matchedJobs )
     if resOpt['OK']:
-      for key, value in resOpt['Value'].items():
+      optParameters = resOpt['Value']
+
+    resultList = []
+    for jobID in matchedJobs:
+      resultDict = {}
+      resultDict['JDL'] = jobJDLs.get( jobID, [] )
+      resultDict['JobID'] = jobID
+      for key, value in optParameters.get( jobID, {} ).items():
         resultDict[key] = value
-    resAtt = gJobDB.getJobAttributes( jobID, ['OwnerDN', 'OwnerGroup'] )
-    if not resAtt['OK']:
-      return S_ERROR( 'Could not retrieve job attributes' )
-    if not resAtt['Value']:
-      return S_ERROR( 'No attributes returned for job' )
 
-    if self.__opsHelper.getValue( "JobScheduling/CheckMatchingDelay", True ):
-      self.__limiter.updateDelayCounters( siteName, jobID )
+      # Report pilot-job association
+      if pilotReference:
+        result = gPilotAgentsDB.setJobForPilot( jobID, pilotReference, updateStatus=False )
+
+      resultDict['DN'] = jobAttributes[jobID]['OwnerDN']
+      resultDict['Group'] = jobAttributes[jobID]['OwnerGroup']
+      resultDict['PilotInfoReportedFlag'] = pilotInfoReported
+      resultList.append( resultDict )
 
-    # Report pilot-job association
     if pilotReference:
-      result = gPilotAgentsDB.setCurrentJobID( pilotReference, jobID )
-      result = gPilotAgentsDB.setJobForPilot( jobID, pilotReference, updateStatus=False )
+      result = gPilotAgentsDB.setCurrentJobID( pilotReference, matchedJobs[-1] )
 
-    resultDict['DN'] = resAtt['Value']['OwnerDN']
-    resultDict['Group'] = resAtt['Value']['OwnerGroup']
-    resultDict['PilotInfoReportedFlag'] = pilotInfoReported
-    return S_OK( resultDict )
+    return S_OK( resultList )
 
 ##############################################################################
   types_requestJob = [ [StringType, DictType] ]
@@ -554,6 +581,20 @@ class MatcherHandler( RequestHandler ):
       gMonitor.addMark( "matchesOK" )
     return result
 
+##############################################################################
+  types_requestJobs = [ [StringType, DictType], [IntType, LongType] ]
+  def export_requestJobs( self, resourceDescription, numJobs ):
+    """ Serve up to numJobs jobs to the request of an agent with several payload
+        slots. Returns a list with the requestJob information of each matched job
+    """
+    maxJobs = self.__opsHelper.getValue( "JobScheduling/MaxJobsPerRequest", 32 )
+    numJobs = max( 1, min( numJobs, maxJobs ) )
+    result = self.selectJobs( resourceDescription, numJobs )
+    gMonitor.addMark( "matchesDone" )
+    if result[ 'OK' ]:
+      gMonitor.addMark( "matchesOK", len( result[ 'Value' ] ) )
+    return result
+
 ##############################################################################
   types_getActiveTaskQueues = []
   def export_getActiveTaskQueues( self ):
@@ -1,6 +1,7 @@
 __RCSID__ = "$Id$"
 
 import types
+import threading
 from DIRAC import S_OK, S_ERROR
 from DIRAC.Core.Utilities import ThreadScheduler
 from DIRAC.Core.Security import Properties
@@ -8,35 +9,109 @@ from DIRAC.Core.Base.ExecutorMindHandler import ExecutorMindHandler
 from DIRAC.WorkloadManagementSystem.Client.JobState.JobState import JobState
 from DIRAC.WorkloadManagementSystem.Client.JobState.CachedJobState import CachedJobState
 from DIRAC.WorkloadManagementSystem.Client.JobState.OptimizationTask import OptimizationTask
+from DIRAC.WorkloadManagementSystem.Client.JobOptimizationNotifier import gJobOptimizationNotifier
 
 class OptimizationMindHandler( ExecutorMindHandler ):
 
   __jobDB = False
   __optimizationStates = [ 'Received', 'Checking' ]
   __loadTaskId = False
+  __commitCond = threading.Condition()
+  __commitQueue = []
+  __committing = False
 
   MSG_DEFINITIONS = { 'OptimizeJobs' : { 'jids' : ( types.ListType, types.TupleType ) } }
 
   auth_msg_OptimizeJobs = [ 'all' ]
   def msg_OptimizeJobs( self, msgObj ):
-    jids = msgObj.jids
-    for jid in jids:
+    jids = []
+    for jid in msgObj.jids:
       try:
-        jid = int( jid )
+        jids.append( int( jid ) )
       except ValueError:
         self.log.error( "Job ID %s has to be an integer" % jid )
+    #Forget and add tasks to ensure state is reset
+    self.__optimizeJobs( jids, forget = True )
+    return S_OK()
 
-      #Forget and add task to ensure state is reset
-      self.forgetTask( jid )
-      result = self.executeTask( jid, OptimizationTask( jid ) )
+  @classmethod
+  def __optimizeJobs( cls, jids, forget = False ):
+    """ Add the jobs to the optimization. Their states are loaded in batches of
+        LoadBatchSize jobs, with a few bulk queries for each batch
+    """
+    batchSize = max( 1, cls.srv_getCSOption( "LoadBatchSize", 100 ) )
+    added = 0
+    for iB in range( 0, len( jids ), batchSize ):
+      batchJids = jids[ iB : iB + batchSize ]
+      result = CachedJobState.loadMany( batchJids )
       if not result[ 'OK' ]:
-        self.log.error( "Could not add job %s to optimization: %s" % ( jid, result[ 'Value' ] ) )
-      else:
-        self.log.info( "Received new job %s" % jid )
-    return S_OK()
+        cls.log.error( "Could not load the state of jobs", "%s: %s" % ( batchJids, result[ 'Message' ] ) )
+        continue
+      jobStates = result[ 'Value' ]
+      for jid in batchJids:
+        if forget:
+          cls.forgetTask( jid )
+        result = cls.executeTask( jid, OptimizationTask( jobStates[ jid ] ) )
+        if not result[ 'OK' ]:
+          cls.log.error( "Could not add job %s to optimization: %s" % ( jid, result[ 'Message' ] ) )
+        else:
+          cls.log.info( "Received new job %s" % jid )
+          added += 1
+    return added
+
+  @classmethod
+  def __commitChanges( cls, cjs ):
+    """ Group commit of the job states: while the changes of a batch of tasks are
+        being written, the tasks processed by other threads are queued and their
+        changes are written together in the next batch
+    """
+    entry = { 'cjs' : cjs }
+    cls.__commitCond.acquire()
+    try:
+      cls.__commitQueue.append( entry )
+      while 'result' not in entry:
+        if cls.__committing:
+          cls.__commitCond.wait()
+          continue
+        batch = cls.__commitQueue
+        cls.__commitQueue = []
+        cls.__committing = True
+        cls.__commitCond.release()
+        try:
+          try:
+            result = CachedJobState.commitMany( [ batchEntry[ 'cjs' ] for batchEntry in batch ] )
+          except Exception, excp:
+            cls.log.exception( "Exception while committing job states" )
+            result = S_ERROR( "Exception while committing job states: %s" % str( excp ) )
+        finally:
+          cls.__commitCond.acquire()
+        for batchEntry in batch:
+          if result[ 'OK' ]:
+            batchEntry[ 'result' ] = result[ 'Value' ].get( batchEntry[ 'cjs' ].jid,
+                                                            S_ERROR( "Job state was not committed" ) )
+          else:
+            batchEntry[ 'result' ] = result
+        if len( batch ) > 1:
+          cls.log.verbose( "Committed the states of %s jobs at once" % len( batch ) )
+        cls.__committing = False
+        cls.__commitCond.notifyAll()
+    finally:
+      cls.__commitCond.release()
+    return entry[ 'result' ]
+
+  @classmethod
+  def __admitJobs( cls, jids ):
+    """ Jobs rescheduled by the JobDB of this process, which can be tasks of the
+        mind being processed, so only the unknown ones are added
+    """
+    knownJids = set( cls.getTaskIds() )
+    cls.__optimizeJobs( [ long( jid ) for jid in jids if long( jid ) not in knownJids ] )
 
   @classmethod
   def __loadJobs( cls, eTypes = None ):
+    """ Safety net for the jobs that were not announced with an OptimizeJobs
+        message: add the jobs waiting for optimization that the mind does not know
+    """
     log = cls.log
     if cls.__loadTaskId:
       period = cls.srv_getCSOption( "LoadJobPeriod", 300 )
@@ -68,14 +143,10 @@ class OptimizationMindHandler( ExecutorMindHandler ):
       if not result[ 'OK' ]:
         return result
       jidList = result[ 'Value' ]
-      knownJids = cls.getTaskIds()
-      added = 0
-      for jid in jidList:
-        jid = long( jid )
-        if jid not in knownJids:
-          #Same as before. Check that the state is ok.
-          cls.executeTask( jid, OptimizationTask( jid ) )
-          added += 1
+      # Only the delta goes to the dispatcher
+      knownJids = set( cls.getTaskIds() )
+      newJids = [ long( jid ) for jid in jidList if long( jid ) not in knownJids ]
+      added = cls.__optimizeJobs( newJids )
       log.info( "Added %s/%s jobs for %s state" % ( added, len( jidList ), opState ) )
     return S_OK()
 
@@ -92,7 +163,10 @@ class OptimizationMindHandler( ExecutorMindHandler ):
     cls.setAllowedClients( "JobManager" )
     JobState.checkDBAccess()
     JobState.cleanTaskQueues()
-    period = cls.srv_getCSOption( "LoadJobPeriod", 60 )
+    # The jobs rescheduled in this process do not need a message
+    gJobOptimizationNotifier.setLocalReceiver( cls.__admitJobs )
+    # New and rescheduled jobs are announced, the periodic load is only a safety net
+    period = cls.srv_getCSOption( "LoadJobPeriod", 300 )
     result = ThreadScheduler.gThreadScheduler.addPeriodicTask( period, cls.__loadJobs )
     if not result[ 'OK' ]:
       return result
@@ -116,9 +190,7 @@ class OptimizationMindHandler( ExecutorMindHandler ):
       if not result[ 'OK' ]:
         cls.__failJob( jid, "Error while splitting", result[ 'Message' ] )
         return S_ERROR( "Fail splitting" )
-      for jid in result[ 'Value' ]:
-        cls.forgetTask( jid )
-        cls.executeTask( jid, OptimizationTask( jid ) )
+      cls.__optimizeJobs( result[ 'Value' ], forget = True )
     except Exception, excp:
       cls.log.exception( "While splitting" )
       cls.__failJob( jid, "Error while splitting", str( excp ) )
@@ -128,7 +200,7 @@ class OptimizationMindHandler( ExecutorMindHandler ):
   def exec_taskProcessed( cls, jid, taskObj, eType ):
     cjs = taskObj.jobState
     cls.log.info( "Saving changes for job %s after %s" % ( jid, eType ) )
-    result = cjs.commitChanges()
+    result = cls.__commitChanges( cjs )
     if not result[ 'OK' ]:
       cls.log.error( "Could not save changes for job", "%s: %s" % ( jid, result[ 'Message' ] ) )
       return result
@@ -150,7 +222,7 @@ class OptimizationMindHandler( ExecutorMindHandler ):
   def exec_taskFreeze( cls, jid, taskObj, eType ):
     jobState = taskObj.jobState
     cls.log.info( "Saving changes for job %s before freezing from %s" % ( jid, eType ) )
-    result = jobState.commitChanges()
+    result = cls.__commitChanges( jobState )
     if not result[ 'OK' ]:
       cls.log.error( "Could not save changes for job", "%s: %s" % ( jid, result[ 'Message' ] ) )
     return result
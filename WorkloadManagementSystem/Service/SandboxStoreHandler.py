@@ -15,6 +15,7 @@ import tempfile
 from DIRAC import gLogger, S_OK, S_ERROR  # , gConfig
 from DIRAC.Core.DISET.RequestHandler import RequestHandler
 from DIRAC.WorkloadManagementSystem.DB.SandboxMetadataDB import SandboxMetadataDB
+from DIRAC.WorkloadManagementSystem.private.SandboxContentStore import SandboxContentStore
 from DIRAC.DataManagementSystem.Client.DataManager  import DataManager
 from DIRAC.RequestManagementSystem.Client.ReqClient import ReqClient
 from DIRAC.RequestManagementSystem.Client.Request import Request
@@ -50,6 +51,7 @@ class SandboxStoreHandler( RequestHandler ):
       self.__useLocalStorage = False
       self.__externalSEName = self.__backend
       self.__seNameToUse = self.__backend
+    self.__contentStore = SandboxContentStore( self.getCSOption( "BasePath", "/opt/dirac/storage/sandboxes" ) )
     # Execute the purge once every 100 calls
     SandboxStoreHandler.__purgeCount += 1
     if SandboxStoreHandler.__purgeCount > self.getCSOption( "QueriesBeforePurge", 1000 ):
@@ -117,12 +119,8 @@ class SandboxStoreHandler( RequestHandler ):
         return result
       return S_OK( sbURL )
 
-    if self.__useLocalStorage:
-      hdPath = self.__sbToHDPath( sbPath )
-    else:
-      hdPath = False
-    # Write to local file
-    result = self.__networkToFile( fileHelper, hdPath )
+    # Write to a temporal file, the hash is computed while receiving
+    result = self.__networkToFile( fileHelper )
     if not result[ 'OK' ]:
       gLogger.error( "Error while receiving sandbox file", "%s" % result['Message'] )
       return result
@@ -133,8 +131,17 @@ class SandboxStoreHandler( RequestHandler ):
       self.__secureUnlinkFile( hdPath )
       gLogger.error( "Hashes don't match! Client defined hash is different with received data hash!" )
       return S_ERROR( "Hashes don't match!" )
-    # If using remote storage, copy there!
-    if not self.__useLocalStorage:
+    if self.__useLocalStorage:
+      # Stored once for all the owners uploading the same sandbox
+      result = self.__contentStore.addFile( hdPath, self.__sbToHDPath( sbPath ) )
+      if not result[ 'OK' ]:
+        self.__secureUnlinkFile( hdPath )
+        return result
+      if result[ 'Value' ]:
+        gLogger.info( "Sandbox content already stored", sbPath )
+      hdPath = self.__sbToHDPath( sbPath )
+    else:
+      # If using remote storage, copy there!
       gLogger.info( "Uploading sandbox to external storage" )
       result = self.__copyToExternalSE( hdPath, sbPath )
       self.__secureUnlinkFile( hdPath )
@@ -146,7 +153,8 @@ class SandboxStoreHandler( RequestHandler ):
     result = sandboxDB.registerAndGetSandbox( credDict[ 'username' ], credDict[ 'DN' ], credDict[ 'group' ],
                                               self.__seNameToUse, sbPath, fileHelper.getTransferedBytes() )
     if not result[ 'OK' ]:
-      self.__secureUnlinkFile( hdPath )
+      if self.__useLocalStorage:
+        self.__contentStore.removeFile( hdPath )
       return result
 
     sbURL = "SB:%s|%s" % ( self.__seNameToUse, sbPath )
@@ -163,7 +171,7 @@ class SandboxStoreHandler( RequestHandler ):
     result = self.__networkToFile( fileHelper )
     if not result[ 'OK' ]:
       return result
-    tmpFilePath = result[ 'OK' ]
+    tmpFilePath = result[ 'Value' ]
     gLogger.info( "Got Sandbox to local storage", tmpFilePath )
 
     extension = fileId[ fileId.find( ".tar" ) + 1: ]
@@ -227,31 +235,29 @@ class SandboxStoreHandler( RequestHandler ):
     basePath = self.getCSOption( "BasePath", "/opt/dirac/storage/sandboxes" )
     return os.path.join( basePath, sbPath )
 
-  def __networkToFile( self, fileHelper, destFileName = False ):
+  def __networkToFile( self, fileHelper ):
     """
-    Dump incoming network data to temporal file
+    Dump incoming network data to temporal file, in the local storage if it's
+    used so the file can be moved to its final path
     """
-    tfd = False
-    if not destFileName:
+    if self.__useLocalStorage:
+      result = self.__contentStore.getTempFile()
+      if not result[ 'OK' ]:
+        return result
+      tfd, destFileName = result[ 'Value' ]
+    else:
       try:
         tfd, destFileName = tempfile.mkstemp( prefix = "DSB." )
       except Exception, e:
         return S_ERROR( "Cannot create temporal file: %s" % str( e ) )
-    destFileName = os.path.realpath( destFileName )
-    try:
-      os.makedirs( os.path.dirname( destFileName ) )
-    except:
-      pass
+    fd = os.fdopen( tfd, "wb" )
     try:
-      fd = open( destFileName, "wb" )
-    except Exception, e:
-      return S_ERROR( "Cannot open to write destination file %s" % destFileName )
-    result = fileHelper.networkToDataSink( fd, maxFileSize = self.__maxUploadBytes )
+      result = fileHelper.networkToDataSink( fd, maxFileSize = self.__maxUploadBytes )
+    finally:
+      fd.close()
     if not result[ 'OK' ]:
+      self.__secureUnlinkFile( destFileName )
       return result
-    if tfd:
-      os.close( tfd )
-    fd.close()
     return S_OK( destFileName )
 
   def __secureUnlinkFile( self, filePath ):
@@ -264,23 +270,13 @@ class SandboxStoreHandler( RequestHandler ):
 
   def __moveToFinalLocation( self, localFilePath, sbPath ):
     if self.__useLocalStorage:
-      hdFilePath = self.__sbToHDPath( sbPath )
+      result = self.__contentStore.addFile( localFilePath, self.__sbToHDPath( sbPath ) )
+      if not result[ 'OK' ]:
+        gLogger.error( "Cannot move temporal file to final path", result[ 'Message' ] )
+        return result
+      if result[ 'Value' ]:
+        gLogger.info( "There was already a sandbox with that content, skipping copy", sbPath )
       result = S_OK( ( self.__localSEName, sbPath ) )
-      if os.path.isfile( hdFilePath ):
-        gLogger.info( "There was already a sandbox with that name, skipping copy", sbPath )
-      else:
-        hdDirPath = os.path.dirname( hdFilePath )
-        if not os.path.isdir( hdDirPath ):
-          try:
-            os.makedirs( hdDirPath )
-          except:
-            pass
-        try:
-          os.rename( localFilePath, hdFilePath )
-        except Exception, e:
-          errMsg = "Cannot move temporal file to final path"
-          gLogger.error( errMsg, str( e ) )
-          result = S_ERROR( "%s: %s" % ( errMsg, str( e ) ) )
     else:
       result = self.__copyToExternalSE( localFilePath, sbPath )
 
@@ -410,36 +406,31 @@ class SandboxStoreHandler( RequestHandler ):
     gLogger.info( "Got %s sandboxes to purge" % len( sbList ) )
     deletedFromSE = []
     for sbId, SEName, SEPFN in sbList:
-      self.__purgeSandbox( sbId, SEName, SEPFN )
+      result = self.__deleteSandboxFromBackend( SEName, SEPFN )
+      if not result[ 'OK' ]:
+        gLogger.error( "Cannot delete sandbox from backend", result[ 'Message' ] )
+        continue
+      deletedFromSE.append( sbId )
+    # The DB records are deleted in bulk
+    batchSize = self.getCSOption( "PurgeBatchSize", 1000 )
+    for i in range( 0, len( deletedFromSE ), batchSize ):
+      result = sandboxDB.deleteSandboxes( deletedFromSE[ i : i + batchSize ] )
+      if not result[ 'OK' ]:
+        gLogger.error( "Cannot delete sandboxes from DB", result[ 'Message' ] )
 
     SandboxStoreHandler.__purgeWorking = False
     return S_OK()
 
-  def __purgeSandbox( self, sbId, SEName, SEPFN ):
-    result = self.__deleteSandboxFromBackend( SEName, SEPFN )
-    if not result[ 'OK' ]:
-      gLogger.error( "Cannot delete sandbox from backend", result[ 'Message' ] )
-      return
-    result = sandboxDB.deleteSandboxes( [ sbId ] )
-    if not result[ 'OK' ]:
-      gLogger.error( "Cannot delete sandbox from DB", result[ 'Message' ] )
-
   def __deleteSandboxFromBackend( self, SEName, SEPFN ):
     gLogger.info( "Purging sandbox" "SB:%s|%s" % ( SEName, SEPFN ) )
     if SEName != self.__localSEName:
       return self.__deleteSandboxFromExternalBackend( SEName, SEPFN )
     else:
       hdPath = self.__sbToHDPath( SEPFN )
-      try:
-        if not os.path.isfile( hdPath ):
-          return S_OK()
-      except Exception, e:
-        gLogger.error( "Cannot perform isfile", "%s : %s" % ( hdPath, str( e ) ) )
-        return S_ERROR( "Error checking %s" % hdPath )
-      try:
-        os.unlink( hdPath )
-      except Exception, e:
-        gLogger.error( "Cannot delete local sandbox", "%s : %s" % ( hdPath, str( e ) ) )
+      # The stored content goes away with the last sandbox using it
+      result = self.__contentStore.removeFile( hdPath )
+      if not result[ 'OK' ]:
+        gLogger.error( "Cannot delete local sandbox", result[ 'Message' ] )
       while hdPath:
         hdPath = os.path.dirname( hdPath )
         gLogger.info( "Checking if dir %s is empty" % hdPath )
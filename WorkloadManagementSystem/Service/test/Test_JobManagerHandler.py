@@ -0,0 +1,82 @@
+""" Test cases for the announcement of the rescheduled and reset jobs by the JobManager
+"""
+
+import unittest
+
+from mock import MagicMock, patch
+
+from DIRAC import S_OK, S_ERROR
+import DIRAC.WorkloadManagementSystem.Service.JobManagerHandler as sut
+
+class FakeJobDB( object ):
+  """ Reschedules and resets the jobs, except the ones in failJobs
+  """
+
+  def __init__( self ):
+    self.failJobs = set()
+    self.notify = []
+
+  def rescheduleJob( self, jid, notify = True ):
+    self.notify.append( notify )
+    if jid in self.failJobs:
+      return S_ERROR( "Cannot reschedule" )
+    result = S_OK( jid )
+    result.update( { 'JobID' : jid, 'Status' : 'Received', 'MinorStatus' : 'Job Rescheduled' } )
+    return result
+
+  def resetJob( self, jid, notify = True ):
+    return self.rescheduleJob( jid, notify = notify )
+
+class RescheduleResetTestCase( unittest.TestCase ):
+  """ The jobs of one request are announced to the OptimizationMind in one notification
+  """
+
+  def setUp( self ):
+    self.jobDB = FakeJobDB()
+    self.notifier = MagicMock()
+    self.patches = [ patch.object( sut, "gJobDB", self.jobDB ),
+                     patch.object( sut, "gtaskQueueDB", MagicMock() ),
+                     patch.object( sut, "gJobLoggingDB", MagicMock() ),
+                     patch.object( sut, "gJobOptimizationNotifier", self.notifier ) ]
+    for patcher in self.patches:
+      patcher.start()
+    self.handler = sut.JobManagerHandler.__new__( sut.JobManagerHandler )
+    self.handler.log = MagicMock()
+    self.handler.jobPolicy = MagicMock()
+    self.handler.jobPolicy.evaluateJobRights.side_effect = lambda jobList, right: ( jobList, [], [], [] )
+
+  def tearDown( self ):
+    for patcher in self.patches:
+      patcher.stop()
+
+  def test_reschedule( self ):
+    result = self.handler.export_rescheduleJob( [ 1, 2, 3 ] )
+    self.assertTrue( result[ 'OK' ] )
+    self.assertEqual( self.jobDB.notify, [ False ] * 3 )
+    self.notifier.optimizeJobs.assert_called_once_with( [ 1, 2, 3 ] )
+
+  def test_rescheduleFailed( self ):
+    """ The jobs rescheduled before the failure are announced
+    """
+    self.jobDB.failJobs = set( [ 2 ] )
+    result = self.handler.export_rescheduleJob( [ 1, 2, 3 ] )
+    self.assertFalse( result[ 'OK' ] )
+    self.notifier.optimizeJobs.assert_called_once_with( [ 1 ] )
+
+  def test_reset( self ):
+    self.jobDB.failJobs = set( [ 2 ] )
+    result = self.handler.export_resetJob( [ 1, 2, 3 ] )
+    self.assertFalse( result[ 'OK' ] )
+    self.assertEqual( result[ 'FailedJobIDs' ], [ 2 ] )
+    self.assertEqual( self.jobDB.notify, [ False ] * 3 )
+    self.notifier.optimizeJobs.assert_called_once_with( [ 1, 3 ] )
+
+  def test_resetNone( self ):
+    self.jobDB.failJobs = set( [ 1 ] )
+    self.handler.export_resetJob( [ 1 ] )
+    self.assertFalse( self.notifier.optimizeJobs.called )
+
+if __name__ == '__main__':
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( RescheduleResetTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( gSuite )
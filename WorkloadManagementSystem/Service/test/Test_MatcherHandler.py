@@ -0,0 +1,176 @@
+""" Test cases for the matching of several jobs in one Matcher request
+"""
+
+import unittest
+
+from mock import MagicMock, patch
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.Core.Security import Properties
+import DIRAC.WorkloadManagementSystem.Service.MatcherHandler as sut
+
+SITE = 'LCG.CERN.ch'
+
+class FakeTaskQueueDB( object ):
+  """ Hands out the jobs in its queue, one per match
+  """
+
+  def __init__( self, jobs ):
+    self.jobs = list( jobs )
+    self.matches = 0
+    self.deleted = []
+
+  def getSingleValueTQDefFields( self ):
+    return ( 'Site', 'CPUTime', 'Setup' )
+
+  def getMultiValueMatchFields( self ):
+    return ( 'GridCE', 'SubmitPool' )
+
+  def matchAndGetJob( self, resourceDict, negativeCond = None ):
+    self.matches += 1
+    if not self.jobs:
+      return S_OK( { 'matchFound' : False } )
+    return S_OK( { 'matchFound' : True, 'jobId' : self.jobs.pop( 0 ) } )
+
+  def deleteJob( self, jobID ):
+    self.deleted.append( jobID )
+    return S_OK()
+
+class FakeJobDB( object ):
+  """ Waiting jobs with a JDL, the ones in notWaiting are already matched
+  """
+
+  def __init__( self ):
+    self.notWaiting = set()
+    self.attributesSet = []
+
+  def getAttributesForJobList( self, jobIDs, attrList ):
+    attributes = {}
+    for jobID in jobIDs:
+      status = 'Waiting'
+      if jobID in self.notWaiting:
+        status = 'Matched'
+      attributes[ jobID ] = { 'OwnerDN' : '/DN/owner%s' % jobID, 'OwnerGroup' : 'group', 'Status' : status }
+    return S_OK( attributes )
+
+  def setJobsAttributes( self, jobIDs, attrNames, attrValues ):
+    self.attributesSet.append( ( list( jobIDs ), dict( zip( attrNames, attrValues ) ) ) )
+    return S_OK()
+
+  def getJobJDLs( self, jobIDs ):
+    return S_OK( dict( [ ( jobID, "[ JobID = %s; ]" % jobID ) for jobID in jobIDs ] ) )
+
+  def getJobsOptParameters( self, jobIDs ):
+    return S_OK( dict( [ ( jobID, { 'CPUTime' : str( jobID * 100 ) } ) for jobID in jobIDs ] ) )
+
+class SelectJobsTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.options = { "Pilot/CheckVersion" : False }
+    self.taskQueueDB = FakeTaskQueueDB( [ 11, 12 ] )
+    self.jobDB = FakeJobDB()
+    self.jobLoggingDB = MagicMock()
+    self.jobLoggingDB.addLoggingRecords.return_value = S_OK()
+    self.pilotAgentsDB = MagicMock()
+    self.patches = [ patch.object( sut, "gTaskQueueDB", self.taskQueueDB ),
+                     patch.object( sut, "gJobDB", self.jobDB ),
+                     patch.object( sut, "gJobLoggingDB", self.jobLoggingDB ),
+                     patch.object( sut, "gPilotAgentsDB", self.pilotAgentsDB ),
+                     patch.object( sut, "gMonitor", MagicMock() ),
+                     patch.object( sut, "Registry", MagicMock() ) ]
+    for patcher in self.patches:
+      patcher.start()
+    sut.Registry.getGroupsForVO.return_value = S_OK( [ 'group' ] )
+
+    self.handler = sut.MatcherHandler.__new__( sut.MatcherHandler )
+    opsHelper = MagicMock()
+    opsHelper.getValue.side_effect = lambda option, default = None: self.options.get( option, default )
+    self.limiter = MagicMock()
+    self.limiter.getNegativeCondForSite.return_value = {}
+    siteStatus = MagicMock()
+    siteStatus.getUsableSites.return_value = S_OK( [ SITE ] )
+    self.handler._MatcherHandler__opsHelper = opsHelper
+    self.handler._MatcherHandler__limiter = self.limiter
+    self.handler._MatcherHandler__siteStatus = siteStatus
+    self.handler.getRemoteCredentials = MagicMock( return_value = { 'properties' : [ Properties.GENERIC_PILOT ],
+                                                                    'group' : 'pilot', 'DN' : '/DN/pilot' } )
+    self.handler.serviceInfoDict = { 'clientSetup' : 'Test' }
+    self.resourceDict = { 'Site' : SITE, 'CPUTime' : 100000, 'PilotReference' : 'pilot://1' }
+
+  def tearDown( self ):
+    for patcher in self.patches:
+      patcher.stop()
+
+  def test_partialMatch( self ):
+    """ Fewer jobs than requested are matched, they are handled together
+    """
+    result = self.handler.export_requestJobs( self.resourceDict, 5 )
+    self.assertTrue( result[ 'OK' ] )
+    jobs = result[ 'Value' ]
+    self.assertEqual( [ job[ 'JobID' ] for job in jobs ], [ 11, 12 ] )
+    self.assertEqual( jobs[1][ 'JDL' ], "[ JobID = 12; ]" )
+    self.assertEqual( jobs[1][ 'CPUTime' ], "1200" )
+    self.assertEqual( jobs[1][ 'DN' ], "/DN/owner12" )
+    self.assertEqual( jobs[1][ 'Group' ], "group" )
+    # The TQs are matched until there is no match
+    self.assertEqual( self.taskQueueDB.matches, 3 )
+    # The limits are evaluated again and the delay counters updated after each match
+    self.assertEqual( self.limiter.getNegativeCondForSite.call_count, 3 )
+    self.assertEqual( [ call[0] for call in self.limiter.updateDelayCounters.call_args_list ],
+                      [ ( SITE, 11 ), ( SITE, 12 ) ] )
+    self.assertEqual( self.jobDB.attributesSet, [ ( [ 11, 12 ], { 'Status' : 'Matched', 'MinorStatus' : 'Assigned',
+                                                                  'ApplicationStatus' : 'Unknown', 'Site' : SITE } ) ] )
+    records = self.jobLoggingDB.addLoggingRecords.call_args[0][0]
+    self.assertEqual( [ record[0] for record in records ], [ 11, 12 ] )
+    self.assertEqual( self.jobLoggingDB.addLoggingRecords.call_count, 1 )
+    self.pilotAgentsDB.setCurrentJobID.assert_called_once_with( 'pilot://1', 12 )
+
+  def test_maxJobsPerRequest( self ):
+    self.taskQueueDB.jobs = range( 1, 10 )
+    self.options[ "JobScheduling/MaxJobsPerRequest" ] = 3
+    result = self.handler.export_requestJobs( self.resourceDict, 5 )
+    self.assertEqual( [ job[ 'JobID' ] for job in result[ 'Value' ] ], [ 1, 2, 3 ] )
+    result = self.handler.export_requestJobs( self.resourceDict, 0 )
+    self.assertEqual( [ job[ 'JobID' ] for job in result[ 'Value' ] ], [ 4 ] )
+
+  def test_notWaiting( self ):
+    """ The jobs that are not waiting any more are removed from the TQs and not served
+    """
+    self.taskQueueDB.jobs = [ 11, 12, 13 ]
+    self.jobDB.notWaiting = set( [ 12 ] )
+    result = self.handler.export_requestJobs( self.resourceDict, 3 )
+    self.assertEqual( [ job[ 'JobID' ] for job in result[ 'Value' ] ], [ 11, 13 ] )
+    self.assertEqual( self.taskQueueDB.deleted, [ 12 ] )
+    self.assertEqual( self.jobDB.attributesSet[0][0], [ 11, 13 ] )
+    self.jobDB.notWaiting = set( [ 14 ] )
+    self.taskQueueDB.jobs = [ 14 ]
+    self.assertFalse( self.handler.export_requestJobs( self.resourceDict, 3 )[ 'OK' ] )
+
+  def test_noMatch( self ):
+    self.taskQueueDB.jobs = []
+    result = self.handler.export_requestJobs( self.resourceDict, 3 )
+    self.assertFalse( result[ 'OK' ] )
+    self.assertEqual( result[ 'Message' ], 'No match found' )
+    self.assertFalse( self.jobLoggingDB.addLoggingRecords.called )
+
+  def test_matchError( self ):
+    """ A failed match ends the request, the jobs matched before are served
+    """
+    matchAndGetJob = self.taskQueueDB.matchAndGetJob
+    results = [ matchAndGetJob( {} ), S_ERROR( "TQ is gone" ) ]
+    self.taskQueueDB.matchAndGetJob = lambda resourceDict, negativeCond = None: results.pop( 0 )
+    result = self.handler.export_requestJobs( self.resourceDict, 3 )
+    self.assertEqual( [ job[ 'JobID' ] for job in result[ 'Value' ] ], [ 11 ] )
+    self.taskQueueDB.matchAndGetJob = lambda resourceDict, negativeCond = None: S_ERROR( "TQ is gone" )
+    self.assertEqual( self.handler.export_requestJobs( self.resourceDict, 3 )[ 'Message' ], "TQ is gone" )
+
+  def test_requestJob( self ):
+    result = self.handler.export_requestJob( self.resourceDict )
+    self.assertTrue( result[ 'OK' ] )
+    self.assertEqual( result[ 'Value' ][ 'JobID' ], 11 )
+    self.assertEqual( self.taskQueueDB.matches, 1 )
+
+if __name__ == '__main__':
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( SelectJobsTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( gSuite )
@@ -0,0 +1,171 @@
+""" Test cases for the group commit of the job states and for the loading of
+    the jobs in the OptimizationMind
+"""
+
+import time
+import threading
+import unittest
+
+from mock import MagicMock, patch
+
+from DIRAC import S_OK, S_ERROR, gLogger
+import DIRAC.WorkloadManagementSystem.Service.OptimizationMindHandler as sut
+
+class FakeJobState( object ):
+
+  def __init__( self, jid ):
+    self.jid = jid
+
+class FakeCachedJobState( object ):
+  """ Records the batches committed, the first commit can be held to build up a batch.
+      The jobs in failJobs get an error
+  """
+
+  def __init__( self ):
+    self.batches = []
+    self.hold = threading.Event()
+    self.hold.set()
+    self.failJobs = set()
+    self.result = None
+    self.raiseException = False
+
+  def commitMany( self, cjsList ):
+    self.hold.wait()
+    self.batches.append( sorted( [ cjs.jid for cjs in cjsList ] ) )
+    if self.raiseException:
+      raise RuntimeError( "DB is gone" )
+    if self.result:
+      return self.result
+    results = {}
+    for cjs in cjsList:
+      if cjs.jid in self.failJobs:
+        results[ cjs.jid ] = S_ERROR( "Initial state was different" )
+      else:
+        results[ cjs.jid ] = S_OK()
+    return S_OK( results )
+
+class CommitChangesTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.cachedJobState = FakeCachedJobState()
+    self.realCachedJobState = sut.CachedJobState
+    sut.CachedJobState = self.cachedJobState
+    sut.OptimizationMindHandler.log = gLogger
+    self.commitChanges = sut.OptimizationMindHandler._OptimizationMindHandler__commitChanges
+
+  def tearDown( self ):
+    self.cachedJobState.hold.set()
+    sut.CachedJobState = self.realCachedJobState
+
+  def commitInThreads( self, jids ):
+    results = {}
+    def commit( jid ):
+      results[ jid ] = self.commitChanges( FakeJobState( jid ) )
+    threads = [ threading.Thread( target = commit, args = ( jid, ) ) for jid in jids ]
+    for thread in threads:
+      thread.start()
+    return threads, results
+
+  def test_single( self ):
+    self.assertTrue( self.commitChanges( FakeJobState( 1 ) )[ 'OK' ] )
+    self.assertEqual( self.cachedJobState.batches, [ [ 1 ] ] )
+
+  def test_groupCommit( self ):
+    """ The states committed while a batch is written are written together, each
+        caller getting the result of its job
+    """
+    self.cachedJobState.failJobs = set( [ 3 ] )
+    self.cachedJobState.hold.clear()
+    firstThreads, firstResults = self.commitInThreads( [ 1 ] )
+    time.sleep( 0.1 )
+    threads, results = self.commitInThreads( range( 2, 6 ) )
+    time.sleep( 0.1 )
+    self.cachedJobState.hold.set()
+    for thread in firstThreads + threads:
+      thread.join()
+    self.assertEqual( self.cachedJobState.batches, [ [ 1 ], [ 2, 3, 4, 5 ] ] )
+    self.assertTrue( firstResults[ 1 ][ 'OK' ] )
+    self.assertFalse( results[ 3 ][ 'OK' ] )
+    for jid in ( 2, 4, 5 ):
+      self.assertTrue( results[ jid ][ 'OK' ] )
+
+  def test_failedBatch( self ):
+    self.cachedJobState.result = S_ERROR( "Cannot commit" )
+    self.cachedJobState.hold.clear()
+    firstThreads, _firstResults = self.commitInThreads( [ 1 ] )
+    time.sleep( 0.1 )
+    threads, results = self.commitInThreads( [ 2, 3 ] )
+    time.sleep( 0.1 )
+    self.cachedJobState.hold.set()
+    for thread in firstThreads + threads:
+      thread.join()
+    for jid in ( 2, 3 ):
+      self.assertFalse( results[ jid ][ 'OK' ] )
+      self.assertEqual( results[ jid ][ 'Message' ], "Cannot commit" )
+
+  def test_exception( self ):
+    self.cachedJobState.raiseException = True
+    result = self.commitChanges( FakeJobState( 1 ) )
+    self.assertFalse( result[ 'OK' ] )
+    self.assertTrue( 'DB is gone' in result[ 'Message' ] )
+    # The next batches are still committed
+    self.cachedJobState.raiseException = False
+    self.assertTrue( self.commitChanges( FakeJobState( 1 ) )[ 'OK' ] )
+
+class LoadJobsTestCase( unittest.TestCase ):
+  """ Only the jobs that the mind does not know are loaded and dispatched
+  """
+
+  def setUp( self ):
+    self.jobDB = MagicMock()
+    self.jobDB.selectJobs.return_value = S_OK( [ '1', '2', '3', '4' ] )
+    self.taskIds = [ 2L, 4L ]
+    self.executeTask = MagicMock( return_value = S_OK() )
+    self.loadMany = MagicMock( side_effect = lambda jids: S_OK( dict( [ ( jid, FakeJobState( jid ) ) for jid in jids ] ) ) )
+    handler = sut.OptimizationMindHandler
+    self.patches = [ patch.object( handler, "_OptimizationMindHandler__jobDB", self.jobDB, create = True ),
+                     patch.object( handler, "log", gLogger, create = True ),
+                     patch.object( handler, "getTaskIds", MagicMock( side_effect = lambda: list( self.taskIds ) ),
+                                   create = True ),
+                     patch.object( handler, "executeTask", self.executeTask, create = True ),
+                     patch.object( handler, "forgetTask", MagicMock(), create = True ),
+                     patch.object( handler, "getExecutorsConnected",
+                                   MagicMock( return_value = { "WorkloadManagement/JobPath" : 1,
+                                                               "WorkloadManagement/InputData" : 0 } ),
+                                   create = True ),
+                     patch.object( handler, "srv_getCSOption", MagicMock( side_effect = lambda option, default: default ),
+                                   create = True ),
+                     patch.object( sut.CachedJobState, "loadMany", self.loadMany ),
+                     patch.object( sut, "OptimizationTask", MagicMock() ) ]
+    for patcher in self.patches:
+      patcher.start()
+
+  def tearDown( self ):
+    for patcher in self.patches:
+      patcher.stop()
+
+  def dispatched( self ):
+    return [ call[0][0] for call in self.executeTask.call_args_list ]
+
+  def test_loadJobs( self ):
+    result = sut.OptimizationMindHandler._OptimizationMindHandler__loadJobs()
+    self.assertTrue( result[ 'OK' ] )
+    # JobPath is the only optimizer connected
+    self.jobDB.selectJobs.assert_called_once_with( { 'Status' : 'Received' }, limit = 10000 )
+    self.assertEqual( self.dispatched(), [ 1L, 3L ] )
+    self.loadMany.assert_called_once_with( [ 1L, 3L ] )
+
+  def test_nothingNew( self ):
+    self.taskIds = [ 1L, 2L, 3L, 4L ]
+    self.assertTrue( sut.OptimizationMindHandler._OptimizationMindHandler__loadJobs()[ 'OK' ] )
+    self.assertEqual( self.dispatched(), [] )
+
+  def test_admitJobs( self ):
+    sut.OptimizationMindHandler._OptimizationMindHandler__admitJobs( [ 3, 4, 5 ] )
+    self.assertEqual( self.dispatched(), [ 3L, 5L ] )
+
+if __name__ == '__main__':
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( CommitChangesTestCase )
+  gSuite.addTest( gTestLoader.loadTestsFromTestCase( LoadJobsTestCase ) )
+  unittest.TextTestRunner( verbosity = 2 ).run( gSuite )
@@ -0,0 +1,229 @@
+""" Coalescing buffer for the job state updates
+
+    The JobStateUpdate service receives a continuous flow of small status,
+    parameter and heart beat updates from the running jobs. With the buffer the
+    updates are merged per job and written with a few multi-row statements for
+    the whole batch. The batches are group commits: an update is written at once
+    if the writer is idle, and the updates received while a batch is being
+    written make up the next batch, so a batch grows with the load instead of
+    the updates being held back.
+
+    The updates of a job are applied in the order they were received: the last
+    value of an attribute or parameter wins and the logging records keep the
+    time at which they were received. The callers are blocked until the batch
+    holding their update has been written, so an OK reply still means that the
+    update is stored in the DB.
+"""
+
+__RCSID__ = "$Id$"
+
+import threading
+
+from DIRAC                                      import gLogger, S_OK, S_ERROR
+from DIRAC.Core.Utilities                       import Time
+from DIRAC.WorkloadManagementSystem.DB.JobDB    import JOB_FINAL_STATES
+
+class _Batch( object ):
+  """ Updates written together and the result for each job
+  """
+
+  def __init__( self ):
+    self.jobs = {}
+    self.loggingRecords = []
+    self.results = {}
+    self.done = threading.Event()
+
+  def getJob( self, jobID ):
+    if jobID not in self.jobs:
+      self.jobs[ jobID ] = { 'Attributes' : {},
+                             'Update' : False,
+                             'HeartBeat' : False,
+                             'StartExecTime' : False,
+                             'EndExecTime' : False,
+                             'CheckExists' : False,
+                             'Parameters' : {},
+                             'HeartBeatData' : [] }
+    return self.jobs[ jobID ]
+
+  def setResult( self, jobIDs, result ):
+    """ Keep the first error of each job
+    """
+    if result[ 'OK' ]:
+      return
+    for jobID in jobIDs:
+      if jobID not in self.results:
+        self.results[ jobID ] = result
+
+class JobStateUpdateBuffer( object ):
+
+  def __init__( self, jobDB, logDB, ackTimeout = 60 ):
+    """
+    :param ackTimeout: seconds a caller waits for its update to be written
+    """
+    self.__jobDB = jobDB
+    self.__logDB = logDB
+    self.__ackTimeout = ackTimeout
+    self.log = gLogger.getSubLogger( "JobStateUpdateBuffer" )
+    self.__cond = threading.Condition()
+    self.__batch = _Batch()
+    self.__flushThread = threading.Thread( target = self.__flushLoop )
+    self.__flushThread.setDaemon( True )
+    self.__flushThread.start()
+
+  def setJobStatus( self, jobID, status = '', minor = '', application = '', source = 'Unknown', date = None ):
+    """ Buffered equivalent of JobDB.setJobStatus followed by JobLoggingDB.addLoggingRecord.
+        The exec time stamps are set as the JobStateUpdate service does
+    """
+    return self.setJobsStatus( [ jobID ], status, minor, application, source, date )
+
+  def setJobsStatus( self, jobIDs, status = '', minor = '', application = '', source = 'Unknown', date = None ):
+    """ Set the same status for several jobs, waiting only once for the batch to be written.
+        Returns the first error found for the jobs
+    """
+    if not jobIDs:
+      return S_OK()
+    if not date:
+      date = Time.dateTime()
+    self.__cond.acquire()
+    try:
+      batch = self.__batch
+      for jobID in jobIDs:
+        jobDict = batch.getJob( jobID )
+        if status:
+          jobDict[ 'Attributes' ][ 'Status' ] = status
+          if status in JOB_FINAL_STATES:
+            jobDict[ 'EndExecTime' ] = True
+          if status == 'Running' and minor == 'Application':
+            jobDict[ 'StartExecTime' ] = True
+          # Do not update the LastUpdate time stamp if setting the Stalled status
+          if status != 'Stalled':
+            jobDict[ 'Update' ] = True
+        else:
+          jobDict[ 'Update' ] = True
+        if minor:
+          jobDict[ 'Attributes' ][ 'MinorStatus' ] = minor
+        if application:
+          jobDict[ 'Attributes' ][ 'ApplicationStatus' ] = application
+        jobDict[ 'CheckExists' ] = True
+        batch.loggingRecords.append( ( jobID, status or 'idem', minor or 'idem', application or 'idem',
+                                       date, source ) )
+      self.__cond.notify()
+    finally:
+      self.__cond.release()
+    return self.__waitForBatch( batch, jobIDs )
+
+  def setJobParameters( self, jobID, parameters ):
+    """ Buffered equivalent of JobDB.setJobParameters
+    """
+    self.__cond.acquire()
+    try:
+      batch = self.__batch
+      jobDict = batch.getJob( jobID )
+      for name, value in parameters:
+        jobDict[ 'Parameters' ][ name ] = value
+      self.__cond.notify()
+    finally:
+      self.__cond.release()
+    return self.__waitForBatch( batch, [ jobID ] )
+
+  def setHeartBeatData( self, jobID, staticDataDict, dynamicDataDict ):
+    """ Buffered equivalent of JobDB.setHeartBeatData
+    """
+    self.__cond.acquire()
+    try:
+      batch = self.__batch
+      jobDict = batch.getJob( jobID )
+      jobDict[ 'HeartBeat' ] = True
+      jobDict[ 'Attributes' ][ 'Status' ] = 'Running'
+      for name, value in staticDataDict.items():
+        jobDict[ 'Parameters' ][ name ] = value
+      jobDict[ 'HeartBeatData' ].extend( dynamicDataDict.items() )
+      self.__cond.notify()
+    finally:
+      self.__cond.release()
+    return self.__waitForBatch( batch, [ jobID ] )
+
+  def __waitForBatch( self, batch, jobIDs ):
+    batch.done.wait( self.__ackTimeout )
+    if not batch.done.isSet():
+      return S_ERROR( "Timeout while waiting for the job updates to be stored" )
+    for jobID in jobIDs:
+      if jobID in batch.results:
+        return batch.results[ jobID ]
+    return S_OK()
+
+  def __flushLoop( self ):
+    while True:
+      self.__cond.acquire()
+      try:
+        # Woken up by the first update, or right after the previous batch if
+        # updates arrived while it was being written
+        while not self.__batch.jobs:
+          self.__cond.wait()
+        batch = self.__batch
+        self.__batch = _Batch()
+      finally:
+        self.__cond.release()
+      try:
+        if batch.jobs:
+          self.__flush( batch )
+      except Exception, excp:
+        batch.setResult( batch.jobs.keys(), S_ERROR( "Exception while storing the updates: %s" % excp ) )
+        self.log.exception( "Exception while storing the job state updates" )
+      # The callers are released whatever happened
+      batch.done.set()
+
+  def __flush( self, batch ):
+    """ Write the updates of a batch
+    """
+    jobs = batch.jobs
+    self.log.verbose( "Storing the updates of %s jobs" % len( jobs ) )
+
+    # Jobs setting the same attribute values are updated with a single statement
+    groups = {}
+    for jobID in jobs:
+      jobDict = jobs[ jobID ]
+      if jobDict[ 'Attributes' ] or jobDict[ 'Update' ] or jobDict[ 'HeartBeat' ]:
+        groupKey = ( tuple( sorted( jobDict[ 'Attributes' ].items() ) ), jobDict[ 'Update' ], jobDict[ 'HeartBeat' ] )
+        groups.setdefault( groupKey, [] ).append( jobID )
+    for groupKey, jobIDs in groups.items():
+      attributes, update, heartBeat = groupKey
+      result = self.__jobDB.setJobsAttributes( jobIDs, [ name for name, _value in attributes ],
+                                               [ value for _name, value in attributes ],
+                                               update = update, heartBeat = heartBeat )
+      batch.setResult( jobIDs, result )
+
+    for attribute in ( 'StartExecTime', 'EndExecTime' ):
+      jobIDs = [ jobID for jobID in jobs if jobs[ jobID ][ attribute ] ]
+      if jobIDs:
+        batch.setResult( jobIDs, self.__jobDB.setJobsExecTime( jobIDs, attribute ) )
+
+    # The status updates of unknown jobs fail and are not logged
+    missingJobs = []
+    jobIDs = [ jobID for jobID in jobs if jobs[ jobID ][ 'CheckExists' ] ]
+    if jobIDs:
+      result = self.__jobDB.getAttributesForJobList( jobIDs, [ 'Status' ] )
+      batch.setResult( jobIDs, result )
+      if result[ 'OK' ]:
+        missingJobs = [ jobID for jobID in jobIDs if int( jobID ) not in result[ 'Value' ] ]
+        for jobID in missingJobs:
+          batch.setResult( [ jobID ], S_ERROR( 'Job %d does not exist' % int( jobID ) ) )
+
+    parametersDict = {}
+    for jobID in jobs:
+      if jobs[ jobID ][ 'Parameters' ]:
+        parametersDict[ jobID ] = jobs[ jobID ][ 'Parameters' ].items()
+    if parametersDict:
+      batch.setResult( parametersDict.keys(), self.__jobDB.setJobsParameters( parametersDict ) )
+
+    heartBeatRecords = []
+    for jobID in jobs:
+      heartBeatRecords.extend( [ ( jobID, name, value ) for name, value in jobs[ jobID ][ 'HeartBeatData' ] ] )
+    if heartBeatRecords:
+      result = self.__jobDB.addHeartBeatRecords( heartBeatRecords )
+      batch.setResult( set( [ record[0] for record in heartBeatRecords ] ), result )
+
+    loggingRecords = [ record for record in batch.loggingRecords if record[0] not in missingJobs ]
+    if loggingRecords:
+      result = self.__logDB.addLoggingRecords( loggingRecords )
+      batch.setResult( set( [ record[0] for record in loggingRecords ] ), result )
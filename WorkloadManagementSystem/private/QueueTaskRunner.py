@@ -0,0 +1,110 @@
+""" Concurrent execution of a call per queue, isolating the slow computing elements
+
+    The SiteDirector talks to each of its queues with calls that can take from
+    milliseconds to minutes, depending on the computing element. The runner
+    makes the calls of a cycle in a bounded number of threads and stops waiting
+    for a call once it has been running for more than the timeout. Its thread
+    is replaced so the other queues are still served, and the call goes on in
+    the background. The queue is busy until the call ends, and it is skipped by
+    the runs made in the meantime.
+"""
+
+__RCSID__ = "$Id$"
+
+import time
+import threading
+
+from DIRAC import S_ERROR, gLogger
+
+class _Run( object ):
+  """ Calls of a run of the runner
+  """
+
+  def __init__( self, function, keyList ):
+    self.function = function
+    self.pending = list( reversed( keyList ) )
+    self.running = {}
+    self.results = {}
+    self.finished = False
+
+class QueueTaskRunner( object ):
+
+  def __init__( self, maxThreads = 10, timeout = 300 ):
+    """
+    :param maxThreads: maximum number of calls running at the same time
+    :param timeout: seconds after which a run stops waiting for a call
+    """
+    self.maxThreads = max( 1, maxThreads )
+    self.timeout = timeout
+    self.log = gLogger.getSubLogger( "QueueTaskRunner" )
+    self.__cond = threading.Condition()
+    self.__busyKeys = set()
+
+  def isBusy( self, key ):
+    """ Whether a call left running by a previous run has not ended yet
+    """
+    return key in self.__busyKeys
+
+  def getBusyKeys( self ):
+    return set( self.__busyKeys )
+
+  def run( self, function, keyList ):
+    """ Call function( key ) for each key that is not busy
+
+    :return: dict key -> ( result, seconds ). A call that raised gets S_ERROR as
+             result, and so does a call that was left running after the timeout
+    """
+    self.__cond.acquire()
+    try:
+      run = _Run( function, [ key for key in keyList if key not in self.__busyKeys ] )
+      for _i in range( min( self.maxThreads, len( run.pending ) ) ):
+        self.__startWorker( run )
+      while run.pending or run.running:
+        now = time.time()
+        for key, startTime in run.running.items():
+          if now - startTime < self.timeout:
+            continue
+          self.log.warn( "Call still running, not waiting for it", "%s: %d seconds" % ( key, now - startTime ) )
+          del run.running[ key ]
+          run.results[ key ] = ( S_ERROR( "Call still running after %d seconds" % self.timeout ), now - startTime )
+          # The thread of the call goes away when it ends
+          if run.pending:
+            self.__startWorker( run )
+        if run.pending or run.running:
+          # Waiting with a timeout so the main thread still gets the signals
+          self.__cond.wait( 1 )
+      run.finished = True
+      return run.results
+    finally:
+      self.__cond.release()
+
+  def __startWorker( self, run ):
+    thread = threading.Thread( target = self.__worker, args = ( run, ) )
+    thread.setDaemon( 1 )
+    thread.start()
+
+  def __worker( self, run ):
+    key = None
+    result = None
+    while True:
+      self.__cond.acquire()
+      try:
+        if key is not None:
+          self.__busyKeys.discard( key )
+          self.__cond.notifyAll()
+          if key not in run.running:
+            # The run stopped waiting for this call and replaced the thread
+            return
+          run.results[ key ] = ( result, time.time() - run.running.pop( key ) )
+        if run.finished or not run.pending:
+          return
+        key = run.pending.pop()
+        run.running[ key ] = time.time()
+        self.__busyKeys.add( key )
+      finally:
+        self.__cond.release()
+      try:
+        result = run.function( key )
+      except Exception, excp:
+        self.log.exception( "Exception in call for %s" % key )
+        result = S_ERROR( "Exception in call for %s: %s" % ( key, str( excp ) ) )
@@ -0,0 +1,161 @@
+""" Content addressed storage of the sandbox files of the SandboxStore
+
+    Each sandbox file is stored once, in a directory sharded by its hash, under
+    the objects directory of the store. The sandbox paths of the owners are hard
+    links to the stored file, so identical sandboxes uploaded by many owners take
+    the space of one, and the link count of the stored file is its reference
+    count: it is removed with the last sandbox path linked to it.
+
+    The files are received into temporary files in the store, on the same file
+    system, and added with links and a rename, so a sandbox path is never seen
+    half written. A file is stored with a link that fails if the file exists, so
+    concurrent first uploads of a content do not replace each other's file.
+"""
+
+__RCSID__ = "$Id$"
+
+import os
+import errno
+import tempfile
+
+from DIRAC import S_OK, S_ERROR, gLogger
+
+def sameContent( filePath1, filePath2, bufferSize = 1048576 ):
+  """ Whether two files have the same content
+  """
+  if os.path.getsize( filePath1 ) != os.path.getsize( filePath2 ):
+    return False
+  file1 = open( filePath1, "rb" )
+  try:
+    file2 = open( filePath2, "rb" )
+    try:
+      while True:
+        data = file1.read( bufferSize )
+        if data != file2.read( bufferSize ):
+          return False
+        if not data:
+          return True
+    finally:
+      file2.close()
+  finally:
+    file1.close()
+
+class SandboxContentStore( object ):
+
+  def __init__( self, basePath ):
+    """ Store under basePath, the directory of the local sandboxes
+    """
+    self.basePath = basePath
+    self.objectsDir = os.path.join( basePath, "objects" )
+    self.tmpDir = os.path.join( basePath, "tmp" )
+    self.log = gLogger.getSubLogger( "SandboxContentStore" )
+
+  def __makeDirs( self, dirPath ):
+    try:
+      os.makedirs( dirPath )
+    except OSError:
+      # Created by some other request in the meantime
+      if not os.path.isdir( dirPath ):
+        raise
+
+  def getObjectPath( self, fileName ):
+    """ Path of the stored file for a sandbox file name, that starts with its hash
+    """
+    return os.path.join( self.objectsDir, fileName[0:3], fileName[3:6], fileName )
+
+  def getTempFile( self ):
+    """ Temporary file to receive a sandbox in
+
+    :return: S_OK( ( file descriptor, path ) )
+    """
+    try:
+      self.__makeDirs( self.tmpDir )
+      return S_OK( tempfile.mkstemp( prefix = "DSB.", dir = self.tmpDir ) )
+    except OSError, e:
+      return S_ERROR( "Cannot create temporal file: %s" % str( e ) )
+
+  def addFile( self, tmpPath, sbPath ):
+    """ Add a received file to the store and link sbPath to it. The temporary
+        file is consumed. If the store already holds a file with the same name
+        but a different content, sbPath gets its own copy
+
+    :return: S_OK( True if the content was already stored )
+    """
+    objectPath = self.getObjectPath( os.path.basename( sbPath ) )
+    try:
+      self.__makeDirs( os.path.dirname( sbPath ) )
+      if os.path.isfile( sbPath ):
+        os.unlink( tmpPath )
+        return S_OK( True )
+      self.__makeDirs( os.path.dirname( objectPath ) )
+      if self.__publishObject( tmpPath, objectPath ):
+        # The temporary file is now a link to the stored file
+        os.rename( tmpPath, sbPath )
+        return S_OK( False )
+      if self.__linkObject( objectPath, tmpPath, sbPath ):
+        os.unlink( tmpPath )
+        return S_OK( True )
+      # Not shared, the sandbox keeps its own file
+      os.rename( tmpPath, sbPath )
+    except ( IOError, OSError ), e:
+      return S_ERROR( "Cannot store sandbox %s: %s" % ( sbPath, str( e ) ) )
+    return S_OK( False )
+
+  def __publishObject( self, tmpPath, objectPath ):
+    """ Store the temporary file as objectPath, unless a file is already stored there
+
+    :return: True if stored
+    """
+    try:
+      os.link( tmpPath, objectPath )
+    except OSError, e:
+      if e.errno != errno.EEXIST:
+        # No hard links in the file system
+        self.log.verbose( "Cannot store sandbox file", "%s: %s" % ( objectPath, str( e ) ) )
+      return False
+    return True
+
+  def __linkObject( self, objectPath, tmpPath, sbPath ):
+    """ Link sbPath to the stored file if it has the content of tmpPath
+
+    :return: True if linked
+    """
+    try:
+      if tmpPath and not sameContent( objectPath, tmpPath ):
+        self.log.warn( "Stored sandbox with the same name but different content", objectPath )
+        return False
+      os.link( objectPath, sbPath )
+    except ( IOError, OSError ), e:
+      if getattr( e, 'errno', None ) == errno.EEXIST:
+        return True
+      if getattr( e, 'errno', None ) != errno.ENOENT:
+        # Too many links or no hard links in the file system
+        self.log.verbose( "Cannot link sandbox to the stored file", "%s: %s" % ( sbPath, str( e ) ) )
+      return False
+    return True
+
+  def removeFile( self, sbPath ):
+    """ Remove a sandbox path, and the stored file if it was its last link
+
+    :return: S_OK( True if the stored file was removed )
+    """
+    objectPath = self.getObjectPath( os.path.basename( sbPath ) )
+    try:
+      try:
+        sbStat = os.stat( sbPath )
+        os.unlink( sbPath )
+      except OSError, e:
+        if e.errno != errno.ENOENT:
+          raise
+        return S_OK( False )
+      try:
+        objectStat = os.stat( objectPath )
+      except OSError:
+        return S_OK( False )
+      if objectStat.st_ino != sbStat.st_ino or objectStat.st_dev != sbStat.st_dev or objectStat.st_nlink > 1:
+        return S_OK( False )
+      # A sandbox linked in the meantime keeps the content through its own link
+      os.unlink( objectPath )
+    except OSError, e:
+      return S_ERROR( "Cannot remove sandbox %s: %s" % ( sbPath, str( e ) ) )
+    return S_OK( True )
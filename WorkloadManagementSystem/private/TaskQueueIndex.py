@@ -0,0 +1,320 @@
+""" In-memory index of the task queues
+
+    The Matcher can keep the definition of all the task queues in memory and
+    select the ones matching a resource without querying the TaskQueueDB. Only
+    the extraction of the job is then done in the DB. The index is reloaded
+    periodically from the DB and kept up to date with the task queue events
+    happening in the same process.
+
+    The matching rules are the ones of TaskQueueDB.__generateTQMatchSQL. Values
+    are compared stripped and case insensitive as the default collation of the
+    TaskQueueDB tables does.
+"""
+
+__RCSID__ = "$Id$"
+
+import time
+import heapq
+import types
+import random
+import threading
+
+def _normList( value ):
+  """ Normalized list of values of a match or task queue field
+  """
+  if type( value ) not in ( types.ListType, types.TupleType ):
+    value = [ value ]
+  return [ str( v ).strip().lower() for v in value ]
+
+class TaskQueueIndex( object ):
+
+  def __init__( self, singleValueFields, multiValueMatchFields, tagMatchFields = ( 'Tag', ),
+                bannedJobMatchFields = ( 'Site', ), strictRequireMatchFields = (),
+                isJobSharingGroup = None, maxAge = 15 ):
+    """
+    :param isJobSharingGroup: function returning True if a group has the JobSharing property
+    :param maxAge: seconds after which the index has to be reloaded from the DB
+    """
+    self.__singleValueFields = singleValueFields
+    self.__multiValueMatchFields = multiValueMatchFields
+    self.__tagMatchFields = tagMatchFields
+    self.__bannedJobMatchFields = bannedJobMatchFields
+    self.__strictRequireMatchFields = strictRequireMatchFields
+    self.__isJobSharingGroup = isJobSharingGroup
+    self.maxAge = maxAge
+    self.__lock = threading.Lock()
+    self.__loadTime = 0
+    self.__tqs = {}
+    #( setup, group ) -> set of TQIds
+    self.__buckets = {}
+    #Multi value field -> value -> set of TQIds, and the TQIds without values for each field
+    self.__valueIndex = {}
+    self.__emptyIndex = {}
+
+  def isExpired( self ):
+    return time.time() - self.__loadTime > self.maxAge
+
+  def isLoaded( self ):
+    return self.__loadTime > 0
+
+  def invalidate( self ):
+    """ Force a reload before the next match
+    """
+    self.__loadTime = 0
+
+  def getNumTaskQueues( self ):
+    return len( self.__tqs )
+
+  def load( self, tqData ):
+    """ Replace the contents of the index
+
+    :param dict tqData: task queues as returned by TaskQueueDB.retrieveTaskQueues
+    """
+    tqs = {}
+    buckets = {}
+    valueIndex = {}
+    emptyIndex = {}
+    for field in self.__multiValueMatchFields:
+      valueIndex[ "%ss" % field ] = {}
+      emptyIndex[ "%ss" % field ] = set()
+    for tqId in tqData:
+      tqDef = tqData[ tqId ]
+      tq = { 'OwnerDN' : tqDef[ 'OwnerDN' ],
+             'OwnerGroup' : tqDef[ 'OwnerGroup' ],
+             'Priority' : max( float( tqDef[ 'Priority' ] ), 1e-10 ),
+             'Jobs' : tqDef[ 'Jobs' ],
+             'CPUTime' : tqDef[ 'CPUTime' ] }
+      for field in self.__singleValueFields:
+        if field != 'CPUTime':
+          tq[ "norm%s" % field ] = _normList( tqDef[ field ] )[0]
+      for field in self.__multiValueMatchFields:
+        for tqField in ( "%ss" % field, "Banned%ss" % field ):
+          tq[ tqField ] = frozenset( _normList( tqDef.get( tqField, [] ) ) )
+      tqs[ tqId ] = tq
+      buckets.setdefault( ( tq[ 'normSetup' ], tq[ 'normOwnerGroup' ] ), set() ).add( tqId )
+      for tqField in valueIndex:
+        if not tq[ tqField ]:
+          emptyIndex[ tqField ].add( tqId )
+        for value in tq[ tqField ]:
+          valueIndex[ tqField ].setdefault( value, set() ).add( tqId )
+    self.__lock.acquire()
+    try:
+      self.__tqs = tqs
+      self.__buckets = buckets
+      self.__valueIndex = valueIndex
+      self.__emptyIndex = emptyIndex
+      self.__loadTime = time.time()
+    finally:
+      self.__lock.release()
+
+  def jobInserted( self, tqId ):
+    self.__lock.acquire()
+    try:
+      if tqId in self.__tqs:
+        self.__tqs[ tqId ][ 'Jobs' ] += 1
+      else:
+        self.__loadTime = 0
+    finally:
+      self.__lock.release()
+
+  def jobExtracted( self, tqId ):
+    """ A job has been taken out of a task queue. Task queues are dropped from the
+        index once they look empty, they will come back with the next reload if
+        jobs were added meanwhile by another process
+    """
+    self.__lock.acquire()
+    try:
+      if tqId in self.__tqs:
+        self.__tqs[ tqId ][ 'Jobs' ] -= 1
+        if self.__tqs[ tqId ][ 'Jobs' ] < 1:
+          self.__remove( tqId )
+    finally:
+      self.__lock.release()
+
+  def dropTaskQueue( self, tqId ):
+    self.__lock.acquire()
+    try:
+      if tqId in self.__tqs:
+        self.__remove( tqId )
+    finally:
+      self.__lock.release()
+
+  def setPriorities( self, prioDict ):
+    self.__lock.acquire()
+    try:
+      for tqId in prioDict:
+        if tqId in self.__tqs:
+          self.__tqs[ tqId ][ 'Priority' ] = max( float( prioDict[ tqId ] ), 1e-10 )
+    finally:
+      self.__lock.release()
+
+  def __remove( self, tqId ):
+    tq = self.__tqs.pop( tqId )
+    bucketKey = ( tq[ 'normSetup' ], tq[ 'normOwnerGroup' ] )
+    bucket = self.__buckets.get( bucketKey, set() )
+    bucket.discard( tqId )
+    if not bucket and bucketKey in self.__buckets:
+      del self.__buckets[ bucketKey ]
+    for tqField in self.__valueIndex:
+      self.__emptyIndex[ tqField ].discard( tqId )
+      for value in tq[ tqField ]:
+        self.__valueIndex[ tqField ][ value ].discard( tqId )
+
+  def match( self, tqMatchDict, numQueuesToGet = 1, negativeCond = None ):
+    """ Get the task queues matching a resource ordered randomly, weighted by their priority
+
+    :param dict tqMatchDict: resource description ( not escaped )
+    :return: list of ( TQId, OwnerDN, OwnerGroup )
+    """
+    normMatch = {}
+    for key in tqMatchDict:
+      if key not in ( 'CPUTime', 'JobID' ):
+        normMatch[ key ] = _normList( tqMatchDict[ key ] )
+    maxCPUTime = False
+    if 'CPUTime' in tqMatchDict:
+      maxCPUTime = tqMatchDict[ 'CPUTime' ]
+      if type( maxCPUTime ) in ( types.ListType, types.TupleType ):
+        maxCPUTime = max( maxCPUTime )
+    filters, requirements = self.__getRequirements( tqMatchDict, normMatch )
+    negativeConditions = False
+    if negativeCond:
+      negativeConditions = self.__getNegativeConditions( negativeCond )
+    self.__lock.acquire()
+    try:
+      matched = []
+      for tqId in self.__getCandidates( normMatch, filters ):
+        tq = self.__tqs[ tqId ]
+        if maxCPUTime is not False and tq[ 'CPUTime' ] > maxCPUTime:
+          continue
+        if not self.__matchOwner( tq, normMatch ):
+          continue
+        if not self.__matchRequirements( tq, requirements ):
+          continue
+        if negativeConditions and not self.__matchNegativeConditions( tq, negativeConditions ):
+          continue
+        matched.append( ( random.random() / tq[ 'Priority' ], tqId, tq[ 'OwnerDN' ], tq[ 'OwnerGroup' ] ) )
+    finally:
+      self.__lock.release()
+    if numQueuesToGet:
+      matched = heapq.nsmallest( numQueuesToGet, matched )
+    else:
+      matched.sort()
+    return [ ( tqId, ownerDN, ownerGroup ) for _, tqId, ownerDN, ownerGroup in matched ]
+
+  def __getCandidates( self, normMatch, filters ):
+    """ Preselect the task queues by Setup and OwnerGroup and apply the multi value
+        field filters using the value index
+    """
+    setups = False
+    if 'Setup' in normMatch:
+      setups = set( normMatch[ 'Setup' ] )
+    groups = False
+    if 'OwnerGroup' in normMatch:
+      groups = set( normMatch[ 'OwnerGroup' ] )
+    candidates = []
+    for bucketKey in self.__buckets:
+      if setups and bucketKey[0] not in setups:
+        continue
+      if groups and bucketKey[1] not in groups:
+        continue
+      candidates.extend( self.__buckets[ bucketKey ] )
+    candidates = set( candidates )
+    for check, tqField, values in filters:
+      if not candidates:
+        break
+      allowed = self.__emptyIndex[ tqField ]
+      if check == 'any':
+        allowed = set( allowed )
+        for value in values:
+          allowed.update( self.__valueIndex[ tqField ].get( value, () ) )
+      candidates.intersection_update( allowed )
+    return candidates
+
+  def __matchOwner( self, tq, normMatch ):
+    if 'OwnerDN' in normMatch and 'OwnerGroup' in normMatch:
+      if tq[ 'normOwnerGroup' ] not in normMatch[ 'OwnerGroup' ]:
+        return False
+      if self.__isJobSharingGroup and self.__isJobSharingGroup( tq[ 'OwnerGroup' ] ):
+        return True
+      return tq[ 'normOwnerDN' ] in normMatch[ 'OwnerDN' ]
+    if 'OwnerDN' in normMatch:
+      return tq[ 'normOwnerDN' ] in normMatch[ 'OwnerDN' ]
+    return True
+
+  def __getRequirements( self, tqMatchDict, normMatch ):
+    """ Translate the multi value fields of a resource into lists of
+        ( check, task queue field, values ). The first one can be resolved with the
+        value index, the second one has to be evaluated for each task queue
+    """
+    filters = []
+    requirements = []
+    for field in self.__multiValueMatchFields:
+      tqField = "%ss" % field
+      if tqMatchDict.get( field ):
+        values = frozenset( normMatch[ field ] )
+        if field in self.__tagMatchFields:
+          if not ( type( tqMatchDict[ field ] ) in types.StringTypes and values == frozenset( [ 'any' ] ) ):
+            requirements.append( ( 'tags', tqField, values ) )
+        else:
+          filters.append( ( 'any', tqField, values ) )
+        if field in self.__bannedJobMatchFields:
+          requirements.append( ( 'notBanned', "Banned%ss" % field, values ) )
+      elif field in self.__strictRequireMatchFields and field not in tqMatchDict:
+        filters.append( ( 'empty', tqField, None ) )
+      bannedField = "Banned%s" % field
+      if tqMatchDict.get( bannedField ):
+        requirements.append( ( 'notBanned', tqField, frozenset( normMatch[ bannedField ] ) ) )
+    return filters, requirements
+
+  def __matchRequirements( self, tq, requirements ):
+    for check, tqField, values in requirements:
+      tqValues = tq[ tqField ]
+      if not tqValues:
+        continue
+      if check == 'tags':
+        #All the tags required by the TQ have to be provided by the resource
+        if not tqValues.issubset( values ):
+          return False
+      elif check == 'notBanned':
+        #At least one of the values has to be out of the banned ones
+        if tqValues.issuperset( values ):
+          return False
+    return True
+
+  def __getNegativeConditions( self, negativeCond ):
+    """ Negative conditions can be a dict or a list of dicts. They are translated
+        into a list with the ( task queue field, values ) conditions of each dict
+    """
+    if type( negativeCond ) not in ( types.ListType, types.TupleType ):
+      negativeCond = [ negativeCond ]
+    negativeConditions = []
+    for condDict in negativeCond:
+      conditions = []
+      for field in condDict:
+        values = _normList( condDict[ field ] )
+        if field in self.__multiValueMatchFields:
+          conditions.append( ( "%ss" % field, frozenset( values ) ) )
+        elif field == 'CPUTime':
+          conditions.append( ( field, values ) )
+        elif field in self.__singleValueFields:
+          conditions.append( ( "norm%s" % field, values ) )
+      negativeConditions.append( conditions )
+    return negativeConditions
+
+  def __matchNegativeConditions( self, tq, negativeConditions ):
+    """ A task queue is eligible if it does not fulfill all the conditions of one of the dicts
+    """
+    for conditions in negativeConditions:
+      if not conditions:
+        return True
+      for tqField, values in conditions:
+        tqValue = tq[ tqField ]
+        if type( tqValue ) == frozenset:
+          if tqValue.isdisjoint( values ):
+            return True
+        else:
+          tqValue = str( tqValue )
+          for value in values:
+            if value != tqValue:
+              return True
+    return False
@@ -0,0 +1,30 @@
+""" Benchmark of the concurrent per-queue calls of the SiteDirector
+
+    Usage: python Bench_QueueTaskRunner.py [ numQueues [ numSlow [ threads ] ] ]
+    times a cycle over many queues with a few slow ones
+"""
+
+import sys
+import time
+
+from DIRAC import S_OK
+from DIRAC.WorkloadManagementSystem.private.QueueTaskRunner import QueueTaskRunner
+
+def benchmark( numQueues = 300, numSlow = 5, threads = 20 ):
+  def call( key ):
+    if key < numSlow:
+      time.sleep( 5 )
+    else:
+      time.sleep( 0.05 )
+    return S_OK()
+  start = time.time()
+  for key in range( numQueues ):
+    call( key )
+  print "Sequential cycle over %d queues, %d slow: %.2f s" % ( numQueues, numSlow, time.time() - start )
+  runner = QueueTaskRunner( maxThreads = threads, timeout = 2 )
+  start = time.time()
+  runner.run( call, range( numQueues ) )
+  print "Concurrent cycle with %d threads and a 2 s timeout: %.2f s" % ( threads, time.time() - start )
+
+if __name__ == '__main__':
+  benchmark( *[ int( arg ) for arg in sys.argv[1:] ] )
@@ -0,0 +1,66 @@
+""" Benchmark of the content addressed storage of the SandboxStore
+
+    Usage: python Bench_SandboxContentStore.py [ numUploads [ numThreads [ numDistinct ] ] ]
+    times numUploads parallel uploads of sandboxes with numDistinct different contents
+"""
+
+import sys
+import os
+import time
+import shutil
+import tempfile
+import threading
+
+from DIRAC.WorkloadManagementSystem.private.SandboxContentStore import SandboxContentStore
+from Test_SandboxContentStore import sandboxPath, upload
+
+def benchmark( numUploads = 2000, numThreads = 16, numDistinct = 20, sandboxSize = 1048576 ):
+  contents = [ os.urandom( sandboxSize ) for _i in range( numDistinct ) ]
+  for useStore in ( False, True ):
+    basePath = tempfile.mkdtemp()
+    store = SandboxContentStore( basePath )
+    nextUpload = [ 0 ]
+    lock = threading.Lock()
+    def uploader():
+      while True:
+        lock.acquire()
+        index = nextUpload[0]
+        nextUpload[0] += 1
+        lock.release()
+        if index >= numUploads:
+          return
+        data = contents[ index % numDistinct ]
+        sbPath = sandboxPath( basePath, "user%d.group" % index, data )
+        if useStore:
+          upload( store, sbPath, data )
+        else:
+          # Each owner gets its own file
+          os.makedirs( os.path.dirname( sbPath ) )
+          sbFile = open( sbPath, "wb" )
+          sbFile.write( data )
+          sbFile.close()
+    start = time.time()
+    threads = [ threading.Thread( target = uploader ) for _i in range( numThreads ) ]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    elapsed = time.time() - start
+    # The links to the same file are counted once
+    fileSizes = {}
+    for dirPath, _dirNames, fileNames in os.walk( basePath ):
+      for fileName in fileNames:
+        fileStat = os.stat( os.path.join( dirPath, fileName ) )
+        fileSizes[ fileStat.st_ino ] = fileStat.st_size
+    diskUsage = sum( fileSizes.values() )
+    if useStore:
+      layout = "content addressed"
+    else:
+      layout = "one file per owner"
+    print "%s: %d uploads of %d contents in %.2f s, %.1f MiB/s received, %.1f MiB on disk" % ( layout, numUploads, numDistinct, elapsed,
+                                                                                         numUploads * sandboxSize / 1048576.0 / elapsed,
+                                                                                         diskUsage / 1048576.0 )
+    shutil.rmtree( basePath )
+
+if __name__ == '__main__':
+  benchmark( *[ int( arg ) for arg in sys.argv[1:] ] )
@@ -0,0 +1,47 @@
+""" Benchmark of the in-memory task queue index
+
+    Usage: python Bench_TaskQueueIndex.py [ tqDump [ resourceDicts ] ]
+    times the matching of recorded pilot resource dicts. tqDump contains the repr
+    of the getActiveTaskQueues reply value and resourceDicts one repr'ed resource
+    dict per line. Synthetic ones are generated if they are not given.
+"""
+
+import sys
+import time
+import random
+
+from Test_TaskQueueIndex import getIndex, tqDef
+
+def benchmark( tqDumpFile = None, resourcesFile = None, repetitions = 5 ):
+  """ Time the matching of pilot resource dicts against a task queue dump
+  """
+  sites = [ 'LCG.Site%d.org' % i for i in range( 200 ) ]
+  groups = [ 'group%d' % i for i in range( 10 ) ]
+  if tqDumpFile:
+    tqData = eval( open( tqDumpFile ).read() )
+  else:
+    tqData = {}
+    for tqId in range( 5000 ):
+      tqData[ tqId ] = tqDef( ownerDN = '/DN/user%d' % ( tqId % 300 ), ownerGroup = random.choice( groups ),
+                              cpuTime = random.choice( [ 3600, 86400, 500000 ] ),
+                              Sites = random.sample( sites, random.randint( 0, 3 ) ),
+                              Platforms = random.choice( [ [], [ 'x86_64-slc6' ] ] ) )
+  if resourcesFile:
+    resources = [ eval( line ) for line in open( resourcesFile ) if line.strip() ]
+  else:
+    resources = [ { 'Setup' : 'Prod', 'CPUTime' : 200000, 'Site' : random.choice( sites ),
+                    'Platform' : [ 'x86_64-slc6', 'x86_64-slc5' ], 'OwnerGroup' : groups }
+                  for _i in range( 1000 ) ]
+  start = time.time()
+  tqIndex = getIndex( tqData )
+  print "Loaded %s task queues in %.3fs" % ( len( tqData ), time.time() - start )
+  best = 1e9
+  for _i in range( repetitions ):
+    start = time.time()
+    for resource in resources:
+      tqIndex.match( resource, numQueuesToGet = 10, negativeCond = { 'JobType' : [ 'User' ] } )
+    best = min( best, time.time() - start )
+  print "%s matches in %.3fs (%.2f ms per match)" % ( len( resources ), best, best * 1000 / len( resources ) )
+
+if __name__ == '__main__':
+  benchmark( *sys.argv[1:] )
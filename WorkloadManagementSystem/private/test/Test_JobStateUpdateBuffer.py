@@ -0,0 +1,171 @@
+""" Test cases for the coalescing buffer of the job state updates
+"""
+
+import time
+import threading
+import unittest
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.WorkloadManagementSystem.private.JobStateUpdateBuffer import JobStateUpdateBuffer
+
+class FakeJobDB( object ):
+  """ Records the calls, the first write can be held to build up a batch
+  """
+
+  def __init__( self, jobs ):
+    self.jobs = jobs
+    self.calls = []
+    self.hold = threading.Event()
+    self.hold.set()
+    self.failAttributes = {}
+    self.raiseException = False
+
+  def setJobsAttributes( self, jobIDs, attrNames, attrValues, update = False, heartBeat = False ):
+    self.hold.wait()
+    if self.raiseException:
+      raise RuntimeError( "DB is gone" )
+    self.calls.append( ( 'setJobsAttributes', sorted( jobIDs ), dict( zip( attrNames, attrValues ) ) ) )
+    for name, value in zip( attrNames, attrValues ):
+      if self.failAttributes.get( name ) == value:
+        return S_ERROR( "Cannot set %s" % name )
+    return S_OK()
+
+  def setJobsExecTime( self, jobIDs, attribute ):
+    self.calls.append( ( 'setJobsExecTime', sorted( jobIDs ), attribute ) )
+    return S_OK()
+
+  def getAttributesForJobList( self, jobIDs, attrList ):
+    return S_OK( dict( [ ( jobID, { 'Status' : 'Running' } ) for jobID in jobIDs if jobID in self.jobs ] ) )
+
+  def setJobsParameters( self, parametersDict ):
+    self.calls.append( ( 'setJobsParameters', dict( parametersDict ) ) )
+    return S_OK()
+
+  def addHeartBeatRecords( self, records ):
+    self.calls.append( ( 'addHeartBeatRecords', sorted( records ) ) )
+    return S_OK()
+
+class FakeLogDB( object ):
+
+  def __init__( self ):
+    self.records = []
+
+  def addLoggingRecords( self, records ):
+    self.records.extend( records )
+    return S_OK()
+
+class JobStateUpdateBufferTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.jobDB = FakeJobDB( range( 1, 100 ) )
+    self.logDB = FakeLogDB()
+    self.buffer = JobStateUpdateBuffer( self.jobDB, self.logDB, ackTimeout = 5 )
+
+  def tearDown( self ):
+    self.jobDB.hold.set()
+
+  def callInThreads( self, calls ):
+    results = {}
+    def run( key, function, args ):
+      results[ key ] = function( *args )
+    threads = [ threading.Thread( target = run, args = ( key, function, args ) )
+                for key, ( function, args ) in calls.items() ]
+    for thread in threads:
+      thread.start()
+    return threads, results
+
+  def test_idleWriter( self ):
+    """ An update is written at once when nothing else is being written
+    """
+    start = time.time()
+    result = self.buffer.setJobStatus( 1, 'Running', 'Application', source = 'Test' )
+    self.assertTrue( result[ 'OK' ] )
+    self.assertTrue( time.time() - start < 0.2 )
+    self.assertEqual( self.jobDB.calls[0], ( 'setJobsAttributes', [ 1 ], { 'Status' : 'Running',
+                                                                          'MinorStatus' : 'Application' } ) )
+    self.assertEqual( self.jobDB.calls[1], ( 'setJobsExecTime', [ 1 ], 'StartExecTime' ) )
+    self.assertEqual( [ record[:4] for record in self.logDB.records ], [ ( 1, 'Running', 'Application', 'idem' ) ] )
+
+  def test_groupCommit( self ):
+    """ The updates received while a batch is written are written together
+    """
+    self.jobDB.hold.clear()
+    firstThreads, firstResults = self.callInThreads( { 1 : ( self.buffer.setJobStatus, ( 1, 'Running' ) ) } )
+    time.sleep( 0.1 )
+    calls = {}
+    for jobID in range( 2, 12 ):
+      calls[ jobID ] = ( self.buffer.setJobStatus, ( jobID, 'Done', 'Execution Complete' ) )
+    calls[ 20 ] = ( self.buffer.setHeartBeatData, ( 20, { 'Node' : 'wn1' }, { 'CPU' : 1.0 } ) )
+    threads, results = self.callInThreads( calls )
+    time.sleep( 0.1 )
+    self.jobDB.hold.set()
+    for thread in firstThreads + threads:
+      thread.join()
+    self.assertTrue( firstResults[ 1 ][ 'OK' ] )
+    self.assertEqual( len( results ), 11 )
+    self.assertTrue( all( [ result[ 'OK' ] for result in results.values() ] ) )
+    attributeCalls = [ call for call in self.jobDB.calls if call[0] == 'setJobsAttributes' ]
+    # The first batch, then one statement for all the Done jobs and one for the heart beat
+    self.assertEqual( len( attributeCalls ), 3 )
+    self.assertTrue( ( 'setJobsAttributes', range( 2, 12 ), { 'Status' : 'Done',
+                                                              'MinorStatus' : 'Execution Complete' } ) in attributeCalls )
+    self.assertTrue( ( 'setJobsExecTime', range( 2, 12 ), 'EndExecTime' ) in self.jobDB.calls )
+    self.assertTrue( ( 'setJobsParameters', { 20 : [ ( 'Node', 'wn1' ) ] } ) in self.jobDB.calls )
+    self.assertTrue( ( 'addHeartBeatRecords', [ ( 20, 'CPU', 1.0 ) ] ) in self.jobDB.calls )
+
+  def test_lastValueWins( self ):
+    self.jobDB.hold.clear()
+    firstThreads, _results = self.callInThreads( { 1 : ( self.buffer.setJobStatus, ( 1, 'Running' ) ) } )
+    time.sleep( 0.1 )
+    threads, results = self.callInThreads( { 1 : ( self.buffer.setJobParameters, ( 2, [ ( 'A', '1' ) ] ) ),
+                                             2 : ( self.buffer.setJobParameters, ( 2, [ ( 'A', '2' ), ( 'B', '3' ) ] ) ) } )
+    time.sleep( 0.1 )
+    self.jobDB.hold.set()
+    for thread in firstThreads + threads:
+      thread.join()
+    parameterCalls = [ call for call in self.jobDB.calls if call[0] == 'setJobsParameters' ]
+    self.assertEqual( len( parameterCalls ), 1 )
+    self.assertEqual( dict( parameterCalls[0][1][2] ), { 'A' : '2', 'B' : '3' } )
+
+  def test_errors( self ):
+    """ Errors go to the jobs they concern only
+    """
+    self.jobDB.failAttributes = { 'Status' : 'Failed' }
+    self.jobDB.hold.clear()
+    firstThreads, _results = self.callInThreads( { 0 : ( self.buffer.setJobStatus, ( 1, 'Running' ) ) } )
+    time.sleep( 0.1 )
+    threads, results = self.callInThreads( { 2 : ( self.buffer.setJobStatus, ( 2, 'Failed' ) ),
+                                             3 : ( self.buffer.setJobStatus, ( 3, 'Done' ) ),
+                                             1000 : ( self.buffer.setJobStatus, ( 1000, 'Done' ) ) } )
+    time.sleep( 0.1 )
+    self.jobDB.hold.set()
+    for thread in firstThreads + threads:
+      thread.join()
+    self.assertFalse( results[ 2 ][ 'OK' ] )
+    self.assertTrue( results[ 3 ][ 'OK' ] )
+    self.assertFalse( results[ 1000 ][ 'OK' ] )
+    self.assertTrue( 'does not exist' in results[ 1000 ][ 'Message' ] )
+    # The unknown job is not logged
+    self.assertEqual( sorted( [ record[0] for record in self.logDB.records ] ), [ 1, 2, 3 ] )
+
+  def test_exception( self ):
+    self.jobDB.raiseException = True
+    result = self.buffer.setJobStatus( 1, 'Running' )
+    self.assertFalse( result[ 'OK' ] )
+    self.assertTrue( 'DB is gone' in result[ 'Message' ] )
+    # The writer goes on with the next batches
+    self.jobDB.raiseException = False
+    self.assertTrue( self.buffer.setJobStatus( 1, 'Running' )[ 'OK' ] )
+
+  def test_timeout( self ):
+    updateBuffer = JobStateUpdateBuffer( self.jobDB, self.logDB, ackTimeout = 0.2 )
+    self.jobDB.hold.clear()
+    result = updateBuffer.setJobStatus( 1, 'Running' )
+    self.assertFalse( result[ 'OK' ] )
+    self.assertTrue( 'Timeout' in result[ 'Message' ] )
+
+if __name__ == '__main__':
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( JobStateUpdateBufferTestCase )
+  gSuite = unittest.TestSuite( [ gSuite ] )
+  unittest.TextTestRunner( verbosity = 2 ).run( gSuite )
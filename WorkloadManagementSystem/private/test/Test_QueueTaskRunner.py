@@ -0,0 +1,79 @@
+""" Test cases for the concurrent per-queue calls of the SiteDirector
+"""
+
+import sys
+import time
+import threading
+if sys.version_info < ( 2, 7 ):
+  import unittest2 as unittest
+else:
+  import unittest
+
+from DIRAC import S_OK
+from DIRAC.WorkloadManagementSystem.private.QueueTaskRunner import QueueTaskRunner
+
+class QueueTaskRunnerTestCase( unittest.TestCase ):
+
+  def test_results( self ):
+    runner = QueueTaskRunner( maxThreads = 4, timeout = 10 )
+    def call( key ):
+      if key == 'bad':
+        raise ValueError( 'bad queue' )
+      return S_OK( key * 2 )
+    results = runner.run( call, [ 'a', 'b', 'c', 'bad' ] )
+    self.assertEqual( sorted( results ), [ 'a', 'b', 'bad', 'c' ] )
+    self.assertEqual( results[ 'a' ][0][ 'Value' ], 'aa' )
+    self.assertFalse( results[ 'bad' ][0][ 'OK' ] )
+    self.assertTrue( results[ 'c' ][1] >= 0 )
+    self.assertEqual( runner.getBusyKeys(), set() )
+
+  def test_maxThreads( self ):
+    runner = QueueTaskRunner( maxThreads = 3, timeout = 10 )
+    lock = threading.Lock()
+    counters = { 'running' : 0, 'max' : 0 }
+    def call( key ):
+      lock.acquire()
+      counters[ 'running' ] += 1
+      counters[ 'max' ] = max( counters[ 'max' ], counters[ 'running' ] )
+      lock.release()
+      time.sleep( 0.05 )
+      lock.acquire()
+      counters[ 'running' ] -= 1
+      lock.release()
+      return S_OK()
+    results = runner.run( call, range( 12 ) )
+    self.assertEqual( len( results ), 12 )
+    self.assertEqual( counters[ 'max' ], 3 )
+
+  def test_slowQueue( self ):
+    runner = QueueTaskRunner( maxThreads = 2, timeout = 0.5 )
+    release = threading.Event()
+    def call( key ):
+      if key == 'slow':
+        release.wait( 10 )
+      else:
+        time.sleep( 0.01 )
+      return S_OK( key )
+    start = time.time()
+    results = runner.run( call, [ 'slow' ] + [ 'q%d' % i for i in range( 20 ) ] )
+    # The other queues are served while the slow one hangs
+    self.assertTrue( time.time() - start < 3 )
+    self.assertEqual( len( results ), 21 )
+    self.assertFalse( results[ 'slow' ][0][ 'OK' ] )
+    self.assertTrue( results[ 'q19' ][0][ 'OK' ] )
+    # Still running, so skipped by the next run
+    self.assertTrue( runner.isBusy( 'slow' ) )
+    results = runner.run( call, [ 'slow', 'q0' ] )
+    self.assertEqual( sorted( results ), [ 'q0' ] )
+    release.set()
+    for _i in range( 100 ):
+      if not runner.isBusy( 'slow' ):
+        break
+      time.sleep( 0.05 )
+    self.assertFalse( runner.isBusy( 'slow' ) )
+    self.assertEqual( sorted( runner.run( call, [ 'slow' ] ) ), [ 'slow' ] )
+if __name__ == '__main__':
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( QueueTaskRunnerTestCase )
+  gSuite = unittest.TestSuite( [ gSuite ] )
+  unittest.TextTestRunner( verbosity = 2 ).run( gSuite )
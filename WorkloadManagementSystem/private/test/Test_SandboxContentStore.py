@@ -0,0 +1,180 @@
+""" Test cases for the content addressed storage of the SandboxStore
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+try:
+  import hashlib as md5
+except:
+  import md5
+if sys.version_info < ( 2, 7 ):
+  import unittest2 as unittest
+else:
+  import unittest
+
+from DIRAC.WorkloadManagementSystem.private.SandboxContentStore import SandboxContentStore
+
+def sandboxPath( basePath, owner, data ):
+  aHash = md5.md5( data ).hexdigest()
+  return os.path.join( basePath, "SandBox", owner[0], owner, aHash[0:3], aHash[3:6], "%s.tar.bz2" % aHash )
+
+def receive( store, data, chunkSize = 65536 ):
+  """ Receive data as the SandboxStoreHandler does, in chunks into a temporal file
+  """
+  result = store.getTempFile()
+  assert result[ 'OK' ]
+  tfd, tmpPath = result[ 'Value' ]
+  tmpFile = os.fdopen( tfd, "wb" )
+  for i in range( 0, len( data ), chunkSize ):
+    tmpFile.write( data[ i : i + chunkSize ] )
+  tmpFile.close()
+  return tmpPath
+
+def upload( store, sbPath, data, chunkSize = 65536 ):
+  return store.addFile( receive( store, data, chunkSize ), sbPath )
+
+class InterleavedStore( SandboxContentStore ):
+  """ Store running the queued uploads just before or after storing a file, as
+      concurrent uploads could
+  """
+
+  def __init__( self, basePath ):
+    SandboxContentStore.__init__( self, basePath )
+    self.before = []
+    self.after = []
+    self.results = []
+
+  def _SandboxContentStore__publishObject( self, tmpPath, objectPath ):
+    while self.before:
+      self.results.append( self.before.pop( 0 )() )
+    stored = SandboxContentStore._SandboxContentStore__publishObject( self, tmpPath, objectPath )
+    while self.after:
+      self.results.append( self.after.pop( 0 )() )
+    return stored
+
+class SandboxContentStoreTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.basePath = tempfile.mkdtemp()
+    self.store = SandboxContentStore( self.basePath )
+
+  def tearDown( self ):
+    shutil.rmtree( self.basePath )
+
+  def read( self, filePath ):
+    dataFile = open( filePath, "rb" )
+    try:
+      return dataFile.read()
+    finally:
+      dataFile.close()
+
+  def test_deduplication( self ):
+    sbPath1 = sandboxPath( self.basePath, "user1.group", "data" )
+    sbPath2 = sandboxPath( self.basePath, "user2.group", "data" )
+    result = upload( self.store, sbPath1, "data" )
+    self.assertTrue( result[ 'OK' ] )
+    self.assertFalse( result[ 'Value' ] )
+    result = upload( self.store, sbPath2, "data" )
+    self.assertTrue( result[ 'OK' ] )
+    self.assertTrue( result[ 'Value' ] )
+    self.assertEqual( self.read( sbPath2 ), "data" )
+    objectPath = self.store.getObjectPath( os.path.basename( sbPath1 ) )
+    self.assertEqual( os.stat( objectPath ).st_nlink, 3 )
+    self.assertEqual( os.listdir( self.store.tmpDir ), [] )
+
+  def test_removal( self ):
+    sbPath1 = sandboxPath( self.basePath, "user1.group", "data" )
+    sbPath2 = sandboxPath( self.basePath, "user2.group", "data" )
+    upload( self.store, sbPath1, "data" )
+    upload( self.store, sbPath2, "data" )
+    objectPath = self.store.getObjectPath( os.path.basename( sbPath1 ) )
+    result = self.store.removeFile( sbPath1 )
+    self.assertTrue( result[ 'OK' ] )
+    self.assertFalse( result[ 'Value' ] )
+    self.assertTrue( os.path.isfile( objectPath ) )
+    result = self.store.removeFile( sbPath2 )
+    self.assertTrue( result[ 'Value' ] )
+    self.assertFalse( os.path.exists( objectPath ) )
+    # Already removed
+    self.assertTrue( self.store.removeFile( sbPath2 )[ 'OK' ] )
+    # Stored again after being removed
+    self.assertFalse( upload( self.store, sbPath1, "data" )[ 'Value' ] )
+    self.assertTrue( os.path.isfile( objectPath ) )
+
+  def test_sameNameDifferentContent( self ):
+    sbPath1 = sandboxPath( self.basePath, "user1.group", "data" )
+    sbPath2 = os.path.join( os.path.dirname( sbPath1.replace( "user1", "user2" ) ), os.path.basename( sbPath1 ) )
+    upload( self.store, sbPath1, "data" )
+    result = upload( self.store, sbPath2, "other data" )
+    self.assertTrue( result[ 'OK' ] )
+    self.assertFalse( result[ 'Value' ] )
+    self.assertEqual( self.read( sbPath1 ), "data" )
+    self.assertEqual( self.read( sbPath2 ), "other data" )
+    self.store.removeFile( sbPath2 )
+    objectPath = self.store.getObjectPath( os.path.basename( sbPath1 ) )
+    self.assertEqual( self.read( objectPath ), "data" )
+
+  def test_legacyFile( self ):
+    sbPath = sandboxPath( self.basePath, "user1.group", "data" )
+    os.makedirs( os.path.dirname( sbPath ) )
+    dataFile = open( sbPath, "wb" )
+    dataFile.write( "data" )
+    dataFile.close()
+    result = self.store.removeFile( sbPath )
+    self.assertTrue( result[ 'OK' ] )
+    self.assertFalse( os.path.exists( sbPath ) )
+
+  def test_concurrentFirstUploads( self ):
+    """ A first upload of a content racing with another one, that stores the
+        content just before or just after it
+    """
+    for queue in ( 'before', 'after' ):
+      store = InterleavedStore( self.basePath )
+      sbPath1 = sandboxPath( self.basePath, "user1.%s" % queue, queue )
+      sbPath2 = sandboxPath( self.basePath, "user2.%s" % queue, queue )
+      getattr( store, queue ).append( lambda: upload( store, sbPath2, queue ) )
+      result = upload( store, sbPath1, queue )
+      self.assertTrue( result[ 'OK' ] )
+      self.assertTrue( store.results[0][ 'OK' ] )
+      # Exactly one of them stored the content
+      self.assertEqual( sorted( [ result[ 'Value' ], store.results[0][ 'Value' ] ] ), [ False, True ] )
+      objectStat = os.stat( store.getObjectPath( os.path.basename( sbPath1 ) ) )
+      self.assertEqual( objectStat.st_nlink, 3 )
+      for sbPath in ( sbPath1, sbPath2 ):
+        self.assertEqual( os.stat( sbPath ).st_ino, objectStat.st_ino )
+      self.assertEqual( os.listdir( store.tmpDir ), [] )
+
+  def test_parallelUploads( self ):
+    """ The sandboxes are all received before being added at the same time
+    """
+    errors = []
+    start = threading.Event()
+    def uploader( index ):
+      owner = "user%d.group" % index
+      received = [ ( receive( self.store, data ), data ) for data in ( "common", "own %d" % index ) ]
+      start.wait()
+      for tmpPath, data in received:
+        result = self.store.addFile( tmpPath, sandboxPath( self.basePath, owner, data ) )
+        if not result[ 'OK' ]:
+          errors.append( result[ 'Message' ] )
+    threads = [ threading.Thread( target = uploader, args = ( i, ) ) for i in range( 10 ) ]
+    for thread in threads:
+      thread.start()
+    start.set()
+    for thread in threads:
+      thread.join()
+    self.assertEqual( errors, [] )
+    objectPath = self.store.getObjectPath( os.path.basename( sandboxPath( self.basePath, "user0.group", "common" ) ) )
+    self.assertEqual( os.stat( objectPath ).st_nlink, 11 )
+    for index in range( 10 ):
+      sbPath = sandboxPath( self.basePath, "user%d.group" % index, "common" )
+      self.assertEqual( os.stat( sbPath ).st_ino, os.stat( objectPath ).st_ino )
+
+if __name__ == '__main__':
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( SandboxContentStoreTestCase )
+  gSuite = unittest.TestSuite( [ gSuite ] )
+  unittest.TextTestRunner( verbosity = 2 ).run( gSuite )
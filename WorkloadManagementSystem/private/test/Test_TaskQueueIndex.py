@@ -0,0 +1,95 @@
+""" Test cases for the in-memory task queue index
+"""
+
+import sys
+if sys.version_info < ( 2, 7 ):
+  import unittest2 as unittest
+else:
+  import unittest
+
+from DIRAC.WorkloadManagementSystem.private.TaskQueueIndex import TaskQueueIndex
+
+SINGLE_FIELDS = ( 'OwnerDN', 'OwnerGroup', 'Setup', 'CPUTime' )
+MATCH_FIELDS = ( 'GridCE', 'Site', 'GridMiddleware', 'Platform',
+                 'PilotType', 'SubmitPool', 'JobType', 'Tag' )
+STRICT_FIELDS = ( 'SubmitPool', 'Platform', 'PilotType', 'Tag' )
+
+def getIndex( tqData, sharingGroups = () ):
+  tqIndex = TaskQueueIndex( SINGLE_FIELDS, MATCH_FIELDS, strictRequireMatchFields = STRICT_FIELDS,
+                            isJobSharingGroup = lambda group: group in sharingGroups )
+  tqIndex.load( tqData )
+  return tqIndex
+
+def tqDef( ownerDN = '/DN/user', ownerGroup = 'user', setup = 'Prod', cpuTime = 86400, jobs = 10, **kwargs ):
+  tq = { 'OwnerDN' : ownerDN, 'OwnerGroup' : ownerGroup, 'Setup' : setup, 'CPUTime' : cpuTime,
+         'Priority' : 1.0, 'Jobs' : jobs }
+  tq.update( kwargs )
+  return tq
+
+class TaskQueueIndexTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.tqData = { 1 : tqDef(),
+                    2 : tqDef( cpuTime = 500000, Sites = [ 'LCG.CERN.ch' ] ),
+                    3 : tqDef( ownerDN = '/DN/prod', ownerGroup = 'prod', BannedSites = [ 'LCG.CNAF.it' ] ),
+                    4 : tqDef( Platforms = [ 'x86_64-slc6' ], JobTypes = [ 'MCSimulation' ] ),
+                    5 : tqDef( setup = 'Cert', Tags = [ 'MultiProcessor' ] ) }
+    self.resource = { 'Setup' : 'Prod', 'CPUTime' : 100000, 'Site' : 'LCG.CNAF.it',
+                      'OwnerGroup' : [ 'user', 'prod' ] }
+
+  def matchIds( self, tqIndex, resource, **kwargs ):
+    return sorted( [ tqTuple[0] for tqTuple in tqIndex.match( resource, numQueuesToGet = 0, **kwargs ) ] )
+
+  def test_singleValues( self ):
+    tqIndex = getIndex( self.tqData )
+    self.assertEqual( self.matchIds( tqIndex, self.resource ), [ 1 ] )
+    resource = dict( self.resource, Site = 'LCG.CERN.ch', CPUTime = 1000000 )
+    self.assertEqual( self.matchIds( tqIndex, resource ), [ 1, 2, 3 ] )
+    resource[ 'OwnerDN' ] = '/DN/user'
+    self.assertEqual( self.matchIds( tqIndex, resource ), [ 1, 2 ] )
+    tqIndex = getIndex( self.tqData, sharingGroups = ( 'prod', ) )
+    self.assertEqual( self.matchIds( tqIndex, resource ), [ 1, 2, 3 ] )
+
+  def test_multiValues( self ):
+    tqIndex = getIndex( self.tqData )
+    resource = dict( self.resource, Platform = 'x86_64-slc6', JobType = 'MCSimulation' )
+    self.assertEqual( self.matchIds( tqIndex, resource ), [ 1, 4 ] )
+    resource[ 'BannedJobType' ] = [ 'MCSimulation' ]
+    self.assertEqual( self.matchIds( tqIndex, resource ), [ 1 ] )
+    resource = dict( self.resource, Setup = 'Cert' )
+    self.assertEqual( self.matchIds( tqIndex, resource ), [] )
+    resource[ 'Tag' ] = [ 'MultiProcessor', 'GPU' ]
+    self.assertEqual( self.matchIds( tqIndex, resource ), [ 5 ] )
+    resource[ 'Tag' ] = 'Any'
+    self.assertEqual( self.matchIds( tqIndex, resource ), [ 5 ] )
+
+  def test_negativeCond( self ):
+    tqIndex = getIndex( self.tqData )
+    resource = dict( self.resource, Site = 'LCG.CERN.ch', CPUTime = 1000000 )
+    self.assertEqual( self.matchIds( tqIndex, resource, negativeCond = { 'Site' : 'LCG.CERN.ch' } ), [ 1, 3 ] )
+    self.assertEqual( self.matchIds( tqIndex, resource, negativeCond = { 'OwnerGroup' : [ 'prod' ] } ), [ 1, 2 ] )
+    negativeCond = [ { 'Site' : 'LCG.CERN.ch' }, { 'OwnerGroup' : [ 'prod' ] } ]
+    self.assertEqual( self.matchIds( tqIndex, resource, negativeCond = negativeCond ), [ 1, 2, 3 ] )
+
+  def test_events( self ):
+    tqIndex = getIndex( { 1 : tqDef( jobs = 2 ), 2 : tqDef( ownerGroup = 'prod' ) } )
+    tqIndex.jobExtracted( 1 )
+    self.assertEqual( self.matchIds( tqIndex, self.resource ), [ 1, 2 ] )
+    tqIndex.jobExtracted( 1 )
+    self.assertEqual( self.matchIds( tqIndex, self.resource ), [ 2 ] )
+    tqIndex.dropTaskQueue( 2 )
+    self.assertEqual( self.matchIds( tqIndex, self.resource ), [] )
+    self.assertFalse( tqIndex.isExpired() )
+    tqIndex.jobInserted( 3 )
+    self.assertTrue( tqIndex.isExpired() )
+
+  def test_priorities( self ):
+    tqIndex = getIndex( { 1 : tqDef(), 2 : tqDef() } )
+    tqIndex.setPriorities( { 1 : 1000000, 2 : 0.001 } )
+    firsts = [ tqIndex.match( self.resource )[0][0] for _i in range( 100 ) ]
+    self.assertTrue( firsts.count( 1 ) > 90 )
+if __name__ == '__main__':
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( TaskQueueIndexTestCase )
+  gSuite = unittest.TestSuite( [ gSuite ] )
+  unittest.TextTestRunner( verbosity = 2 ).run( gSuite )